@@ -0,0 +1,55 @@
+"""Add report_jobs table for background report generation
+
+Revision ID: 002_report_jobs
+Revises: 001_add_indexes
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '002_report_jobs'
+down_revision: Union[str, None] = '001_add_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create report_jobs."""
+    op.create_table(
+        'report_jobs',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('team_id', sa.Integer(), sa.ForeignKey('teams.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('kind', sa.String(20), nullable=True),
+        sa.Column('period', sa.String(20), nullable=False),
+        sa.Column('format', sa.String(10), nullable=True),
+        sa.Column('start_date', sa.DateTime(), nullable=True),
+        sa.Column('end_date', sa.DateTime(), nullable=True),
+        sa.Column('recipient_email', sa.String(255), nullable=True),
+        sa.Column('source', sa.String(20), nullable=True),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('file_path', sa.String(500), nullable=True),
+        sa.Column('file_size', sa.Integer(), nullable=True),
+        sa.Column('filename', sa.String(255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        if_not_exists=True
+    )
+    op.create_index('ix_report_jobs_user_id', 'report_jobs', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_report_jobs_user_created', 'report_jobs', ['user_id', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_report_jobs_status', 'report_jobs', ['status'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Drop report_jobs."""
+    op.drop_index('ix_report_jobs_status', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_user_created', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_user_id', table_name='report_jobs')
+    op.drop_table('report_jobs')
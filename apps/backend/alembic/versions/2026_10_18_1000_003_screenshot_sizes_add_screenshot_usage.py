@@ -0,0 +1,61 @@
+"""Store screenshot byte sizes and per-user screenshot usage
+
+Revision ID: 003_screenshot_sizes
+Revises: 002_report_jobs
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003_screenshot_sizes'
+down_revision: Union[str, None] = '002_report_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _file_size(path) -> int:
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def upgrade() -> None:
+    """Add size columns, backfill them from local files and create screenshot_usage."""
+    op.add_column('screenshots', sa.Column('image_size', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('screenshots', sa.Column('thumbnail_size', sa.Integer(), nullable=False, server_default='0'))
+
+    # Local files can still be measured once; cloud-only rows stay at 0
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, image_path, thumbnail_path FROM screenshots "
+        "WHERE image_path IS NOT NULL OR thumbnail_path IS NOT NULL"
+    )).fetchall()
+    for row in rows:
+        conn.execute(
+            sa.text("UPDATE screenshots SET image_size = :image, thumbnail_size = :thumb WHERE id = :id"),
+            {"image": _file_size(row.image_path), "thumb": _file_size(row.thumbnail_path), "id": row.id},
+        )
+
+    # Usage rows are built lazily from the sizes above on first read
+    op.create_table(
+        'screenshot_usage',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('screenshot_count', sa.Integer(), nullable=False),
+        sa.Column('total_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Drop screenshot_usage and the size columns."""
+    op.drop_table('screenshot_usage')
+    op.drop_column('screenshots', 'thumbnail_size')
+    op.drop_column('screenshots', 'image_size')
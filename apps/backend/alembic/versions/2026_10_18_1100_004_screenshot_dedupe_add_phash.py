@@ -0,0 +1,32 @@
+"""Add perceptual hash and duplicate reference to screenshots
+
+Revision ID: 004_screenshot_dedupe
+Revises: 003_screenshot_sizes
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '004_screenshot_dedupe'
+down_revision: Union[str, None] = '003_screenshot_sizes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add phash and duplicate_of to screenshots."""
+    op.add_column('screenshots', sa.Column('phash', sa.String(16), nullable=True))
+    op.add_column('screenshots', sa.Column('duplicate_of', sa.String(), nullable=True))
+    op.create_index('ix_screenshots_duplicate_of', 'screenshots', ['duplicate_of'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Drop phash and duplicate_of."""
+    op.drop_index('ix_screenshots_duplicate_of', table_name='screenshots')
+    op.drop_column('screenshots', 'duplicate_of')
+    op.drop_column('screenshots', 'phash')
@@ -0,0 +1,30 @@
+"""Add storage tier to screenshots
+
+Revision ID: 005_screenshot_tiers
+Revises: 004_screenshot_dedupe
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '005_screenshot_tiers'
+down_revision: Union[str, None] = '004_screenshot_dedupe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add storage_tier to screenshots; existing rows are originals."""
+    op.add_column('screenshots', sa.Column('storage_tier', sa.String(16), nullable=False, server_default='original'))
+    op.create_index('ix_screenshots_tier_time', 'screenshots', ['storage_tier', 'timestamp'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Drop storage_tier."""
+    op.drop_index('ix_screenshots_tier_time', table_name='screenshots')
+    op.drop_column('screenshots', 'storage_tier')
@@ -0,0 +1,43 @@
+"""Allow one scheduled report job per user and window
+
+Revision ID: 006_report_job_dedupe
+Revises: 005_screenshot_tiers
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '006_report_job_dedupe'
+down_revision: Union[str, None] = '005_screenshot_tiers'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Drop duplicate scheduled jobs, then index scheduled windows uniquely."""
+    op.execute("""
+        DELETE FROM report_jobs
+        WHERE source = 'scheduled'
+          AND id NOT IN (
+              SELECT MIN(id) FROM report_jobs
+              WHERE source = 'scheduled'
+              GROUP BY user_id, period, start_date, end_date
+          )
+    """)
+    op.create_index(
+        'ux_report_jobs_scheduled_window', 'report_jobs',
+        ['user_id', 'period', 'start_date', 'end_date'], unique=True,
+        sqlite_where=sa.text("source = 'scheduled'"),
+        postgresql_where=sa.text("source = 'scheduled'"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Drop the scheduled window index."""
+    op.drop_index('ux_report_jobs_scheduled_window', table_name='report_jobs')
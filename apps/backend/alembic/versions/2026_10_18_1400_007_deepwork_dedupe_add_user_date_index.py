@@ -0,0 +1,39 @@
+"""Allow one deep work score per user and day
+
+Revision ID: 007_deepwork_dedupe
+Revises: 006_report_job_dedupe
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007_deepwork_dedupe'
+down_revision: Union[str, None] = '006_report_job_dedupe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Drop duplicate daily scores, then index user and day uniquely."""
+    op.execute("""
+        DELETE FROM deep_work_scores
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM deep_work_scores
+            GROUP BY user_id, date
+        )
+    """)
+    op.create_index(
+        'ux_deep_work_scores_user_date', 'deep_work_scores',
+        ['user_id', 'date'], unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Drop the user and day index."""
+    op.drop_index('ux_deep_work_scores_user_date', table_name='deep_work_scores')
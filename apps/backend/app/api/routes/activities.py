@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func
 from typing import Optional, List
@@ -9,16 +10,21 @@ import hashlib
 import re
 
 from app.core.database import get_db
+from app.core.realtime_backend import get_realtime_backend
 from app.core.rate_limiter import limiter, api_rate_limit, sensitive_rate_limit
 from app.models.activity import Activity
 from app.models.user import User
 from app.api.routes.auth import get_current_user_optional
+from app.services.activity_events import activity_events
 from app.services.activity_tracker import (
     activity_watch_client,
     get_current_activity as aw_get_current_activity,
     check_activitywatch_status,
 )
 from app.services.classification import classify_activity
+from app.services.deepwork_service import streaming_scorer
+from app.services.live_totals import live_totals
+from app.services.auth_service import verify_token
 from app.services.url_analyzer import url_analyzer
 
 router = APIRouter()
@@ -289,9 +295,9 @@ async def get_daily_summary(
     result = await db.execute(query)
     activities = result.scalars().all()
 
-    # If no DB activities, fetch from ActivityWatch
+    # If no DB activities, fetch per-app/title totals from ActivityWatch
     if not activities:
-        aw_activities = await activity_watch_client.get_activities(filter_date, next_day)
+        aw_activities = await activity_watch_client.get_app_totals(filter_date, next_day, by_title=True)
 
         # Transform to our format with classification
         activities_data = []
@@ -481,6 +487,8 @@ async def create_manual_activity(
     db.add(new_activity)
     await db.commit()
     await db.refresh(new_activity)
+    await streaming_scorer.record_activity(new_activity)
+    await live_totals.record_activity(new_activity)
 
     return ActivityResponse(
         id=new_activity.id,
@@ -513,6 +521,10 @@ async def delete_activity(
     await db.delete(activity)
     await db.commit()
 
+    if activity.user_id is not None:
+        await streaming_scorer.invalidate(activity.user_id, activity.start_time.date())
+        await live_totals.refresh(db, activity.user_id)
+
     return {"status": "deleted", "id": activity_id}
 
 
@@ -575,6 +587,8 @@ async def track_browser_activity(
 
     db.add(new_activity)
     await db.commit()
+    await streaming_scorer.record_activity(new_activity)
+    await live_totals.record_activity(new_activity)
 
     return {"status": "recorded", "id": new_activity.id}
 
@@ -775,7 +789,7 @@ async def get_time_stats(
     )
 
     # Get today's stats
-    today_activities = await activity_watch_client.get_activities(day_start, now)
+    today_activities = await activity_watch_client.get_app_totals(day_start, now, by_title=True)
     today_total = sum(a.get("duration", 0) for a in today_activities)
     today_productive = sum(
         a.get("duration", 0) for a in today_activities
@@ -784,7 +798,7 @@ async def get_time_stats(
     today_productivity = round((today_productive / today_total * 100) if today_total > 0 else 0)
 
     # Get week stats
-    week_activities = await activity_watch_client.get_activities(week_start, now)
+    week_activities = await activity_watch_client.get_app_totals(week_start, now, by_title=True)
     week_total = sum(a.get("duration", 0) for a in week_activities)
     week_productive = sum(
         a.get("duration", 0) for a in week_activities
@@ -793,7 +807,7 @@ async def get_time_stats(
     week_productivity = round((week_productive / week_total * 100) if week_total > 0 else 0)
 
     # Get month stats
-    month_activities = await activity_watch_client.get_activities(month_start, now)
+    month_activities = await activity_watch_client.get_app_totals(month_start, now, by_title=True)
     month_total = sum(a.get("duration", 0) for a in month_activities)
     month_productive = sum(
         a.get("duration", 0) for a in month_activities
@@ -1512,8 +1526,31 @@ async def get_url_history(
 
 # ============== Real-Time Activity Endpoints ==============
 
-# In-memory tracking state
-_tracking_state = {"enabled": True}
+# ============== Shared Live State ==============
+# The tracking switch, the native tracker's latest report and extension events
+# live in the realtime backend, so every worker sees the same values
+
+TRACKING_KEY = "tracking:enabled"
+NATIVE_CURRENT_KEY = "native:current"
+NATIVE_HISTORY_KEY = "native:history"
+NATIVE_HISTORY_SIZE = 1000
+
+
+async def _is_tracking() -> bool:
+    backend = await get_realtime_backend()
+    enabled = await backend.get(TRACKING_KEY)
+    return True if enabled is None else enabled
+
+
+async def _set_tracking(enabled: bool):
+    backend = await get_realtime_backend()
+    await backend.set(TRACKING_KEY, enabled)
+
+
+async def _native_state() -> dict:
+    """The desktop app's latest report: {"current": ..., "last_update": ...}"""
+    backend = await get_realtime_backend()
+    return await backend.get(NATIVE_CURRENT_KEY) or {"current": None, "last_update": None}
 
 
 @router.get("/current-realtime")
@@ -1535,11 +1572,12 @@ async def get_current_activity_realtime(
         data_source = "none"  # Track where current activity data comes from
 
         # PRIORITY 1: Check native Tauri tracking first
-        native_current = _native_activity_state.get("current")
-        if native_current and _native_activity_state.get("last_update"):
+        native_state = await _native_state()
+        native_current = native_state["current"]
+        if native_current and native_state["last_update"]:
             # Only use native if it was updated recently (within 10 seconds)
             try:
-                last_update = datetime.fromisoformat(_native_activity_state["last_update"])
+                last_update = datetime.fromisoformat(native_state["last_update"])
                 time_diff = (now - last_update).total_seconds()
                 print(f"[DEBUG] Native state check: app={native_current.get('app_name')}, title={native_current.get('window_title')[:30] if native_current.get('window_title') else 'N/A'}, time_diff={time_diff:.1f}s")
                 if time_diff < 10:
@@ -1669,7 +1707,7 @@ async def get_current_activity_realtime(
                 "week_total": int(week_total),
                 "month_total": int(month_total)
             },
-            "is_tracking": _tracking_state["enabled"],
+            "is_tracking": await _is_tracking(),
             "timestamp": now.isoformat(),
             "data_source": data_source,  # "native", "activitywatch", "mock", or "none"
             "stats_source": stats_source  # "database" or "activitywatch"
@@ -1685,19 +1723,68 @@ async def get_current_activity_realtime(
                 "week_total": 0,
                 "month_total": 0
             },
-            "is_tracking": _tracking_state["enabled"],
+            "is_tracking": await _is_tracking(),
             "timestamp": datetime.now().isoformat()
         }
 
 
+@router.get("/stream")
+async def stream_current_activity(
+    token: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """
+    Server-Sent Events replacement for polling /current-realtime.
+
+    Authenticate with the Authorization header, or ?token=<jwt_token> since
+    EventSource can't set headers. The stream opens with a "snapshot" event
+    ({current_activity, stats, is_tracking, timestamp}), then sends an event
+    per change: "current_activity"/"activity_diff" with the fields of the
+    current activity that changed, and "totals" with the stats that changed.
+    """
+    user_id = current_user.id if current_user else _token_user_id(token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    # Seed the totals now, while the request's session is still open;
+    # ingestion keeps them current after that
+    seeded = await live_totals.get_totals(db, user_id)
+
+    async def snapshot() -> dict:
+        current = await activity_events.snapshot(user_id)
+        return {
+            "current_activity": current["data"] if current else None,
+            "stats": await live_totals.cached_totals(user_id) or seeded,
+            "is_tracking": await _is_tracking(),
+            "timestamp": datetime.now().isoformat(),
+        }
+
+    return StreamingResponse(
+        live_totals.stream(user_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _token_user_id(token: Optional[str]) -> Optional[int]:
+    """User id from a ?token=<jwt_token> query parameter, if it is valid"""
+    if not token:
+        return None
+    payload = verify_token(token)
+    try:
+        return int(payload["sub"]) if payload else None
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
 @router.post("/toggle-tracking")
 async def toggle_tracking(data: dict):
     """Toggle tracking on/off - also controls screenshot capture"""
     tracking = data.get("tracking", True)
 
-    # Sync both tracking states
-    _tracking_state["enabled"] = tracking
-    _native_activity_state["is_tracking"] = tracking
+    # One switch for every worker
+    await _set_tracking(tracking)
 
     # Also control screenshot capture
     from app.services.screenshot_service import screenshot_service
@@ -1805,7 +1892,7 @@ async def get_activity_diagnostics():
                 "error": status.get("error")
             },
             "tracking": {
-                "enabled": _tracking_state["enabled"],
+                "enabled": await _is_tracking(),
                 "has_current_activity": current is not None,
                 "current_app": current.app_name if current else None,
                 "activities_today": activity_count
@@ -1820,7 +1907,7 @@ async def get_activity_diagnostics():
             "timestamp": datetime.now().isoformat(),
             "error": str(e),
             "activitywatch": {"available": False},
-            "tracking": {"enabled": _tracking_state["enabled"]}
+            "tracking": {"enabled": await _is_tracking()}
         }
 
 
@@ -2146,16 +2233,31 @@ async def get_video_platform_activity(
 
 # ============== Browser Extension Endpoints ==============
 
-# In-memory storage for extension data (replace with database in production)
-_extension_data = {
-    "browser_activities": [],
-    "video_progress": [],
-    "video_completed": [],
-    "course_progress": [],
-    "heartbeats": {}
+# Recent extension events, kept in the realtime backend (newest N per kind)
+EXTENSION_LIST_SIZES = {
+    "browser_activities": 5000,
+    "video_progress": 1000,
+    "video_completed": 5000,
+    "course_progress": 5000,
 }
 
 
+async def _extension_push(name: str, item: dict) -> int:
+    """Append an extension event, keeping the newest EXTENSION_LIST_SIZES[name]"""
+    backend = await get_realtime_backend()
+    return await backend.push(f"extension:{name}", item, EXTENSION_LIST_SIZES[name])
+
+
+async def _extension_items(name: str) -> list:
+    backend = await get_realtime_backend()
+    return await backend.range(f"extension:{name}")
+
+
+async def _extension_count(name: str) -> int:
+    backend = await get_realtime_backend()
+    return await backend.length(f"extension:{name}")
+
+
 @router.post("/browser")
 async def receive_browser_activity(data: dict):
     """Receive browsing activity from extension"""
@@ -2165,23 +2267,20 @@ async def receive_browser_activity(data: dict):
         "source": "extension"
     }
 
-    _extension_data["browser_activities"].append(activity)
-
-    # Keep only last 5000
-    if len(_extension_data["browser_activities"]) > 5000:
-        _extension_data["browser_activities"] = _extension_data["browser_activities"][-5000:]
+    count = await _extension_push("browser_activities", activity)
 
-    return {"success": True, "id": len(_extension_data["browser_activities"])}
+    return {"success": True, "id": count}
 
 
 @router.post("/heartbeat")
 async def receive_heartbeat(data: dict):
     """Receive heartbeat from extension"""
     domain = data.get("domain", "unknown")
-    _extension_data["heartbeats"][domain] = {
+    backend = await get_realtime_backend()
+    await backend.set(f"extension:heartbeat:{domain}", {
         **data,
         "last_seen": datetime.now().isoformat()
-    }
+    }, ttl=24 * 60 * 60)
     return {"success": True}
 
 
@@ -2193,11 +2292,7 @@ async def receive_video_progress(data: dict):
         "received_at": datetime.now().isoformat()
     }
 
-    _extension_data["video_progress"].append(progress)
-
-    # Keep only last 1000
-    if len(_extension_data["video_progress"]) > 1000:
-        _extension_data["video_progress"] = _extension_data["video_progress"][-1000:]
+    await _extension_push("video_progress", progress)
 
     return {"success": True}
 
@@ -2210,7 +2305,7 @@ async def receive_video_completed(data: dict):
         "received_at": datetime.now().isoformat()
     }
 
-    _extension_data["video_completed"].append(completed)
+    await _extension_push("video_completed", completed)
 
     return {"success": True}
 
@@ -2223,7 +2318,7 @@ async def receive_course_progress(data: dict):
         "received_at": datetime.now().isoformat()
     }
 
-    _extension_data["course_progress"].append(progress)
+    await _extension_push("course_progress", progress)
 
     return {"success": True}
 
@@ -2231,8 +2326,8 @@ async def receive_course_progress(data: dict):
 @router.get("/extension/stats")
 async def get_extension_stats():
     """Get stats from browser extension data"""
-    browser_activities = _extension_data["browser_activities"]
-    video_progress = _extension_data["video_progress"]
+    browser_activities = await _extension_items("browser_activities")
+    video_progress = await _extension_items("video_progress")
 
     # Get today's data
     today = datetime.now().date().isoformat()
@@ -2281,8 +2376,8 @@ async def get_extension_stats():
         "totals": {
             "browser_activities": len(browser_activities),
             "video_progress_events": len(video_progress),
-            "videos_completed": len(_extension_data["video_completed"]),
-            "course_progress_events": len(_extension_data["course_progress"])
+            "videos_completed": await _extension_count("video_completed"),
+            "course_progress_events": await _extension_count("course_progress")
         }
     }
 
@@ -2293,8 +2388,8 @@ async def get_extension_video_history(
     limit: int = Query(default=50, le=200)
 ):
     """Get detailed video watching history from extension"""
-    video_progress = _extension_data["video_progress"]
-    video_completed = _extension_data["video_completed"]
+    video_progress = await _extension_items("video_progress")
+    video_completed = await _extension_items("video_completed")
 
     now = datetime.now()
     if period == "today":
@@ -2381,22 +2476,14 @@ class SessionActivityCreate(BaseModel):
     source: str = "native_event"
 
 
-# In-memory storage for native activities (for real-time tracking)
-_native_activity_state = {
-    "current": None,
-    "last_update": None,
-    "history": [],  # Keep last 1000 entries
-    "is_tracking": True
-}
-
-
-def get_current_native_activity() -> Optional[dict]:
+async def get_current_native_activity() -> Optional[dict]:
     """
     Get current native activity for use by other modules (e.g., screenshots).
     Returns the current activity dict or None if no recent activity.
     """
-    current = _native_activity_state.get("current")
-    last_update = _native_activity_state.get("last_update")
+    native_state = await _native_state()
+    current = native_state["current"]
+    last_update = native_state["last_update"]
 
     if not current or not last_update:
         return None
@@ -2472,6 +2559,17 @@ async def receive_activity_session(
 
     db.add(new_activity)
     await db.commit()
+    await streaming_scorer.record_activity(new_activity)
+    await live_totals.record_activity(new_activity)
+    await activity_events.publish(
+        new_activity.user_id,
+        data.app_name,
+        data.window_title,
+        data.url,
+        source=data.source,
+        started_at=start_time,
+        classification=classification,
+    )
 
     print(f"[Event Session] Saved: {data.app_name} - {data.window_title} ({data.duration}s)")
 
@@ -2497,8 +2595,8 @@ async def receive_native_activity(
 
     NOTE: This is the legacy endpoint. Use /session for accurate timing.
     """
-    # Update in-memory state for real-time tracking
-    _native_activity_state["current"] = {
+    # Update shared state for real-time tracking
+    current = {
         "app_name": data.app_name,
         "window_title": data.window_title,
         "url": data.url,
@@ -2507,16 +2605,11 @@ async def receive_native_activity(
         "timestamp": data.timestamp,
         "source": data.source
     }
-    _native_activity_state["last_update"] = datetime.now().isoformat()
+    backend = await get_realtime_backend()
+    await backend.set(NATIVE_CURRENT_KEY, {"current": current, "last_update": datetime.now().isoformat()})
 
     # Add to history
-    _native_activity_state["history"].append(_native_activity_state["current"])
-    if len(_native_activity_state["history"]) > 1000:
-        _native_activity_state["history"] = _native_activity_state["history"][-1000:]
-
-    # Skip saving if user is idle
-    if data.is_idle:
-        return {"status": "ok", "idle": True}
+    await backend.push(NATIVE_HISTORY_KEY, current, NATIVE_HISTORY_SIZE)
 
     # Classify the activity
     classification = classify_activity(
@@ -2525,6 +2618,21 @@ async def receive_native_activity(
         data.url
     )
 
+    # Push the change (if any) to the user's open dashboards
+    await activity_events.publish(
+        current_user.id if current_user else None,
+        data.app_name,
+        data.window_title,
+        data.url,
+        is_idle=data.is_idle,
+        source=data.source,
+        classification=classification,
+    )
+
+    # Skip saving if user is idle
+    if data.is_idle:
+        return {"status": "ok", "idle": True}
+
     # Parse timestamp
     try:
         timestamp = datetime.fromisoformat(data.timestamp.replace("Z", "+00:00"))
@@ -2551,6 +2659,8 @@ async def receive_native_activity(
 
     db.add(new_activity)
     await db.commit()
+    await streaming_scorer.record_activity(new_activity)
+    await live_totals.record_activity(new_activity)
 
     return {
         "status": "recorded",
@@ -2567,11 +2677,12 @@ async def get_native_current_activity():
     Get the current activity from native Tauri tracking.
     This is used by the frontend for real-time display.
     """
-    current = _native_activity_state.get("current")
+    native_state = await _native_state()
+    current = native_state["current"]
     if not current:
         return {
             "current_activity": None,
-            "is_tracking": _native_activity_state["is_tracking"],
+            "is_tracking": await _is_tracking(),
             "source": "native"
         }
 
@@ -2590,8 +2701,8 @@ async def get_native_current_activity():
             "productivity_score": classification.productivity_score,
             "is_productive": classification.productivity_type == "productive"
         },
-        "last_update": _native_activity_state["last_update"],
-        "is_tracking": _native_activity_state["is_tracking"],
+        "last_update": native_state["last_update"],
+        "is_tracking": await _is_tracking(),
         "source": "native"
     }
 
@@ -2600,8 +2711,9 @@ async def get_native_current_activity():
 async def get_native_activity_history(
     limit: int = Query(default=50, le=200)
 ):
-    """Get recent native activity history from in-memory storage."""
-    history = _native_activity_state["history"][-limit:]
+    """Get recent native activity history from shared state."""
+    backend = await get_realtime_backend()
+    history = await backend.range(NATIVE_HISTORY_KEY, limit)
 
     # Classify each entry
     result = []
@@ -2630,9 +2742,8 @@ async def toggle_native_tracking(data: dict):
     """Toggle native tracking on/off - also controls screenshot capture"""
     tracking = data.get("tracking", True)
 
-    # Sync both tracking states
-    _native_activity_state["is_tracking"] = tracking
-    _tracking_state["enabled"] = tracking
+    # One switch for every worker
+    await _set_tracking(tracking)
 
     # Also control screenshot capture (same as main toggle)
     from app.services.screenshot_service import screenshot_service
@@ -2654,10 +2765,12 @@ async def toggle_native_tracking(data: dict):
 @router.get("/native/status")
 async def get_native_tracking_status():
     """Get native tracking status"""
+    native_state = await _native_state()
+    backend = await get_realtime_backend()
     return {
-        "is_tracking": _native_activity_state["is_tracking"],
-        "has_current": _native_activity_state["current"] is not None,
-        "last_update": _native_activity_state["last_update"],
-        "history_count": len(_native_activity_state["history"]),
+        "is_tracking": await _is_tracking(),
+        "has_current": native_state["current"] is not None,
+        "last_update": native_state["last_update"],
+        "history_count": await backend.length(NATIVE_HISTORY_KEY),
         "source": "native"
     }
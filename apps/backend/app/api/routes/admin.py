@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, desc
 from typing import Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 from pydantic import BaseModel
 
 from app.core.database import get_db
@@ -693,6 +693,77 @@ async def get_online_users(
     }
 
 
+# ============================================================================
+# Background Jobs
+# ============================================================================
+
+@router.get("/jobs/deepwork")
+@limiter.limit(api_rate_limit())
+async def get_deepwork_batch_status(
+    request: Request,
+    admin: User = Depends(require_admin),
+):
+    """Get throughput stats of the last nightly deep work recomputation"""
+    from app.services.deepwork_batch_service import deepwork_batch_service
+
+    return {
+        "last_run": deepwork_batch_service.last_run,
+        "workers": deepwork_batch_service.max_workers,
+        "chunk_size": deepwork_batch_service.chunk_size,
+    }
+
+
+@router.post("/jobs/deepwork/recompute")
+@limiter.limit(sensitive_rate_limit())
+async def run_deepwork_batch(
+    request: Request,
+    target_date: Optional[date] = Query(None, description="Day to recompute (defaults to yesterday)"),
+    db: AsyncSession = Depends(get_db),
+    admin: User = Depends(require_super_admin),
+):
+    """Recompute deep work scores for all active users on a day"""
+    from app.services.deepwork_batch_service import deepwork_batch_service
+
+    day = target_date or (datetime.utcnow().date() - timedelta(days=1))
+    return await deepwork_batch_service.recompute_day(db, day)
+
+
+@router.get("/jobs/reports")
+@limiter.limit(api_rate_limit())
+async def get_report_render_stats(
+    request: Request,
+    admin: User = Depends(require_admin),
+):
+    """Get PDF render pool load, queue/render timings and cache hit rate"""
+    from app.services.report_cache import report_pdf_cache
+    from app.services.report_renderer import report_renderer
+
+    return {
+        **report_renderer.get_stats(),
+        "cache": report_pdf_cache.get_stats(),
+    }
+
+
+@router.get("/jobs/screenshots")
+@limiter.limit(api_rate_limit())
+async def get_screenshot_capture_stats(
+    request: Request,
+    admin: User = Depends(require_admin),
+):
+    """Get screenshot capture timings, pending uploads, contact-sheet cache and tiering runs"""
+    from app.services.screenshot_service import screenshot_service
+    from app.services.screenshot_upload_queue import screenshot_upload_queue
+    from app.services.screenshot_sprite_service import screenshot_sprite_service
+    from app.services.screenshot_tiering_service import screenshot_tiering_service
+
+    return {
+        **screenshot_service.get_capture_stats(),
+        "upload_queue": await screenshot_upload_queue.get_stats(),
+        "sprites": screenshot_sprite_service.get_stats(),
+        "tiering": screenshot_tiering_service.get_stats(),
+    }
+
+
 # ============================================================================
 # Landing Page Admin Dashboard (Simple Token Auth)
 # These endpoints are for the marketing site admin panel
@@ -728,7 +728,7 @@ async def export_user_data(
     """
     from sqlalchemy import select
     from app.models import (
-        Activity, URLActivity, Screenshot, Goal, Streak,
+        Activity, URLActivity, Screenshot, ScreenshotUsage, Goal, Streak,
         Achievement, FocusSession, UserSettings
     )
     from app.models.team import TeamMember, Team
@@ -992,7 +992,7 @@ async def delete_account(
     """
     from sqlalchemy import select, delete as sql_delete
     from app.models import (
-        Activity, URLActivity, Screenshot, Goal, Streak,
+        Activity, URLActivity, Screenshot, ScreenshotUsage, Goal, Streak,
         Achievement, FocusSession, UserSettings
     )
     from app.models.team import TeamMember, Team
@@ -1058,6 +1058,9 @@ async def delete_account(
     await db.execute(
         sql_delete(Screenshot).where(Screenshot.user_id == user_id)
     )
+    await db.execute(
+        sql_delete(ScreenshotUsage).where(ScreenshotUsage.user_id == user_id)
+    )
 
     # 4. Delete goals, streaks, achievements
     await db.execute(
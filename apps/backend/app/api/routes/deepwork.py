@@ -11,7 +11,7 @@ from app.core.database import get_db
 from app.api.routes.auth import get_current_user
 from app.models.user import User
 from app.models.calendar import DeepWorkScore, FocusBlock
-from app.services.deepwork_service import deepwork_calculator
+from app.services.deepwork_service import deepwork_calculator, streaming_scorer
 
 
 router = APIRouter()
@@ -124,10 +124,8 @@ async def get_today_score(
     db: AsyncSession = Depends(get_db),
 ):
     """Get today's deep work score (for dashboard widget)"""
-    today = date.today()
-
-    # Calculate or get today's score
-    score = await deepwork_calculator.calculate_daily_score(db, current_user.id, today)
+    # Served from the running state fed by ingestion; recomputes only when stale
+    score = await streaming_scorer.get_today_score(db, current_user.id)
 
     # Determine status and message
     deep_work_score = score.deep_work_score or 0
@@ -180,6 +178,7 @@ async def calculate_score_for_date(
     db: AsyncSession = Depends(get_db),
 ):
     """Force recalculation of deep work score for a specific date"""
+    await streaming_scorer.invalidate(current_user.id, target_date)
     score = await deepwork_calculator.calculate_daily_score(db, current_user.id, target_date)
     return DeepWorkScoreResponse.from_orm_with_hours(score)
 
@@ -6,7 +6,8 @@ from datetime import datetime, timedelta
 from typing import Optional, List
 from enum import Enum
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func
 from pydantic import BaseModel
@@ -15,10 +16,13 @@ from app.core.database import get_db
 from app.api.routes.auth import get_current_user
 from app.models.user import User
 from app.models import Activity
+from app.services.report_job_service import report_job_service
+from app.services.report_cache import report_pdf_cache
 from app.services.report_service import (
-    ProductivityReportGenerator,
+    ReportData,
     ReportDataAggregator,
     ReportPeriod,
+    TeamReportAggregator,
 )
 from app.models.team import Team, TeamMember, TeamRole
 
@@ -75,6 +79,9 @@ class EmailReportRequest(BaseModel):
     """Request to send report via email"""
     period: ReportPeriod = ReportPeriod.WEEKLY
     recipient_email: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    background: bool = False  # Queue as a report job instead of sending inline
 
 
 class ScheduleReportRequest(BaseModel):
@@ -86,6 +93,143 @@ class ScheduleReportRequest(BaseModel):
     enabled: bool = True
 
 
+def report_to_json(data: ReportData) -> dict:
+    """Serialize report data for the JSON download format"""
+    return {
+        "period": data.period.value,
+        "start_date": data.start_date.isoformat(),
+        "end_date": data.end_date.isoformat(),
+        "user_name": data.user_name,
+        "user_email": data.user_email,
+        "metrics": {
+            "total_tracked_hours": round(data.total_tracked_hours, 2),
+            "productive_hours": round(data.productive_hours, 2),
+            "meeting_hours": round(data.meeting_hours, 2),
+            "deep_work_score": data.deep_work_score,
+            "productivity_percentage": round(data.productivity_percentage, 1),
+        },
+        "trends": {
+            "score_trend": data.score_trend,
+            "productivity_trend": data.productivity_trend,
+        },
+        "daily_stats": data.daily_stats,
+        "category_breakdown": data.category_breakdown,
+        "top_apps": data.top_apps,
+        "top_websites": data.top_websites,
+        "meetings": {
+            "count": data.meeting_count,
+            "total_hours": round(data.meeting_hours, 2),
+            "avg_duration": round(data.avg_meeting_duration, 0),
+            "organized": data.meetings_organized,
+        },
+        "insights": data.insights,
+        "recommendations": data.recommendations,
+    }
+
+
+class PinnedFileResponse(FileResponse):
+    """Sends a cached report file, releasing its cache pin however the send ends"""
+
+    def __init__(self, *args, cache_key: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            report_pdf_cache.release(self.cache_key)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag"""
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in client_etags or "*" in client_etags
+
+
+async def pdf_response(request: Request, data: ReportData, filename: str) -> Response:
+    """Serve a report PDF from the content-addressed cache with ETag revalidation"""
+    # The ETag is the content hash, so revalidation never touches the cache
+    etag = f'"{data.content_hash()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = await report_pdf_cache.get_or_render(data, pin=True)
+    return PinnedFileResponse(
+        cached.path, media_type="application/pdf", filename=filename, headers=headers,
+        cache_key=cached.key,
+    )
+
+
+def stored_pdf_response(request: Request, job) -> Response:
+    """Serve a finished job's PDF; its file never changes, so the job id is the ETag"""
+    etag = f'"{job.id}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(job.file_path, media_type="application/pdf", filename=job.filename, headers=headers)
+
+
+async def email_report(data: ReportData, pdf_bytes: bytes, email_to: str) -> None:
+    """Email a rendered report with a short summary"""
+    from app.services.email_service import EmailService
+
+    email_service = EmailService()
+
+    date_str = data.end_date.strftime("%B %d, %Y")
+    subject = f"Your {data.period.value.title()} Productivity Report - {date_str}"
+
+    html_content = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <h2 style="color: #6366f1;">Your Productivity Report is Ready!</h2>
+        <p>Hi {data.user_name},</p>
+        <p>Your {data.period.value} productivity report for {data.start_date.strftime('%B %d')} - {data.end_date.strftime('%B %d, %Y')} is attached.</p>
+
+        <div style="background: #f3f4f6; padding: 20px; border-radius: 10px; margin: 20px 0;">
+            <h3 style="margin: 0 0 15px 0; color: #1f2937;">Quick Summary</h3>
+            <table style="width: 100%;">
+                <tr>
+                    <td style="padding: 5px 0;"><strong>Deep Work Score:</strong></td>
+                    <td style="text-align: right; color: {'#22c55e' if data.deep_work_score >= 70 else '#f59e0b' if data.deep_work_score >= 40 else '#ef4444'};">{data.deep_work_score}/100</td>
+                </tr>
+                <tr>
+                    <td style="padding: 5px 0;"><strong>Productive Hours:</strong></td>
+                    <td style="text-align: right;">{data.productive_hours:.1f}h</td>
+                </tr>
+                <tr>
+                    <td style="padding: 5px 0;"><strong>Meeting Hours:</strong></td>
+                    <td style="text-align: right;">{data.meeting_hours:.1f}h</td>
+                </tr>
+                <tr>
+                    <td style="padding: 5px 0;"><strong>Productivity:</strong></td>
+                    <td style="text-align: right;">{data.productivity_percentage:.0f}%</td>
+                </tr>
+            </table>
+        </div>
+
+        <p style="color: #6b7280; font-size: 14px;">
+            Open the attached PDF for detailed analytics, charts, and personalized recommendations.
+        </p>
+
+        <p style="margin-top: 30px;">Keep up the great work!</p>
+        <p style="color: #6b7280;">- The Productify Pro Team</p>
+    </div>
+    """
+
+    filename = f"productivity_report_{data.period.value}_{data.end_date.strftime('%Y-%m-%d')}.pdf"
+
+    await email_service.send_email_with_attachment(
+        to_email=email_to,
+        subject=subject,
+        html_content=html_content,
+        attachment_data=pdf_bytes,
+        attachment_filename=filename,
+        attachment_type="application/pdf",
+    )
+
+
 # ═══════════════════════════════════════════════════════════════════
 # NEW ENHANCED ENDPOINTS
 # ═══════════════════════════════════════════════════════════════════
@@ -146,10 +290,12 @@ async def get_report_preview(
 
 @router.get("/download")
 async def download_report(
+    request: Request,
     period: ReportPeriod = Query(default=ReportPeriod.WEEKLY),
     format: ReportFormat = Query(default=ReportFormat.PDF),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    background: bool = Query(default=False, description="Queue the report and return a job id"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -163,6 +309,25 @@ async def download_report(
         if start_date:
             start_dt = datetime.fromisoformat(start_date)
 
+        if background:
+            job = await report_job_service.submit(
+                db,
+                user_id=current_user.id,
+                period=period,
+                format=format.value,
+                start_date=start_dt,
+                end_date=end_dt if end_date else None,
+            )
+            return job_accepted(job)
+
+        # Last week's report may already have been rendered by the Monday job;
+        # it is only served for the exact window it covers, which is what the
+        # desktop client asks for (reportWindow in lib/api/reports.ts)
+        if format == ReportFormat.PDF and period == ReportPeriod.WEEKLY and start_dt and end_date:
+            job = await report_job_service.find_pregenerated(db, current_user.id, period, start_dt, end_dt)
+            if job:
+                return stored_pdf_response(request, job)
+
         # Aggregate data
         aggregator = ReportDataAggregator(db)
         data = await aggregator.get_report_data(
@@ -173,53 +338,14 @@ async def download_report(
         )
 
         if format == ReportFormat.PDF:
-            # Generate PDF
-            generator = ProductivityReportGenerator()
-            pdf_bytes = generator.generate_report(data)
-
             # Create filename
             date_str = data.end_date.strftime("%Y-%m-%d")
             filename = f"productivity_report_{period.value}_{date_str}.pdf"
 
-            return Response(
-                content=pdf_bytes,
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f"attachment; filename={filename}"
-                }
-            )
+            return await pdf_response(request, data, filename)
         else:
             # Return JSON
-            return {
-                "period": data.period.value,
-                "start_date": data.start_date.isoformat(),
-                "end_date": data.end_date.isoformat(),
-                "user_name": data.user_name,
-                "user_email": data.user_email,
-                "metrics": {
-                    "total_tracked_hours": round(data.total_tracked_hours, 2),
-                    "productive_hours": round(data.productive_hours, 2),
-                    "meeting_hours": round(data.meeting_hours, 2),
-                    "deep_work_score": data.deep_work_score,
-                    "productivity_percentage": round(data.productivity_percentage, 1),
-                },
-                "trends": {
-                    "score_trend": data.score_trend,
-                    "productivity_trend": data.productivity_trend,
-                },
-                "daily_stats": data.daily_stats,
-                "category_breakdown": data.category_breakdown,
-                "top_apps": data.top_apps,
-                "top_websites": data.top_websites,
-                "meetings": {
-                    "count": data.meeting_count,
-                    "total_hours": round(data.meeting_hours, 2),
-                    "avg_duration": round(data.avg_meeting_duration, 0),
-                    "organized": data.meetings_organized,
-                },
-                "insights": data.insights,
-                "recommendations": data.recommendations,
-            }
+            return report_to_json(data)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
@@ -235,77 +361,37 @@ async def send_report_email(
     Send a report via email
     """
     try:
-        from app.services.email_service import EmailService
-
         # Parse dates
-        end_dt = datetime.now()
+        end_dt = datetime.fromisoformat(request.end_date) if request.end_date else datetime.now()
+        start_dt = datetime.fromisoformat(request.start_date) if request.start_date else None
+
+        if request.background:
+            job = await report_job_service.submit(
+                db,
+                user_id=current_user.id,
+                period=request.period,
+                kind="email",
+                start_date=start_dt,
+                end_date=end_dt if request.end_date else None,
+                recipient_email=request.recipient_email or current_user.email,
+            )
+            return {"message": "Report queued for email", "job_id": job.id, "success": True}
 
         # Aggregate data
         aggregator = ReportDataAggregator(db)
         data = await aggregator.get_report_data(
             user_id=current_user.id,
             period=request.period,
+            start_date=start_dt,
             end_date=end_dt,
         )
 
         # Generate PDF
-        generator = ProductivityReportGenerator()
-        pdf_bytes = generator.generate_report(data)
+        pdf_bytes = await report_pdf_cache.get_bytes(data)
 
         # Send email
-        email_service = EmailService()
         email_to = request.recipient_email or current_user.email
-
-        date_str = data.end_date.strftime("%B %d, %Y")
-        subject = f"Your {request.period.value.title()} Productivity Report - {date_str}"
-
-        html_content = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #6366f1;">Your Productivity Report is Ready!</h2>
-            <p>Hi {data.user_name},</p>
-            <p>Your {request.period.value} productivity report for {data.start_date.strftime('%B %d')} - {data.end_date.strftime('%B %d, %Y')} is attached.</p>
-
-            <div style="background: #f3f4f6; padding: 20px; border-radius: 10px; margin: 20px 0;">
-                <h3 style="margin: 0 0 15px 0; color: #1f2937;">Quick Summary</h3>
-                <table style="width: 100%;">
-                    <tr>
-                        <td style="padding: 5px 0;"><strong>Deep Work Score:</strong></td>
-                        <td style="text-align: right; color: {'#22c55e' if data.deep_work_score >= 70 else '#f59e0b' if data.deep_work_score >= 40 else '#ef4444'};">{data.deep_work_score}/100</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 5px 0;"><strong>Productive Hours:</strong></td>
-                        <td style="text-align: right;">{data.productive_hours:.1f}h</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 5px 0;"><strong>Meeting Hours:</strong></td>
-                        <td style="text-align: right;">{data.meeting_hours:.1f}h</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 5px 0;"><strong>Productivity:</strong></td>
-                        <td style="text-align: right;">{data.productivity_percentage:.0f}%</td>
-                    </tr>
-                </table>
-            </div>
-
-            <p style="color: #6b7280; font-size: 14px;">
-                Open the attached PDF for detailed analytics, charts, and personalized recommendations.
-            </p>
-
-            <p style="margin-top: 30px;">Keep up the great work!</p>
-            <p style="color: #6b7280;">- The Productify Pro Team</p>
-        </div>
-        """
-
-        filename = f"productivity_report_{request.period.value}_{data.end_date.strftime('%Y-%m-%d')}.pdf"
-
-        await email_service.send_email_with_attachment(
-            to_email=email_to,
-            subject=subject,
-            html_content=html_content,
-            attachment_data=pdf_bytes,
-            attachment_filename=filename,
-            attachment_type="application/pdf",
-        )
+        await email_report(data, pdf_bytes, email_to)
 
         return {"message": f"Report sent to {email_to}", "success": True}
 
@@ -313,12 +399,70 @@ async def send_report_email(
         raise HTTPException(status_code=500, detail=f"Failed to send report: {str(e)}")
 
 
+# ═══════════════════════════════════════════════════════════════════
+# REPORT JOBS
+# ═══════════════════════════════════════════════════════════════════
+
+def job_accepted(job) -> JSONResponse:
+    """202 response pointing the client at a queued job"""
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/reports/jobs/{job.id}",
+        },
+    )
+
+
+@router.get("/jobs")
+async def list_report_jobs(
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List the current user's recent report jobs"""
+    jobs = await report_job_service.list_jobs(db, current_user.id, limit)
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+
+@router.get("/jobs/{job_id}")
+async def get_report_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Poll a report job"""
+    job = await report_job_service.get_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/file")
+async def download_report_job_file(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Download the artifact of a completed report job"""
+    job = await report_job_service.get_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != "completed" or not job.file_path:
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+
+    media_type = "application/pdf" if job.filename.endswith(".pdf") else "application/json"
+    return FileResponse(job.file_path, media_type=media_type, filename=job.filename)
+
+
 # ═══════════════════════════════════════════════════════════════════
 # LEGACY ENDPOINTS (kept for backward compatibility)
 # ═══════════════════════════════════════════════════════════════════
 
 @router.get("/daily/{date_str}")
 async def download_daily_report_legacy(
+    request: Request,
     date_str: str,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -340,33 +484,26 @@ async def download_daily_report_legacy(
             end_date=end_date,
         )
 
-        generator = ProductivityReportGenerator()
-        pdf_bytes = generator.generate_report(data)
-
         filename = f"productivity-report-{data.end_date.strftime('%Y-%m-%d')}.pdf"
 
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return await pdf_response(request, data, filename)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
 
 
 @router.get("/daily")
 async def download_today_report_legacy(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Download today's report as PDF (legacy endpoint)"""
-    return await download_daily_report_legacy("today", db, current_user)
+    return await download_daily_report_legacy(request, "today", db, current_user)
 
 
 @router.get("/weekly")
 async def download_weekly_report_legacy(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -378,18 +515,9 @@ async def download_weekly_report_legacy(
             period=ReportPeriod.WEEKLY,
         )
 
-        generator = ProductivityReportGenerator()
-        pdf_bytes = generator.generate_report(data)
-
         filename = f"productivity-report-week-{data.start_date.strftime('%Y-%m-%d')}.pdf"
 
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return await pdf_response(request, data, filename)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
 
@@ -452,6 +580,7 @@ class TeamReportPreviewResponse(BaseModel):
     top_performers: List[dict]
     needs_attention: List[dict]
     team_trends: dict
+    daily_stats: List[dict] = []
     category_breakdown: List[dict]
     insights: List[str]
     recommendations: List[str]
@@ -524,31 +653,30 @@ async def get_team_report_preview(
         )
         members = members_result.all()
 
-        # Aggregate data for each member
-        aggregator = ReportDataAggregator(db)
-        member_data = []
-
-        for member, user in members:
-            try:
-                data = await aggregator.get_report_data(
-                    user_id=user.id,
-                    period=period,
-                    start_date=start_dt,
-                    end_date=end_dt,
-                )
-                member_data.append({
-                    "user_id": user.id,
-                    "name": user.name or user.email,
-                    "role": member.role.value,
-                    "deep_work_score": data.deep_work_score,
-                    "productive_hours": data.productive_hours,
-                    "meeting_hours": data.meeting_hours,
-                    "productivity_percentage": data.productivity_percentage,
-                    "total_hours": data.total_tracked_hours,
-                })
-            except Exception:
-                # Skip members with no data
-                continue
+        # Previous period of the same length, for trends
+        period_days = (end_dt - start_dt).days or 1
+        prev_end_dt = start_dt - timedelta(days=1)
+        prev_start_dt = prev_end_dt - timedelta(days=period_days)
+
+        # Aggregate every member in a fixed number of grouped queries
+        aggregator = TeamReportAggregator(db)
+        team_data = await aggregator.get_team_data(
+            user_ids=[user.id for _, user in members],
+            start_date=start_dt,
+            end_date=end_dt,
+            prev_start_date=prev_start_dt,
+            prev_end_date=prev_end_dt,
+        )
+
+        member_data = [
+            {
+                "user_id": user.id,
+                "name": user.name or user.email,
+                "role": member.role.value,
+                **team_data["members"][user.id],
+            }
+            for member, user in members
+        ]
 
         if not member_data:
             # Return empty report if no data
@@ -608,26 +736,7 @@ async def get_team_report_preview(
             recommendations.append("Implement team-wide focus blocks to improve deep work.")
         recommendations.append("Review the detailed member breakdowns to identify patterns.")
 
-        # Calculate team trends by comparing with previous period
-        period_days = (end_dt - start_dt).days or 1
-        prev_end_dt = start_dt - timedelta(days=1)
-        prev_start_dt = prev_end_dt - timedelta(days=period_days)
-
-        prev_member_data = []
-        for member, user in members:
-            try:
-                data = await aggregator.get_report_data(
-                    user_id=user.id,
-                    period=period,
-                    start_date=prev_start_dt,
-                    end_date=prev_end_dt,
-                )
-                prev_member_data.append({
-                    "deep_work_score": data.deep_work_score,
-                    "productivity_percentage": data.productivity_percentage,
-                })
-            except Exception:
-                continue
+        prev_member_data = list(team_data["previous"].values())
 
         # Calculate trends
         score_trend = 0
@@ -638,32 +747,14 @@ async def get_team_report_preview(
             score_trend = round(avg_score - prev_avg_score, 1)
             productivity_trend = round(avg_productivity - prev_avg_productivity, 1)
 
-        # Aggregate category breakdown from member data
-        category_totals = {}
-        for member, user in members:
-            try:
-                data = await aggregator.get_report_data(
-                    user_id=user.id,
-                    period=period,
-                    start_date=start_dt,
-                    end_date=end_dt,
-                )
-                for cat in data.category_breakdown:
-                    if cat.category not in category_totals:
-                        category_totals[cat.category] = {"hours": 0, "percentage": 0}
-                    category_totals[cat.category]["hours"] += cat.hours
-            except Exception:
-                continue
-
-        total_category_hours = sum(c["hours"] for c in category_totals.values())
-        category_breakdown = []
-        for cat_name, cat_data in sorted(category_totals.items(), key=lambda x: x[1]["hours"], reverse=True):
-            percentage = (cat_data["hours"] / total_category_hours * 100) if total_category_hours > 0 else 0
-            category_breakdown.append({
-                "category": cat_name,
-                "hours": round(cat_data["hours"], 2),
-                "percentage": round(percentage, 1),
-            })
+        category_breakdown = [
+            {
+                "category": cat["category"],
+                "hours": round(cat["hours"], 2),
+                "percentage": round(cat["percentage"], 1),
+            }
+            for cat in team_data["category_breakdown"]
+        ]
 
         return TeamReportPreviewResponse(
             team_name=team.name,
@@ -679,6 +770,7 @@ async def get_team_report_preview(
             top_performers=top_performers,
             needs_attention=needs_attention,
             team_trends={"score_trend": score_trend, "productivity_trend": productivity_trend},
+            daily_stats=team_data["daily_stats"],
             category_breakdown=category_breakdown[:10],
             insights=insights,
             recommendations=recommendations,
@@ -699,6 +791,7 @@ async def download_team_report(
     format: ReportFormat = Query(default=ReportFormat.JSON),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    background: bool = Query(default=False, description="Queue the report and return a job id"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -708,6 +801,19 @@ async def download_team_report(
     """
     team = await get_team_with_admin_check(team_id, current_user, db)
 
+    if background:
+        job = await report_job_service.submit(
+            db,
+            user_id=current_user.id,
+            period=period,
+            kind="team",
+            format="json",
+            team_id=team_id,
+            start_date=datetime.fromisoformat(start_date) if start_date else None,
+            end_date=datetime.fromisoformat(end_date) if end_date else None,
+        )
+        return job_accepted(job)
+
     # Get preview data (reuse the preview endpoint logic)
     preview = await get_team_report_preview(
         team_id=team_id,
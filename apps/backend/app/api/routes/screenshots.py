@@ -1,18 +1,24 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, func
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from pathlib import Path
+import asyncio
 import os
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.screenshot import Screenshot
 from app.models.user import User
 from app.api.routes.auth import get_current_user_optional
 from app.services.screenshot_service import screenshot_service
+from app.services.screenshot_file_index import screenshot_file_index
+from app.services.screenshot_sprite_service import screenshot_sprite_service
+from app.services.firebase_storage import firebase_storage, thumbnail_storage_path
+from app.services.storage_usage_service import detach_duplicates, release_screenshots
 from app.services.activity_tracker import activity_watch_client
 from app.services.classification import classify_activity
 from app.api.routes.activities import get_current_native_activity
@@ -33,6 +39,7 @@ class ScreenshotResponse(BaseModel):
     category: str
     is_blurred: bool
     productivity_type: str = "neutral"
+    duplicate_of: Optional[str] = None  # Earlier capture whose image this one reuses
 
     class Config:
         from_attributes = True
@@ -100,6 +107,7 @@ async def get_screenshots(
             category=s.category,
             is_blurred=s.is_blurred,
             productivity_type=_get_productivity_type(s.app_name, s.window_title, s.url),
+            duplicate_of=s.duplicate_of,
         )
         for s in screenshots
     ]
@@ -115,24 +123,77 @@ def _get_productivity_type(app_name: Optional[str], window_title: Optional[str],
 
 # These routes MUST come before /{screenshot_id} to avoid route conflicts
 @router.get("/files")
-async def list_screenshot_files(limit: int = Query(50)):
-    """List screenshot files directly from disk (without database)"""
-    screenshots_dir = screenshot_service.screenshots_path
-    files = []
-
-    if screenshots_dir.exists():
-        for f in sorted(screenshots_dir.glob("*.jpg"), key=lambda x: x.stat().st_mtime, reverse=True):
-            if "_thumb" not in f.name:
-                files.append({
-                    "filename": f.name,
-                    "path": str(f),
-                    "size_kb": round(f.stat().st_size / 1024, 1),
-                    "modified": datetime.fromtimestamp(f.stat().st_mtime).isoformat(),
-                })
-                if len(files) >= limit:
-                    break
-
-    return {"screenshots": files, "count": len(files), "directory": str(screenshots_dir)}
+async def list_screenshot_files(limit: int = Query(50), offset: int = Query(0)):
+    """List screenshot files on disk, newest first (without database)"""
+    # Served from the maintained file index rather than a directory walk
+    screenshots_dir = screenshot_file_index.directory
+    files = [
+        {
+            "filename": entry["name"],
+            "path": str(screenshots_dir / entry["name"]),
+            "size_kb": round(entry["size"] / 1024, 1),
+            "modified": datetime.fromtimestamp(entry["mtime"]).isoformat(),
+            "format": entry["format"],
+        }
+        for entry in await screenshot_file_index.list(limit=limit, offset=offset)
+    ]
+
+    return {
+        "screenshots": files,
+        "count": len(files),
+        "total": await screenshot_file_index.count(),
+        "directory": str(screenshots_dir),
+    }
+
+
+@router.get("/sprites")
+async def get_screenshot_sprite(
+    date: Optional[str] = Query(None, description="Day to show (YYYY-MM-DD), default today"),
+    page: int = Query(0, ge=0, description="Zero-based page, oldest first"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """A page of the day's thumbnails as one contact-sheet image plus tile offsets"""
+    if current_user:
+        scope = ("gallery", current_user.id)
+        conditions = [or_(Screenshot.user_id == current_user.id, Screenshot.user_id == None)]
+    else:
+        scope = ("gallery", None)
+        conditions = []
+
+    sheet = await screenshot_sprite_service.get_sheet(db, scope, conditions, parse_sprite_day(date), page)
+    return with_sprite_url(sheet)
+
+
+@router.get("/sprites/{key}")
+async def get_screenshot_sprite_image(key: str, request: Request):
+    """Contact-sheet image; keys are content hashes, so it never changes"""
+    if len(key) != 32 or any(c not in "0123456789abcdef" for c in key):
+        raise HTTPException(status_code=400, detail="Invalid sprite key")
+
+    headers = _image_headers(f'"{key}"')
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    path = await screenshot_sprite_service.get_path(key)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Sprite not found")
+
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+
+def parse_sprite_day(value: Optional[str]):
+    if not value:
+        return datetime.now().date()
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+
+def with_sprite_url(sheet: dict) -> dict:
+    sheet["sprite_url"] = f"/api/screenshots/sprites/{sheet['sprite_key']}" if sheet["sprite_key"] else None
+    return sheet
 
 
 def _get_media_type(filename: str) -> str:
@@ -142,6 +203,24 @@ def _get_media_type(filename: str) -> str:
     return "image/jpeg"
 
 
+def _image_etag(name: str, size: int) -> str:
+    """Strong ETag for a screenshot image; ids are unique and files are never rewritten in place"""
+    return f'"{name}-{size}"'
+
+
+def _image_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.screenshot_image_max_age}, immutable",
+    }
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in client_etags or "*" in client_etags
+
+
 def _sanitize_filename(filename: str) -> str:
     """
     Sanitize filename to prevent path traversal attacks.
@@ -198,15 +277,29 @@ def _validate_screenshot_path(filename: str) -> Path:
 
 
 @router.get("/files/{filename}")
-async def get_screenshot_file(filename: str):
+async def get_screenshot_file(filename: str, request: Request):
     """Get a screenshot file directly by filename"""
     # Validate and sanitize the path to prevent path traversal
     filepath = _validate_screenshot_path(filename)
 
+    # Indexed images revalidate without touching the disk; thumbnails need a stat
+    entry = await screenshot_file_index.get(filepath.name)
+    if entry is not None:
+        size = entry["size"]
+    else:
+        try:
+            size = (await asyncio.to_thread(filepath.stat)).st_size
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Screenshot file not found")
+
+    headers = _image_headers(_image_etag(filepath.name, size))
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     if not filepath.exists():
         raise HTTPException(status_code=404, detail="Screenshot file not found")
 
-    return FileResponse(filepath, media_type=_get_media_type(filename), filename=filepath.name)
+    return FileResponse(filepath, media_type=_get_media_type(filename), filename=filepath.name, headers=headers)
 
 
 @router.post("/capture/quick")
@@ -235,8 +328,13 @@ async def get_screenshot_stats(
     """Get screenshot statistics"""
     start = datetime.now() - timedelta(days=days)
 
-    # Build query with user filter for consistency with list endpoint
-    query = select(Screenshot).where(
+    # One grouped query over stored sizes; no file stats
+    query = select(
+        Screenshot.category,
+        func.count(Screenshot.id),
+        func.coalesce(func.sum(Screenshot.image_size + Screenshot.thumbnail_size), 0),
+        func.count(Screenshot.duplicate_of),
+    ).where(
         and_(
             Screenshot.timestamp >= start,
             Screenshot.is_deleted == False
@@ -252,28 +350,18 @@ async def get_screenshot_stats(
             )
         )
 
-    result = await db.execute(query)
-    screenshots = result.scalars().all()
-
-    # Calculate stats
-    total_count = len(screenshots)
-
-    # Calculate storage
-    total_size = 0
-    for s in screenshots:
-        try:
-            if s.image_path and os.path.exists(s.image_path):
-                total_size += os.path.getsize(s.image_path)
-            if s.thumbnail_path and os.path.exists(s.thumbnail_path):
-                total_size += os.path.getsize(s.thumbnail_path)
-        except OSError:
-            pass
+    result = await db.execute(query.group_by(Screenshot.category))
 
     # Category breakdown
     categories: dict = {}
-    for s in screenshots:
-        cat = s.category
-        categories[cat] = categories.get(cat, 0) + 1
+    total_count = 0
+    total_size = 0
+    duplicate_count = 0
+    for category, count, size, duplicates in result.all():
+        categories[category] = count
+        total_count += count
+        total_size += size
+        duplicate_count += duplicates
 
     return {
         "period_days": days,
@@ -282,6 +370,9 @@ async def get_screenshot_stats(
         "storage_mb": round(total_size / (1024 * 1024), 2),
         "categories": categories,
         "daily_average": round(total_count / days, 1) if days > 0 else 0,
+        # Near-identical captures stored as references to an earlier image
+        "duplicate_count": duplicate_count,
+        "dedupe_ratio": round(duplicate_count / total_count, 3) if total_count else 0,
     }
 
 
@@ -312,16 +403,18 @@ async def get_screenshot(
         category=screenshot.category,
         is_blurred=screenshot.is_blurred,
         productivity_type=_get_productivity_type(screenshot.app_name, screenshot.window_title, screenshot.url),
+        duplicate_of=screenshot.duplicate_of,
     )
 
 
 @router.get("/{screenshot_id}/image")
 async def get_screenshot_image(
     screenshot_id: str,
+    request: Request,
     thumbnail: bool = Query(False, description="Return thumbnail instead"),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get the actual screenshot image file"""
+    """Get the actual screenshot image file, or a redirect to it in cloud storage"""
     result = await db.execute(
         select(Screenshot).where(
             and_(Screenshot.id == screenshot_id, Screenshot.is_deleted == False)
@@ -332,23 +425,77 @@ async def get_screenshot_image(
     if not screenshot:
         raise HTTPException(status_code=404, detail="Screenshot not found")
 
+    if not screenshot.image_path and screenshot.storage_path:
+        return await _cloud_image_redirect(screenshot, thumbnail)
+
     # Get appropriate path
     if thumbnail and screenshot.thumbnail_path:
         image_path = screenshot.thumbnail_path
+        size = screenshot.thumbnail_size
     else:
         image_path = screenshot.image_path
+        size = screenshot.image_size
+
+    # The stored size changes whenever the file does, so no stat is needed to revalidate
+    variant = "thumb" if image_path == screenshot.thumbnail_path else "image"
+    headers = _image_headers(_image_etag(f"{screenshot.id}-{variant}", size))
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
 
     # Check if file exists
-    if not os.path.exists(image_path):
+    if not image_path or not os.path.exists(image_path):
         raise HTTPException(status_code=404, detail="Screenshot file not found")
 
     return FileResponse(
         image_path,
         media_type=_get_media_type(image_path),
-        filename=os.path.basename(image_path)
+        filename=os.path.basename(image_path),
+        headers=headers,
+    )
+
+
+async def _cloud_image_redirect(screenshot: Screenshot, thumbnail: bool) -> Response:
+    """Redirect to a (cached) signed URL for an uploaded screenshot"""
+    storage_path = screenshot.storage_path
+    public_url = screenshot.storage_url
+    if thumbnail:
+        storage_path = thumbnail_storage_path(storage_path)
+        public_url = screenshot.thumbnail_url or public_url
+
+    url = await firebase_storage.get_signed_url(storage_path) or public_url
+    if not url:
+        raise HTTPException(status_code=404, detail="Screenshot file not found")
+
+    # The redirect may be cached by the browser only while the signed URL is reused
+    return RedirectResponse(
+        url,
+        status_code=307,
+        headers={"Cache-Control": f"private, max-age={firebase_storage.signed_url_cache_seconds}"},
     )
 
 
+# Registered before /{screenshot_id} so "cleanup" is not taken as an id
+@router.delete("/cleanup")
+async def cleanup_old_screenshots(
+    older_than_days: int = Query(30, description="Delete screenshots older than N days"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Clean up old screenshots"""
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    # Batched, set-based deletes; see ScreenshotService.cleanup_screenshots
+    result = await screenshot_service.cleanup_screenshots(db, cutoff)
+    deleted_count = result["deleted_count"]
+    freed_bytes = result["freed_bytes"]
+
+    return {
+        "status": "cleaned",
+        "deleted_count": deleted_count,
+        "freed_mb": round(freed_bytes / (1024 * 1024), 2),
+        "cutoff_date": cutoff.isoformat(),
+    }
+
+
 @router.delete("/{screenshot_id}")
 async def delete_screenshot(
     screenshot_id: str,
@@ -365,16 +512,19 @@ async def delete_screenshot(
         raise HTTPException(status_code=404, detail="Screenshot not found")
 
     if permanent:
-        # Delete files
+        # Delete files, unless a near-duplicate takes them over
         try:
-            if screenshot.image_path and os.path.exists(screenshot.image_path):
-                os.remove(screenshot.image_path)
-            if screenshot.thumbnail_path and os.path.exists(screenshot.thumbnail_path):
-                os.remove(screenshot.thumbnail_path)
+            if await detach_duplicates(db, [screenshot]):
+                if screenshot.image_path and os.path.exists(screenshot.image_path):
+                    os.remove(screenshot.image_path)
+                if screenshot.thumbnail_path and os.path.exists(screenshot.thumbnail_path):
+                    os.remove(screenshot.thumbnail_path)
+                await screenshot_file_index.discard([screenshot.image_path])
         except OSError as e:
             print(f"Error deleting screenshot files: {e}")
 
         # Delete from database
+        await release_screenshots(db, [screenshot])
         await db.delete(screenshot)
     else:
         # Soft delete
@@ -392,7 +542,7 @@ async def capture_screenshot_now(
 ):
     """Capture a screenshot immediately"""
     # Get current activity for metadata - prioritize native tracking
-    native_activity = get_current_native_activity()
+    native_activity = await get_current_native_activity()
     current_activity = await activity_watch_client.get_current_activity()
 
     # Use native activity if available (from Tauri desktop app)
@@ -411,7 +561,8 @@ async def capture_screenshot_now(
 
     # Capture screenshot with user context
     result = await screenshot_service.capture_screenshot(
-        user_id=current_user.id if current_user else None
+        user_id=current_user.id if current_user else None,
+        app_name=app_name,
     )
 
     if not result:
@@ -452,12 +603,16 @@ class ScreenshotSettingsUpdate(BaseModel):
     enabled: Optional[bool] = None
     interval_min: Optional[int] = None
     interval_max: Optional[int] = None
-    blur_mode: Optional[str] = None
+    blur_mode: Optional[str] = None  # always, excluded, never
     quality: Optional[int] = None
     excluded_apps: Optional[List[str]] = None
     retention_days: Optional[int] = None  # 0 = keep forever
     resolution: Optional[str] = None  # full, high, medium, low
     format: Optional[str] = None  # webp, jpeg
+    tier_after_days: Optional[int] = None  # recompress older screenshots; 0 = off
+    tier_resolution: Optional[str] = None  # resolution preset for recompressed images
+    tier_quality: Optional[int] = None  # 1-100
+    tier_drop_full_size: Optional[bool] = None  # keep only the thumbnail
 
 
 @router.get("/settings/current")
@@ -474,6 +629,10 @@ async def get_screenshot_settings():
         "resolution": screenshot_service.resolution,
         "format": screenshot_service.format,
         "resolution_presets": list(screenshot_service.RESOLUTION_PRESETS.keys()),
+        "tier_after_days": screenshot_service.tier_after_days,
+        "tier_resolution": screenshot_service.tier_resolution,
+        "tier_quality": screenshot_service.tier_quality,
+        "tier_drop_full_size": screenshot_service.tier_drop_full_size,
     }
 
 
@@ -493,6 +652,10 @@ async def update_screenshot_settings(
         retention_days=settings.retention_days,
         resolution=settings.resolution,
         format=settings.format,
+        tier_after_days=settings.tier_after_days,
+        tier_resolution=settings.tier_resolution,
+        tier_quality=settings.tier_quality,
+        tier_drop_full_size=settings.tier_drop_full_size,
     )
 
     return {
@@ -507,47 +670,9 @@ async def update_screenshot_settings(
             "retention_days": screenshot_service.retention_days,
             "resolution": screenshot_service.resolution,
             "format": screenshot_service.format,
+            "tier_after_days": screenshot_service.tier_after_days,
+            "tier_resolution": screenshot_service.tier_resolution,
+            "tier_quality": screenshot_service.tier_quality,
+            "tier_drop_full_size": screenshot_service.tier_drop_full_size,
         }
     }
-
-
-@router.delete("/cleanup")
-async def cleanup_old_screenshots(
-    older_than_days: int = Query(30, description="Delete screenshots older than N days"),
-    db: AsyncSession = Depends(get_db),
-):
-    """Clean up old screenshots"""
-    cutoff = datetime.now() - timedelta(days=older_than_days)
-
-    result = await db.execute(
-        select(Screenshot).where(Screenshot.timestamp < cutoff)
-    )
-    old_screenshots = result.scalars().all()
-
-    deleted_count = 0
-    freed_bytes = 0
-
-    for screenshot in old_screenshots:
-        try:
-            # Delete files
-            if screenshot.image_path and os.path.exists(screenshot.image_path):
-                freed_bytes += os.path.getsize(screenshot.image_path)
-                os.remove(screenshot.image_path)
-            if screenshot.thumbnail_path and os.path.exists(screenshot.thumbnail_path):
-                freed_bytes += os.path.getsize(screenshot.thumbnail_path)
-                os.remove(screenshot.thumbnail_path)
-
-            # Delete from database
-            await db.delete(screenshot)
-            deleted_count += 1
-        except OSError as e:
-            print(f"Error deleting screenshot: {e}")
-
-    await db.commit()
-
-    return {
-        "status": "cleaned",
-        "deleted_count": deleted_count,
-        "freed_mb": round(freed_bytes / (1024 * 1024), 2),
-        "cutoff_date": cutoff.isoformat(),
-    }
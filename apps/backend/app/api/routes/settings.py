@@ -619,6 +619,8 @@ async def remove_from_list(
 
 from app.models.activity import Activity, URLActivity, YouTubeActivity
 from app.models.screenshot import Screenshot
+from app.services.storage_usage_service import release_screenshots
+from app.services.screenshot_file_index import screenshot_file_index
 from fastapi.responses import JSONResponse
 from datetime import datetime as dt
 import json
@@ -797,6 +799,7 @@ async def delete_all_screenshots(
     )
     screenshots = result.scalars().all()
 
+    deleted = []
     deleted_count = 0
     freed_bytes = 0
 
@@ -813,11 +816,14 @@ async def delete_all_screenshots(
 
             # Delete from database
             await db.delete(screenshot)
+            deleted.append(screenshot)
             deleted_count += 1
         except OSError as e:
             print(f"Error deleting screenshot files: {e}")
 
+    await release_screenshots(db, deleted)
     await db.commit()
+    await screenshot_file_index.discard(s.image_path for s in deleted)
 
     return {
         "status": "deleted",
@@ -859,8 +865,8 @@ async def reset_all_settings(
 # Storage Info Endpoint
 # ============================================================================
 
-from pathlib import Path
-from app.core.config import settings as app_settings
+from sqlalchemy import func
+from app.services.storage_usage_service import get_screenshot_usage
 
 
 @router.get("/storage")
@@ -870,51 +876,20 @@ async def get_storage_info(
 ):
     """Get storage usage information"""
 
-    # Calculate activity data size (estimate based on record count)
-    result = await db.execute(
-        select(Activity).where(Activity.user_id == current_user.id)
-    )
-    activities = result.scalars().all()
-    activity_count = len(activities)
-    # Estimate ~500 bytes per activity record
-    activity_data_bytes = activity_count * 500
-
-    result = await db.execute(
-        select(URLActivity).where(URLActivity.user_id == current_user.id)
-    )
-    url_activities = result.scalars().all()
-    activity_data_bytes += len(url_activities) * 400
-
-    result = await db.execute(
-        select(YouTubeActivity).where(YouTubeActivity.user_id == current_user.id)
-    )
-    yt_activities = result.scalars().all()
-    activity_data_bytes += len(yt_activities) * 600
-
-    # Calculate screenshots storage
-    result = await db.execute(
-        select(Screenshot).where(Screenshot.user_id == current_user.id)
+    # Record counts in one round trip; ~500/400/600 bytes per activity,
+    # URL and YouTube record
+    counts = await db.execute(
+        select(
+            select(func.count(Activity.id)).where(Activity.user_id == current_user.id).scalar_subquery(),
+            select(func.count(URLActivity.id)).where(URLActivity.user_id == current_user.id).scalar_subquery(),
+            select(func.count(YouTubeActivity.id)).where(YouTubeActivity.user_id == current_user.id).scalar_subquery(),
+        )
     )
-    screenshots = result.scalars().all()
+    activity_count, url_count, youtube_count = counts.one()
+    activity_data_bytes = activity_count * 500 + url_count * 400 + youtube_count * 600
 
-    screenshots_bytes = 0
-    for s in screenshots:
-        try:
-            if s.image_path and os.path.exists(s.image_path):
-                screenshots_bytes += os.path.getsize(s.image_path)
-            if s.thumbnail_path and os.path.exists(s.thumbnail_path):
-                screenshots_bytes += os.path.getsize(s.thumbnail_path)
-        except OSError:
-            pass
-
-    # Also check screenshots directory for any orphaned files
-    screenshots_path = Path(app_settings.screenshots_path).expanduser()
-    if screenshots_path.exists():
-        for f in screenshots_path.glob("*.jpg"):
-            try:
-                screenshots_bytes += f.stat().st_size
-            except OSError:
-                pass
+    # Screenshot totals come from the running usage counters
+    screenshot_count, screenshots_bytes = await get_screenshot_usage(db, current_user.id)
 
     activity_data_mb = round(activity_data_bytes / (1024 * 1024), 2)
     screenshots_mb = round(screenshots_bytes / (1024 * 1024), 2)
@@ -928,7 +903,7 @@ async def get_storage_info(
         "limit_mb": limit_mb,
         "usage_percent": round((total_mb / limit_mb) * 100, 1) if limit_mb > 0 else 0,
         "activity_count": activity_count,
-        "screenshot_count": len(screenshots),
+        "screenshot_count": screenshot_count,
     }
 
 
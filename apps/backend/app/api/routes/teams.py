@@ -1091,6 +1091,36 @@ async def get_member_screenshots(
     }
 
 
+@router.get("/{team_id}/members/{user_id}/screenshots/sprite")
+async def get_member_screenshot_sprite(
+    team_id: int,
+    user_id: int,
+    date: Optional[str] = None,
+    page: int = 0,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Team member's screenshots for a day as contact sheets, one page per request
+    (admin only, respects privacy settings)
+    """
+    from app.api.routes.screenshots import parse_sprite_day, with_sprite_url
+    from app.services.screenshot_sprite_service import screenshot_sprite_service
+
+    await _verify_admin_and_get_member(
+        team_id, user_id, current_user, db,
+        require_share_screenshots=True
+    )
+
+    if page < 0:
+        raise HTTPException(400, "Page must be 0 or greater")
+
+    sheet = await screenshot_sprite_service.get_sheet(
+        db, ("member", user_id), [Screenshot.user_id == user_id], parse_sprite_day(date), page
+    )
+    return {"user_id": user_id, **with_sprite_url(sheet)}
+
+
 @router.get("/{team_id}/members/{user_id}/summary")
 async def get_member_summary(
     team_id: int,
@@ -32,8 +32,12 @@ class Settings(BaseSettings):
     # Use /app/data for Docker containers, fallback to home directory for local dev
     screenshots_path: str = "/app/data/screenshots" if os.path.exists("/app") else str(Path.home() / ".productify" / "screenshots")
 
+    # Generated report artifacts
+    reports_path: str = "/app/data/reports" if os.path.exists("/app") else str(Path.home() / ".productify" / "reports")
+
     # ActivityWatch
     activitywatch_url: str = "http://localhost:5600"
+    activitywatch_use_query: bool = False  # Aggregate summaries server-side via /api/0/query/
 
     # OpenAI
     openai_api_key: str = ""
@@ -58,6 +62,19 @@ class Settings(BaseSettings):
     # Firebase Storage
     firebase_credentials_path: str = ""  # Path to firebase-credentials.json
     firebase_storage_bucket: str = ""  # e.g., "productify-pro.appspot.com"
+    firebase_upload_workers: int = 4  # Threads running blocking blob calls
+    screenshot_upload_max_attempts: int = 10  # Retries before a local copy is kept for good
+    screenshot_upload_backoff_seconds: int = 30  # First retry delay, doubled per attempt
+    screenshot_upload_backoff_max_seconds: int = 3600  # Retry delay ceiling
+    screenshot_dedupe_threshold: int = 4  # Max differing dHash bits for a near-duplicate (0 = off)
+    screenshot_cleanup_batch_size: int = 500  # Rows deleted per retention cleanup transaction
+    screenshot_image_max_age: int = 31536000  # Cache-Control max-age for screenshot images
+    screenshot_signed_url_cache_seconds: int = 300  # Reuse of a signed URL (kept below its expiry)
+    screenshot_sprite_page_size: int = 60  # Thumbnails per contact sheet
+    screenshot_sprite_columns: int = 10  # Contact sheet grid width in tiles
+    screenshot_sprite_cache_mb: int = 256  # Disk budget for cached contact sheets (LRU)
+    screenshot_tier_after_days: int = 0  # Recompress local screenshots older than this (0 = off)
+    screenshot_tier_workers: int = 1  # Low-priority process pool size (0 = recompress on a thread)
 
     # Supabase (Production Database)
     supabase_url: str = ""
@@ -79,6 +96,23 @@ class Settings(BaseSettings):
     stripe_price_pro: str = ""
     stripe_price_team: str = ""
 
+    # Nightly deep work recomputation
+    deepwork_batch_workers: int = 2  # Process pool size (0 = compute inline)
+    deepwork_batch_chunk_size: int = 200  # Users fetched per grouped query
+
+    # Report PDF rendering
+    report_render_workers: int = 2  # Process pool size (0 = render on a thread)
+    report_render_max_pending: int = 8  # Renders submitted to the pool at once
+    report_job_workers: int = 2  # Background report jobs processed concurrently
+    report_job_retention_days: int = 30  # Finished jobs and files kept this long
+    report_job_timeout_minutes: int = 30  # Running jobs older than this are assumed dead and requeued
+    report_cache_max_mb: int = 512  # Disk budget for cached report PDFs (LRU)
+
+    # WebSocket fan-out
+    websocket_send_queue_size: int = 64  # Messages buffered per connection
+    websocket_slow_consumer_policy: str = "drop_oldest"  # drop_oldest or disconnect when the buffer is full
+    websocket_send_timeout_seconds: float = 10.0  # A single send stalled this long disconnects
+
     # CORS
     cors_origins: str = "http://localhost:1420,http://localhost:3000,tauri://localhost"
 
@@ -77,7 +77,7 @@ async def init_db():
     """Initialize database tables"""
     # Import models to register them with Base
     from app.models.activity import Activity, URLActivity, YouTubeActivity
-    from app.models.screenshot import Screenshot
+    from app.models.screenshot import Screenshot, ScreenshotUsage
     from app.models.settings import UserSettings, CustomList
     from app.models.goals import Goal, FocusSession
     from app.models.notifications import Notification
@@ -100,6 +100,12 @@ async def init_db():
     except ImportError:
         pass
 
+    # Import background report jobs
+    try:
+        from app.models.report import ReportJob
+    except ImportError:
+        pass
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
@@ -0,0 +1,19 @@
+"""
+Timing Metrics Helpers
+
+Summaries of recent timing samples for the admin stats endpoints.
+"""
+from typing import Dict, Iterable
+
+
+def summarize_samples(samples: Iterable[float]) -> Dict[str, float]:
+    """Average, median, p95 and max of a window of samples (in ms)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"avg": 0, "p50": 0, "p95": 0, "max": 0}
+    return {
+        "avg": round(sum(ordered) / len(ordered), 1),
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        "max": round(ordered[-1], 1),
+    }
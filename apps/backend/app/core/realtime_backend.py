@@ -0,0 +1,262 @@
+"""
+Realtime Backend for Productify Pro
+
+Pub/sub and small shared state for the live activity features, so that a
+client's socket and its desktop app's heartbeats can land on different
+workers or replicas.
+
+Uses Redis when REDIS_URL is set and reachable; otherwise (and in tests) an
+in-process implementation with the same interface, which is only correct for
+a single worker.
+"""
+import asyncio
+import copy
+import json
+import time
+from collections import deque
+from typing import Optional, Any, Dict, List, Set, Callable, Awaitable
+
+from app.core.config import settings
+
+
+# Called with (channel, message) for each message published on a channel
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+# Given a key's current value (None if unset), returns its new value, or None
+# to leave it as it is. May be called more than once, so it must not have
+# side effects beyond the value it returns.
+UpdateFunction = Callable[[Optional[Any]], Optional[Any]]
+
+
+class InProcessBackend:
+    """
+    Pub/sub and shared state in this process's memory.
+    Used for tests and single-worker deployments without Redis.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._handlers: Dict[str, Set[MessageHandler]] = {}
+        self._values: Dict[str, tuple] = {}  # key -> (value, expiry or None)
+        self._lists: Dict[str, deque] = {}
+
+    # ── Pub/sub ─────────────────────────────────────────────────────────
+
+    async def publish(self, channel: str, message: str):
+        for handler in list(self._handlers.get(channel, ())):
+            await handler(channel, message)
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        self._handlers.setdefault(channel, set()).add(handler)
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler):
+        handlers = self._handlers.get(channel, set())
+        handlers.discard(handler)
+        if not handlers:
+            self._handlers.pop(channel, None)
+
+    # ── Shared state ────────────────────────────────────────────────────
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expiry = item
+        if expiry is not None and time.time() > expiry:
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    async def update(self, key: str, fn: UpdateFunction, ttl: Optional[int] = None) -> Optional[Any]:
+        """
+        Atomic read-modify-write: no other update or set to the key can land
+        between reading it and writing fn's result. Returns the value written,
+        or None if fn left the key alone.
+        """
+        # Nothing in here suspends, so no other task runs in between; fn gets
+        # a copy, as it would a freshly decoded value from Redis
+        value = fn(copy.deepcopy(await self.get(key)))
+        if value is not None:
+            await self.set(key, value, ttl)
+        return value
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def push(self, key: str, value: Any, max_len: int) -> int:
+        """Append to a capped list, dropping the oldest items; returns its length"""
+        items = self._lists.get(key)
+        if items is None or items.maxlen != max_len:
+            items = self._lists[key] = deque(items or (), maxlen=max_len)
+        items.append(value)
+        return len(items)
+
+    async def range(self, key: str, count: Optional[int] = None) -> List[Any]:
+        """The newest `count` items of a list (all if None), oldest first"""
+        items = list(self._lists.get(key, ()))
+        return items[-count:] if count else items
+
+    async def length(self, key: str) -> int:
+        return len(self._lists.get(key, ()))
+
+    async def close(self):
+        pass
+
+
+class RedisBackend:
+    """
+    Redis pub/sub and shared state. Values are stored as JSON under a key
+    prefix; one subscriber connection per process reads all its channels.
+    """
+
+    name = "redis"
+    PREFIX = "productify:"
+
+    def __init__(self, redis_url: str):
+        self._redis_url = redis_url
+        self._client = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, Set[MessageHandler]] = {}
+
+    async def connect(self):
+        import redis.asyncio as aioredis
+        self._client = aioredis.from_url(self._redis_url, encoding="utf-8", decode_responses=True)
+        await self._client.ping()
+        self._pubsub = self._client.pubsub()
+
+    # ── Pub/sub ─────────────────────────────────────────────────────────
+
+    async def publish(self, channel: str, message: str):
+        await self._client.publish(self.PREFIX + channel, message)
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        handlers = self._handlers.setdefault(channel, set())
+        handlers.add(handler)
+        if len(handlers) > 1:
+            return  # already subscribed in this process
+        await self._pubsub.subscribe(self.PREFIX + channel)
+        # The reader stops whenever the last channel is unsubscribed
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler):
+        handlers = self._handlers.get(channel, set())
+        handlers.discard(handler)
+        if not handlers:
+            self._handlers.pop(channel, None)
+            await self._pubsub.unsubscribe(self.PREFIX + channel)
+
+    async def _read(self):
+        async for message in self._pubsub.listen():
+            if message["type"] != "message":
+                continue
+            channel = message["channel"][len(self.PREFIX):]
+            for handler in list(self._handlers.get(channel, ())):
+                try:
+                    await handler(channel, message["data"])
+                except Exception as e:
+                    print(f"Realtime handler error on {channel}: {e}")
+
+    # ── Shared state ────────────────────────────────────────────────────
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._client.get(self.PREFIX + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await self._client.set(self.PREFIX + key, json.dumps(value, default=str), ex=ttl)
+
+    async def update(self, key: str, fn: UpdateFunction, ttl: Optional[int] = None) -> Optional[Any]:
+        # Optimistic transaction: WATCH the key, and retry if another client
+        # writes it before our MULTI/EXEC goes through
+        from redis.exceptions import WatchError
+
+        name = self.PREFIX + key
+        async with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    raw = await pipe.get(name)
+                    value = fn(json.loads(raw) if raw is not None else None)
+                    if value is None:
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value, default=str), ex=ttl)
+                    await pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+
+    async def delete(self, key: str):
+        await self._client.delete(self.PREFIX + key)
+
+    async def push(self, key: str, value: Any, max_len: int) -> int:
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.PREFIX + key, json.dumps(value, default=str))
+            pipe.ltrim(self.PREFIX + key, -max_len, -1)
+            pipe.llen(self.PREFIX + key)
+            results = await pipe.execute()
+        return results[-1]
+
+    async def range(self, key: str, count: Optional[int] = None) -> List[Any]:
+        items = await self._client.lrange(self.PREFIX + key, -count if count else 0, -1)
+        return [json.loads(item) for item in items]
+
+    async def length(self, key: str) -> int:
+        return await self._client.llen(self.PREFIX + key)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+
+
+_backend = None
+_backend_lock = asyncio.Lock()
+
+
+async def get_realtime_backend():
+    """The process's realtime backend, connecting on first use"""
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    async with _backend_lock:
+        if _backend is not None:
+            return _backend
+
+        if settings.redis_url:
+            backend = RedisBackend(settings.redis_url)
+            try:
+                await backend.connect()
+                _backend = backend
+                print("✅ Using Redis for realtime pub/sub and state")
+                return _backend
+            except Exception as e:
+                print(f"⚠️ Redis not available for realtime: {e}")
+
+        _backend = InProcessBackend()
+        print("⚠️ Using in-process realtime backend (configure REDIS_URL to run several workers)")
+        return _backend
+
+
+def set_realtime_backend(backend):
+    """Replace the backend (tests use a fresh InProcessBackend)"""
+    global _backend
+    _backend = backend
+
+
+async def close_realtime_backend():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
@@ -3,7 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
 import json
-from typing import List
+from typing import Optional
 from datetime import datetime
 
 # Initialize logging first
@@ -39,8 +39,10 @@ if app_settings.sentry_dsn:
 
 from app.api.routes import activities, analytics, screenshots, ai_insights, settings, goals, notifications, onboarding, system, reports, auth, billing, teams, updates, rules, calendar, deepwork, focus, team_deepwork, integrations, meeting_intelligence, admin, work_sessions
 from app.core.database import init_db
-from app.services.activity_tracker import get_current_activity, check_activitywatch_status
-from app.services.classification import classify_activity
+from app.services.activity_tracker import check_activitywatch_status
+from app.services.activity_events import activity_events
+from app.services.live_totals import live_totals
+from app.services.connection_manager import manager
 
 # Optional: Real-time transcription (requires deepgram)
 try:
@@ -52,82 +54,6 @@ except ImportError:
     app_logger.warning("Real-time transcription not available (deepgram not installed)")
 
 
-class ConnectionManager:
-    """Manages WebSocket connections"""
-
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self._logger = get_logger("websocket.manager")
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self._logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        self._logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-
-    async def broadcast(self, message: dict):
-        """Send message to all connected clients"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                disconnected.append(connection)
-
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
-
-
-manager = ConnectionManager()
-
-
-async def activity_broadcaster():
-    """Background task to broadcast current activity"""
-    while True:
-        try:
-            if manager.active_connections:
-                # Get current activity
-                current = await get_current_activity()
-                status = await check_activitywatch_status()
-
-                if current:
-                    # Classify the activity
-                    classification = classify_activity(
-                        current.app_name,
-                        current.window_title,
-                        current.url
-                    )
-
-                    message = {
-                        "type": "current_activity",
-                        "timestamp": datetime.now().isoformat(),
-                        "data": {
-                            "app_name": current.app_name,
-                            "window_title": current.window_title,
-                            "url": current.url,
-                            "duration": current.duration,
-                            "start_time": current.start_time.isoformat() if current.start_time else None,
-                            "is_afk": current.is_afk,
-                            "category": classification.category,
-                            "productivity_score": classification.productivity_score,
-                            "productivity_type": classification.productivity_type,
-                        },
-                        "activitywatch_available": status.get("available", False),
-                    }
-                    await manager.broadcast(message)
-
-        except Exception as e:
-            app_logger.error(f"Error in activity broadcaster: {e}", exc_info=True)
-
-        # Wait before next update
-        await asyncio.sleep(2)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
@@ -149,23 +75,35 @@ async def lifespan(app: FastAPI):
     screenshot_service.start_scheduler()
     app_logger.info(f"Screenshot scheduler started (interval: {screenshot_service.min_interval}-{screenshot_service.max_interval} min)")
 
+    # Retry cloud uploads that failed, including ones from previous runs
+    from app.services.screenshot_upload_queue import screenshot_upload_queue
+    screenshot_upload_queue.start()
+
+    # Start nightly deep work recomputation
+    from app.services.deepwork_batch_service import deepwork_batch_service
+    deepwork_batch_service.start_scheduler()
+
+    # Start background report workers and weekly pre-generation
+    from app.services.report_job_service import report_job_service
+
+    async def notify_report_job(job):
+        await manager.send_to_user(job.user_id, {
+            "type": "report_job",
+            "timestamp": datetime.now().isoformat(),
+            "data": {"job_id": job.id, "user_id": job.user_id, "status": job.status},
+        })
+
+    report_job_service.add_listener(notify_report_job)
+    await report_job_service.start()
+
     # Start goal sync service
     from app.services.goal_sync_service import goal_sync_service
     goal_syncer_task = asyncio.create_task(goal_sync_service.start())
     app_logger.info(f"Goal sync service started (interval: {goal_sync_service.sync_interval}s)")
 
-    # Start background broadcaster
-    broadcaster_task = asyncio.create_task(activity_broadcaster())
-
     yield
 
     # Shutdown
-    broadcaster_task.cancel()
-    try:
-        await broadcaster_task
-    except asyncio.CancelledError:
-        pass
-
     # Stop goal sync service
     goal_sync_service.stop()
     goal_syncer_task.cancel()
@@ -180,6 +118,27 @@ async def lifespan(app: FastAPI):
     except Exception:
         pass
 
+    # Stop upload retries; pending entries stay on disk for the next start
+    await screenshot_upload_queue.stop()
+    from app.services.firebase_storage import firebase_storage
+    firebase_storage.shutdown()
+    from app.services.screenshot_sprite_service import screenshot_sprite_service
+    screenshot_sprite_service.shutdown()
+
+    # Stop deep work batch scheduler
+    try:
+        deepwork_batch_service.stop_scheduler()
+    except Exception:
+        pass
+
+    # Stop report job workers, then the render pool they use
+    await report_job_service.stop()
+    from app.services.report_renderer import report_renderer
+    report_renderer.shutdown()
+
+    from app.core.realtime_backend import close_realtime_backend
+    await close_realtime_backend()
+
     app_logger.info("Shutting down Productify Pro Backend...")
 
 
@@ -254,11 +213,39 @@ app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(work_sessions.router, prefix="/api/work-sessions", tags=["Work Sessions"])
 
 
+def _websocket_user_id(token: Optional[str]) -> Optional[int]:
+    """User id from a ?token=<jwt_token> query parameter, if it is valid"""
+    if not token:
+        return None
+    from app.services.auth_service import verify_token
+
+    payload = verify_token(token)
+    try:
+        return int(payload["sub"]) if payload else None
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
 @app.websocket("/ws/activities")
-async def activity_websocket(websocket: WebSocket):
-    """WebSocket endpoint for real-time activity updates"""
-    await manager.connect(websocket)
+async def activity_websocket(websocket: WebSocket, token: str = None):
+    """
+    WebSocket endpoint for real-time activity updates
+
+    Connect with ?token=<jwt_token>. The socket receives the user's current
+    activity on connect (if known), then an "activity_diff" with only the
+    changed fields whenever their desktop app reports a change.
+    """
+    user_id = _websocket_user_id(token)
+    if user_id is None:
+        await websocket.close(code=1008)  # policy violation
+        return
+
+    await manager.connect(websocket, user_id)
     try:
+        snapshot = await activity_events.snapshot(user_id)
+        if snapshot:
+            await manager.send_personal(websocket, snapshot)
+
         while True:
             # Keep connection alive and handle incoming messages
             data = await websocket.receive_text()
@@ -266,7 +253,9 @@ async def activity_websocket(websocket: WebSocket):
                 message = json.loads(data)
                 # Handle client messages if needed
                 if message.get("type") == "ping":
-                    await websocket.send_json({"type": "pong", "timestamp": datetime.now().isoformat()})
+                    await manager.send_personal(
+                        websocket, {"type": "pong", "timestamp": datetime.now().isoformat()}
+                    )
             except json.JSONDecodeError:
                 pass
     except WebSocketDisconnect:
@@ -504,6 +493,9 @@ async def get_metrics():
             "environment": app_settings.app_env,
         },
         "websocket_connections": len(manager.active_connections),
+        "websocket": manager.get_stats(),
+        "activity_events": activity_events.get_stats(),
+        "live_totals": live_totals.get_stats(),
         "performance": performance_metrics.get_metrics(),
     }
 
@@ -1,5 +1,5 @@
 from app.models.activity import Activity, URLActivity, YouTubeActivity
-from app.models.screenshot import Screenshot
+from app.models.screenshot import Screenshot, ScreenshotUsage
 from app.models.settings import UserSettings, CustomList
 from app.models.goals import (
     Goal,
@@ -53,12 +53,14 @@ from app.models.integrations import (
     IntegrationWebhook,
 )
 from app.models.work_session import WorkSession
+from app.models.report import ReportJob
 
 __all__ = [
     "Activity",
     "URLActivity",
     "YouTubeActivity",
     "Screenshot",
+    "ScreenshotUsage",
     "UserSettings",
     "CustomList",
     "Goal",
@@ -108,4 +110,6 @@ __all__ = [
     "IntegrationWebhook",
     # Work Sessions (Freelancer time tracking)
     "WorkSession",
+    # Report jobs
+    "ReportJob",
 ]
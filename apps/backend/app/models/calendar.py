@@ -1,7 +1,7 @@
 """
 Calendar and Deep Work models for meeting tracking and focus analytics
 """
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, JSON, ForeignKey, Text, Enum
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, JSON, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -226,6 +226,10 @@ class MeetingCostSettings(Base):
 class DeepWorkScore(Base):
     """Daily calculated deep work metrics"""
     __tablename__ = "deep_work_scores"
+    __table_args__ = (
+        # Every worker runs the nightly batch; one row per user and day
+        Index("ux_deep_work_scores_user_date", "user_id", "date", unique=True),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
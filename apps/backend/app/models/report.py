@@ -0,0 +1,71 @@
+"""
+Report Job Model - Background report generation
+
+A job is created when a report is requested asynchronously or pre-generated
+by the scheduler. Workers render it and store the artifact on disk; clients
+poll the job (or get a WebSocket notification) and download the file.
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, text
+from app.core.database import Base
+import uuid
+
+
+class ReportJob(Base):
+    """A queued, running or finished report render"""
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        Index("ix_report_jobs_user_created", "user_id", "created_at"),
+        Index("ix_report_jobs_status", "status"),
+        # Every worker runs the Monday pre-generation; one job per user and week
+        Index(
+            "ux_report_jobs_scheduled_window", "user_id", "period", "start_date", "end_date",
+            unique=True,
+            sqlite_where=text("source = 'scheduled'"),
+            postgresql_where=text("source = 'scheduled'"),
+        ),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), nullable=True)
+
+    # What to build
+    kind = Column(String(20), default="user")  # user, team, email
+    period = Column(String(20), nullable=False)  # daily, weekly, monthly
+    format = Column(String(10), default="pdf")  # pdf, json
+    start_date = Column(DateTime, nullable=True)
+    end_date = Column(DateTime, nullable=True)
+    recipient_email = Column(String(255), nullable=True)  # email jobs only
+    source = Column(String(20), default="request")  # request, scheduled
+
+    # Progress
+    status = Column(String(20), default="pending")  # pending, running, completed, failed
+    error = Column(Text, nullable=True)
+
+    # Artifact
+    file_path = Column(String(500), nullable=True)
+    file_size = Column(Integer, nullable=True)
+    filename = Column(String(255), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "period": self.period,
+            "format": self.format,
+            "team_id": self.team_id,
+            "source": self.source,
+            "status": self.status,
+            "error": self.error,
+            "filename": self.filename,
+            "file_size": self.file_size,
+            "start_date": self.start_date.isoformat() if self.start_date else None,
+            "end_date": self.end_date.isoformat() if self.end_date else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+        }
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, ForeignKey, Index
+from datetime import datetime
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, BigInteger, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -12,6 +13,10 @@ class Screenshot(Base):
         Index("ix_screenshots_user_time", "user_id", "timestamp"),
         # Index for filtering deleted screenshots
         Index("ix_screenshots_user_deleted", "user_id", "is_deleted"),
+        # Index for finding captures that share an earlier image
+        Index("ix_screenshots_duplicate_of", "duplicate_of"),
+        # Index for the tiering job's scan of older, not yet recompressed rows
+        Index("ix_screenshots_tier_time", "storage_tier", "timestamp"),
     )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -27,6 +32,18 @@ class Screenshot(Base):
     thumbnail_url = Column(String, nullable=True)  # Firebase thumbnail URL
     storage_path = Column(String, nullable=True)  # Firebase path: users/{uid}/screenshots/{id}.jpg
 
+    # Encoded sizes in bytes, recorded at write time (local or cloud)
+    image_size = Column(Integer, nullable=False, default=0, server_default="0")
+    thumbnail_size = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Perceptual de-duplication: 64-bit dHash (hex), and the earlier capture whose
+    # files this one shares when they were near-identical (sizes are then 0)
+    phash = Column(String(16), nullable=True)
+    duplicate_of = Column(String, nullable=True)
+
+    # Storage tier: original, compressed (re-encoded smaller) or thumbnail (full image dropped)
+    storage_tier = Column(String(16), nullable=False, default="original", server_default="original")
+
     # Metadata
     app_name = Column(String, nullable=True)
     window_title = Column(String, nullable=True)
@@ -37,3 +54,13 @@ class Screenshot(Base):
 
     # Relationship
     user = relationship("User", back_populates="screenshots")
+
+
+class ScreenshotUsage(Base):
+    """Running per-user totals of stored screenshots, updated with each insert and delete"""
+    __tablename__ = "screenshot_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    screenshot_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
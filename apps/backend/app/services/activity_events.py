@@ -0,0 +1,119 @@
+"""
+Activity Events
+
+Pushes each user's live activity to their /ws/activities sockets as it is
+ingested, instead of a loop polling ActivityWatch for every client.
+
+The ingestion endpoints publish what the desktop app reported; the last state
+per user is kept in the realtime backend (so any worker can compute the diff)
+and only the fields that changed are sent on. Repeated heartbeats for the
+same window produce no message at all, and nothing runs between publishes.
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from app.core.realtime_backend import get_realtime_backend
+from app.services.classification import classify_activity
+from app.services.connection_manager import manager
+
+
+STATE_TTL_SECONDS = 24 * 60 * 60  # a user idle this long starts over with a snapshot
+
+
+def _state_key(user_id: int) -> str:
+    return f"activity:{user_id}"
+
+
+def diff_activity(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of `current` that differ from `previous`"""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+class ActivityEventService:
+    """Per-user live activity state, published as diffs"""
+
+    def __init__(self):
+        self.published = 0
+        self.suppressed = 0
+
+    async def publish(
+        self,
+        user_id: Optional[int],
+        app_name: str,
+        window_title: str,
+        url: Optional[str] = None,
+        is_idle: bool = False,
+        source: Optional[str] = None,
+        started_at: Optional[datetime] = None,
+        classification=None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Record a user's current activity and push what changed to their sockets.
+
+        Returns the message sent, or None when nothing changed (or there is no
+        user to send it to). Pass the ingestion's `classification` to avoid
+        classifying twice.
+        """
+        if user_id is None:
+            return None
+
+        if classification is None:
+            classification = classify_activity(app_name, window_title, url)
+        current = {
+            "app_name": app_name,
+            "window_title": window_title,
+            "url": url,
+            "category": classification.category,
+            "productivity_score": classification.productivity_score,
+            "productivity_type": classification.productivity_type,
+            "is_idle": is_idle,
+            "source": source,
+        }
+
+        backend = await get_realtime_backend()
+        previous = await backend.get(_state_key(user_id))
+        same_window = previous is not None and all(
+            previous[key] == current[key] for key in ("app_name", "window_title", "url")
+        )
+        # Clients count the duration up from here; heartbeats don't reset it
+        if same_window:
+            current["started_at"] = previous["started_at"]
+        else:
+            current["started_at"] = (started_at or datetime.now()).isoformat()
+        await backend.set(_state_key(user_id), current, ttl=STATE_TTL_SECONDS)
+
+        changes = diff_activity(previous, current) if previous is not None else current
+        if not changes:
+            self.suppressed += 1
+            return None
+
+        message = {
+            "type": "activity_diff" if previous is not None else "current_activity",
+            "timestamp": datetime.now().isoformat(),
+            "data": changes,
+        }
+        self.published += 1
+        await manager.send_to_user(user_id, message)
+        return message
+
+    async def snapshot(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Full current activity message for a socket that just subscribed"""
+        backend = await get_realtime_backend()
+        current = await backend.get(_state_key(user_id))
+        if current is None:
+            return None
+        return {
+            "type": "current_activity",
+            "timestamp": datetime.now().isoformat(),
+            "data": current,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "published": self.published,
+            "suppressed": self.suppressed,
+        }
+
+
+# Singleton instance
+activity_events = ActivityEventService()
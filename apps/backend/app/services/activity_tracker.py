@@ -3,10 +3,15 @@ ActivityWatch Integration Service
 Connects to ActivityWatch API to fetch current and historical activity data.
 """
 
+import asyncio
+import bisect
+import time
 import httpx
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Hashable, Tuple
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
+from urllib.parse import urlparse
+import json
 import platform as sys_platform
 
 from app.core.config import settings
@@ -25,9 +30,117 @@ class CurrentActivity:
     is_afk: bool = False
 
 
+class _SingleFlight:
+    """
+    Coalesces concurrent identical requests into one in-flight task.
+
+    Results for ranges that already ended are kept for a short TTL, so a
+    dashboard burst asking for the same day costs one ActivityWatch round-trip.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        cacheable: bool = False,
+    ) -> Any:
+        cached = self._results.get(key)
+        if cached is not None:
+            expires_at, value = cached
+            if time.monotonic() < expires_at:
+                return value
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t, cacheable))
+
+        # Shield so one caller's cancellation doesn't cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Task, cacheable: bool) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not cacheable or task.cancelled() or task.exception() is not None:
+            return
+        if not task.result():
+            # Empty results are also what a failed fetch returns; don't pin them
+            return
+
+        if len(self._results) >= self.max_entries:
+            now = time.monotonic()
+            for k in [k for k, (exp, _) in self._results.items() if exp <= now]:
+                del self._results[k]
+            while len(self._results) >= self.max_entries:
+                del self._results[next(iter(self._results))]
+        self._results[key] = (time.monotonic() + self.ttl, task.result())
+
+    def clear(self) -> None:
+        self._results.clear()
+
+
+def _ended(end: Optional[datetime]) -> bool:
+    """Whether a range ends in the past (its events can no longer change)"""
+    if end is None:
+        return False
+    return end <= datetime.now(end.tzinfo)
+
+
+def _copy_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Shallow-copy shared results so callers can't mutate each other's data"""
+    return [dict(e) for e in events]
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """ActivityWatch timestamp as a naive UTC datetime (None if unparseable)"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _merge_periods(periods: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """Sort and union overlapping periods"""
+    merged: List[Tuple[datetime, datetime]] = []
+    for start, end in sorted(periods):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _seconds_within(start: datetime, end: datetime, periods: List[Tuple[datetime, datetime]], starts: List[datetime]) -> int:
+    """Seconds of [start, end) covered by merged, sorted periods"""
+    covered = 0.0
+    i = max(bisect.bisect_right(starts, start) - 1, 0)
+    while i < len(periods) and periods[i][0] < end:
+        overlap = (min(end, periods[i][1]) - max(start, periods[i][0])).total_seconds()
+        if overlap > 0:
+            covered += overlap
+        i += 1
+    return int(covered)
+
+
 class ActivityWatchClient:
     """Client for communicating with ActivityWatch API"""
 
+    AFK_PAGE_SIZE = 1000
+
     def __init__(self):
         self.base_url = settings.activitywatch_url
         self.timeout = 5.0
@@ -37,6 +150,13 @@ class ActivityWatchClient:
         self._buckets_cache: Optional[Dict] = None
         self._buckets_cache_time: Optional[datetime] = None
 
+        # Server-side aggregation via the query2 API (opt-in)
+        self.use_query_api = settings.activitywatch_use_query
+        self._query_supported: Optional[bool] = None
+
+        # Shared in-flight requests and short-lived results for past ranges
+        self._flights = _SingleFlight(ttl=30.0)
+
         # Determine bucket names based on OS
         hostname = sys_platform.node()
         self.window_bucket = f"aw-watcher-window_{hostname}"
@@ -88,7 +208,21 @@ class ActivityWatchClient:
         end: Optional[datetime] = None,
         limit: int = 100,
     ) -> List[Dict[str, Any]]:
-        """Get events from a specific bucket"""
+        """Get events from a specific bucket (concurrent identical calls share one fetch)"""
+        events = await self._flights.do(
+            ("events", self.base_url, bucket_id, start, end, limit),
+            lambda: self._fetch_events(bucket_id, start, end, limit),
+            cacheable=_ended(end),
+        )
+        return _copy_events(events)
+
+    async def _fetch_events(
+        self,
+        bucket_id: str,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
         try:
             async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
                 params = {"limit": limit}
@@ -203,6 +337,18 @@ class ActivityWatchClient:
         end_date: datetime
     ) -> List[Dict[str, Any]]:
         """Get activities for a date range, merging window and web data"""
+        activities = await self._flights.do(
+            ("activities", self.base_url, start_date, end_date),
+            lambda: self._fetch_activities(start_date, end_date),
+            cacheable=_ended(end_date),
+        )
+        return _copy_events(activities)
+
+    async def _fetch_activities(
+        self,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Dict[str, Any]]:
         if not await self.is_running():
             return self._get_mock_activities(start_date, end_date)
 
@@ -278,6 +424,255 @@ class ActivityWatchClient:
 
         return activities
 
+    # ============== Server-side Aggregation (query2) ==============
+
+    # Window events intersected with not-afk periods, shared by all summary queries
+    _QUERY_PRELUDE = [
+        'afk_events = query_bucket(find_bucket("aw-watcher-afk_"));',
+        'not_afk = filter_keyvals(afk_events, "status", ["not-afk"]);',
+        'window_events = query_bucket(find_bucket("aw-watcher-window_"));',
+        'window_events = filter_period_intersect(window_events, not_afk);',
+    ]
+
+    async def query(
+        self,
+        timeperiods: List[tuple],
+        query_lines: List[str],
+    ) -> Optional[List[Any]]:
+        """
+        Run a query2 program against /api/0/query/.
+
+        Returns one result per timeperiod, or None when the query API is
+        unavailable so callers can fall back to raw events.
+        """
+        if self._query_supported is False:
+            return None
+
+        payload = {
+            "timeperiods": [f"{s.isoformat()}/{e.isoformat()}" for s, e in timeperiods],
+            "query": query_lines,
+        }
+        try:
+            async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
+                response = await client.post(f"{self.base_url}/api/0/query/", json=payload)
+        except Exception:
+            return None
+
+        if response.status_code in (404, 405):
+            # Older ActivityWatch server without query2 support
+            self._query_supported = False
+            return None
+        if response.status_code != 200:
+            return None
+
+        self._query_supported = True
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    async def _use_query(self) -> bool:
+        """Whether summary requests should go through the query API"""
+        return self.use_query_api and self._query_supported is not False and await self.is_running()
+
+    async def _afk_periods(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[Tuple[datetime, datetime]]:
+        """
+        Merged periods the AFK watcher saw the user away. The events API
+        returns the newest events first, up to a limit, so the bucket is
+        read a page at a time until the range's oldest event.
+        """
+        if not await self.is_running():
+            return []
+
+        periods = []
+        for bucket_id in [b for b in await self.get_buckets() if "aw-watcher-afk" in b]:
+            page_end, oldest = end_date, None
+            while True:
+                events = await self.get_events(bucket_id, start=start_date, end=page_end, limit=self.AFK_PAGE_SIZE)
+                starts = []
+                for e in events:
+                    start = _parse_timestamp(e.get("timestamp"))
+                    if start is None:
+                        continue
+                    starts.append(start)
+                    if e.get("data", {}).get("status") == "afk":
+                        periods.append((start, start + timedelta(seconds=float(e.get("duration", 0)))))
+                if len(events) < self.AFK_PAGE_SIZE or not starts or (oldest and min(starts) >= oldest):
+                    break
+                # Events at the page boundary come back twice; merging absorbs them
+                oldest = min(starts)
+                page_end = oldest.replace(tzinfo=timezone.utc)
+        return _merge_periods(periods)
+
+    async def _active_activities(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[Dict[str, Any]]:
+        """
+        Raw activities with the time the AFK watcher saw the user away cut
+        out, the fallback's version of _QUERY_PRELUDE's not-afk intersection.
+        Time the AFK watcher has no events for (not installed, or stopped)
+        counts as active rather than being dropped.
+        """
+        activities = await self.get_activities(start_date, end_date)
+        periods = await self._afk_periods(start_date, end_date)
+        if not periods:
+            return activities
+
+        starts = [start for start, _ in periods]
+        active = []
+        for a in activities:
+            start = _parse_timestamp(a.get("start_time"))
+            if start is None:
+                continue
+            duration = int(a.get("duration", 0))
+            seconds = duration - _seconds_within(start, start + timedelta(seconds=duration), periods, starts)
+            if seconds > 0:
+                active.append({**a, "duration": seconds})
+        return active
+
+    async def get_app_totals(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        by_title: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get total active time per app (optionally per app and window title).
+
+        Uses server-side merging when the query API is enabled; otherwise
+        groups the raw activities after the same AFK filter. The fallback's
+        title grouping keeps the URL so browser time is classified by it;
+        merged window events carry none, so the query path sets url to None.
+        Both paths give the same time per app and title.
+        """
+        if await self._use_query():
+            keys = ["app", "title"] if by_title else ["app"]
+            result = await self.query(
+                [(start_date, end_date)],
+                self._QUERY_PRELUDE + [
+                    f"events = merge_events_by_keys(window_events, {json.dumps(keys)});",
+                    "RETURN = sort_by_duration(events);",
+                ],
+            )
+            if result is not None:
+                totals = []
+                for e in result[0] if result else []:
+                    data = e.get("data", {})
+                    item = {
+                        "app_name": data.get("app", "Unknown"),
+                        "duration": int(e.get("duration", 0)),
+                    }
+                    if by_title:
+                        item["window_title"] = data.get("title", "")
+                        item["url"] = None
+                    totals.append(item)
+                return totals
+
+        activities = await self._active_activities(start_date, end_date)
+        grouped: Dict[tuple, Dict[str, Any]] = {}
+        for a in activities:
+            if by_title:
+                key = (a.get("app_name", "Unknown"), a.get("window_title", ""), a.get("url"))
+            else:
+                key = (a.get("app_name", "Unknown"),)
+            if key not in grouped:
+                grouped[key] = {"app_name": key[0], "duration": 0}
+                if by_title:
+                    grouped[key]["window_title"] = key[1]
+                    grouped[key]["url"] = key[2]
+            grouped[key]["duration"] += int(a.get("duration", 0))
+
+        return sorted(grouped.values(), key=lambda x: x["duration"], reverse=True)
+
+    async def get_domain_totals(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[Dict[str, Any]]:
+        """Get total browsing time per domain"""
+        if await self._use_query():
+            result = await self.query(
+                [(start_date, end_date)],
+                self._QUERY_PRELUDE + [
+                    'web_events = query_bucket(find_bucket("aw-watcher-web"));',
+                    "web_events = filter_period_intersect(web_events, not_afk);",
+                    "web_events = split_url_events(web_events);",
+                    'events = merge_events_by_keys(web_events, ["$domain"]);',
+                    "RETURN = sort_by_duration(events);",
+                ],
+            )
+            if result is not None:
+                return [
+                    {
+                        "domain": e.get("data", {}).get("$domain", ""),
+                        "duration": int(e.get("duration", 0)),
+                    }
+                    for e in (result[0] if result else [])
+                ]
+
+        activities = await self._active_activities(start_date, end_date)
+        totals: Dict[str, int] = {}
+        for a in activities:
+            url = a.get("url")
+            if not url:
+                continue
+            domain = urlparse(url).netloc
+            if domain.startswith("www."):
+                domain = domain[4:]
+            if domain:
+                totals[domain] = totals.get(domain, 0) + int(a.get("duration", 0))
+
+        return [
+            {"domain": domain, "duration": duration}
+            for domain, duration in sorted(totals.items(), key=lambda x: x[1], reverse=True)
+        ]
+
+    async def get_hourly_totals(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict[int, int]:
+        """Get total active seconds per hour of day (0-23)"""
+        hourly = {h: 0 for h in range(24)}
+
+        if await self._use_query():
+            periods = []
+            cursor = start_date
+            while cursor < end_date:
+                next_hour = min(
+                    cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1),
+                    end_date,
+                )
+                periods.append((cursor, next_hour))
+                cursor = next_hour
+
+            result = await self.query(
+                periods,
+                self._QUERY_PRELUDE + ["RETURN = sum_durations(window_events);"],
+            )
+            if result is not None and len(result) == len(periods):
+                for (period_start, _), seconds in zip(periods, result):
+                    hourly[period_start.hour] += int(seconds or 0)
+                return hourly
+
+        for a in await self._active_activities(start_date, end_date):
+            start = a.get("start_time")
+            if isinstance(start, str):
+                try:
+                    start = datetime.fromisoformat(start.replace("Z", "+00:00"))
+                except ValueError:
+                    continue
+            if start:
+                hourly[start.hour] += int(a.get("duration", 0))
+
+        return hourly
+
     async def get_today_activities(self) -> List[Dict[str, Any]]:
         """Get all activities for today"""
         today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -330,6 +725,7 @@ class ActivityWatchClient:
             "buckets": buckets,
             "window_bucket": self.window_bucket,
             "afk_bucket": self.afk_bucket,
+            "query_api": self.use_query_api and self._query_supported is not False,
         }
 
 
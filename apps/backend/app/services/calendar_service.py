@@ -11,6 +11,7 @@ from sqlalchemy.orm import selectinload
 
 from app.core.config import settings
 from app.models.calendar import CalendarConnection, CalendarEvent, CalendarProvider
+from app.services.deepwork_service import streaming_scorer
 
 
 class GoogleCalendarService:
@@ -461,6 +462,9 @@ class CalendarSyncService:
             connection.last_sync_at = datetime.utcnow()
             await db.commit()
 
+            # Meetings changed; running deep work state must be rebuilt
+            await streaming_scorer.invalidate(connection.user_id)
+
             return {
                 "success": True,
                 "total_synced": total_synced,
@@ -0,0 +1,194 @@
+"""
+WebSocket Connection Manager
+
+Tracks the sockets connected to /ws/activities, grouped by the user each one
+authenticated as, so a message for one user only goes to that user's sockets.
+
+Messages go through the realtime backend, so a user's sockets receive them
+whichever worker they are connected to: each worker subscribes to the channel
+of every user with a socket on it, plus the broadcast channel.
+
+Sending never waits on a client. Each message is serialized once and the same
+text is put on every recipient's bounded queue, and a writer task per
+connection drains its queue. A client that falls behind loses its oldest
+queued messages, or is disconnected, depending on
+websocket_slow_consumer_policy.
+"""
+import asyncio
+import json
+from collections import defaultdict, deque
+from typing import Dict, Set, Optional, Any
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.realtime_backend import get_realtime_backend
+
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+SLOW_CONSUMER_CLOSE_CODE = 1013  # try again later
+BROADCAST_CHANNEL = "ws:broadcast"
+
+
+def user_channel(user_id: int) -> str:
+    return f"ws:user:{user_id}"
+
+
+class Connection:
+    """One socket's outgoing queue and the task writing it out"""
+
+    def __init__(self, websocket: WebSocket, user_id: int, max_queue: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: deque = deque(maxlen=max_queue)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.writer: Optional[asyncio.Task] = None
+
+
+class ConnectionManager:
+    """Manages WebSocket connections"""
+
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        policy: Optional[str] = None,
+        send_timeout: Optional[float] = None,
+    ):
+        self.max_queue = settings.websocket_send_queue_size if max_queue is None else max_queue
+        self.policy = policy or settings.websocket_slow_consumer_policy
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            self.policy = "drop_oldest"
+        self.send_timeout = settings.websocket_send_timeout_seconds if send_timeout is None else send_timeout
+
+        self.active_connections: Dict[WebSocket, Connection] = {}
+        self._channels: Dict[int, Set[WebSocket]] = defaultdict(set)  # user_id -> sockets
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.slow_disconnects = 0
+        self._subscribed_broadcast = False
+        self._logger = get_logger("websocket.manager")
+
+    async def connect(self, websocket: WebSocket, user_id: int):
+        await websocket.accept()
+        connection = Connection(websocket, user_id, self.max_queue)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.active_connections[websocket] = connection
+        first_for_user = user_id not in self._channels
+        self._channels[user_id].add(websocket)
+        self._logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+
+        backend = await get_realtime_backend()
+        if first_for_user:
+            await backend.subscribe(user_channel(user_id), self._on_message)
+        if not self._subscribed_broadcast:
+            self._subscribed_broadcast = True
+            await backend.subscribe(BROADCAST_CHANNEL, self._on_message)
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+        channel = self._channels.get(connection.user_id)
+        if channel is not None:
+            channel.discard(websocket)
+            if not channel:
+                del self._channels[connection.user_id]
+                asyncio.ensure_future(self._unsubscribe(connection.user_id))
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        self._logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+
+    # ═══════════════════════════════════════════════════════════════════
+    # SENDING
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Queue a message for one socket (replies go through its writer too)"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, json.dumps(message))
+
+    async def send_to_user(self, user_id: int, message: dict):
+        """Queue a message for every socket of one user, on any worker"""
+        # Serialized once; every recipient gets the same text
+        backend = await get_realtime_backend()
+        await backend.publish(user_channel(user_id), json.dumps(message))
+
+    async def broadcast(self, message: dict):
+        """Queue a message for all connected clients, on any worker"""
+        backend = await get_realtime_backend()
+        await backend.publish(BROADCAST_CHANNEL, json.dumps(message))
+
+    async def _on_message(self, channel: str, payload: str):
+        """Deliver a published message to this worker's sockets"""
+        if channel == BROADCAST_CHANNEL:
+            sockets = list(self.active_connections)
+        else:
+            sockets = list(self._channels.get(int(channel.rsplit(":", 1)[1]), ()))
+        for websocket in sockets:
+            self._enqueue(self.active_connections[websocket], payload)
+
+    async def _unsubscribe(self, user_id: int):
+        # The user may have reconnected while this was scheduled
+        if user_id not in self._channels:
+            backend = await get_realtime_backend()
+            await backend.unsubscribe(user_channel(user_id), self._on_message)
+
+    def _enqueue(self, connection: Connection, payload: str):
+        if len(connection.queue) == connection.queue.maxlen:
+            if self.policy == "disconnect":
+                self._drop_slow_consumer(connection)
+                return
+            # The deque discards the oldest message as this one goes in
+            connection.dropped += 1
+            self.messages_dropped += 1
+        connection.queue.append(payload)
+        connection.ready.set()
+
+    async def _writer(self, connection: Connection):
+        websocket = connection.websocket
+        try:
+            while True:
+                await connection.ready.wait()
+                while connection.queue:
+                    payload = connection.queue.popleft()
+                    await asyncio.wait_for(websocket.send_text(payload), timeout=self.send_timeout)
+                    self.messages_sent += 1
+                connection.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._drop_slow_consumer(connection)
+        except Exception:
+            # Client went away; the receive loop notices too
+            self.disconnect(websocket)
+
+    def _drop_slow_consumer(self, connection: Connection):
+        self.slow_disconnects += 1
+        self._logger.warning(f"Disconnecting slow WebSocket client (user {connection.user_id})")
+        self.disconnect(connection.websocket)
+        asyncio.ensure_future(_close(connection.websocket))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.active_connections),
+            "users": len(self._channels),
+            "queued": sum(len(c.queue) for c in self.active_connections.values()),
+            "sent": self.messages_sent,
+            "dropped": self.messages_dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "policy": self.policy,
+        }
+
+
+async def _close(websocket: WebSocket):
+    try:
+        await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+    except Exception:
+        pass
+
+
+# Singleton instance
+manager = ConnectionManager()
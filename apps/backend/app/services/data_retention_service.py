@@ -12,6 +12,7 @@ from typing import Optional
 from app.core.database import get_db, async_session
 from app.models import Activity, URLActivity, Screenshot, UserSettings, FocusSession
 from app.models.calendar import FocusBlock
+from app.services.storage_usage_service import detach_duplicates, release_screenshots
 
 
 class DataRetentionService:
@@ -97,7 +98,10 @@ class DataRetentionService:
             )
         )
         screenshots = screenshots_result.scalars().all()
-        screenshot_paths = [s.storage_path for s in screenshots if s.storage_path]
+        # Blobs shared with newer near-duplicates are handed over, not deleted
+        owners = await detach_duplicates(db, screenshots)
+        screenshot_paths = [s.storage_path for s in owners if s.storage_path]
+        await release_screenshots(db, screenshots)
 
         # Delete screenshot records
         result = await db.execute(
@@ -0,0 +1,339 @@
+"""
+Deep Work Batch Service
+
+Nightly recomputation of yesterday's deep work scores for all active users,
+so team aggregates always find a DeepWorkScore row per member.
+
+Users are processed in chunks: each chunk costs one grouped query for
+activities, one for meetings and three for comparison baselines, regardless
+of chunk size. The pure-Python metric computation runs across a bounded
+process pool while the next chunk is being fetched.
+
+Every worker schedules the batch. Scores are unique per user and day, so a
+chunk whose inserts lose to another worker updates that worker's rows.
+"""
+import asyncio
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import select, and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.activity import Activity
+from app.models.calendar import CalendarEvent, DeepWorkScore
+from app.models.user import User
+from app.services.deepwork_service import DeepWorkCalculator, deepwork_calculator
+
+
+# Picklable rows carrying only the columns the calculator reads
+ActivityRow = namedtuple("ActivityRow", "start_time end_time duration productivity_score app_name")
+MeetingRow = namedtuple("MeetingRow", "start_time end_time duration_minutes")
+
+
+def compute_metrics_chunk(
+    days: List[Tuple[int, List[ActivityRow], List[MeetingRow]]],
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """Compute metrics for a chunk of users (runs inside a worker process)"""
+    calculator = DeepWorkCalculator()
+    return [
+        (user_id, calculator._calculate_metrics(activities, meetings, None, None))
+        for user_id, activities, meetings in days
+    ]
+
+
+class DeepWorkBatchService:
+    """Scheduled batch computation of deep work scores across all users"""
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler()
+        self.max_workers = settings.deepwork_batch_workers
+        self.chunk_size = settings.deepwork_batch_chunk_size
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start_scheduler(self):
+        """Schedule the nightly recomputation at 2:30 AM"""
+        if not self.scheduler.running:
+            self.scheduler.start()
+        self.scheduler.add_job(
+            self.recompute_yesterday,
+            trigger=CronTrigger(hour=2, minute=30),
+            id='deepwork_nightly',
+            replace_existing=True,
+        )
+        print("🧠 Deep work recomputation scheduled daily at 2:30 AM")
+
+    def stop_scheduler(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    async def recompute_yesterday(self) -> Dict[str, Any]:
+        """Entry point for the scheduler"""
+        async with async_session() as db:
+            return await self.recompute_day(db, date.today() - timedelta(days=1))
+
+    async def recompute_day(self, db: AsyncSession, target_date: date) -> Dict[str, Any]:
+        """
+        Compute and store deep work scores for every active user on a day.
+
+        At most max_workers chunks are computing at once; DB reads and writes
+        stay on this coroutine so the session is never used concurrently.
+        """
+        started = time.perf_counter()
+        stats = {
+            "date": target_date.isoformat(),
+            "users": 0,
+            "scored": 0,
+            "skipped": 0,
+            "activities": 0,
+            "chunks": 0,
+            "errors": [],
+        }
+
+        result = await db.execute(
+            select(User.id).where(User.is_active == True).order_by(User.id)
+        )
+        user_ids = [row[0] for row in result.all()]
+        stats["users"] = len(user_ids)
+
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=self.max_workers) if self.max_workers > 0 else None
+        in_flight: deque = deque()
+        max_in_flight = max(self.max_workers, 1)
+
+        try:
+            for i in range(0, len(user_ids), self.chunk_size):
+                chunk = user_ids[i:i + self.chunk_size]
+                days = await self._fetch_chunk(db, chunk, target_date)
+                stats["activities"] += sum(len(acts) for _, acts, _ in days)
+                stats["skipped"] += len(chunk) - len(days)
+                stats["chunks"] += 1
+
+                if executor is None:
+                    future = loop.create_future()
+                    future.set_result(compute_metrics_chunk(days))
+                else:
+                    future = loop.run_in_executor(executor, compute_metrics_chunk, days)
+                in_flight.append((chunk, future))
+
+                if len(in_flight) >= max_in_flight:
+                    await self._drain_one(db, in_flight, target_date, stats)
+
+            while in_flight:
+                await self._drain_one(db, in_flight, target_date, stats)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["users_per_second"] = round(stats["users"] / elapsed, 1) if elapsed > 0 else 0
+        self.last_run = stats
+
+        print(
+            f"🧠 Deep work batch for {stats['date']}: scored {stats['scored']}/{stats['users']} users "
+            f"({stats['activities']} activities, {stats['chunks']} chunks) in {elapsed:.1f}s "
+            f"= {stats['users_per_second']} users/s"
+        )
+        return stats
+
+    async def _drain_one(
+        self,
+        db: AsyncSession,
+        in_flight: deque,
+        target_date: date,
+        stats: Dict[str, Any],
+    ) -> None:
+        chunk, future = in_flight.popleft()
+        try:
+            results = await future
+            await self._save_chunk(db, results, target_date)
+            stats["scored"] += len(results)
+        except Exception as e:
+            await db.rollback()
+            stats["errors"].append({"user_ids": [chunk[0], chunk[-1]], "error": str(e)})
+
+    async def _fetch_chunk(
+        self,
+        db: AsyncSession,
+        user_ids: List[int],
+        target_date: date,
+    ) -> List[Tuple[int, List[ActivityRow], List[MeetingRow]]]:
+        """One grouped query per table for a chunk of users"""
+        start_of_day = datetime.combine(target_date, datetime.min.time())
+        end_of_day = datetime.combine(target_date, datetime.max.time())
+
+        activities: Dict[int, List[ActivityRow]] = {}
+        result = await db.execute(
+            select(
+                Activity.user_id,
+                Activity.start_time,
+                Activity.end_time,
+                Activity.duration,
+                Activity.productivity_score,
+                Activity.app_name,
+            )
+            .where(
+                and_(
+                    Activity.user_id.in_(user_ids),
+                    Activity.start_time >= start_of_day,
+                    Activity.start_time < end_of_day,
+                )
+            )
+            .order_by(Activity.user_id, Activity.start_time)
+        )
+        for user_id, *columns in result.all():
+            activities.setdefault(user_id, []).append(ActivityRow(*columns))
+
+        meetings: Dict[int, List[MeetingRow]] = {}
+        result = await db.execute(
+            select(
+                CalendarEvent.user_id,
+                CalendarEvent.start_time,
+                CalendarEvent.end_time,
+                CalendarEvent.duration_minutes,
+            )
+            .where(
+                and_(
+                    CalendarEvent.user_id.in_(user_ids),
+                    CalendarEvent.start_time >= start_of_day,
+                    CalendarEvent.start_time < end_of_day,
+                    CalendarEvent.status != "cancelled",
+                    CalendarEvent.is_focus_time == False,
+                    CalendarEvent.is_all_day == False,
+                )
+            )
+            .order_by(CalendarEvent.user_id, CalendarEvent.start_time)
+        )
+        for user_id, *columns in result.all():
+            meetings.setdefault(user_id, []).append(MeetingRow(*columns))
+
+        # Users with no activity and no meetings get no row (not a zero score)
+        return [
+            (user_id, activities.get(user_id, []), meetings.get(user_id, []))
+            for user_id in user_ids
+            if user_id in activities or user_id in meetings
+        ]
+
+    async def _save_chunk(
+        self,
+        db: AsyncSession,
+        results: List[Tuple[int, Dict[str, Any]]],
+        target_date: date,
+    ) -> None:
+        """Upsert a chunk's scores with grouped baseline and existing-row lookups"""
+        if not results:
+            return
+
+        user_ids = [user_id for user_id, _ in results]
+        baselines = await self._get_baselines(db, user_ids, target_date)
+        start_of_day = datetime.combine(target_date, datetime.min.time())
+
+        for attempt in range(2):
+            existing = await self._existing_scores(db, user_ids, target_date)
+            now = datetime.utcnow()
+            for user_id, metrics in results:
+                comparisons = deepwork_calculator._comparisons_from_baselines(
+                    metrics["deep_work_score"], baselines.get(user_id, {})
+                )
+                score = existing.get(user_id)
+                if score:
+                    for key, value in {**metrics, **comparisons}.items():
+                        setattr(score, key, value)
+                    score.calculated_at = now
+                else:
+                    db.add(DeepWorkScore(
+                        user_id=user_id,
+                        date=start_of_day,
+                        **metrics,
+                        **comparisons,
+                    ))
+
+            try:
+                await db.commit()
+                return
+            except IntegrityError:
+                # Another worker's batch stored some of these days since the
+                # lookup; look again and update its rows instead
+                await db.rollback()
+                if attempt:
+                    raise
+
+    async def _existing_scores(
+        self,
+        db: AsyncSession,
+        user_ids: List[int],
+        target_date: date,
+    ) -> Dict[int, DeepWorkScore]:
+        """Stored score rows for a day, by user"""
+        start_of_day = datetime.combine(target_date, datetime.min.time())
+        end_of_day = datetime.combine(target_date, datetime.max.time())
+        result = await db.execute(
+            select(DeepWorkScore).where(
+                and_(
+                    DeepWorkScore.user_id.in_(user_ids),
+                    DeepWorkScore.date >= start_of_day,
+                    DeepWorkScore.date < end_of_day,
+                )
+            )
+        )
+        return {s.user_id: s for s in result.scalars().all()}
+
+    async def _get_baselines(
+        self,
+        db: AsyncSession,
+        user_ids: List[int],
+        target_date: date,
+    ) -> Dict[int, Dict[str, Optional[float]]]:
+        """Yesterday's score and week/month averages for many users at once"""
+        day_start = datetime.combine(target_date, datetime.min.time())
+        yesterday = target_date - timedelta(days=1)
+        yesterday_start = datetime.combine(yesterday, datetime.min.time())
+        yesterday_end = datetime.combine(yesterday, datetime.max.time())
+        week_start = datetime.combine(target_date - timedelta(days=7), datetime.min.time())
+        month_start = datetime.combine(target_date - timedelta(days=30), datetime.min.time())
+
+        baselines: Dict[int, Dict[str, Optional[float]]] = {
+            user_id: {"yesterday": None, "week_avg": None, "month_avg": None}
+            for user_id in user_ids
+        }
+
+        result = await db.execute(
+            select(DeepWorkScore.user_id, DeepWorkScore.deep_work_score).where(
+                and_(
+                    DeepWorkScore.user_id.in_(user_ids),
+                    DeepWorkScore.date >= yesterday_start,
+                    DeepWorkScore.date < yesterday_end,
+                )
+            )
+        )
+        for user_id, score in result.all():
+            baselines[user_id]["yesterday"] = score
+
+        for key, window_start in (("week_avg", week_start), ("month_avg", month_start)):
+            result = await db.execute(
+                select(DeepWorkScore.user_id, func.avg(DeepWorkScore.deep_work_score))
+                .where(
+                    and_(
+                        DeepWorkScore.user_id.in_(user_ids),
+                        DeepWorkScore.date >= window_start,
+                        DeepWorkScore.date < day_start,
+                    )
+                )
+                .group_by(DeepWorkScore.user_id)
+            )
+            for user_id, avg in result.all():
+                baselines[user_id][key] = avg
+
+        return baselines
+
+
+# Singleton instance
+deepwork_batch_service = DeepWorkBatchService()
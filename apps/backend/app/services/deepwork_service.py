@@ -6,12 +6,194 @@ from datetime import datetime, timedelta, date
 from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func
-from collections import defaultdict
+from sqlalchemy.exc import IntegrityError
+import heapq
 
+from app.core.realtime_backend import get_realtime_backend
 from app.models.calendar import CalendarEvent, DeepWorkScore, FocusBlock
 from app.models.activity import Activity
 
 
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _parse_iso(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+class FocusSweep:
+    """
+    Single sweep-line pass over start-ordered activities and meeting intervals.
+
+    Meetings are sorted once; while activities are fed in start order, meetings
+    that have started are pushed onto a min-heap of end times and popped once
+    they end, so "is this activity during a meeting" costs O(log M) instead of
+    scanning every meeting. The same pass accumulates focus blocks, meeting
+    overlap, context switches, productivity minutes and hourly scores, so all
+    metrics share one traversal.
+    """
+
+    def __init__(
+        self,
+        meetings: List[CalendarEvent],
+        productive_threshold: float,
+        min_block_minutes: int,
+    ):
+        self.productive_threshold = productive_threshold
+        self.min_block_minutes = min_block_minutes
+
+        self._meetings = sorted((m.start_time, m.end_time) for m in meetings)
+        self._next_meeting = 0
+        self._active_meeting_ends: List[datetime] = []
+
+        # Focus blocks
+        self.focus_blocks: List[Dict[str, Any]] = []
+        self.block_start: Optional[datetime] = None
+        self.block_minutes = 0
+
+        # Fragmentation inputs
+        self.meeting_count = len(meetings)
+        self.meeting_minutes = sum(m.duration_minutes or 0 for m in meetings)
+        self.context_switches = 0
+        self.meeting_overlap_minutes = 0
+        self._prev_app: Optional[str] = None
+
+        # Productivity breakdown
+        self.activity_count = 0
+        self.total_tracked_minutes = 0
+        self.productive_minutes = 0
+        self.neutral_minutes = 0
+        self.distracting_minutes = 0
+        self.first_start: Optional[datetime] = None
+        self.last_start: Optional[datetime] = None
+        self.last_end: Optional[datetime] = None
+
+        # hour -> [sum of scores, count]
+        self.hourly_scores: Dict[int, List[float]] = {}
+
+    def _during_meeting(self, start_time: datetime) -> bool:
+        """Whether any meeting satisfies start <= start_time < end"""
+        while (self._next_meeting < len(self._meetings)
+               and self._meetings[self._next_meeting][0] <= start_time):
+            heapq.heappush(self._active_meeting_ends, self._meetings[self._next_meeting][1])
+            self._next_meeting += 1
+        while self._active_meeting_ends and self._active_meeting_ends[0] <= start_time:
+            heapq.heappop(self._active_meeting_ends)
+        return bool(self._active_meeting_ends)
+
+    def add(self, activity: Activity) -> None:
+        """Feed the next activity (activities must arrive in start-time order)"""
+        duration_minutes = (activity.duration or 0) // 60
+        score = activity.productivity_score or 0.5
+
+        if self.first_start is None:
+            self.first_start = activity.start_time
+        self.last_start = activity.start_time
+        self.last_end = activity.end_time or activity.start_time
+        self.activity_count += 1
+
+        # Productivity breakdown
+        self.total_tracked_minutes += duration_minutes
+        if score >= self.productive_threshold:
+            self.productive_minutes += duration_minutes
+        elif score >= 0.4:
+            self.neutral_minutes += duration_minutes
+        else:
+            self.distracting_minutes += duration_minutes
+
+        # Context switches (app changes)
+        if self._prev_app and activity.app_name != self._prev_app:
+            self.context_switches += 1
+        self._prev_app = activity.app_name
+
+        # Hourly productivity
+        if activity.start_time:
+            bucket = self.hourly_scores.setdefault(activity.start_time.hour, [0.0, 0])
+            bucket[0] += score
+            bucket[1] += 1
+
+        # Focus blocks, broken by meetings and non-productive activity
+        during_meeting = self._during_meeting(activity.start_time)
+        if during_meeting:
+            self.meeting_overlap_minutes += duration_minutes
+
+        if score >= self.productive_threshold and not during_meeting:
+            if self.block_start is None:
+                self.block_start = activity.start_time
+            self.block_minutes += duration_minutes
+        else:
+            self._close_block()
+
+    def _close_block(self) -> None:
+        if self.block_minutes >= self.min_block_minutes:
+            self.focus_blocks.append({
+                "start_time": self.block_start,
+                "duration_minutes": self.block_minutes,
+            })
+        self.block_start = None
+        self.block_minutes = 0
+
+    def blocks(self) -> List[Dict[str, Any]]:
+        """Completed focus blocks plus the open block if it already qualifies"""
+        if self.block_minutes >= self.min_block_minutes:
+            return self.focus_blocks + [{
+                "start_time": self.block_start,
+                "duration_minutes": self.block_minutes,
+            }]
+        return list(self.focus_blocks)
+
+    # ── Serialization (running state is shared between workers) ─────────
+
+    _DATETIME_FIELDS = ("block_start", "first_start", "last_start", "last_end")
+    _PLAIN_FIELDS = (
+        "productive_threshold", "min_block_minutes", "_next_meeting", "block_minutes",
+        "meeting_count", "meeting_minutes", "context_switches", "meeting_overlap_minutes",
+        "_prev_app", "activity_count", "total_tracked_minutes", "productive_minutes",
+        "neutral_minutes", "distracting_minutes",
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe copy of the sweep's state, to resume it with from_dict"""
+        data = {name: getattr(self, name) for name in self._PLAIN_FIELDS}
+        data.update({name: _iso(getattr(self, name)) for name in self._DATETIME_FIELDS})
+        data["_meetings"] = [[_iso(start), _iso(end)] for start, end in self._meetings]
+        data["_active_meeting_ends"] = [_iso(end) for end in self._active_meeting_ends]
+        data["focus_blocks"] = [
+            {"start_time": _iso(b["start_time"]), "duration_minutes": b["duration_minutes"]}
+            for b in self.focus_blocks
+        ]
+        data["hourly_scores"] = [[hour, total, count] for hour, (total, count) in self.hourly_scores.items()]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FocusSweep":
+        sweep = cls.__new__(cls)
+        for name in cls._PLAIN_FIELDS:
+            setattr(sweep, name, data[name])
+        for name in cls._DATETIME_FIELDS:
+            setattr(sweep, name, _parse_iso(data[name]))
+        sweep._meetings = [(_parse_iso(start), _parse_iso(end)) for start, end in data["_meetings"]]
+        # Still a valid heap: the order is kept as it was
+        sweep._active_meeting_ends = [_parse_iso(end) for end in data["_active_meeting_ends"]]
+        sweep.focus_blocks = [
+            {"start_time": _parse_iso(b["start_time"]), "duration_minutes": b["duration_minutes"]}
+            for b in data["focus_blocks"]
+        ]
+        sweep.hourly_scores = {hour: [total, count] for hour, total, count in data["hourly_scores"]}
+        return sweep
+
+    def best_focus_hour(self) -> Optional[int]:
+        """Hour with the highest average productivity score"""
+        if not self.hourly_scores:
+            return None
+        avg_scores = {
+            hour: total / count
+            for hour, (total, count) in self.hourly_scores.items()
+        }
+        return max(avg_scores, key=avg_scores.get)
+
+
 class DeepWorkCalculator:
     """
     Calculates Deep Work Score and related metrics.
@@ -57,6 +239,23 @@ class DeepWorkCalculator:
         # Calculate metrics
         metrics = self._calculate_metrics(activities, meetings, start_of_day, end_of_day)
 
+        # Get comparison data
+        comparisons = await self._calculate_comparisons(db, user_id, target_date, metrics)
+
+        return await self._save_score(db, user_id, target_date, metrics, comparisons)
+
+    async def _save_score(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        target_date: date,
+        metrics: Dict[str, Any],
+        comparisons: Dict[str, Any],
+    ) -> DeepWorkScore:
+        """Create or update the stored score row for a day"""
+        start_of_day = datetime.combine(target_date, datetime.min.time())
+        end_of_day = datetime.combine(target_date, datetime.max.time())
+
         # Check for existing score
         result = await db.execute(
             select(DeepWorkScore).where(
@@ -69,9 +268,6 @@ class DeepWorkCalculator:
         )
         existing_score = result.scalar_one_or_none()
 
-        # Get comparison data
-        comparisons = await self._calculate_comparisons(db, user_id, target_date, metrics)
-
         if existing_score:
             # Update existing score
             for key, value in metrics.items():
@@ -91,7 +287,15 @@ class DeepWorkCalculator:
             **comparisons,
         )
         db.add(score)
-        await db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            # The nightly batch in another worker stored this day first
+            await db.rollback()
+            existing = await self.get_score_for_date(db, user_id, target_date)
+            if existing is None:
+                raise
+            return await self._save_score(db, user_id, target_date, metrics, comparisons)
         await db.refresh(score)
         return score
 
@@ -150,7 +354,16 @@ class DeepWorkCalculator:
         """Calculate all deep work metrics"""
 
         # Initialize metrics
-        metrics = {
+        metrics = self._empty_metrics()
+
+        if not activities and not meetings:
+            return metrics
+
+        # One pass over activities and meetings feeds every metric
+        return self._metrics_from_sweep(self._sweep(activities, meetings))
+
+    def _empty_metrics(self) -> Dict[str, Any]:
+        return {
             "deep_work_score": 0,
             "deep_work_minutes": 0,
             "total_tracked_minutes": 0,
@@ -171,12 +384,16 @@ class DeepWorkCalculator:
             "best_focus_hour": None,
         }
 
-        if not activities and not meetings:
+    def _metrics_from_sweep(self, sweep: "FocusSweep") -> Dict[str, Any]:
+        """Build all deep work metrics from the running sweep state"""
+        metrics = self._empty_metrics()
+
+        if not sweep.activity_count and not sweep.meeting_count:
             return metrics
 
         # Calculate meeting metrics
-        metrics["meeting_count"] = len(meetings)
-        metrics["total_meeting_minutes"] = sum(m.duration_minutes or 0 for m in meetings)
+        metrics["meeting_count"] = sweep.meeting_count
+        metrics["total_meeting_minutes"] = sweep.meeting_minutes
 
         # Calculate work hours (9 hours default)
         work_minutes = self.WORK_HOURS * 60
@@ -185,31 +402,17 @@ class DeepWorkCalculator:
         ) if work_minutes > 0 else 0
 
         # Calculate activity metrics
-        if activities:
-            metrics["work_start_time"] = activities[0].start_time
-            metrics["work_end_time"] = activities[-1].end_time or activities[-1].start_time
-
-            for activity in activities:
-                duration = activity.duration or 0
-                metrics["total_tracked_minutes"] += duration // 60
-
-                score = activity.productivity_score or 0.5
-                if score >= self.PRODUCTIVE_THRESHOLD:
-                    metrics["productive_minutes"] += duration // 60
-                elif score >= 0.4:
-                    metrics["neutral_minutes"] += duration // 60
-                else:
-                    metrics["distracting_minutes"] += duration // 60
-
-            # Count context switches (app changes)
-            prev_app = None
-            for activity in activities:
-                if prev_app and activity.app_name != prev_app:
-                    metrics["context_switches"] += 1
-                prev_app = activity.app_name
+        if sweep.activity_count:
+            metrics["work_start_time"] = sweep.first_start
+            metrics["work_end_time"] = sweep.last_end
+            metrics["total_tracked_minutes"] = sweep.total_tracked_minutes
+            metrics["productive_minutes"] = sweep.productive_minutes
+            metrics["neutral_minutes"] = sweep.neutral_minutes
+            metrics["distracting_minutes"] = sweep.distracting_minutes
+            metrics["context_switches"] = sweep.context_switches
 
         # Calculate focus blocks (periods of uninterrupted productive work)
-        focus_blocks = self._identify_focus_blocks(activities, meetings)
+        focus_blocks = sweep.blocks()
         if focus_blocks:
             metrics["focus_blocks_count"] = len(focus_blocks)
             block_durations = [b["duration_minutes"] for b in focus_blocks]
@@ -220,8 +423,11 @@ class DeepWorkCalculator:
             metrics["deep_work_minutes"] = sum(block_durations)
 
         # Calculate fragmentation score (0-100, lower is better)
-        metrics["fragmentation_score"] = self._calculate_fragmentation(
-            activities, meetings, metrics["context_switches"]
+        metrics["fragmentation_score"] = self._fragmentation_from_inputs(
+            sweep.activity_count > 0,
+            sweep.meeting_count,
+            metrics["context_switches"],
+            focus_blocks,
         )
 
         # Calculate focus efficiency
@@ -232,14 +438,25 @@ class DeepWorkCalculator:
             )
 
         # Calculate best focus hour
-        if activities:
-            metrics["best_focus_hour"] = self._find_best_focus_hour(activities)
+        if sweep.activity_count:
+            metrics["best_focus_hour"] = sweep.best_focus_hour()
 
         # Calculate overall Deep Work Score (0-100)
         metrics["deep_work_score"] = self._calculate_overall_score(metrics)
 
         return metrics
 
+    def _sweep(
+        self,
+        activities: List[Activity],
+        meetings: List[CalendarEvent],
+    ) -> FocusSweep:
+        """Run the sweep-line pass over activities sorted by start time"""
+        sweep = FocusSweep(meetings, self.PRODUCTIVE_THRESHOLD, self.MIN_FOCUS_BLOCK_MINUTES)
+        for activity in sorted(activities, key=lambda a: a.start_time):
+            sweep.add(activity)
+        return sweep
+
     def _identify_focus_blocks(
         self,
         activities: List[Activity],
@@ -254,61 +471,14 @@ class DeepWorkCalculator:
         """
         if not activities:
             return []
-
-        # Create list of interruptions (meetings + distracting activities)
-        interruptions = []
-        for meeting in meetings:
-            interruptions.append({
-                "start": meeting.start_time,
-                "end": meeting.end_time,
-                "type": "meeting",
-            })
-
-        # Sort activities by start time
-        sorted_activities = sorted(activities, key=lambda a: a.start_time)
-
-        focus_blocks = []
-        current_block_start = None
-        current_block_duration = 0
-
-        for activity in sorted_activities:
-            is_productive = (activity.productivity_score or 0.5) >= self.PRODUCTIVE_THRESHOLD
-            duration_minutes = (activity.duration or 0) // 60
-
-            # Check if activity is during a meeting
-            during_meeting = any(
-                i["start"] <= activity.start_time < i["end"]
-                for i in interruptions
-            )
-
-            if is_productive and not during_meeting:
-                if current_block_start is None:
-                    current_block_start = activity.start_time
-                current_block_duration += duration_minutes
-            else:
-                # End current block if it meets minimum threshold
-                if current_block_duration >= self.MIN_FOCUS_BLOCK_MINUTES:
-                    focus_blocks.append({
-                        "start_time": current_block_start,
-                        "duration_minutes": current_block_duration,
-                    })
-                current_block_start = None
-                current_block_duration = 0
-
-        # Don't forget the last block
-        if current_block_duration >= self.MIN_FOCUS_BLOCK_MINUTES:
-            focus_blocks.append({
-                "start_time": current_block_start,
-                "duration_minutes": current_block_duration,
-            })
-
-        return focus_blocks
+        return self._sweep(activities, meetings).blocks()
 
     def _calculate_fragmentation(
         self,
         activities: List[Activity],
         meetings: List[CalendarEvent],
         context_switches: int,
+        focus_blocks: Optional[List[Dict[str, Any]]] = None,
     ) -> int:
         """
         Calculate fragmentation score (0-100, lower is better).
@@ -318,14 +488,28 @@ class DeepWorkCalculator:
         - Context switches (more switches = more fragmented)
         - Average gap between activities
         """
-        if not activities:
+        if focus_blocks is None and activities:
+            focus_blocks = self._identify_focus_blocks(activities, meetings)
+        return self._fragmentation_from_inputs(
+            bool(activities), len(meetings), context_switches, focus_blocks or []
+        )
+
+    def _fragmentation_from_inputs(
+        self,
+        has_activities: bool,
+        meeting_count: int,
+        context_switches: int,
+        focus_blocks: List[Dict[str, Any]],
+    ) -> int:
+        """Fragmentation score from precomputed sweep inputs"""
+        if not has_activities:
             return 100  # No data = maximum fragmentation (unknown)
 
         # Base score starts at 0 (no fragmentation)
         score = 0
 
         # Meeting penalty: +10 per meeting, capped at 50
-        meeting_penalty = min(len(meetings) * 10, 50)
+        meeting_penalty = min(meeting_count * 10, 50)
         score += meeting_penalty
 
         # Context switch penalty: +2 per switch, capped at 30
@@ -333,7 +517,6 @@ class DeepWorkCalculator:
         score += switch_penalty
 
         # Short focus blocks penalty
-        focus_blocks = self._identify_focus_blocks(activities, meetings)
         if focus_blocks:
             avg_block = sum(b["duration_minutes"] for b in focus_blocks) / len(focus_blocks)
             # Penalty if average block is less than ideal (90 min)
@@ -349,24 +532,7 @@ class DeepWorkCalculator:
         """Find the hour with highest average productivity"""
         if not activities:
             return None
-
-        hourly_scores = defaultdict(list)
-        for activity in activities:
-            if activity.start_time:
-                hour = activity.start_time.hour
-                hourly_scores[hour].append(activity.productivity_score or 0.5)
-
-        if not hourly_scores:
-            return None
-
-        # Calculate average score per hour
-        avg_scores = {
-            hour: sum(scores) / len(scores)
-            for hour, scores in hourly_scores.items()
-        }
-
-        # Return hour with highest average
-        return max(avg_scores, key=avg_scores.get)
+        return self._sweep(activities, []).best_focus_hour()
 
     def _calculate_overall_score(self, metrics: Dict[str, Any]) -> int:
         """
@@ -409,13 +575,17 @@ class DeepWorkCalculator:
         current_metrics: Dict[str, Any],
     ) -> Dict[str, Any]:
         """Calculate comparisons to yesterday, week average, and month average"""
-        comparisons = {
-            "vs_yesterday": None,
-            "vs_week_avg": None,
-            "vs_month_avg": None,
-        }
+        baselines = await self._get_comparison_baselines(db, user_id, target_date)
+        return self._comparisons_from_baselines(current_metrics["deep_work_score"], baselines)
 
-        current_score = current_metrics["deep_work_score"]
+    async def _get_comparison_baselines(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        target_date: date,
+    ) -> Dict[str, Optional[float]]:
+        """Fetch yesterday's score and the week/month averages before a day"""
+        day_start = datetime.combine(target_date, datetime.min.time())
 
         # Get yesterday's score
         yesterday = target_date - timedelta(days=1)
@@ -432,10 +602,6 @@ class DeepWorkCalculator:
             )
         )
         yesterday_score = result.scalar_one_or_none()
-        if yesterday_score is not None:
-            comparisons["vs_yesterday"] = round(
-                ((current_score - yesterday_score) / max(yesterday_score, 1)) * 100, 1
-            )
 
         # Get week average
         week_start = datetime.combine(target_date - timedelta(days=7), datetime.min.time())
@@ -444,15 +610,11 @@ class DeepWorkCalculator:
                 and_(
                     DeepWorkScore.user_id == user_id,
                     DeepWorkScore.date >= week_start,
-                    DeepWorkScore.date < datetime.combine(target_date, datetime.min.time()),
+                    DeepWorkScore.date < day_start,
                 )
             )
         )
         week_avg = result.scalar_one_or_none()
-        if week_avg is not None:
-            comparisons["vs_week_avg"] = round(
-                ((current_score - week_avg) / max(week_avg, 1)) * 100, 1
-            )
 
         # Get month average
         month_start = datetime.combine(target_date - timedelta(days=30), datetime.min.time())
@@ -461,16 +623,38 @@ class DeepWorkCalculator:
                 and_(
                     DeepWorkScore.user_id == user_id,
                     DeepWorkScore.date >= month_start,
-                    DeepWorkScore.date < datetime.combine(target_date, datetime.min.time()),
+                    DeepWorkScore.date < day_start,
                 )
             )
         )
         month_avg = result.scalar_one_or_none()
-        if month_avg is not None:
-            comparisons["vs_month_avg"] = round(
-                ((current_score - month_avg) / max(month_avg, 1)) * 100, 1
-            )
 
+        return {
+            "yesterday": yesterday_score,
+            "week_avg": week_avg,
+            "month_avg": month_avg,
+        }
+
+    def _comparisons_from_baselines(
+        self,
+        current_score: int,
+        baselines: Dict[str, Optional[float]],
+    ) -> Dict[str, Any]:
+        """Percentage change of the current score against each baseline"""
+        comparisons = {
+            "vs_yesterday": None,
+            "vs_week_avg": None,
+            "vs_month_avg": None,
+        }
+        for key, baseline in (
+            ("vs_yesterday", baselines.get("yesterday")),
+            ("vs_week_avg", baselines.get("week_avg")),
+            ("vs_month_avg", baselines.get("month_avg")),
+        ):
+            if baseline is not None:
+                comparisons[key] = round(
+                    ((current_score - baseline) / max(baseline, 1)) * 100, 1
+                )
         return comparisons
 
     async def get_score_for_date(
@@ -589,5 +773,170 @@ class DeepWorkCalculator:
         }
 
 
-# Singleton instance
+def _state_key(user_id: int, day: date) -> str:
+    return f"deepwork:{user_id}:{day.isoformat()}"
+
+
+def _seeded(state: Optional[Dict[str, Any]]) -> bool:
+    """Whether a stored state holds a sweep (not just a seed's ingest counter)"""
+    return state is not None and "sweep" in state
+
+
+class StreamingDeepWorkScorer:
+    """
+    Incremental deep work scoring for today.
+
+    The first read of a user's day runs a full calculation and keeps its
+    FocusSweep. Ingestion then feeds each new activity into that sweep, so
+    reading today's score is O(1) with no activity or meeting queries.
+    Comparison baselines (yesterday, week and month averages) are fetched
+    once per day since past scores don't change during the day.
+
+    The running state lives in the realtime backend, so ingestion, reads and
+    invalidation may each land on a different worker; every change to it is
+    an atomic update, and a seed only installs its sweep if nothing was
+    ingested while it queried (as live_totals does). The state is dropped
+    and recomputed from the database when activities arrive out of order,
+    are deleted, or meetings are re-synced. The stored DeepWorkScore row is refreshed at most every
+    PERSIST_INTERVAL_SECONDS.
+    """
+
+    PERSIST_INTERVAL_SECONDS = 300
+    STATE_TTL_SECONDS = 2 * 24 * 60 * 60  # outlives the day it covers
+    SEED_ATTEMPTS = 3
+
+    def __init__(self, calculator: DeepWorkCalculator):
+        self.calculator = calculator
+
+    async def record_activity(self, activity: Activity) -> None:
+        """Feed a newly ingested activity into its user's running state"""
+        if activity.user_id is None or activity.start_time is None:
+            return
+
+        def add(state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if state is None:
+                # Nobody has read this day yet; the first read seeds from the DB
+                return None
+            # Tells a seed running concurrently that its query may have missed this
+            state["ingested"] += 1
+            if not _seeded(state) or state["stale"]:
+                return state
+            sweep = FocusSweep.from_dict(state["sweep"])
+            if sweep.last_start and activity.start_time <= sweep.last_start:
+                # The sweep needs start-ordered input, and an activity that
+                # doesn't start after it may already be in it (committed
+                # before the seed's query); rebuild on next read
+                state["stale"] = True
+                return state
+            sweep.add(activity)
+            state["sweep"] = sweep.to_dict()
+            state["dirty"] = True
+            return state
+
+        backend = await get_realtime_backend()
+        await backend.update(
+            _state_key(activity.user_id, activity.start_time.date()), add, ttl=self.STATE_TTL_SECONDS
+        )
+
+    async def invalidate(self, user_id: int, target_date: Optional[date] = None) -> None:
+        """Force a full recompute (reclassification, deletions, meeting sync)"""
+        # Only today's state is ever kept
+        target_date = target_date or date.today()
+        backend = await get_realtime_backend()
+        await backend.delete(_state_key(user_id, target_date))
+
+    async def get_today_score(self, db: AsyncSession, user_id: int) -> DeepWorkScore:
+        """Get today's score, recomputing only when there is no valid state"""
+        today = date.today()
+        backend = await get_realtime_backend()
+        state = await backend.get(_state_key(user_id, today))
+        if not _seeded(state) or state["stale"]:
+            return await self._seed(db, user_id, today)
+
+        metrics = self.calculator._metrics_from_sweep(FocusSweep.from_dict(state["sweep"]))
+        comparisons = self.calculator._comparisons_from_baselines(
+            metrics["deep_work_score"], state["baselines"]
+        )
+
+        if state["dirty"] and (
+            datetime.utcnow() - datetime.fromisoformat(state["persisted_at"])
+        ).total_seconds() >= self.PERSIST_INTERVAL_SECONDS:
+            row = await self.calculator._save_score(db, user_id, today, metrics, comparisons)
+            persisted_at = datetime.utcnow().isoformat()
+
+            def mark_persisted(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+                if not _seeded(current):
+                    return None
+                # Activity added since our read stays dirty for the next save
+                current.update(
+                    score_id=row.id,
+                    dirty=current["sweep"] != state["sweep"],
+                    persisted_at=persisted_at,
+                )
+                return current
+
+            await backend.update(_state_key(user_id, today), mark_persisted, ttl=self.STATE_TTL_SECONDS)
+            return row
+
+        return DeepWorkScore(
+            id=state["score_id"],
+            user_id=user_id,
+            date=datetime.combine(today, datetime.min.time()),
+            **metrics,
+            **comparisons,
+        )
+
+    async def _seed(self, db: AsyncSession, user_id: int, target_date: date) -> DeepWorkScore:
+        """
+        Full recompute from the database, keeping the sweep for later updates.
+
+        The sweep is only installed if no activity was ingested while the
+        queries ran: it may be missing from them, and installing the sweep
+        would lose it, so seed again.
+        """
+        calc = self.calculator
+        start_of_day = datetime.combine(target_date, datetime.min.time())
+        end_of_day = datetime.combine(target_date, datetime.max.time())
+        backend = await get_realtime_backend()
+        key = _state_key(user_id, target_date)
+        baselines = await calc._get_comparison_baselines(db, user_id, target_date)
+
+        for _ in range(self.SEED_ATTEMPTS):
+            # Start counting ingests (a bare counter until the sweep is in)
+            marked = await backend.update(
+                key, lambda state: state or {"ingested": 0}, ttl=self.STATE_TTL_SECONDS
+            )
+            ingested = marked["ingested"]
+
+            activities = await calc._get_activities(db, user_id, start_of_day, end_of_day)
+            meetings = await calc._get_meetings(db, user_id, start_of_day, end_of_day)
+            sweep = calc._sweep(activities, meetings)
+            metrics = calc._metrics_from_sweep(sweep)
+            comparisons = calc._comparisons_from_baselines(metrics["deep_work_score"], baselines)
+            row = await calc._save_score(db, user_id, target_date, metrics, comparisons)
+            state = {
+                "ingested": ingested,
+                "sweep": sweep.to_dict(),
+                "baselines": baselines,
+                "score_id": row.id,
+                "stale": False,
+                "dirty": False,
+                "persisted_at": datetime.utcnow().isoformat(),
+            }
+
+            def install(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+                if current is None or current["ingested"] != ingested:
+                    return None
+                return state
+
+            if await backend.update(key, install, ttl=self.STATE_TTL_SECONDS) is not None:
+                break
+
+        # If ingestion kept racing us, this row is right for this read and
+        # the next read seeds again
+        return row
+
+
+# Singleton instances
 deepwork_calculator = DeepWorkCalculator()
+streaming_scorer = StreamingDeepWorkScorer(deepwork_calculator)
@@ -1,23 +1,65 @@
 """
 Firebase Storage Service
 Handles screenshot and file uploads to Firebase Cloud Storage.
+
+The Firebase Admin SDK is blocking, so every blob operation runs on a bounded
+thread pool; a screenshot's image and thumbnail upload concurrently. Signed
+URLs are reused for a short while instead of being generated per request.
 """
 
 import io
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from PIL import Image
 
 from app.core.config import settings
 
 
+def thumbnail_storage_path(storage_path: str) -> str:
+    """Thumbnails are uploaded next to the image with a _thumb suffix"""
+    root, ext = os.path.splitext(storage_path)
+    return f"{root}_thumb{ext}"
+
+
+def _encode_jpeg(image_bytes: bytes, quality: int, create_thumbnail: bool) -> Tuple[bytes, Optional[bytes]]:
+    """Re-encode raw image bytes as JPEG, plus an optional 320x180 thumbnail"""
+    image = Image.open(io.BytesIO(image_bytes))
+
+    # Convert to RGB if necessary (for JPEG)
+    if image.mode in ('RGBA', 'P'):
+        image = image.convert('RGB')
+
+    img_buffer = io.BytesIO()
+    image.save(img_buffer, format='JPEG', quality=quality)
+
+    thumbnail_bytes = None
+    if create_thumbnail:
+        thumb_size = (320, 180)  # 16:9 thumbnail
+        image.thumbnail(thumb_size, Image.Resampling.LANCZOS)
+        thumb_buffer = io.BytesIO()
+        image.save(thumb_buffer, format='JPEG', quality=75)
+        thumbnail_bytes = thumb_buffer.getvalue()
+
+    return img_buffer.getvalue(), thumbnail_bytes
+
+
 class FirebaseStorageService:
     """Service for uploading and managing files in Firebase Storage"""
 
-    def __init__(self):
+    SIGNED_URL_CACHE_SIZE = 1024
+
+    def __init__(self, max_workers: Optional[int] = None):
         self._bucket = None
         self._initialized = False
+        self.max_workers = settings.firebase_upload_workers if max_workers is None else max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.signed_url_cache_seconds = settings.screenshot_signed_url_cache_seconds
+        self._signed_urls: Dict[Tuple[str, int], Tuple[float, str]] = {}
 
     def _initialize(self):
         """Lazy initialization of Firebase Admin SDK"""
@@ -57,12 +99,28 @@ class FirebaseStorageService:
         self._initialize()
         return self._bucket is not None
 
+    async def _run(self, fn, *args):
+        """Run a blocking SDK call on the upload pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, self.max_workers), thread_name_prefix="firebase"
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _upload_blob(self, storage_path: str, content: bytes, content_type: str) -> str:
+        """Upload bytes to a public blob and return its URL (blocking)"""
+        blob = self._bucket.blob(storage_path)
+        blob.upload_from_string(content, content_type=content_type)
+        blob.make_public()
+        return blob.public_url
+
     async def upload_screenshot(
         self,
         user_id: int,
         image_bytes: bytes,
         create_thumbnail: bool = True,
-        quality: int = 85
+        quality: int = 85,
+        thumbnail_bytes: Optional[bytes] = None,
     ) -> Dict[str, Any]:
         """
         Upload screenshot to Firebase Storage
@@ -72,6 +130,8 @@ class FirebaseStorageService:
             image_bytes: Raw image bytes
             create_thumbnail: Whether to create a thumbnail
             quality: JPEG quality (1-100)
+            thumbnail_bytes: Pre-encoded JPEG thumbnail. When given, image_bytes
+                is taken as an encoded JPEG too and both are uploaded as-is.
 
         Returns:
             Dict with storage_path, storage_url, thumbnail_url
@@ -82,53 +142,31 @@ class FirebaseStorageService:
             return {"error": "Firebase not available"}
 
         try:
-            from firebase_admin import storage
-
             # Generate unique filename
             file_id = str(uuid4())
             timestamp = datetime.now().strftime("%Y%m%d")
             storage_path = f"users/{user_id}/screenshots/{timestamp}/{file_id}.jpg"
 
-            # Process image
-            image = Image.open(io.BytesIO(image_bytes))
-
-            # Convert to RGB if necessary (for JPEG)
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-
-            # Compress and save to buffer
-            img_buffer = io.BytesIO()
-            image.save(img_buffer, format='JPEG', quality=quality)
-            img_buffer.seek(0)
+            if thumbnail_bytes is None:
+                # Compress (and thumbnail) on the pool rather than the loop
+                image_bytes, thumbnail_bytes = await self._run(
+                    _encode_jpeg, image_bytes, quality, create_thumbnail
+                )
 
-            # Upload main image
-            blob = self._bucket.blob(storage_path)
-            blob.upload_from_file(img_buffer, content_type='image/jpeg')
-            blob.make_public()
-            storage_url = blob.public_url
-
-            # Create and upload thumbnail
-            thumbnail_url = None
+            # Upload main image and thumbnail concurrently
+            uploads = [self._run(self._upload_blob, storage_path, image_bytes, 'image/jpeg')]
             thumbnail_path = None
-            if create_thumbnail:
+            if thumbnail_bytes is not None:
                 thumbnail_path = f"users/{user_id}/screenshots/{timestamp}/{file_id}_thumb.jpg"
-                thumb_size = (320, 180)  # 16:9 thumbnail
-                image.thumbnail(thumb_size, Image.Resampling.LANCZOS)
-
-                thumb_buffer = io.BytesIO()
-                image.save(thumb_buffer, format='JPEG', quality=75)
-                thumb_buffer.seek(0)
+                uploads.append(self._run(self._upload_blob, thumbnail_path, thumbnail_bytes, 'image/jpeg'))
 
-                thumb_blob = self._bucket.blob(thumbnail_path)
-                thumb_blob.upload_from_file(thumb_buffer, content_type='image/jpeg')
-                thumb_blob.make_public()
-                thumbnail_url = thumb_blob.public_url
+            urls = await asyncio.gather(*uploads)
 
             return {
                 "storage_path": storage_path,
-                "storage_url": storage_url,
+                "storage_url": urls[0],
                 "thumbnail_path": thumbnail_path,
-                "thumbnail_url": thumbnail_url,
+                "thumbnail_url": urls[1] if thumbnail_path else None,
             }
 
         except Exception as e:
@@ -143,6 +181,9 @@ class FirebaseStorageService:
         """
         Generate a temporary signed URL for private file access
 
+        A URL is reused for up to signed_url_cache_seconds, and never for more
+        than half its lifetime, so callers always get one with time left on it.
+
         Args:
             storage_path: Path to file in Firebase Storage
             expiry_minutes: URL expiration time in minutes
@@ -155,18 +196,65 @@ class FirebaseStorageService:
         if not self._bucket:
             return None
 
-        try:
+        key = (storage_path, expiry_minutes)
+        cached = self._signed_urls.get(key)
+        if cached is not None:
+            expires_at, url = cached
+            if time.monotonic() < expires_at:
+                return url
+            del self._signed_urls[key]
+
+        def sign() -> str:
             blob = self._bucket.blob(storage_path)
-            url = blob.generate_signed_url(
+            return blob.generate_signed_url(
                 version="v4",
                 expiration=timedelta(minutes=expiry_minutes),
                 method="GET"
             )
-            return url
+
+        try:
+            url = await self._run(sign)
         except Exception as e:
             print(f"Error generating signed URL: {e}")
             return None
 
+        ttl = min(self.signed_url_cache_seconds, expiry_minutes * 30)
+        if ttl > 0:
+            if len(self._signed_urls) >= self.SIGNED_URL_CACHE_SIZE:
+                now = time.monotonic()
+                for k in [k for k, (exp, _) in self._signed_urls.items() if exp <= now]:
+                    del self._signed_urls[k]
+                while len(self._signed_urls) >= self.SIGNED_URL_CACHE_SIZE:
+                    del self._signed_urls[next(iter(self._signed_urls))]
+            self._signed_urls[key] = (time.monotonic() + ttl, url)
+        return url
+
+    def forget_signed_urls(self, storage_path: str):
+        """Drop cached signed URLs for a blob that was deleted or replaced"""
+        for key in [k for k in self._signed_urls if k[0] == storage_path]:
+            del self._signed_urls[key]
+
+    async def download_file(self, storage_path: str) -> Optional[bytes]:
+        """
+        Download a file from Firebase Storage
+
+        Args:
+            storage_path: Path to file in Firebase Storage
+
+        Returns:
+            File bytes or None if failed
+        """
+        self._initialize()
+
+        if not self._bucket:
+            return None
+
+        try:
+            return await self._run(lambda: self._bucket.blob(storage_path).download_as_bytes())
+        except Exception as e:
+            print(f"Error downloading from Firebase: {e}")
+            return None
+
     async def delete_file(self, storage_path: str) -> bool:
         """
         Delete a file from Firebase Storage
@@ -182,9 +270,9 @@ class FirebaseStorageService:
         if not self._bucket:
             return False
 
+        self.forget_signed_urls(storage_path)
         try:
-            blob = self._bucket.blob(storage_path)
-            blob.delete()
+            await self._run(lambda: self._bucket.blob(storage_path).delete())
             return True
         except Exception as e:
             print(f"Error deleting from Firebase: {e}")
@@ -205,14 +293,16 @@ class FirebaseStorageService:
         if not self._bucket:
             return 0
 
-        try:
+        def delete_all() -> int:
             prefix = f"users/{user_id}/screenshots/"
-            blobs = self._bucket.list_blobs(prefix=prefix)
             count = 0
-            for blob in blobs:
+            for blob in self._bucket.list_blobs(prefix=prefix):
                 blob.delete()
                 count += 1
             return count
+
+        try:
+            return await self._run(delete_all)
         except Exception as e:
             print(f"Error deleting user screenshots: {e}")
             return 0
@@ -221,26 +311,39 @@ class FirebaseStorageService:
         """
         Calculate total storage used by a user (for quotas)
 
+        Sums the sizes recorded on the user's cloud screenshot rows rather
+        than listing the bucket.
+
         Args:
             user_id: User ID
 
         Returns:
             Total bytes used
         """
-        self._initialize()
-
-        if not self._bucket:
-            return 0
+        from sqlalchemy import select, func
+        from app.core.database import async_session
+        from app.models.screenshot import Screenshot
 
         try:
-            prefix = f"users/{user_id}/"
-            blobs = self._bucket.list_blobs(prefix=prefix)
-            total_bytes = sum(blob.size or 0 for blob in blobs)
-            return total_bytes
+            async with async_session() as db:
+                result = await db.execute(
+                    select(
+                        func.coalesce(func.sum(Screenshot.image_size + Screenshot.thumbnail_size), 0)
+                    ).where(
+                        Screenshot.user_id == user_id,
+                        Screenshot.storage_path.isnot(None),
+                    )
+                )
+                return result.scalar_one()
         except Exception as e:
             print(f"Error calculating storage usage: {e}")
             return 0
 
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
 
 # Singleton instance
 firebase_storage = FirebaseStorageService()
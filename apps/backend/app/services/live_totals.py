@@ -0,0 +1,253 @@
+"""
+Live Totals
+
+Running per-user time totals for the dashboard's live view, and the
+Server-Sent Events stream that carries them.
+
+A user's totals are seeded from one aggregate query the first time they are
+read, then kept current by ingestion: each new activity adds its duration
+and pushes only the totals that changed to the user's channel (the same one
+/ws/activities uses), so watching the dashboard costs no queries at all.
+Totals are kept in the realtime backend and changed with its atomic update,
+so any worker can add to them without losing another worker's additions.
+"""
+import asyncio
+import json
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, AsyncIterator, Callable, Awaitable
+
+from sqlalchemy import select, func, case, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.realtime_backend import get_realtime_backend
+from app.models.activity import Activity
+from app.services.connection_manager import manager, user_channel
+
+
+STATE_TTL_SECONDS = 2 * 24 * 60 * 60
+SEED_ATTEMPTS = 3
+KEEPALIVE_SECONDS = 30  # comment line so dead connections are noticed
+STREAM_QUEUE_SIZE = 64
+
+
+def _state_key(user_id: int) -> str:
+    return f"totals:{user_id}"
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _seeded(state: Optional[Dict[str, Any]]) -> bool:
+    """Whether a stored state holds totals (not just a seed's ingest counter)"""
+    return state is not None and "day" in state
+
+
+def stats_view(state: Dict[str, Any]) -> Dict[str, int]:
+    """The client-facing totals, with the same names as /current-realtime"""
+    today_total = state["today_total"]
+    return {
+        "today_total": today_total,
+        "today_productive": state["today_productive"],
+        "productivity": round(state["today_productive"] / today_total * 100) if today_total else 0,
+        "week_total": state["week_total"],
+    }
+
+
+def sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+class LiveTotalsService:
+    """Per-user today/week totals, updated from ingestion"""
+
+    def __init__(self):
+        self.seeded = 0
+        self.updates = 0
+
+    async def get_totals(self, db: AsyncSession, user_id: int) -> Dict[str, int]:
+        """Current totals, seeding them from the database if needed"""
+        backend = await get_realtime_backend()
+        state = await backend.get(_state_key(user_id))
+        if not _seeded(state) or state["day"] != date.today().isoformat():
+            state = await self._seed(db, user_id)
+        return stats_view(state)
+
+    async def cached_totals(self, user_id: int) -> Optional[Dict[str, int]]:
+        """Current totals if they are already seeded, without touching the database"""
+        backend = await get_realtime_backend()
+        state = await backend.get(_state_key(user_id))
+        return stats_view(state) if _seeded(state) else None
+
+    async def record_activity(self, activity: Activity) -> None:
+        """Add a newly ingested activity to its user's totals and push the change"""
+        if activity.user_id is None or activity.start_time is None or not activity.duration:
+            return
+
+        activity_day = activity.start_time.date()
+        before: Dict[str, int] = {}
+
+        def add(state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if state is None:
+                # Nobody has read these totals yet; the first read seeds from the DB
+                return None
+            # Tells a seed running concurrently that its query may have missed this
+            state["ingested"] += 1
+            if not _seeded(state):
+                return state
+            before.update(stats_view(state))
+
+            state_day = date.fromisoformat(state["day"])
+            if activity_day > state_day:
+                # First activity of a new day (and maybe a new week)
+                same_week = _week_start(activity_day) == _week_start(state_day)
+                state.update(
+                    day=activity_day.isoformat(),
+                    today_total=0,
+                    today_productive=0,
+                    week_total=state["week_total"] if same_week else 0,
+                )
+                state_day = activity_day
+
+            if activity_day == state_day:
+                state["today_total"] += activity.duration
+                if activity.is_productive:
+                    state["today_productive"] += activity.duration
+            if activity_day >= _week_start(state_day):
+                state["week_total"] += activity.duration
+            return state
+
+        # One atomic read-modify-write, so concurrent ingests on other
+        # workers can't overwrite each other's additions
+        backend = await get_realtime_backend()
+        state = await backend.update(_state_key(activity.user_id), add, ttl=STATE_TTL_SECONDS)
+        if _seeded(state):
+            await self._publish(activity.user_id, before, stats_view(state))
+
+    async def refresh(self, db: AsyncSession, user_id: int) -> None:
+        """Recompute from the database after changes ingestion can't add up (deletes)"""
+        backend = await get_realtime_backend()
+        state = await backend.get(_state_key(user_id))
+        if not _seeded(state):
+            return
+        before = stats_view(state)
+        await self._publish(user_id, before, stats_view(await self._seed(db, user_id)))
+
+    async def _seed(self, db: AsyncSession, user_id: int) -> Dict[str, Any]:
+        """
+        Sum the totals from the database and store them, unless an activity
+        was ingested while the query ran: it may be missing from the sums,
+        and overwriting the stored totals would lose it, so seed again.
+        """
+        backend = await get_realtime_backend()
+        key = _state_key(user_id)
+        for _ in range(SEED_ATTEMPTS):
+            # Start counting ingests (a bare counter until the totals are in)
+            marked = await backend.update(
+                key, lambda state: state or {"ingested": 0}, ttl=STATE_TTL_SECONDS
+            )
+            ingested = marked["ingested"]
+            state = {"ingested": ingested, **await self._query_totals(db, user_id)}
+
+            def install(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+                if current is None or current["ingested"] != ingested:
+                    return None
+                return state
+
+            if await backend.update(key, install, ttl=STATE_TTL_SECONDS) is not None:
+                self.seeded += 1
+                return state
+
+        # Ingestion kept racing us; these totals are right for this read, and
+        # the next read tries again
+        return state
+
+    async def _query_totals(self, db: AsyncSession, user_id: int) -> Dict[str, Any]:
+        today = date.today()
+        day_start = datetime.combine(today, datetime.min.time())
+        week_start = datetime.combine(_week_start(today), datetime.min.time())
+        today_cond = Activity.start_time >= day_start
+
+        result = await db.execute(
+            select(
+                func.coalesce(func.sum(Activity.duration), 0),
+                func.coalesce(func.sum(case((today_cond, Activity.duration), else_=0)), 0),
+                func.coalesce(func.sum(case(
+                    (and_(today_cond, Activity.is_productive == True), Activity.duration), else_=0
+                )), 0),
+            ).where(Activity.user_id == user_id, Activity.start_time >= week_start)
+        )
+        week_total, today_total, today_productive = result.one()
+        return {
+            "day": today.isoformat(),
+            "today_total": int(today_total),
+            "today_productive": int(today_productive),
+            "week_total": int(week_total),
+        }
+
+    async def _publish(self, user_id: int, before: Dict[str, int], after: Dict[str, int]):
+        changes = {key: value for key, value in after.items() if before.get(key) != value}
+        if changes:
+            self.updates += 1
+            await manager.send_to_user(user_id, {
+                "type": "totals",
+                "timestamp": datetime.now().isoformat(),
+                "data": changes,
+            })
+
+    # ═══════════════════════════════════════════════════════════════════
+    # SERVER-SENT EVENTS
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def stream(
+        self,
+        user_id: int,
+        snapshot: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> AsyncIterator[str]:
+        """
+        SSE frames for one client: a "snapshot" event, then each message
+        published to the user's channel ("activity_diff", "totals", ...) as an
+        event of that type, passed through without re-serializing.
+
+        A client that falls too far behind gets a fresh snapshot instead of
+        the messages it missed.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        overflowed = False
+
+        async def on_message(channel: str, payload: str):
+            nonlocal overflowed
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                overflowed = True
+
+        # Subscribe before taking the snapshot so no change falls in between
+        backend = await get_realtime_backend()
+        await backend.subscribe(user_channel(user_id), on_message)
+        try:
+            yield sse_event("snapshot", json.dumps(await snapshot()))
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if overflowed:
+                    overflowed = False
+                    while not queue.empty():
+                        queue.get_nowait()
+                    yield sse_event("snapshot", json.dumps(await snapshot()))
+                    continue
+
+                yield sse_event(json.loads(payload).get("type", "message"), payload)
+        finally:
+            await backend.unsubscribe(user_channel(user_id), on_message)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"seeded": self.seeded, "updates": self.updates}
+
+
+# Singleton instance
+live_totals = LiveTotalsService()
@@ -0,0 +1,230 @@
+"""
+Report PDF Cache
+
+Rendered PDFs are stored on disk under the content hash of the ReportData
+they were built from, so an unchanged weekly or monthly report is rendered
+once and then served as a file. The hash doubles as the HTTP ETag.
+
+The cache is bounded by total bytes and evicts least recently used files.
+Files being sent are pinned so eviction can't delete them mid-response.
+
+Workers share the directory but not the index, so a pin is also a file next
+to the PDF that every worker's eviction respects. Pin files older than
+PIN_TIMEOUT_SECONDS were left by a worker that died and are ignored.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from app.core.config import settings
+from app.services.report_renderer import report_renderer
+from app.services.report_service import ReportData
+
+
+PIN_TIMEOUT_SECONDS = 10 * 60
+
+@dataclass
+class CachedReport:
+    key: str
+    path: str
+    size: int
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.key}"'
+
+
+class ReportPdfCache:
+    """Content-addressed, size-bounded LRU cache of rendered report PDFs"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = Path(directory or Path(settings.reports_path) / "cache")
+        self.max_bytes = settings.report_cache_max_mb * 1024 * 1024 if max_bytes is None else max_bytes
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self._pins: Dict[str, int] = {}
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_or_render(self, data: ReportData, pin: bool = False) -> CachedReport:
+        """
+        Return the cached PDF for this data, rendering it on a miss.
+
+        With pin=True the file is kept from eviction until release(key) is
+        called, for callers that read it after other requests may have run.
+        """
+        while True:
+            cached = await self._get_or_render(data)
+            # Evicted while we waited (on a render or a touch): try again
+            if cached.key not in self._entries:
+                continue
+            if not pin:
+                return cached
+            self._pins[cached.key] = self._pins.get(cached.key, 0) + 1
+            await asyncio.to_thread(_write_pin, self._pin_path(cached.key))
+            # Another worker may have evicted it before the pin landed
+            if await asyncio.to_thread(os.path.exists, cached.path):
+                return cached
+            self.release(cached.key)
+
+    def release(self, key: str):
+        """Undo one pin from get_or_render(pin=True)"""
+        remaining = self._pins.get(key, 0) - 1
+        if remaining > 0:
+            self._pins[key] = remaining
+        else:
+            self._pins.pop(key, None)
+            _remove(self._pin_path(key))
+            self._evict()
+
+    async def _get_or_render(self, data: ReportData) -> CachedReport:
+        await self._load_index()
+        key = data.content_hash()
+
+        if key in self._entries and os.path.exists(self._path(key)):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            await asyncio.to_thread(_touch, self._path(key))
+            return CachedReport(key, str(self._path(key)), self._entries[key])
+
+        # Identical concurrent requests wait for the same render
+        if key in self._rendering:
+            self.hits += 1
+            return await asyncio.shield(self._rendering[key])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._rendering[key] = future
+        try:
+            pdf_bytes = await report_renderer.render(data)
+            await asyncio.to_thread(_write_file, self._path(key), pdf_bytes)
+            self._add(key, len(pdf_bytes))
+            cached = CachedReport(key, str(self._path(key)), len(pdf_bytes))
+            future.set_result(cached)
+            return cached
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._rendering[key]
+
+    async def get_bytes(self, data: ReportData) -> bytes:
+        """Rendered PDF bytes, through the cache"""
+        cached = await self.get_or_render(data, pin=True)
+        try:
+            return await asyncio.to_thread(Path(cached.path).read_bytes)
+        finally:
+            self.release(cached.key)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pdf"
+
+    def _pin_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.{self._owner}.pin"
+
+    def _pinned_elsewhere(self, key: str) -> bool:
+        """Whether another worker holds a live pin on this file"""
+        cutoff = time.time() - PIN_TIMEOUT_SECONDS
+        pinned = False
+        for path in self._path(key).parent.glob(f"{key}.*.pin"):
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    pinned = True
+                else:
+                    _remove(path)
+            except FileNotFoundError:
+                continue
+        return pinned
+
+    async def _load_index(self):
+        """Rebuild the LRU order from files on disk; hits bump mtime, so oldest first"""
+        if self._entries is not None:
+            return
+        files = await asyncio.to_thread(_scan, self.directory)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        for key, size in files:
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _add(self, key: str, size: int):
+        self._total_bytes -= self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the budget;
+        # pinned files are skipped and go once released
+        for key in list(self._entries)[:-1]:
+            if self._total_bytes <= self.max_bytes:
+                break
+            if key in self._pins or self._pinned_elsewhere(key):
+                continue
+            self._total_bytes -= self._entries.pop(key)
+            self.evictions += 1
+            _remove(self._path(key))
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries or {}),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+            "pinned": len(self._pins),
+        }
+
+
+def _write_file(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+def _write_pin(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def _remove(path: Path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _touch(path: Path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _scan(directory: Path):
+    if not directory.exists():
+        return []
+    files = []
+    for path in directory.glob("*/*.pdf"):
+        stat = path.stat()
+        files.append((stat.st_mtime, path.stem, stat.st_size))
+    files.sort()
+    return [(key, size) for _, key, size in files]
+
+
+# Singleton instance
+report_pdf_cache = ReportPdfCache()
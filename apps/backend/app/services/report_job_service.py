@@ -0,0 +1,368 @@
+"""
+Report Job Service
+
+Runs report generation outside the HTTP request. Submitting a job stores a
+ReportJob row and returns its id; background workers aggregate the data,
+render through the PDF cache and write the artifact to disk. Listeners (the
+WebSocket manager) are told when a job finishes.
+
+Every worker process runs its own workers over the same table, so a worker
+claims a job with a conditional UPDATE before building it; a job is only
+ever built once.
+
+Every Monday morning the scheduler pre-generates last week's report (the
+seven days up to Monday midnight) for each active user, so downloads of that
+week are served from storage. Each worker's scheduler fires; a unique index
+on scheduled windows lets only the first one queue a user's week.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.report import ReportJob
+from app.models.user import User
+from app.services.report_cache import report_pdf_cache
+from app.services.report_service import ReportDataAggregator, ReportPeriod
+
+
+JobListener = Callable[[ReportJob], Awaitable[None]]
+
+
+class ReportJobService:
+    """Queue, workers and storage for background report generation"""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or async_session
+        self.workers = settings.report_job_workers
+        self.storage_path = Path(settings.reports_path)
+        self.retention_days = settings.report_job_retention_days
+        self.timeout = timedelta(minutes=settings.report_job_timeout_minutes)
+        self.scheduler = AsyncIOScheduler()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._listeners: List[JobListener] = []
+
+    # ═══════════════════════════════════════════════════════════════════
+    # LIFECYCLE
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def start(self):
+        """Start workers, requeue unfinished jobs and schedule pre-generation"""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))]
+
+        # Pick up pending jobs, and running ones whose worker died (another
+        # live process may be building the rest; claiming keeps it to one)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(ReportJob)
+                .where(and_(
+                    ReportJob.status == "running",
+                    ReportJob.started_at < datetime.utcnow() - self.timeout,
+                ))
+                .values(status="pending")
+            )
+            await db.commit()
+            result = await db.execute(
+                select(ReportJob.id).where(ReportJob.status == "pending")
+                .order_by(ReportJob.created_at)
+            )
+            for (job_id,) in result.all():
+                self._queue.put_nowait(job_id)
+
+        if not self.scheduler.running:
+            self.scheduler.start()
+        self.scheduler.add_job(
+            self.pregenerate_weekly,
+            trigger=CronTrigger(day_of_week="mon", hour=4, minute=0),
+            id="reports_weekly_pregenerate",
+            replace_existing=True,
+        )
+        print(f"📄 Report workers started ({len(self._tasks)}), weekly pre-generation Mondays at 4:00 AM")
+
+    async def stop(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._queue = None
+
+    def add_listener(self, listener: JobListener):
+        """Register a coroutine called with each job when it completes or fails"""
+        self._listeners.append(listener)
+
+    # ═══════════════════════════════════════════════════════════════════
+    # JOBS
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def submit(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        period: ReportPeriod,
+        kind: str = "user",
+        format: str = "pdf",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        team_id: Optional[int] = None,
+        recipient_email: Optional[str] = None,
+        source: str = "request",
+    ) -> ReportJob:
+        """Create a job and hand it to the workers"""
+        job = ReportJob(
+            user_id=user_id,
+            team_id=team_id,
+            kind=kind,
+            period=period.value,
+            format=format,
+            start_date=start_date,
+            end_date=end_date,
+            recipient_email=recipient_email,
+            source=source,
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+
+        # Without running workers the job stays pending until the next start()
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        return job
+
+    async def get_job(self, db: AsyncSession, job_id: str, user_id: int) -> Optional[ReportJob]:
+        result = await db.execute(
+            select(ReportJob).where(
+                and_(ReportJob.id == job_id, ReportJob.user_id == user_id)
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def list_jobs(self, db: AsyncSession, user_id: int, limit: int = 20) -> List[ReportJob]:
+        result = await db.execute(
+            select(ReportJob).where(ReportJob.user_id == user_id)
+            .order_by(ReportJob.created_at.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def find_pregenerated(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        period: ReportPeriod,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Optional[ReportJob]:
+        """Scheduled PDF rendered for exactly this window, if its file exists"""
+        result = await db.execute(
+            select(ReportJob).where(
+                and_(
+                    ReportJob.user_id == user_id,
+                    ReportJob.kind == "user",
+                    ReportJob.period == period.value,
+                    ReportJob.format == "pdf",
+                    ReportJob.source == "scheduled",
+                    ReportJob.status == "completed",
+                    ReportJob.start_date == start_date,
+                    ReportJob.end_date == end_date,
+                )
+            ).order_by(ReportJob.completed_at.desc()).limit(1)
+        )
+        job = result.scalar_one_or_none()
+        if job and job.file_path and os.path.exists(job.file_path):
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception as e:
+                print(f"❌ Report job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id: str) -> Optional[ReportJob]:
+        """Build, store and announce a single job"""
+        async with self.session_factory() as db:
+            # Claim the job; if another worker got there first, leave it to them
+            claimed = await db.execute(
+                update(ReportJob)
+                .where(and_(ReportJob.id == job_id, ReportJob.status == "pending"))
+                .values(status="running", started_at=datetime.utcnow())
+            )
+            await db.commit()
+            job = await db.get(ReportJob, job_id)
+            if claimed.rowcount != 1:
+                return job
+
+            try:
+                content, filename = await self._build(db, job)
+                path = self.storage_path / str(job.user_id) / f"{job.id}{Path(filename).suffix}"
+                await asyncio.to_thread(_write_file, path, content)
+
+                job.file_path = str(path)
+                job.file_size = len(content)
+                job.filename = filename
+                job.status = "completed"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"❌ Report job {job.id} failed: {e}")
+
+            job.completed_at = datetime.utcnow()
+            await db.commit()
+
+        for listener in self._listeners:
+            try:
+                await listener(job)
+            except Exception as e:
+                print(f"⚠️ Report job listener error: {e}")
+        return job
+
+    async def _build(self, db: AsyncSession, job: ReportJob) -> Tuple[bytes, str]:
+        """Produce the artifact bytes and download filename for a job"""
+        period = ReportPeriod(job.period)
+
+        if job.kind == "team":
+            # Same builder as the synchronous endpoint, including the admin check
+            from app.api.routes.reports import get_team_report_preview
+
+            user = await db.get(User, job.user_id)
+            preview = await get_team_report_preview(
+                team_id=job.team_id,
+                period=period,
+                start_date=job.start_date.isoformat() if job.start_date else None,
+                end_date=job.end_date.isoformat() if job.end_date else None,
+                db=db,
+                current_user=user,
+            )
+            date_str = preview.end_date[:10]
+            return (
+                json.dumps(preview.model_dump()).encode(),
+                f"team_report_{job.team_id}_{period.value}_{date_str}.json",
+            )
+
+        data = await ReportDataAggregator(db).get_report_data(
+            user_id=job.user_id,
+            period=period,
+            start_date=job.start_date,
+            end_date=job.end_date,
+        )
+        date_str = data.end_date.strftime("%Y-%m-%d")
+
+        if job.format == "json":
+            from app.api.routes.reports import report_to_json
+
+            return (
+                json.dumps(report_to_json(data)).encode(),
+                f"productivity_report_{period.value}_{date_str}.json",
+            )
+
+        pdf_bytes = await report_pdf_cache.get_bytes(data)
+        if job.kind == "email":
+            from app.api.routes.reports import email_report
+
+            user = await db.get(User, job.user_id)
+            await email_report(data, pdf_bytes, job.recipient_email or user.email)
+
+        return pdf_bytes, f"productivity_report_{period.value}_{date_str}.pdf"
+
+    # ═══════════════════════════════════════════════════════════════════
+    # SCHEDULED PRE-GENERATION
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def pregenerate_weekly(self) -> Dict[str, Any]:
+        """Queue last week's report for every active user and prune old artifacts"""
+        week_start, week_end = last_week_window()
+
+        async with self.session_factory() as db:
+            result = await db.execute(select(User.id).where(User.is_active == True))
+            user_ids = [row[0] for row in result.all()]
+
+            queued = 0
+            for user_id in user_ids:
+                try:
+                    await self.submit(
+                        db,
+                        user_id=user_id,
+                        period=ReportPeriod.WEEKLY,
+                        start_date=week_start,
+                        end_date=week_end,
+                        source="scheduled",
+                    )
+                    queued += 1
+                except IntegrityError:
+                    # Another worker already queued this user's week
+                    await db.rollback()
+
+            removed = await self.cleanup_expired(db)
+
+        print(f"📄 Queued {queued} weekly reports, removed {removed} expired artifacts")
+        return {"queued": queued, "removed": removed}
+
+    async def cleanup_expired(self, db: AsyncSession) -> int:
+        """Delete finished jobs and their files past the retention window"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        result = await db.execute(
+            select(ReportJob).where(
+                and_(
+                    ReportJob.created_at < cutoff,
+                    or_(ReportJob.status == "completed", ReportJob.status == "failed"),
+                )
+            )
+        )
+        jobs = result.scalars().all()
+        for job in jobs:
+            if job.file_path:
+                await asyncio.to_thread(_remove_file, job.file_path)
+        # One statement, so a worker pruning the same jobs concurrently is harmless
+        await db.execute(delete(ReportJob).where(ReportJob.id.in_([job.id for job in jobs])))
+        await db.commit()
+        return len(jobs)
+
+
+def last_week_window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """
+    The seven days up to the most recent Monday midnight, in the same local
+    time the report aggregator uses for its own default windows.
+    """
+    now = now or datetime.now()
+    week_end = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return week_end - timedelta(days=7), week_end
+
+
+def _write_file(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Singleton instance
+report_job_service = ReportJobService()
@@ -0,0 +1,116 @@
+"""
+Report Renderer Service
+
+Builds report PDFs in a bounded process pool so ReportLab never runs on the
+event loop. Inputs are plain picklable ReportData values and the rendered
+bytes come back to the caller; each render records how long it waited for a
+worker and how long the build itself took.
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from app.core.config import settings
+from app.core.metrics import summarize_samples
+from app.services.report_service import ReportData, ProductivityReportGenerator
+
+
+# Per-process generator, built on first use in each worker
+_generator = None
+
+
+def render_productivity_report(data: ReportData) -> bytes:
+    global _generator
+    if _generator is None:
+        _generator = ProductivityReportGenerator()
+    return _generator.generate_report(data)
+
+
+def _timed_render(fn: Callable[[Any], bytes], data: Any, submitted_at: float) -> Tuple[bytes, float, float]:
+    """Run a render in the worker and report (pdf, queue_seconds, render_seconds)"""
+    started_at = time.time()
+    pdf_bytes = fn(data)
+    return pdf_bytes, started_at - submitted_at, time.time() - started_at
+
+
+class ReportRenderer:
+    """Bounded process pool for PDF rendering with queue and render timings"""
+
+    SAMPLE_SIZE = 200
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = settings.report_render_workers if max_workers is None else max_workers
+        self.max_pending = settings.report_render_max_pending if max_pending is None else max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._rendered = 0
+        self._failed = 0
+        self._queue_ms = deque(maxlen=self.SAMPLE_SIZE)
+        self._render_ms = deque(maxlen=self.SAMPLE_SIZE)
+
+    async def render(self, data: ReportData) -> bytes:
+        """Render a full productivity report"""
+        return await self._submit(render_productivity_report, data)
+
+    async def _submit(self, fn: Callable[[Any], bytes], data: Any) -> bytes:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, self.max_pending))
+
+        submitted_at = time.time()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # 0 workers renders on a thread instead, which still keeps the loop free
+            pdf_bytes, queue_seconds, render_seconds = await loop.run_in_executor(
+                self._get_executor(), _timed_render, fn, data, submitted_at
+            )
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+        self._rendered += 1
+        self._queue_ms.append(queue_seconds * 1000)
+        self._render_ms.append(render_seconds * 1000)
+        return pdf_bytes
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus queue/render percentiles over recent renders"""
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "rendered": self._rendered,
+            "failed": self._failed,
+            "queue_ms": summarize_samples(self._queue_ms),
+            "render_ms": summarize_samples(self._render_ms),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+report_renderer = ReportRenderer()
@@ -2,11 +2,13 @@
 PDF Report Generation Service
 Creates beautiful productivity reports with charts and analytics
 """
+import hashlib
 import io
+import json
 import os
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from enum import Enum
 
 from reportlab.lib import colors
@@ -25,10 +27,14 @@ from reportlab.graphics.charts.linecharts import HorizontalLineChart
 from reportlab.graphics.widgets.markers import makeMarker
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, or_, case
 from sqlalchemy.orm import selectinload
 
 
+# Bump when the PDF layout changes so cached reports are re-rendered
+REPORT_LAYOUT_VERSION = 1
+
+
 class ReportPeriod(str, Enum):
     DAILY = "daily"
     WEEKLY = "weekly"
@@ -79,6 +85,23 @@ class ReportData:
     insights: List[str]
     recommendations: List[str]
 
+    def content_hash(self) -> str:
+        """Hash of everything the PDF renders, used as the PDF cache key and ETag
+
+        The period bounds and daily dates are reduced to the day, matching what
+        ProductivityReportGenerator prints, so requests ending "now" still hit
+        while the underlying numbers are unchanged.
+        """
+        content = asdict(self)
+        content["start_date"] = self.start_date.date().isoformat()
+        content["end_date"] = self.end_date.date().isoformat()
+        content["daily_stats"] = [
+            {**day, "date": str(day.get("date", ""))[:10]} for day in self.daily_stats
+        ]
+        content["_version"] = REPORT_LAYOUT_VERSION
+        serialized = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
 
 class ProductivityReportGenerator:
     """Generates beautiful PDF productivity reports"""
@@ -744,52 +767,65 @@ class ReportDataAggregator:
         start_date: datetime,
         end_date: datetime
     ) -> List[Dict[str, Any]]:
-        """Calculate daily statistics"""
+        """Calculate daily statistics
+
+        Days are 24-hour windows starting at start_date; the last window is the
+        one that contains end_date. Each table is read once for the whole range
+        and rows are bucketed in Python.
+        """
         from app.models import Activity, CalendarEvent
 
-        daily_stats = []
-        current_date = start_date
-
-        while current_date <= end_date:
-            next_date = current_date + timedelta(days=1)
-
-            # Get activities for this day
-            result = await self.db.execute(
-                select(Activity).where(
-                    and_(
-                        Activity.user_id == user_id,
-                        Activity.start_time >= current_date,
-                        Activity.start_time < next_date
-                    )
+        if end_date < start_date:
+            return []
+
+        one_day = timedelta(days=1)
+        day_count = (end_date - start_date) // one_day + 1
+        range_end = start_date + day_count * one_day
+
+        days = [
+            {"productive_seconds": 0, "total_seconds": 0, "meeting_minutes": 0}
+            for _ in range(day_count)
+        ]
+
+        activity_rows = await self.db.execute(
+            select(Activity.start_time, Activity.duration, Activity.is_productive).where(
+                and_(
+                    Activity.user_id == user_id,
+                    Activity.start_time >= start_date,
+                    Activity.start_time < range_end
                 )
             )
-            day_activities = result.scalars().all()
-
-            # Get events for this day
-            events_result = await self.db.execute(
-                select(CalendarEvent).where(
-                    and_(
-                        CalendarEvent.user_id == user_id,
-                        CalendarEvent.start_time >= current_date,
-                        CalendarEvent.start_time < next_date
-                    )
+        )
+        for start_time, duration, is_productive in activity_rows.all():
+            day = days[(start_time - start_date) // one_day]
+            day["total_seconds"] += duration
+            if is_productive:
+                day["productive_seconds"] += duration
+
+        event_rows = await self.db.execute(
+            select(CalendarEvent.start_time, CalendarEvent.duration_minutes).where(
+                and_(
+                    CalendarEvent.user_id == user_id,
+                    CalendarEvent.start_time >= start_date,
+                    CalendarEvent.start_time < range_end,
+                    _not_focus_time(CalendarEvent)
                 )
             )
-            day_events = events_result.scalars().all()
-
-            productive_seconds = sum(a.duration for a in day_activities if a.is_productive)
-            meeting_minutes = sum(e.duration_minutes for e in day_events if not e.is_focus_time)
+        )
+        for start_time, duration_minutes in event_rows.all():
+            days[(start_time - start_date) // one_day]["meeting_minutes"] += duration_minutes
 
+        daily_stats = []
+        for index, day in enumerate(days):
+            current_date = start_date + index * one_day
             daily_stats.append({
                 "date": current_date.isoformat(),
                 "day_name": current_date.strftime("%A"),
-                "productive_hours": productive_seconds / 3600,
-                "meeting_hours": meeting_minutes / 60,
-                "total_hours": sum(a.duration for a in day_activities) / 3600,
+                "productive_hours": day["productive_seconds"] / 3600,
+                "meeting_hours": day["meeting_minutes"] / 60,
+                "total_hours": day["total_seconds"] / 3600,
             })
 
-            current_date = next_date
-
         return daily_stats
 
     async def _calculate_category_breakdown(
@@ -905,3 +941,220 @@ class ReportDataAggregator:
         recommendations.append("Schedule your most important work during your peak energy hours (typically morning).")
 
         return insights, recommendations
+
+
+class TeamReportAggregator:
+    """Aggregates report data for a whole team with grouped queries.
+
+    Every metric is grouped by user (or by day/category) in the database, so
+    the number of queries is fixed regardless of team size or period length.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_team_data(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime,
+        prev_start_date: datetime,
+        prev_end_date: datetime,
+    ) -> Dict[str, Any]:
+        """Aggregate member, previous-period, daily and category stats for a team"""
+        return {
+            "members": await self.get_member_stats(user_ids, start_date, end_date),
+            "previous": await self.get_member_stats(user_ids, prev_start_date, prev_end_date),
+            "daily_stats": await self.get_daily_stats(user_ids, start_date, end_date),
+            "category_breakdown": await self.get_category_breakdown(user_ids, start_date, end_date),
+        }
+
+    async def get_member_stats(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Per-member period totals, matching ReportDataAggregator.get_report_data"""
+        from app.models import Activity, CalendarEvent, DeepWorkScore
+
+        if not user_ids:
+            return {}
+
+        stats = {
+            user_id: {"total_seconds": 0, "productive_seconds": 0, "meeting_minutes": 0, "avg_score": 0}
+            for user_id in user_ids
+        }
+
+        activity_rows = await self.db.execute(
+            select(
+                Activity.user_id,
+                func.sum(Activity.duration),
+                func.sum(case((Activity.is_productive == True, Activity.duration), else_=0)),
+            ).where(
+                and_(
+                    Activity.user_id.in_(user_ids),
+                    Activity.start_time >= start_date,
+                    Activity.start_time <= end_date
+                )
+            ).group_by(Activity.user_id)
+        )
+        for user_id, total, productive in activity_rows.all():
+            stats[user_id]["total_seconds"] = total or 0
+            stats[user_id]["productive_seconds"] = productive or 0
+
+        meeting_rows = await self.db.execute(
+            select(
+                CalendarEvent.user_id,
+                func.sum(CalendarEvent.duration_minutes),
+            ).where(
+                and_(
+                    CalendarEvent.user_id.in_(user_ids),
+                    CalendarEvent.start_time >= start_date,
+                    CalendarEvent.end_time <= end_date,
+                    _not_focus_time(CalendarEvent)
+                )
+            ).group_by(CalendarEvent.user_id)
+        )
+        for user_id, minutes in meeting_rows.all():
+            stats[user_id]["meeting_minutes"] = minutes or 0
+
+        score_rows = await self.db.execute(
+            select(
+                DeepWorkScore.user_id,
+                func.avg(DeepWorkScore.deep_work_score),
+            ).where(
+                and_(
+                    DeepWorkScore.user_id.in_(user_ids),
+                    DeepWorkScore.date >= start_date,
+                    DeepWorkScore.date <= end_date
+                )
+            ).group_by(DeepWorkScore.user_id)
+        )
+        for user_id, avg_score in score_rows.all():
+            stats[user_id]["avg_score"] = float(avg_score or 0)
+
+        return {
+            user_id: {
+                "deep_work_score": int(s["avg_score"]),
+                "productive_hours": s["productive_seconds"] / 3600,
+                "meeting_hours": s["meeting_minutes"] / 60,
+                "productivity_percentage": (
+                    s["productive_seconds"] / s["total_seconds"] * 100
+                ) if s["total_seconds"] > 0 else 0,
+                "total_hours": s["total_seconds"] / 3600,
+            }
+            for user_id, s in stats.items()
+        }
+
+    async def get_daily_stats(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[Dict[str, Any]]:
+        """Team totals per calendar day"""
+        from app.models import Activity, CalendarEvent
+
+        if not user_ids:
+            return []
+
+        days: Dict[str, Dict[str, float]] = {}
+
+        def bucket(day) -> Dict[str, float]:
+            key = str(day)[:10]
+            if key not in days:
+                days[key] = {"productive_seconds": 0, "total_seconds": 0, "meeting_minutes": 0}
+            return days[key]
+
+        activity_day = func.date(Activity.start_time)
+        activity_rows = await self.db.execute(
+            select(
+                activity_day,
+                func.sum(Activity.duration),
+                func.sum(case((Activity.is_productive == True, Activity.duration), else_=0)),
+            ).where(
+                and_(
+                    Activity.user_id.in_(user_ids),
+                    Activity.start_time >= start_date,
+                    Activity.start_time <= end_date
+                )
+            ).group_by(activity_day)
+        )
+        for day, total, productive in activity_rows.all():
+            stats = bucket(day)
+            stats["total_seconds"] = total or 0
+            stats["productive_seconds"] = productive or 0
+
+        event_day = func.date(CalendarEvent.start_time)
+        event_rows = await self.db.execute(
+            select(
+                event_day,
+                func.sum(CalendarEvent.duration_minutes),
+            ).where(
+                and_(
+                    CalendarEvent.user_id.in_(user_ids),
+                    CalendarEvent.start_time >= start_date,
+                    CalendarEvent.start_time <= end_date,
+                    _not_focus_time(CalendarEvent)
+                )
+            ).group_by(event_day)
+        )
+        for day, minutes in event_rows.all():
+            bucket(day)["meeting_minutes"] = minutes or 0
+
+        return [
+            {
+                "date": day,
+                "day_name": datetime.fromisoformat(day).strftime("%A"),
+                "productive_hours": s["productive_seconds"] / 3600,
+                "meeting_hours": s["meeting_minutes"] / 60,
+                "total_hours": s["total_seconds"] / 3600,
+            }
+            for day, s in sorted(days.items())
+        ]
+
+    async def get_category_breakdown(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[Dict[str, Any]]:
+        """Team time per category, sorted by hours"""
+        from app.models import Activity
+
+        if not user_ids:
+            return []
+
+        rows = await self.db.execute(
+            select(
+                Activity.category,
+                func.sum(Activity.duration),
+            ).where(
+                and_(
+                    Activity.user_id.in_(user_ids),
+                    Activity.start_time >= start_date,
+                    Activity.start_time <= end_date
+                )
+            ).group_by(Activity.category)
+        )
+
+        category_times: Dict[str, int] = {}
+        for category, seconds in rows.all():
+            category = category or "Other"
+            category_times[category] = category_times.get(category, 0) + (seconds or 0)
+
+        total = sum(category_times.values())
+        return [
+            {
+                "category": category,
+                "hours": seconds / 3600,
+                "percentage": (seconds / total * 100) if total > 0 else 0,
+            }
+            for category, seconds in sorted(category_times.items(), key=lambda x: x[1], reverse=True)
+        ]
+
+
+def _not_focus_time(event_model):
+    """Meetings are calendar events not marked as focus time"""
+    return or_(event_model.is_focus_time == False, event_model.is_focus_time.is_(None))
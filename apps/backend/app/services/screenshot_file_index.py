@@ -0,0 +1,218 @@
+"""
+Screenshot File Index
+
+An ordered index of the screenshot images stored on local disk (name, size,
+mtime, format), so listing them is a slice of memory rather than a directory
+walk with a stat() per file.
+
+Writers record changes as they happen: the capture path adds files, deletes
+and the upload queue discard them. The index is kept as an append-only log
+next to the files, replayed on first use and compacted once most of its lines
+are stale. A missing log is rebuilt with a single scan of the directory.
+"""
+import asyncio
+import bisect
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable
+
+from app.core.config import settings
+
+
+IMAGE_FORMATS = {
+    ".webp": "webp",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".png": "png",
+    ".gif": "gif",
+}
+
+
+def _is_image(name: str) -> bool:
+    root, ext = os.path.splitext(name)
+    return ext.lower() in IMAGE_FORMATS and not root.endswith("_thumb")
+
+
+class ScreenshotFileIndex:
+    """Newest-first index of local screenshot images, persisted as a log"""
+
+    LOG_NAME = "index.jsonl"
+
+    def __init__(self, directory: Optional[str] = None):
+        self.reset(directory or Path(settings.screenshots_path).expanduser())
+
+    def reset(self, directory):
+        """Point the index at a directory; it is loaded again on next use"""
+        self.directory = Path(directory)
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None  # None until loaded
+        self._order: List[tuple] = []  # (mtime, name), oldest first
+        self._log_lines = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def log_path(self) -> Path:
+        return self.directory / self.LOG_NAME
+
+    # ═══════════════════════════════════════════════════════════════════
+    # READS
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def list(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Entries newest first"""
+        await self._ensure_loaded()
+        end = len(self._order) - offset
+        names = [name for _, name in self._order[max(0, end - limit):max(0, end)]]
+        return [dict(self._entries[name]) for name in reversed(names)]
+
+    async def get(self, name: str) -> Optional[Dict[str, Any]]:
+        await self._ensure_loaded()
+        entry = self._entries.get(name)
+        return dict(entry) if entry is not None else None
+
+    async def count(self) -> int:
+        await self._ensure_loaded()
+        return len(self._entries)
+
+    # ═══════════════════════════════════════════════════════════════════
+    # WRITES
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def add(self, path, size: int, mtime: Optional[float] = None):
+        """Record an image written to the screenshots directory"""
+        path = Path(path)
+        if path.parent != self.directory or not _is_image(path.name):
+            return
+        await self._ensure_loaded()
+
+        entry = {
+            "name": path.name,
+            "size": size,
+            "mtime": time.time() if mtime is None else mtime,
+            "format": IMAGE_FORMATS[path.suffix.lower()],
+        }
+        self._drop(path.name)
+        self._put(entry)
+        await self._append([{"op": "add", **entry}])
+
+    async def discard(self, paths: Iterable[Optional[str]]):
+        """Forget images removed from the screenshots directory"""
+        await self._ensure_loaded()
+
+        names = []
+        for path in paths:
+            if path and Path(path).parent == self.directory and self._drop(Path(path).name):
+                names.append(Path(path).name)
+        if names:
+            await self._append([{"op": "remove", "name": name} for name in names])
+
+    async def rebuild(self) -> int:
+        """Re-scan the directory and rewrite the log; returns the entry count"""
+        async with self._lock:
+            entries = await asyncio.to_thread(self._scan)
+            self._load_entries(entries)
+            await asyncio.to_thread(self._write_log, self._snapshot())
+        return len(entries)
+
+    # ═══════════════════════════════════════════════════════════════════
+    # STATE
+    # ═══════════════════════════════════════════════════════════════════
+
+    def _put(self, entry: Dict[str, Any]):
+        self._entries[entry["name"]] = entry
+        bisect.insort(self._order, (entry["mtime"], entry["name"]))
+
+    def _drop(self, name: str) -> bool:
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return False
+        key = (entry["mtime"], name)
+        self._order.pop(bisect.bisect_left(self._order, key))
+        return True
+
+    def _load_entries(self, entries: List[Dict[str, Any]]):
+        self._entries = {entry["name"]: entry for entry in entries}
+        self._order = sorted((e["mtime"], e["name"]) for e in self._entries.values())
+        self._log_lines = len(self._entries)
+
+    def _snapshot(self) -> List[Dict[str, Any]]:
+        """Live entries as log records, taken on the loop before writing them out"""
+        return [{"op": "add", **self._entries[name]} for _, name in self._order]
+
+    async def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        async with self._lock:
+            if self._entries is not None:
+                return
+            if await asyncio.to_thread(self.log_path.exists):
+                entries, lines = await asyncio.to_thread(self._replay)
+                self._load_entries(entries)
+                self._log_lines = lines
+            else:
+                self._load_entries(await asyncio.to_thread(self._scan))
+                await asyncio.to_thread(self._write_log, self._snapshot())
+
+    async def _append(self, records: List[Dict[str, Any]]):
+        # Serialized so the log keeps the order the changes were made in
+        async with self._lock:
+            self._log_lines += len(records)
+            if self._log_lines > 2 * len(self._entries) + 100:
+                self._log_lines = len(self._entries)
+                await asyncio.to_thread(self._write_log, self._snapshot())
+            else:
+                await asyncio.to_thread(self._append_lines, records)
+
+    # ═══════════════════════════════════════════════════════════════════
+    # STORAGE
+    # ═══════════════════════════════════════════════════════════════════
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        entries = []
+        if not self.directory.exists():
+            return entries
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.is_file() and _is_image(item.name):
+                    stat = item.stat()
+                    entries.append({
+                        "name": item.name,
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime,
+                        "format": IMAGE_FORMATS[os.path.splitext(item.name)[1].lower()],
+                    })
+        return entries
+
+    def _replay(self):
+        entries: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        with open(self.log_path) as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash
+                lines += 1
+                if record.pop("op") == "add":
+                    entries[record["name"]] = record
+                else:
+                    entries.pop(record["name"], None)
+        return list(entries.values()), lines
+
+    def _append_lines(self, records: List[Dict[str, Any]]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a") as log:
+            log.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def _write_log(self, records: List[Dict[str, Any]]):
+        """Compact: rewrite the log as one add per live entry"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.log_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as log:
+            log.write("".join(json.dumps(record) + "\n" for record in records))
+        os.replace(tmp_path, self.log_path)
+
+
+# Singleton instance
+screenshot_file_index = ScreenshotFileIndex()
@@ -1,11 +1,15 @@
 import mss
-from PIL import Image
+from PIL import Image, ImageFilter
 import io
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime, timedelta
 import uuid
-from typing import Optional
+from typing import Optional, Dict, Any, Tuple
 import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.date import DateTrigger
@@ -13,8 +17,163 @@ from apscheduler.triggers.cron import CronTrigger
 import random
 
 from app.core.config import settings
+from app.core.metrics import summarize_samples
 from app.core.database import async_session, USE_CLOUD_DB
-from app.services.firebase_storage import firebase_storage
+from app.services.firebase_storage import firebase_storage, thumbnail_storage_path
+from app.services.screenshot_file_index import screenshot_file_index
+from app.services.screenshot_upload_queue import screenshot_upload_queue
+from app.services.screenshot_tiering_service import screenshot_tiering_service
+from app.services.storage_usage_service import detach_duplicates, record_screenshot_usage, release_screenshots
+
+
+THUMBNAIL_SIZE = (320, 180)  # 16:9 thumbnail for list views
+CAPTURE_STAGES = ("grab", "decode", "resize", "blur", "hash", "encode", "thumbnail")
+BLUR_MODES = ("always", "excluded", "never")  # "excluded": only while an excluded app is active
+
+
+@dataclass
+class CapturedFrame:
+    """An encoded screenshot and its thumbnail, with per-stage timings in ms"""
+    image_bytes: bytes
+    thumbnail_bytes: bytes
+    format: str  # webp or jpeg
+    width: int
+    height: int
+    timings: Dict[str, float] = field(default_factory=dict)
+    phash: Optional[int] = None
+    duplicate: bool = False  # near-identical to the previous capture; nothing encoded
+    blurred: bool = False
+
+    @property
+    def extension(self) -> str:
+        return "webp" if self.format == "webp" else "jpg"
+
+    @property
+    def mime_type(self) -> str:
+        return "image/webp" if self.format == "webp" else "image/jpeg"
+
+
+def _encode_image(img: Image.Image, format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if format == "webp":
+        img.save(buffer, 'WEBP', quality=quality, method=4)
+    else:
+        img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def blur_radius(width: int) -> int:
+    """Gaussian radius that makes text unreadable at any capture resolution"""
+    return max(6, width // 80)
+
+
+def capture_frame(
+    target_size: Optional[Tuple[int, int]],
+    format: str,
+    quality: int,
+    thumbnail_quality: int,
+    previous_hash: Optional[int] = None,
+    dedupe_threshold: int = 0,
+    blur: bool = False,
+) -> CapturedFrame:
+    """
+    Grab the primary monitor and encode the image and its thumbnail.
+
+    Blocking - runs on the capture thread. The frame is decoded once; the
+    thumbnail is scaled down from the resized frame after it is encoded.
+    With `blur`, the resized frame is blurred before anything is derived
+    from it, so the thumbnail is never sharper than the image.
+    A frame within `dedupe_threshold` bits of `previous_hash` is returned
+    as a duplicate without being encoded.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 2)
+        started = now
+
+    with mss.mss() as sct:
+        screenshot = sct.grab(sct.monitors[1])
+    lap("grab")
+
+    img = Image.frombytes('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX')
+    lap("decode")
+
+    # Resize to configured resolution, maintaining aspect ratio
+    if target_size is not None:
+        img.thumbnail(target_size, Image.Resampling.LANCZOS)
+    width, height = img.size
+    lap("resize")
+
+    # Blurring the downscaled frame is far cheaper than the full-size grab
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur_radius(width)))
+    lap("blur")
+
+    phash = dhash(img)
+    lap("hash")
+    if (
+        previous_hash is not None
+        and dedupe_threshold > 0
+        and hamming_distance(phash, previous_hash) <= dedupe_threshold
+    ):
+        return CapturedFrame(b"", b"", format, width, height, timings, phash, duplicate=True, blurred=blur)
+
+    image_bytes = _encode_image(img, format, quality)
+    lap("encode")
+
+    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    thumbnail_bytes = _encode_image(img, format, thumbnail_quality)
+    lap("thumbnail")
+
+    return CapturedFrame(image_bytes, thumbnail_bytes, format, width, height, timings, phash, blurred=blur)
+
+
+def _write_files(files: Dict[Path, bytes]):
+    for path, content in files.items():
+        path.write_bytes(content)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not remove screenshot file {path}: {e}")
+
+
+async def _remove_stored_files(screenshots):
+    """Unlink local files on the default executor and delete cloud blobs, all concurrently"""
+    loop = asyncio.get_running_loop()
+    removals = [screenshot_file_index.discard(s.image_path for s in screenshots)]
+    for screenshot in screenshots:
+        for path in (screenshot.image_path, screenshot.thumbnail_path):
+            if path:
+                removals.append(loop.run_in_executor(None, _remove_file, path))
+        if screenshot.storage_path and firebase_storage.is_available:
+            removals.append(firebase_storage.delete_file(screenshot.storage_path))
+            removals.append(firebase_storage.delete_file(thumbnail_storage_path(screenshot.storage_path)))
+    await asyncio.gather(*removals)
 
 
 class ScreenshotService:
@@ -28,6 +187,8 @@ class ScreenshotService:
         "low": (854, 480),      # SD - Smallest size
     }
 
+    SAMPLE_SIZE = 200
+
     def __init__(self):
         # Expand ~ to actual home directory
         self.screenshots_path = Path(settings.screenshots_path).expanduser()
@@ -37,12 +198,33 @@ class ScreenshotService:
         self.min_interval = 7   # minutes (minimum)
         self.max_interval = 13  # minutes (maximum, under 15 as requested)
         self.excluded_apps = []
-        self.blur_mode = "never"
+        self.blur_mode = "never"  # one of BLUR_MODES
         self.quality = 50       # Lower quality for smaller files (was 70)
         self.resolution = "medium"  # 1280x720 - good balance
         self.format = "webp"    # WebP for best compression
         self.retention_days = 30  # Auto-delete after 30 days
+        self.cleanup_batch_size = settings.screenshot_cleanup_batch_size
+
+        # Older screenshots are recompressed to a cheaper tier (0 days = off)
+        self.tier_after_days = settings.screenshot_tier_after_days
+        self.tier_resolution = "low"
+        self.tier_quality = 30
+        self.tier_drop_full_size = False  # keep only the thumbnail instead
         self.current_user_id: Optional[int] = None  # Set by auth context
+        self.session_factory = async_session
+
+        # Capture and encode run on one worker thread, off the event loop
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._captured = 0
+        self._failed = 0
+
+        # Near-duplicate captures reference the previous image instead of storing a new one
+        self.dedupe_threshold = settings.screenshot_dedupe_threshold
+        self._deduplicated = 0
+        self._bytes_saved = 0
+        self._blurred = 0
+        self._stage_ms = {stage: deque(maxlen=self.SAMPLE_SIZE) for stage in CAPTURE_STAGES}
+        self._total_ms = deque(maxlen=self.SAMPLE_SIZE)
 
     def start_scheduler(self):
         """Start the screenshot scheduler"""
@@ -55,6 +237,9 @@ class ScreenshotService:
         """Stop the screenshot scheduler"""
         if self.scheduler.running:
             self.scheduler.shutdown(wait=False)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     def _schedule_next_capture(self):
         """Schedule the next screenshot capture at a random interval"""
@@ -95,53 +280,124 @@ class ScreenshotService:
         )
         print(f"🗑️  Screenshot cleanup scheduled daily at 3:00 AM (retention: {self.retention_days} days)")
 
+        # Tiering runs after cleanup so it never recompresses files about to be deleted
+        self.scheduler.add_job(
+            self._tier_old_screenshots,
+            trigger=CronTrigger(hour=3, minute=30),
+            id='screenshot_tiering',
+            replace_existing=True,
+        )
+
     async def _cleanup_old_screenshots(self):
         """Delete screenshots older than retention period"""
         if self.retention_days <= 0:
             return  # Retention disabled
 
         cutoff_date = datetime.now() - timedelta(days=self.retention_days)
-        deleted_count = 0
-        freed_bytes = 0
 
         try:
-            from app.models.screenshot import Screenshot
-            from sqlalchemy import select
+            async with self.session_factory() as session:
+                result = await self.cleanup_screenshots(session, cutoff_date)
 
-            async with async_session() as session:
-                # Find old screenshots
-                result = await session.execute(
-                    select(Screenshot).where(Screenshot.timestamp < cutoff_date)
-                )
-                old_screenshots = result.scalars().all()
-
-                for screenshot in old_screenshots:
-                    # Delete local files
-                    if screenshot.image_path and os.path.exists(screenshot.image_path):
-                        try:
-                            freed_bytes += os.path.getsize(screenshot.image_path)
-                            os.remove(screenshot.image_path)
-                        except OSError:
-                            pass
-
-                    if screenshot.thumbnail_path and os.path.exists(screenshot.thumbnail_path):
-                        try:
-                            freed_bytes += os.path.getsize(screenshot.thumbnail_path)
-                            os.remove(screenshot.thumbnail_path)
-                        except OSError:
-                            pass
-
-                    # Delete from database
-                    await session.delete(screenshot)
-                    deleted_count += 1
+            if result["deleted_count"] > 0:
+                freed_mb = result["freed_bytes"] / (1024 * 1024)
+                print(f"🗑️  Cleaned up {result['deleted_count']} old screenshots, freed {freed_mb:.1f} MB")
+        except Exception as e:
+            print(f"Failed to cleanup old screenshots: {e}")
 
-                await session.commit()
+    async def _tier_old_screenshots(self):
+        """Recompress screenshots older than tier_after_days"""
+        if self.tier_after_days <= 0:
+            return  # Tiering disabled
 
-            if deleted_count > 0:
-                freed_mb = freed_bytes / (1024 * 1024)
-                print(f"🗑️  Cleaned up {deleted_count} old screenshots, freed {freed_mb:.1f} MB")
+        try:
+            async with self.session_factory() as session:
+                await self.tier_screenshots(session)
         except Exception as e:
-            print(f"Failed to cleanup old screenshots: {e}")
+            print(f"Failed to recompress old screenshots: {e}")
+
+    async def tier_screenshots(self, session, cutoff: Optional[datetime] = None) -> Dict[str, Any]:
+        """Move screenshots taken before `cutoff` (default: tier_after_days ago) to the configured tier"""
+        if cutoff is None:
+            cutoff = datetime.now() - timedelta(days=self.tier_after_days)
+        return await screenshot_tiering_service.run(
+            session,
+            cutoff,
+            max_size=self.RESOLUTION_PRESETS.get(self.tier_resolution),
+            quality=self.tier_quality,
+            drop_full_size=self.tier_drop_full_size,
+        )
+
+    async def cleanup_screenshots(
+        self,
+        session,
+        cutoff: datetime,
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Delete every screenshot taken before `cutoff`, one batch at a time.
+
+        Batches walk (timestamp, id) in order and read only the columns needed;
+        rows go in one DELETE ... WHERE id IN (...) and each batch commits on
+        its own, so memory and transaction size stay bounded. Files and cloud
+        blobs are removed concurrently after the rows are gone.
+
+        Every worker runs cleanup, so the DELETE is also the claim: usage,
+        heirs and files are settled only for the rows it returns.
+        """
+        from app.models.screenshot import Screenshot
+        from sqlalchemy import select, delete, and_, or_
+
+        batch_size = batch_size or self.cleanup_batch_size
+        deleted_count = 0
+        freed_bytes = 0
+        last_key = None
+
+        while True:
+            query = select(
+                Screenshot.id,
+                Screenshot.user_id,
+                Screenshot.timestamp,
+                Screenshot.image_path,
+                Screenshot.thumbnail_path,
+                Screenshot.storage_path,
+                Screenshot.duplicate_of,
+                Screenshot.image_size,
+                Screenshot.thumbnail_size,
+            ).where(Screenshot.timestamp < cutoff)
+            if last_key is not None:
+                last_timestamp, last_id = last_key
+                query = query.where(or_(
+                    Screenshot.timestamp > last_timestamp,
+                    and_(Screenshot.timestamp == last_timestamp, Screenshot.id > last_id),
+                ))
+            rows = (await session.execute(
+                query.order_by(Screenshot.timestamp, Screenshot.id).limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            last_key = (rows[-1].timestamp, rows[-1].id)
+
+            # Rows another worker deleted since the select are not returned
+            result = await session.execute(
+                delete(Screenshot)
+                .where(Screenshot.id.in_([row.id for row in rows]))
+                .returning(Screenshot.id)
+                .execution_options(synchronize_session=False)
+            )
+            claimed_ids = set(result.scalars().all())
+            claimed = [row for row in rows if row.id in claimed_ids]
+
+            # Files shared with newer near-duplicates are handed over, not removed
+            owners = await detach_duplicates(session, claimed)
+            await release_screenshots(session, claimed)
+            await session.commit()
+
+            await _remove_stored_files(owners)
+            deleted_count += len(claimed)
+            freed_bytes += sum(row.image_size + row.thumbnail_size for row in owners)
+
+        return {"deleted_count": deleted_count, "freed_bytes": freed_bytes}
 
     async def _capture_and_reschedule(self):
         """Capture screenshot and schedule next one"""
@@ -158,7 +414,7 @@ class ScreenshotService:
             from app.api.routes.activities import get_current_native_activity
             from app.services.classification import classify_activity
 
-            native_activity = get_current_native_activity()
+            native_activity = await get_current_native_activity()
             if native_activity:
                 app_name = native_activity.get("app_name")
                 window_title = native_activity.get("window_title")
@@ -169,7 +425,7 @@ class ScreenshotService:
         except Exception as e:
             print(f"📸 Could not get activity metadata: {e}")
 
-        result = await self.capture_screenshot()
+        result = await self.capture_screenshot(app_name=app_name)
 
         # Update screenshot with activity metadata
         if result:
@@ -177,7 +433,7 @@ class ScreenshotService:
                 from app.models.screenshot import Screenshot
                 from sqlalchemy import update
 
-                async with async_session() as session:
+                async with self.session_factory() as session:
                     await session.execute(
                         update(Screenshot)
                         .where(Screenshot.id == result["id"])
@@ -195,16 +451,6 @@ class ScreenshotService:
         # Schedule the next capture with a new random interval
         self._schedule_next_capture()
 
-    def _resize_image(self, img: Image.Image) -> Image.Image:
-        """Resize image to configured resolution preset"""
-        target_size = self.RESOLUTION_PRESETS.get(self.resolution)
-        if target_size is None:
-            return img  # Return original if "full" resolution
-
-        # Maintain aspect ratio
-        img.thumbnail(target_size, Image.Resampling.LANCZOS)
-        return img
-
     def _get_file_extension(self) -> str:
         """Get file extension based on format"""
         return "webp" if self.format == "webp" else "jpg"
@@ -213,105 +459,214 @@ class ScreenshotService:
         """Get MIME type based on format"""
         return "image/webp" if self.format == "webp" else "image/jpeg"
 
-    async def capture_screenshot(self, user_id: Optional[int] = None) -> Optional[dict]:
-        """Capture a screenshot of the primary monitor"""
+    async def _capture_frame(
+        self,
+        format: str,
+        thumbnail_quality: int,
+        previous_hash: Optional[int] = None,
+        blur: bool = False,
+    ) -> CapturedFrame:
+        """Run the grab, resize, blur, hash and encode pipeline on the capture thread"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot")
+
+        loop = asyncio.get_running_loop()
+        try:
+            frame = await loop.run_in_executor(
+                self._executor,
+                capture_frame,
+                self.RESOLUTION_PRESETS.get(self.resolution),
+                format,
+                self.quality,
+                thumbnail_quality,
+                previous_hash,
+                self.dedupe_threshold,
+                blur,
+            )
+        except Exception:
+            self._failed += 1
+            raise
+
+        self._captured += 1
+        if frame.blurred:
+            self._blurred += 1
+        for stage, ms in frame.timings.items():
+            self._stage_ms[stage].append(ms)
+        self._total_ms.append(sum(frame.timings.values()))
+        return frame
+
+    def get_capture_stats(self) -> Dict[str, Any]:
+        """Capture counters plus per-stage timings over recent captures"""
+        return {
+            "captured": self._captured,
+            "failed": self._failed,
+            "resolution": self.resolution,
+            "format": self.format,
+            "stages_ms": {stage: summarize_samples(samples) for stage, samples in self._stage_ms.items()},
+            "total_ms": summarize_samples(self._total_ms),
+            "dedupe": {
+                "threshold": self.dedupe_threshold,
+                "deduplicated": self._deduplicated,
+                "ratio": round(self._deduplicated / self._captured, 3) if self._captured else 0,
+                "bytes_saved": self._bytes_saved,
+            },
+            "blur": {
+                "mode": self.blur_mode,
+                "blurred": self._blurred,
+            },
+        }
+
+    def should_blur(self, app_name: Optional[str], flagged: bool = False) -> bool:
+        """
+        Whether a capture is blurred under the current blur_mode.
+
+        Flagged captures (the user's privacy setting, or a caller asking for
+        it) are blurred in every mode; "never" only means nothing else is.
+        """
+        if flagged or self.blur_mode == "always":
+            return True
+        if self.blur_mode == "excluded" and app_name:
+            app = app_name.lower()
+            return any(excluded.lower() in app for excluded in self.excluded_apps if excluded)
+        return False
+
+    async def _blur_requested(self, user_id: Optional[int]) -> bool:
+        """The user's own "blur screenshots" privacy setting"""
+        if not user_id:
+            return False
+        from app.models.settings import UserSettings
+        from sqlalchemy import select
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(UserSettings.blur_screenshots).where(UserSettings.user_id == user_id)
+            )
+            return bool(result.scalar_one_or_none())
+
+    async def _previous_original(self, user_id: Optional[int]):
+        """The user's most recent stored (non-duplicate) capture, if it has a hash"""
+        from app.models.screenshot import Screenshot
+        from sqlalchemy import select
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Screenshot).where(
+                    Screenshot.user_id == user_id if user_id else Screenshot.user_id.is_(None),
+                    Screenshot.is_deleted == False,
+                    Screenshot.duplicate_of.is_(None),
+                    Screenshot.phash.isnot(None),
+                ).order_by(Screenshot.timestamp.desc()).limit(1)
+            )
+            return result.scalar_one_or_none()
+
+    async def capture_screenshot(
+        self,
+        user_id: Optional[int] = None,
+        app_name: Optional[str] = None,
+        blur: bool = False,
+    ) -> Optional[dict]:
+        """Capture a screenshot of the primary monitor, blurred if `should_blur` says so"""
         if not self.enabled:
             return None
 
         # Use provided user_id or fall back to current_user_id
         effective_user_id = user_id or self.current_user_id
+        use_cloud = bool(effective_user_id) and firebase_storage.is_available
 
         try:
-            with mss.mss() as sct:
-                # Capture primary monitor
-                monitor = sct.monitors[1]
-                screenshot = sct.grab(monitor)
-
-                # Convert to PIL Image
-                img = Image.frombytes(
-                    'RGB',
-                    screenshot.size,
-                    screenshot.bgra,
-                    'raw',
-                    'BGRX'
+            blur = self.should_blur(app_name, blur or await self._blur_requested(effective_user_id))
+            previous = await self._previous_original(effective_user_id) if self.dedupe_threshold > 0 else None
+            if previous is not None and bool(previous.is_blurred) != blur:
+                # Never let a capture that must be blurred reuse a sharp image (or vice versa)
+                previous = None
+
+            # Cloud copies are always JPEG; local files follow the format setting
+            frame = await self._capture_frame(
+                format="jpeg" if use_cloud else self.format,
+                thumbnail_quality=75 if use_cloud else 40,
+                previous_hash=int(previous.phash, 16) if previous else None,
+                blur=blur,
+            )
+
+            # Generate identifiers
+            timestamp = datetime.now()
+            screenshot_id = str(uuid.uuid4())
+
+            # Result dict
+            result = {
+                'id': screenshot_id,
+                'timestamp': timestamp.isoformat(),
+                'user_id': effective_user_id,
+            }
+
+            # Try cloud upload first if available and user is authenticated
+            retry_upload = False
+            if frame.duplicate:
+                # Point at the earlier image; nothing is written or uploaded
+                result.update({
+                    'image_path': previous.image_path,
+                    'thumbnail_path': previous.thumbnail_path,
+                    'storage_url': previous.storage_url,
+                    'thumbnail_url': previous.thumbnail_url,
+                    'storage_path': previous.storage_path,
+                    'duplicate_of': previous.id,
+                })
+                self._deduplicated += 1
+                self._bytes_saved += previous.image_size + previous.thumbnail_size
+            elif use_cloud:
+                upload_result = await firebase_storage.upload_screenshot(
+                    user_id=effective_user_id,
+                    image_bytes=frame.image_bytes,
+                    thumbnail_bytes=frame.thumbnail_bytes,
                 )
 
-                # Resize to configured resolution (professional optimization)
-                img = self._resize_image(img)
-
-                # Generate identifiers
-                timestamp = datetime.now()
-                screenshot_id = str(uuid.uuid4())
-
-                # Result dict
-                result = {
-                    'id': screenshot_id,
-                    'timestamp': timestamp.isoformat(),
-                    'user_id': effective_user_id,
-                }
-
-                # Try cloud upload first if available and user is authenticated
-                if effective_user_id and firebase_storage.is_available:
-                    # Convert image to bytes
-                    img_buffer = io.BytesIO()
-                    img.save(img_buffer, format='JPEG', quality=self.quality)
-                    img_bytes = img_buffer.getvalue()
-
-                    # Upload to Firebase
-                    upload_result = await firebase_storage.upload_screenshot(
-                        user_id=effective_user_id,
-                        image_bytes=img_bytes,
-                        create_thumbnail=True,
-                        quality=self.quality
-                    )
-
-                    if "error" not in upload_result:
-                        result.update({
-                            'storage_url': upload_result.get('storage_url'),
-                            'thumbnail_url': upload_result.get('thumbnail_url'),
-                            'storage_path': upload_result.get('storage_path'),
-                            'image_path': None,  # No local file
-                            'thumbnail_path': None,
-                        })
-                        print(f"☁️  Screenshot uploaded to Firebase: {upload_result.get('storage_path')}")
-                    else:
-                        # Fall back to local storage on upload failure
-                        print(f"Firebase upload failed, using local storage: {upload_result.get('error')}")
-                        result = await self._save_locally(img, timestamp, screenshot_id, effective_user_id)
+                if "error" not in upload_result:
+                    result.update({
+                        'storage_url': upload_result.get('storage_url'),
+                        'thumbnail_url': upload_result.get('thumbnail_url'),
+                        'storage_path': upload_result.get('storage_path'),
+                        'image_path': None,  # No local file
+                        'thumbnail_path': None,
+                    })
+                    print(f"☁️  Screenshot uploaded to Firebase: {upload_result.get('storage_path')}")
                 else:
-                    # Local storage (development or unauthenticated)
-                    result = await self._save_locally(img, timestamp, screenshot_id, effective_user_id)
-
-                # Save to database
-                await self._save_to_database(result)
-
-                return result
+                    # Keep a local copy for now and retry the upload in the background
+                    print(f"Firebase upload failed, queued for retry: {upload_result.get('error')}")
+                    result = await self._save_locally(frame, timestamp, screenshot_id, effective_user_id)
+                    retry_upload = True
+            else:
+                # Local storage (development or unauthenticated)
+                result = await self._save_locally(frame, timestamp, screenshot_id, effective_user_id)
+
+            result['image_size'] = len(frame.image_bytes)
+            result['thumbnail_size'] = len(frame.thumbnail_bytes)
+            result['phash'] = f"{frame.phash:016x}"
+            result['is_blurred'] = frame.blurred
+            result['timings'] = frame.timings
+
+            # Save to database
+            await self._save_to_database(result)
+            if retry_upload:
+                await screenshot_upload_queue.enqueue(result)
+
+            return result
 
         except Exception as e:
             print(f"Failed to capture screenshot: {e}")
             return None
 
-    async def _save_locally(self, img: Image.Image, timestamp: datetime, screenshot_id: str, user_id: Optional[int]) -> dict:
-        """Save screenshot to local filesystem using WebP for optimal compression"""
-        ext = self._get_file_extension()
-        filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{screenshot_id}.{ext}"
-        thumbnail_filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{screenshot_id}_thumb.{ext}"
+    async def _save_locally(self, frame: CapturedFrame, timestamp: datetime, screenshot_id: str, user_id: Optional[int]) -> dict:
+        """Write an encoded frame and its thumbnail to the local filesystem"""
+        filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{screenshot_id}.{frame.extension}"
+        thumbnail_filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{screenshot_id}_thumb.{frame.extension}"
 
-        # Save full image (WebP or JPEG based on format setting)
         image_path = self.screenshots_path / filename
-        if self.format == "webp":
-            img.save(str(image_path), 'WEBP', quality=self.quality, method=4)
-        else:
-            img.save(str(image_path), 'JPEG', quality=self.quality)
-
-        # Create and save thumbnail (smaller size for list views)
-        thumbnail = img.copy()
-        thumbnail.thumbnail((320, 180), Image.Resampling.LANCZOS)
         thumbnail_path = self.screenshots_path / thumbnail_filename
-        if self.format == "webp":
-            thumbnail.save(str(thumbnail_path), 'WEBP', quality=40, method=4)
-        else:
-            thumbnail.save(str(thumbnail_path), 'JPEG', quality=40)
+        await asyncio.to_thread(_write_files, {
+            image_path: frame.image_bytes,
+            thumbnail_path: frame.thumbnail_bytes,
+        })
+        await screenshot_file_index.add(image_path, len(frame.image_bytes))
 
         return {
             'id': screenshot_id,
@@ -329,7 +684,7 @@ class ScreenshotService:
         try:
             from app.models.screenshot import Screenshot
 
-            async with async_session() as session:
+            async with self.session_factory() as session:
                 screenshot = Screenshot(
                     id=screenshot_data['id'],
                     user_id=screenshot_data.get('user_id'),
@@ -339,8 +694,19 @@ class ScreenshotService:
                     storage_url=screenshot_data.get('storage_url'),
                     thumbnail_url=screenshot_data.get('thumbnail_url'),
                     storage_path=screenshot_data.get('storage_path'),
+                    image_size=screenshot_data.get('image_size', 0),
+                    thumbnail_size=screenshot_data.get('thumbnail_size', 0),
+                    phash=screenshot_data.get('phash'),
+                    duplicate_of=screenshot_data.get('duplicate_of'),
+                    is_blurred=screenshot_data.get('is_blurred', False),
                 )
                 session.add(screenshot)
+                await record_screenshot_usage(
+                    session,
+                    screenshot.user_id,
+                    1,
+                    screenshot.image_size + screenshot.thumbnail_size,
+                )
                 await session.commit()
         except Exception as e:
             print(f"Failed to save screenshot to database: {e}")
@@ -356,6 +722,10 @@ class ScreenshotService:
         retention_days: Optional[int] = None,
         resolution: Optional[str] = None,
         format: Optional[str] = None,
+        tier_after_days: Optional[int] = None,
+        tier_resolution: Optional[str] = None,
+        tier_quality: Optional[int] = None,
+        tier_drop_full_size: Optional[bool] = None,
     ):
         """Update screenshot settings"""
         if enabled is not None:
@@ -366,7 +736,7 @@ class ScreenshotService:
             self.max_interval = max_interval
         if excluded_apps is not None:
             self.excluded_apps = excluded_apps
-        if blur_mode is not None:
+        if blur_mode is not None and blur_mode in BLUR_MODES:
             self.blur_mode = blur_mode
         if quality is not None:
             self.quality = quality
@@ -376,6 +746,14 @@ class ScreenshotService:
             self.resolution = resolution
         if format is not None and format in ("webp", "jpeg"):
             self.format = format
+        if tier_after_days is not None:
+            self.tier_after_days = tier_after_days
+        if tier_resolution is not None and tier_resolution in self.RESOLUTION_PRESETS:
+            self.tier_resolution = tier_resolution
+        if tier_quality is not None and 1 <= tier_quality <= 100:
+            self.tier_quality = tier_quality
+        if tier_drop_full_size is not None:
+            self.tier_drop_full_size = tier_drop_full_size
 
         # Reschedule with new settings
         self._schedule_next_capture()
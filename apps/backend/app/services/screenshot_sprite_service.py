@@ -0,0 +1,334 @@
+"""
+Screenshot Sprite Service
+
+Composes a page of screenshot thumbnails into one contact-sheet image plus an
+offset map, so a day's gallery is one image request instead of one per tile.
+
+Sheets are composed on a worker thread and cached on disk under a hash of the
+page's contents, so a page is rendered again only when its screenshots
+change. Each (scope, day, page) keeps just its latest sheet, and the cache as
+a whole is bounded by bytes with least recently used eviction.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Hashable, Tuple
+
+from PIL import Image
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.screenshot import Screenshot
+from app.services.firebase_storage import firebase_storage, thumbnail_storage_path
+
+
+TILE_SIZE = (320, 180)  # matches the capture thumbnail size
+
+
+@dataclass
+class SpriteSheet:
+    """A composed page of thumbnails and where each one sits in the image"""
+    key: str
+    path: str
+    width: int
+    height: int
+    tiles: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _compose_sprite(
+    sources: List[Optional[Any]],
+    columns: int,
+    quality: int,
+) -> Tuple[bytes, List[Optional[Tuple[int, int]]]]:
+    """Paste thumbnails (paths or encoded bytes) into a grid; returns WebP bytes and each tile's size"""
+    rows = max(1, -(-len(sources) // columns))
+    sheet = Image.new("RGB", (TILE_SIZE[0] * min(columns, max(1, len(sources))), TILE_SIZE[1] * rows))
+    sizes = []
+
+    for index, source in enumerate(sources):
+        if source is None:
+            sizes.append(None)
+            continue
+        try:
+            with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as img:
+                img = img.convert("RGB")
+                if img.width > TILE_SIZE[0] or img.height > TILE_SIZE[1]:
+                    img.thumbnail(TILE_SIZE, Image.Resampling.LANCZOS)
+                x = (index % columns) * TILE_SIZE[0]
+                y = (index // columns) * TILE_SIZE[1]
+                sheet.paste(img, (x, y))
+                sizes.append(img.size)
+        except (OSError, ValueError):
+            sizes.append(None)
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, "WEBP", quality=quality, method=4)
+    return buffer.getvalue(), sizes
+
+
+class ScreenshotSpriteService:
+    """Contact sheets of screenshot thumbnails, cached per page contents"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = Path(directory or Path(settings.screenshots_path).expanduser() / "sprites")
+        self.max_bytes = settings.screenshot_sprite_cache_mb * 1024 * 1024 if max_bytes is None else max_bytes
+        self.page_size = settings.screenshot_sprite_page_size
+        self.columns = settings.screenshot_sprite_columns
+        self.quality = 75
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._entries: Optional["OrderedDict[str, int]"] = None  # key -> bytes, oldest first
+        self._sizes: Dict[str, List[Optional[Tuple[int, int]]]] = {}  # key -> tile sizes
+        self._total_bytes = 0
+        self._pages: Dict[Hashable, str] = {}  # (scope, day, page) -> latest key
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ═══════════════════════════════════════════════════════════════════
+    # SHEETS
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def get_sheet(
+        self,
+        db: AsyncSession,
+        scope: Hashable,
+        conditions: list,
+        day: date,
+        page: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Offset map for one page of a day's screenshots, composing the sheet if needed.
+
+        Args:
+            scope: Identifies whose screenshots these are (for per-page caching)
+            conditions: Filters selecting those screenshots
+            day: Calendar day to show
+            page: Zero-based page of `page_size` screenshots, oldest first
+        """
+        start = datetime.combine(day, datetime.min.time())
+        where = [
+            *conditions,
+            Screenshot.is_deleted == False,
+            Screenshot.timestamp >= start,
+            Screenshot.timestamp < start + timedelta(days=1),
+        ]
+
+        total = (await db.execute(select(func.count(Screenshot.id)).where(*where))).scalar_one()
+        result = await db.execute(
+            select(
+                Screenshot.id,
+                Screenshot.timestamp,
+                Screenshot.thumbnail_path,
+                Screenshot.thumbnail_size,
+                Screenshot.storage_path,
+                Screenshot.app_name,
+                Screenshot.window_title,
+                Screenshot.category,
+                Screenshot.is_blurred,
+                Screenshot.duplicate_of,
+            )
+            .where(*where)
+            .order_by(Screenshot.timestamp, Screenshot.id)
+            .offset(page * self.page_size)
+            .limit(self.page_size)
+        )
+        rows = result.all()
+
+        sheet = await self._sheet(scope, day, page, rows) if rows else None
+        return {
+            "date": day.isoformat(),
+            "page": page,
+            "pages": -(-total // self.page_size),
+            "page_size": self.page_size,
+            "total": total,
+            "count": len(rows),
+            "sprite_key": sheet.key if sheet else None,
+            "width": sheet.width if sheet else 0,
+            "height": sheet.height if sheet else 0,
+            "tile_width": TILE_SIZE[0],
+            "tile_height": TILE_SIZE[1],
+            "columns": self.columns,
+            "tiles": sheet.tiles if sheet else [],
+        }
+
+    async def get_path(self, key: str) -> Optional[Path]:
+        """Cached sheet file for a key, if it is still in the cache"""
+        await self._load_index()
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._path(key)
+
+    async def _sheet(self, scope: Hashable, day: date, page: int, rows) -> SpriteSheet:
+        await self._load_index()
+
+        # Any change to the page (new capture, delete, re-encode) changes the key
+        digest = hashlib.sha256(f"{self.columns}:{self.quality}".encode())
+        for row in rows:
+            digest.update(f"|{row.id}:{row.thumbnail_size}:{row.thumbnail_path or row.storage_path}".encode())
+        key = digest.hexdigest()[:32]
+
+        if key in self._entries and os.path.exists(self._path(key)):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._layout(key, rows, self._sizes.get(key))
+
+        # Identical concurrent requests wait for the same render
+        if key not in self._rendering:
+            self.misses += 1
+            self._rendering[key] = asyncio.ensure_future(self._render(key, rows))
+            self._rendering[key].add_done_callback(lambda _: self._rendering.pop(key, None))
+        else:
+            self.hits += 1
+        sizes = await asyncio.shield(self._rendering[key])
+
+        # Only the newest sheet of a page is worth keeping
+        page_key = (scope, day, page)
+        previous = self._pages.get(page_key)
+        self._pages[page_key] = key
+        if previous and previous != key:
+            self._discard(previous)
+
+        return self._layout(key, rows, sizes)
+
+    async def _render(self, key: str, rows) -> List[Optional[Tuple[int, int]]]:
+        sources = await asyncio.gather(*(self._source(row) for row in rows))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprite")
+        loop = asyncio.get_running_loop()
+        image_bytes, sizes = await loop.run_in_executor(
+            self._executor, _compose_sprite, sources, self.columns, self.quality
+        )
+        await asyncio.to_thread(_write_file, self._path(key), image_bytes)
+        self._sizes[key] = sizes
+        self._add(key, len(image_bytes))
+        return sizes
+
+    async def _source(self, row):
+        """Local thumbnail path, or thumbnail bytes fetched from cloud storage"""
+        if row.thumbnail_path:
+            return row.thumbnail_path
+        if row.storage_path and firebase_storage.is_available:
+            return await firebase_storage.download_file(thumbnail_storage_path(row.storage_path))
+        return None
+
+    def _layout(self, key: str, rows, sizes) -> SpriteSheet:
+        """Offsets of each tile; a width of 0 marks a screenshot without a thumbnail"""
+        if sizes is None:
+            # Sheets found on disk after a restart have no recorded sizes; assume full cells
+            sizes = [TILE_SIZE] * len(rows)
+        columns = min(self.columns, len(rows))
+        tiles = []
+        for index, row in enumerate(rows):
+            size = sizes[index]
+            tiles.append({
+                "id": row.id,
+                "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+                "x": (index % self.columns) * TILE_SIZE[0],
+                "y": (index // self.columns) * TILE_SIZE[1],
+                "width": size[0] if size else 0,
+                "height": size[1] if size else 0,
+                "app_name": row.app_name,
+                "window_title": row.window_title,
+                "category": row.category,
+                "is_blurred": row.is_blurred,
+                "duplicate_of": row.duplicate_of,
+            })
+        rows_count = -(-len(rows) // self.columns)
+        return SpriteSheet(
+            key, str(self._path(key)), columns * TILE_SIZE[0], rows_count * TILE_SIZE[1], tiles
+        )
+
+    # ═══════════════════════════════════════════════════════════════════
+    # CACHE
+    # ═══════════════════════════════════════════════════════════════════
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.webp"
+
+    async def _load_index(self):
+        """Rebuild the LRU order from files on disk, oldest first"""
+        if self._entries is not None:
+            return
+        files = await asyncio.to_thread(_scan, self.directory)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        for key, size in files:
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _add(self, key: str, size: int):
+        self._total_bytes -= self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._total_bytes += size
+        self._evict()
+
+    def _discard(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is None:
+            return
+        self._total_bytes -= size
+        self._sizes.pop(key, None)
+        _remove(self._path(key))
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._discard(key)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries or {}),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _write_file(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+def _remove(path: Path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _scan(directory: Path):
+    if not directory.exists():
+        return []
+    files = []
+    for path in directory.glob("*.webp"):
+        stat = path.stat()
+        files.append((stat.st_mtime, path.stem, stat.st_size))
+    files.sort()
+    return [(key, size) for _, key, size in files]
+
+
+# Singleton instance
+screenshot_sprite_service = ScreenshotSpriteService()
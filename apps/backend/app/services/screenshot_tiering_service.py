@@ -0,0 +1,282 @@
+"""
+Screenshot Tiering Service
+
+Nightly job that moves older local screenshots to a cheaper storage tier: the
+full image is re-encoded at a smaller resolution and quality or, when
+configured, dropped so that only the thumbnail remains. Thumbnails are left
+as they are, and uploaded screenshots are not touched.
+
+Re-encoding runs in a process pool whose workers lower their own CPU
+priority, a chunk of files per task, while DB reads and writes stay on the
+calling coroutine. Rows record their tier so each file is processed once, and
+every run reports the bytes it reclaimed.
+"""
+import asyncio
+import io
+import os
+import time
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+from PIL import Image
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.screenshot import Screenshot
+from app.services.screenshot_file_index import screenshot_file_index
+from app.services.storage_usage_service import record_screenshot_usage
+
+
+TIER_ORIGINAL = "original"
+TIER_COMPRESSED = "compressed"  # full image re-encoded smaller
+TIER_THUMBNAIL = "thumbnail"  # full image dropped, thumbnail stands in
+
+# (screenshot_id, image_path, thumbnail_path)
+TierTask = Tuple[str, str, Optional[str]]
+# (screenshot_id, new image size or None when dropped, mtime, error)
+TierResult = Tuple[str, Optional[int], Optional[float], Optional[str]]
+
+
+def _lower_priority():
+    """Worker initializer: yield the CPU to capture and request handling"""
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass  # not available on this platform
+
+
+def recompress_image(path: str, max_size: Optional[Tuple[int, int]], quality: int) -> Tuple[int, float]:
+    """Re-encode an image in place, keeping its format and mtime; returns (size, mtime)"""
+    stat = os.stat(path)
+    with Image.open(path) as img:
+        format = "WEBP" if path.lower().endswith(".webp") else "JPEG"
+        img = img.convert("RGB")
+        if max_size and (img.width > max_size[0] or img.height > max_size[1]):
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if format == "WEBP":
+            img.save(buffer, format, quality=quality, method=6)
+        else:
+            img.save(buffer, format, quality=quality, optimize=True)
+
+    content = buffer.getvalue()
+    if len(content) >= stat.st_size:
+        return stat.st_size, stat.st_mtime  # already as small as this tier gets
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    # Listings and the file index order by mtime, so keep the capture time
+    os.utime(path, (stat.st_atime, stat.st_mtime))
+    return len(content), stat.st_mtime
+
+
+def tier_chunk(
+    tasks: List[TierTask],
+    max_size: Optional[Tuple[int, int]],
+    quality: int,
+    drop_full_size: bool,
+) -> List[TierResult]:
+    """Recompress or drop a chunk of images (runs inside a worker process)"""
+    results = []
+    for screenshot_id, image_path, thumbnail_path in tasks:
+        try:
+            if drop_full_size and thumbnail_path and os.path.exists(thumbnail_path):
+                if image_path != thumbnail_path:
+                    os.remove(image_path)
+                results.append((screenshot_id, None, None, None))
+            else:
+                size, mtime = recompress_image(image_path, max_size, quality)
+                results.append((screenshot_id, size, mtime, None))
+        except Exception as e:
+            results.append((screenshot_id, None, None, str(e) or type(e).__name__))
+    return results
+
+
+class ScreenshotTieringService:
+    """Background recompression of older screenshots, with bytes reclaimed per run"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = settings.screenshot_tier_workers if max_workers is None else max_workers
+        self.batch_size = 200  # rows read per query
+        self.chunk_size = 25  # files per worker task
+        self.runs: deque = deque(maxlen=30)
+        self.total_reclaimed = 0
+        self._running = False
+
+    async def run(
+        self,
+        db: AsyncSession,
+        cutoff: datetime,
+        max_size: Optional[Tuple[int, int]],
+        quality: int,
+        drop_full_size: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Move local screenshots taken before `cutoff` down a tier.
+
+        Rows are read in (timestamp, id) keyset batches; at most max_workers
+        chunks are being re-encoded at once, and each finished chunk is
+        written back and committed on its own.
+        """
+        if self._running:
+            return {"status": "already_running"}
+        self._running = True
+
+        started = time.perf_counter()
+        stats = {
+            "started_at": datetime.now().isoformat(),
+            "cutoff": cutoff.isoformat(),
+            "tier": TIER_THUMBNAIL if drop_full_size else TIER_COMPRESSED,
+            "processed": 0,
+            "failed": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+            "bytes_reclaimed": 0,
+            "errors": [],
+        }
+
+        loop = asyncio.get_running_loop()
+        executor = None
+        if self.max_workers > 0:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_lower_priority)
+        in_flight: deque = deque()
+        max_in_flight = max(self.max_workers, 1)
+
+        try:
+            async for rows in self._batches(db, cutoff, drop_full_size):
+                for i in range(0, len(rows), self.chunk_size):
+                    chunk = {row.id: row for row in rows[i:i + self.chunk_size]}
+                    tasks = [(row.id, row.image_path, row.thumbnail_path) for row in chunk.values()]
+                    if executor is None:
+                        future = loop.run_in_executor(None, tier_chunk, tasks, max_size, quality, drop_full_size)
+                    else:
+                        future = loop.run_in_executor(
+                            executor, tier_chunk, tasks, max_size, quality, drop_full_size
+                        )
+                    in_flight.append((chunk, future))
+
+                    if len(in_flight) >= max_in_flight:
+                        await self._drain_one(db, in_flight, stats)
+
+            while in_flight:
+                await self._drain_one(db, in_flight, stats)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._running = False
+
+        stats["bytes_reclaimed"] = stats["bytes_before"] - stats["bytes_after"]
+        stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        stats["errors"] = stats["errors"][:20]
+        self.total_reclaimed += stats["bytes_reclaimed"]
+        self.runs.append(stats)
+
+        print(
+            f"🗜️  Screenshot tiering: {stats['processed']} moved to {stats['tier']}, "
+            f"{stats['failed']} failed, reclaimed {stats['bytes_reclaimed'] / (1024 * 1024):.1f} MB "
+            f"in {stats['elapsed_seconds']:.1f}s"
+        )
+        return stats
+
+    async def _batches(self, db: AsyncSession, cutoff: datetime, drop_full_size: bool):
+        # Compressed images can still be dropped later; nothing moves back up
+        tiers = [TIER_ORIGINAL, TIER_COMPRESSED] if drop_full_size else [TIER_ORIGINAL]
+        last_key = None
+        while True:
+            query = select(
+                Screenshot.id,
+                Screenshot.user_id,
+                Screenshot.timestamp,
+                Screenshot.image_path,
+                Screenshot.thumbnail_path,
+                Screenshot.image_size,
+            ).where(
+                Screenshot.timestamp < cutoff,
+                Screenshot.storage_tier.in_(tiers),
+                Screenshot.image_path.isnot(None),
+                # Near-duplicates share their original's files
+                Screenshot.duplicate_of.is_(None),
+            )
+            if last_key is not None:
+                last_timestamp, last_id = last_key
+                query = query.where(or_(
+                    Screenshot.timestamp > last_timestamp,
+                    and_(Screenshot.timestamp == last_timestamp, Screenshot.id > last_id),
+                ))
+            rows = (await db.execute(
+                query.order_by(Screenshot.timestamp, Screenshot.id).limit(self.batch_size)
+            )).all()
+            if not rows:
+                return
+            yield rows
+            last_key = (rows[-1].timestamp, rows[-1].id)
+
+    async def _drain_one(self, db: AsyncSession, in_flight: deque, stats: Dict[str, Any]):
+        chunk, future = in_flight.popleft()
+        try:
+            results = await future
+            await self._save_chunk(db, chunk, results, stats)
+        except Exception as e:
+            await db.rollback()
+            stats["failed"] += len(chunk)
+            stats["errors"].append({"error": str(e)})
+
+    async def _save_chunk(self, db: AsyncSession, chunk: Dict[str, Any], results: List[TierResult], stats):
+        usage_deltas = defaultdict(int)
+        indexed = []
+        dropped = []
+
+        for screenshot_id, size, mtime, error in results:
+            row = chunk[screenshot_id]
+            if error is not None:
+                stats["failed"] += 1
+                stats["errors"].append({"id": screenshot_id, "error": error})
+                continue
+
+            if size is None:
+                # The thumbnail now stands in for the image, for near-duplicates too
+                values = {"image_path": row.thumbnail_path, "image_size": 0, "storage_tier": TIER_THUMBNAIL}
+                await db.execute(
+                    update(Screenshot)
+                    .where(Screenshot.duplicate_of == screenshot_id)
+                    .values(image_path=row.thumbnail_path)
+                )
+                dropped.append(row.image_path)
+            else:
+                values = {"image_size": size, "storage_tier": TIER_COMPRESSED}
+                indexed.append((row.image_path, size, mtime))
+
+            await db.execute(update(Screenshot).where(Screenshot.id == screenshot_id).values(**values))
+            usage_deltas[row.user_id] += values["image_size"] - row.image_size
+            stats["processed"] += 1
+            stats["bytes_before"] += row.image_size
+            stats["bytes_after"] += values["image_size"]
+
+        for user_id, delta in usage_deltas.items():
+            await record_screenshot_usage(db, user_id, 0, delta)
+        await db.commit()
+
+        for path, size, mtime in indexed:
+            await screenshot_file_index.add(path, size, mtime)
+        await screenshot_file_index.discard(dropped)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "running": self._running,
+            "total_reclaimed_bytes": self.total_reclaimed,
+            "last_run": self.runs[-1] if self.runs else None,
+            "runs": [
+                {k: run[k] for k in ("started_at", "tier", "processed", "failed", "bytes_reclaimed")}
+                for run in self.runs
+            ],
+        }
+
+
+# Singleton instance
+screenshot_tiering_service = ScreenshotTieringService()
@@ -0,0 +1,296 @@
+"""
+Screenshot Upload Retry Queue
+
+When a cloud upload fails the capture is kept as a local file and an entry is
+written here, one JSON file per screenshot next to the screenshots folder, so
+pending uploads survive restarts. A background task retries due entries with
+exponential backoff; on success the Screenshot row is switched to the cloud
+URLs and the local copy is removed. After the last attempt the entry is
+dropped and the local copy stays.
+
+Every worker drains the same directory, so an entry is claimed by renaming
+it to a file only this queue owns before it is uploaded; whoever loses the
+rename skips it. Claims left by a worker that died mid-upload are put back
+once they are older than CLAIM_TIMEOUT_SECONDS.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import update, or_
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.screenshot import Screenshot
+from app.services.firebase_storage import firebase_storage
+from app.services.screenshot_file_index import screenshot_file_index
+
+
+CLAIM_TIMEOUT_SECONDS = 10 * 60
+
+class ScreenshotUploadQueue:
+    """Persistent, backoff-driven retry queue for failed screenshot uploads"""
+
+    def __init__(self, directory: Optional[str] = None, session_factory=None):
+        self.directory = Path(directory or Path(settings.screenshots_path).expanduser() / "upload_queue")
+        self.session_factory = session_factory or async_session
+        self.max_attempts = settings.screenshot_upload_max_attempts
+        self.backoff_seconds = settings.screenshot_upload_backoff_seconds
+        self.backoff_max_seconds = settings.screenshot_upload_backoff_max_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.uploaded = 0
+        self.retried = 0
+        self.dropped = 0
+
+    # ═══════════════════════════════════════════════════════════════════
+    # LIFECYCLE
+    # ═══════════════════════════════════════════════════════════════════
+
+    def start(self):
+        """Start draining; entries left by a previous process are picked up"""
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                print(f"⚠️ Screenshot upload queue error: {e}")
+
+            # Sleep until the next entry is due or a new one arrives
+            due = await asyncio.to_thread(self._next_due)
+            timeout = self.backoff_max_seconds if due is None else max(1.0, due - time.time())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # ═══════════════════════════════════════════════════════════════════
+    # QUEUE
+    # ═══════════════════════════════════════════════════════════════════
+
+    async def enqueue(self, screenshot: Dict[str, Any]):
+        """Queue a locally saved capture for upload, first try after one backoff step"""
+        entry = {
+            "screenshot_id": screenshot["id"],
+            "user_id": screenshot["user_id"],
+            "image_path": screenshot["image_path"],
+            "thumbnail_path": screenshot.get("thumbnail_path"),
+            "attempts": 0,
+            "next_attempt_at": time.time() + self.backoff_seconds,
+            "last_error": None,
+        }
+        await asyncio.to_thread(self._write_entry, entry)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def drain(self, now: Optional[float] = None) -> int:
+        """Retry every due entry once; returns how many were uploaded"""
+        now = time.time() if now is None else now
+        await asyncio.to_thread(self._release_stale_claims)
+        entries = await asyncio.to_thread(self._read_entries)
+        uploaded = 0
+        for entry in entries:
+            if entry["next_attempt_at"] > now:
+                continue
+            claimed = await asyncio.to_thread(self._claim, entry["screenshot_id"], now)
+            if claimed is not None and await self._attempt(claimed):
+                uploaded += 1
+        return uploaded
+
+    async def _attempt(self, entry: Dict[str, Any]) -> bool:
+        if not firebase_storage.is_available:
+            return False
+
+        try:
+            image_bytes, thumbnail_bytes = await asyncio.to_thread(
+                _read_files, entry["image_path"], entry.get("thumbnail_path")
+            )
+        except FileNotFoundError:
+            # The screenshot was deleted locally in the meantime
+            await asyncio.to_thread(self._remove_entry, entry["screenshot_id"])
+            return False
+
+        result = await firebase_storage.upload_screenshot(
+            user_id=entry["user_id"],
+            image_bytes=image_bytes,
+            thumbnail_bytes=thumbnail_bytes,
+        )
+
+        if "error" in result:
+            await asyncio.to_thread(self._schedule_retry, entry, result["error"])
+            return False
+
+        async with self.session_factory() as db:
+            # Near-duplicates share these files, so they move to the cloud too
+            await db.execute(
+                update(Screenshot)
+                .where(or_(
+                    Screenshot.id == entry["screenshot_id"],
+                    Screenshot.duplicate_of == entry["screenshot_id"],
+                ))
+                .values(
+                    storage_url=result["storage_url"],
+                    thumbnail_url=result.get("thumbnail_url"),
+                    storage_path=result["storage_path"],
+                    image_path=None,
+                    thumbnail_path=None,
+                )
+            )
+            await db.commit()
+
+        await asyncio.to_thread(_remove_files, entry["image_path"], entry.get("thumbnail_path"))
+        await screenshot_file_index.discard([entry["image_path"]])
+        await asyncio.to_thread(self._remove_entry, entry["screenshot_id"])
+        self.uploaded += 1
+        print(f"☁️  Queued screenshot {entry['screenshot_id']} uploaded after {entry['attempts']} retries")
+        return True
+
+    def _schedule_retry(self, entry: Dict[str, Any], error: str):
+        entry["attempts"] += 1
+        entry["last_error"] = error
+        if entry["attempts"] >= self.max_attempts:
+            self.dropped += 1
+            self._remove_entry(entry["screenshot_id"])
+            print(f"⚠️ Giving up on uploading screenshot {entry['screenshot_id']}, keeping local copy")
+            return
+
+        self.retried += 1
+        entry["next_attempt_at"] = time.time() + self.backoff_delay(entry["attempts"])
+        self._write_entry(entry)
+        # Hand the entry back to whichever worker is due to retry it
+        self._remove_entry(entry["screenshot_id"])
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Exponential delay with up to 10% jitter, capped at the configured max"""
+        delay = min(self.backoff_seconds * (2 ** attempts), self.backoff_max_seconds)
+        return delay * random.uniform(0.9, 1.0)
+
+    # ═══════════════════════════════════════════════════════════════════
+    # STORAGE
+    # ═══════════════════════════════════════════════════════════════════
+
+    def _entry_path(self, screenshot_id: str) -> Path:
+        return self.directory / f"{screenshot_id}.json"
+
+    def _claim_path(self, screenshot_id: str) -> Path:
+        return self.directory / f"{screenshot_id}.{self._owner}.claimed"
+
+    def _write_entry(self, entry: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(entry["screenshot_id"])
+        tmp_path = path.with_suffix(f".{self._owner}.tmp")
+        tmp_path.write_text(json.dumps(entry))
+        os.replace(tmp_path, path)
+
+    def _remove_entry(self, screenshot_id: str):
+        """Forget a claimed entry"""
+        try:
+            os.remove(self._claim_path(screenshot_id))
+        except FileNotFoundError:
+            pass
+
+    def _claim(self, screenshot_id: str, now: float) -> Optional[Dict[str, Any]]:
+        """
+        Take an entry for this queue alone; None if another worker got it
+        first, or rescheduled it since it was read and it is no longer due.
+        """
+        path, claim_path = self._entry_path(screenshot_id), self._claim_path(screenshot_id)
+        try:
+            os.rename(path, claim_path)
+            # A rename keeps the entry's mtime; the claim's age starts now
+            os.utime(claim_path)
+            entry = json.loads(claim_path.read_text())
+        except FileNotFoundError:
+            # Lost the rename, or the claim was put back before it was stamped
+            return None
+        except (OSError, ValueError):
+            os.rename(claim_path, path)
+            return None
+        if entry["next_attempt_at"] > now:
+            os.rename(claim_path, path)
+            return None
+        return entry
+
+    def _release_stale_claims(self):
+        """Put back entries claimed by a worker that died before finishing them"""
+        if not self.directory.exists():
+            return
+        cutoff = time.time() - CLAIM_TIMEOUT_SECONDS
+        for path in self.directory.glob("*.claimed"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    os.rename(path, self._entry_path(path.name.split(".", 1)[0]))
+            except FileNotFoundError:
+                continue
+
+    def _read_entries(self) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                entries.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        entries.sort(key=lambda e: e["next_attempt_at"])
+        return entries
+
+    def _next_due(self) -> Optional[float]:
+        entries = self._read_entries()
+        return entries[0]["next_attempt_at"] if entries else None
+
+    def _in_flight(self) -> int:
+        if not self.directory.exists():
+            return 0
+        return sum(1 for _ in self.directory.glob("*.claimed"))
+
+    async def get_stats(self) -> Dict[str, Any]:
+        entries = await asyncio.to_thread(self._read_entries)
+        return {
+            "pending": len(entries),
+            "in_flight": await asyncio.to_thread(self._in_flight),
+            "next_attempt_at": entries[0]["next_attempt_at"] if entries else None,
+            "uploaded": self.uploaded,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
+
+
+def _read_files(image_path: str, thumbnail_path: Optional[str]):
+    image_bytes = Path(image_path).read_bytes()
+    thumbnail_bytes = None
+    if thumbnail_path and os.path.exists(thumbnail_path):
+        thumbnail_bytes = Path(thumbnail_path).read_bytes()
+    return image_bytes, thumbnail_bytes
+
+
+def _remove_files(*paths: Optional[str]):
+    for path in paths:
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Singleton instance
+screenshot_upload_queue = ScreenshotUploadQueue()
@@ -0,0 +1,120 @@
+"""
+Storage Usage Service
+Per-user screenshot storage totals without walking the disk or the bucket.
+
+Each Screenshot row records its encoded sizes when it is written, and a
+ScreenshotUsage row keeps running totals that are adjusted in the same
+transaction as every insert and delete. A user without a usage row yet (data
+from before the counters existed) gets one built from a single aggregate
+query on first read.
+
+Near-duplicate captures share their original's files and count no bytes of
+their own, so deletes go through detach_duplicates first.
+"""
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.screenshot import Screenshot, ScreenshotUsage
+
+
+def screenshot_bytes(screenshot: Screenshot) -> int:
+    """Stored size of a screenshot and its thumbnail"""
+    return (screenshot.image_size or 0) + (screenshot.thumbnail_size or 0)
+
+
+async def record_screenshot_usage(
+    db: AsyncSession,
+    user_id: Optional[int],
+    count_delta: int,
+    bytes_delta: int,
+) -> None:
+    """Adjust a user's totals; does not commit"""
+    if user_id is None or (count_delta == 0 and bytes_delta == 0):
+        return
+
+    # Missing rows are built from the table on first read, which already
+    # reflects this change, so there is nothing to adjust yet
+    await db.execute(
+        update(ScreenshotUsage)
+        .where(ScreenshotUsage.user_id == user_id)
+        .values(
+            screenshot_count=ScreenshotUsage.screenshot_count + count_delta,
+            total_bytes=ScreenshotUsage.total_bytes + bytes_delta,
+        )
+    )
+
+
+async def release_screenshots(db: AsyncSession, screenshots: Iterable[Screenshot]) -> int:
+    """Subtract screenshots about to be hard-deleted; returns the bytes released"""
+    totals = defaultdict(lambda: [0, 0])
+    for screenshot in screenshots:
+        totals[screenshot.user_id][0] += 1
+        totals[screenshot.user_id][1] += screenshot_bytes(screenshot)
+
+    for user_id, (count, size) in totals.items():
+        await record_screenshot_usage(db, user_id, -count, -size)
+    return sum(size for _, size in totals.values())
+
+
+async def detach_duplicates(db: AsyncSession, screenshots: Iterable[Screenshot]) -> List[Screenshot]:
+    """
+    Prepare screenshots for a hard delete; returns those whose files can go.
+
+    A deleted original with surviving duplicates hands its files (and their
+    bytes) to the oldest survivor, and the other survivors are re-pointed at
+    it. Duplicates never own files, so they are never in the result.
+    """
+    screenshots = list(screenshots)
+    originals = {s.id: s for s in screenshots if s.duplicate_of is None}
+    if not originals:
+        return []
+
+    result = await db.execute(
+        select(Screenshot).where(
+            Screenshot.duplicate_of.in_(list(originals)),
+            Screenshot.id.notin_([s.id for s in screenshots]),
+        ).order_by(Screenshot.timestamp)
+    )
+
+    heirs = {}
+    for duplicate in result.scalars().all():
+        original = originals[duplicate.duplicate_of]
+        heir = heirs.get(original.id)
+        if heir is None:
+            heirs[original.id] = duplicate
+            duplicate.duplicate_of = None
+            duplicate.image_size = original.image_size
+            duplicate.thumbnail_size = original.thumbnail_size
+            await record_screenshot_usage(db, duplicate.user_id, 0, screenshot_bytes(duplicate))
+        else:
+            duplicate.duplicate_of = heir.id
+
+    return [s for s in originals.values() if s.id not in heirs]
+
+
+async def get_screenshot_usage(db: AsyncSession, user_id: int) -> Tuple[int, int]:
+    """(screenshot_count, total_bytes) stored for a user"""
+    usage = await db.get(ScreenshotUsage, user_id)
+    if usage is not None:
+        return usage.screenshot_count, usage.total_bytes
+
+    result = await db.execute(
+        select(
+            func.count(Screenshot.id),
+            func.coalesce(func.sum(Screenshot.image_size + Screenshot.thumbnail_size), 0),
+        ).where(Screenshot.user_id == user_id)
+    )
+    count, total_bytes = result.one()
+    db.add(ScreenshotUsage(user_id=user_id, screenshot_count=count, total_bytes=total_bytes))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request built it first
+        await db.rollback()
+        usage = await db.get(ScreenshotUsage, user_id)
+        return usage.screenshot_count, usage.total_bytes
+    return count, total_bytes
@@ -332,9 +332,12 @@ class TeamDeepWorkService:
             )
         )
         members = members_result.scalars().all()
+        member_scores = await self._get_member_scores(
+            [m.user_id for m in members], today
+        )
 
         for member in members:
-            member_score = await self._get_member_score(member.user_id, today)
+            member_score = member_scores.get(member.user_id)
             if not member_score:
                 continue
 
@@ -607,25 +610,28 @@ class TeamDeepWorkService:
         )
         return result.scalar_one_or_none()
 
-    async def _get_member_score(
+    async def _get_member_scores(
         self,
-        user_id: int,
+        user_ids: List[int],
         date: datetime
-    ) -> Optional[DeepWorkScore]:
-        """Get individual member's deep work score for a date"""
+    ) -> Dict[int, DeepWorkScore]:
+        """Get deep work scores for a date for several members, keyed by user_id"""
+        if not user_ids:
+            return {}
+
         start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_day = start_of_day + timedelta(days=1)
 
         result = await self.db.execute(
             select(DeepWorkScore).where(
                 and_(
-                    DeepWorkScore.user_id == user_id,
+                    DeepWorkScore.user_id.in_(user_ids),
                     DeepWorkScore.date >= start_of_day,
                     DeepWorkScore.date < end_of_day
                 )
             )
         )
-        return result.scalar_one_or_none()
+        return {s.user_id: s for s in result.scalars().all()}
 
     async def _get_member_breakdown(
         self,
@@ -637,49 +643,58 @@ class TeamDeepWorkService:
         end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
         start_date = end_date - timedelta(days=days)
 
-        members_result = await self.db.execute(
-            select(TeamMember, User).join(
-                User, TeamMember.user_id == User.id
-            ).where(
+        sharing_members = and_(
+            TeamMember.team_id == team_id,
+            TeamMember.share_activity == True
+        )
+
+        # Per-user averages over the window, restricted to this team's members
+        averages = (
+            select(
+                DeepWorkScore.user_id.label("user_id"),
+                func.avg(DeepWorkScore.deep_work_score).label("avg_score"),
+                func.avg(DeepWorkScore.deep_work_minutes).label("avg_deep_work"),
+                func.avg(DeepWorkScore.meeting_load_percent).label("avg_meetings"),
+            )
+            .where(
                 and_(
-                    TeamMember.team_id == team_id,
-                    TeamMember.share_activity == True
+                    DeepWorkScore.date >= start_date,
+                    DeepWorkScore.user_id.in_(
+                        select(TeamMember.user_id).where(sharing_members)
+                    )
                 )
             )
+            .group_by(DeepWorkScore.user_id)
+            .subquery()
         )
-        members = members_result.all()
 
-        member_data = []
-        for member, user in members:
-            # Get scores for this member
-            scores_result = await self.db.execute(
-                select(DeepWorkScore).where(
-                    and_(
-                        DeepWorkScore.user_id == member.user_id,
-                        DeepWorkScore.date >= start_date
-                    )
-                )
+        # One round-trip for the whole team; members without scores get NULLs
+        members_result = await self.db.execute(
+            select(
+                TeamMember,
+                User,
+                averages.c.avg_score,
+                averages.c.avg_deep_work,
+                averages.c.avg_meetings,
             )
-            scores = scores_result.scalars().all()
-
-            if scores:
-                avg_score = sum(s.deep_work_score for s in scores) / len(scores)
-                avg_deep_work = sum(s.deep_work_minutes for s in scores) / len(scores)
-                avg_meetings = sum(s.meeting_load_percent for s in scores) / len(scores)
-            else:
-                avg_score = 0
-                avg_deep_work = 0
-                avg_meetings = 0
-
-            member_data.append({
+            .join(User, TeamMember.user_id == User.id)
+            .outerjoin(averages, averages.c.user_id == TeamMember.user_id)
+            .where(sharing_members)
+        )
+        members = members_result.all()
+
+        member_data = [
+            {
                 "user_id": user.id,
                 "name": user.name,
                 "avatar_url": user.avatar_url,
-                "avg_score": round(avg_score, 1),
-                "avg_deep_work_minutes": round(avg_deep_work),
-                "avg_meeting_load": round(avg_meetings, 1),
+                "avg_score": round(float(avg_score or 0), 1),
+                "avg_deep_work_minutes": round(float(avg_deep_work or 0)),
+                "avg_meeting_load": round(float(avg_meetings or 0), 1),
                 "role": member.role.value,
-            })
+            }
+            for member, user, avg_score, avg_deep_work, avg_meetings in members
+        ]
 
         # Sort by avg score descending
         member_data.sort(key=lambda x: x["avg_score"], reverse=True)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+ActivityWatch Query Benchmark for Productify Pro
+
+Compares the raw-events path (fetch every window/web event and aggregate in
+Python) against the query2 path (server-side merge via /api/0/query/) for the
+summary requests used by the dashboard: totals per app, per domain and per hour.
+
+A local ActivityWatch stand-in is started on a free port, seeded with synthetic
+events, and records the response bytes of every request it serves.
+
+Usage:
+    python scripts/benchmark_aw_query.py                 # 1 day, 2000 events
+    python scripts/benchmark_aw_query.py --events 5000   # Heavier day
+    python scripts/benchmark_aw_query.py --rounds 20     # More timing samples
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("USE_SQLITE", "true")
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+from app.services.activity_tracker import ActivityWatchClient
+
+APPS = [
+    ("Code", "activity_tracker.py - productify-pro", None),
+    ("Google Chrome", "Pull Request #42 - GitHub", "https://github.com/org/repo/pull/42"),
+    ("Google Chrome", "YouTube", "https://www.youtube.com/watch?v=abc"),
+    ("Slack", "#engineering - Slack", None),
+    ("Terminal", "zsh - npm run dev", None),
+    ("Figma", "Dashboard Mockups", None),
+    ("Google Chrome", "Stack Overflow", "https://stackoverflow.com/questions/1"),
+]
+
+
+def _parse(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def build_stand_in(day_start: datetime, n_events: int) -> FastAPI:
+    """Build a minimal ActivityWatch server with synthetic buckets"""
+    host = "benchhost"
+    window_bucket = f"aw-watcher-window_{host}"
+    afk_bucket = f"aw-watcher-afk_{host}"
+    web_bucket = f"aw-watcher-web-chrome_{host}"
+
+    rng = random.Random(42)
+    window_events, web_events = [], []
+    cursor = day_start
+    step = timedelta(seconds=86400 / n_events)
+    for i in range(n_events):
+        app, title, url = rng.choice(APPS)
+        duration = rng.uniform(5, step.total_seconds())
+        event = {
+            "id": i,
+            "timestamp": cursor.isoformat(),
+            "duration": duration,
+            "data": {"app": app, "title": title},
+        }
+        window_events.append(event)
+        if url:
+            web_events.append({
+                "id": i,
+                "timestamp": cursor.isoformat(),
+                "duration": duration,
+                "data": {"url": url, "title": title},
+            })
+        cursor += step
+
+    buckets = {
+        window_bucket: window_events,
+        web_bucket: web_events,
+        afk_bucket: [],
+    }
+
+    app = FastAPI()
+    app.state.bytes = defaultdict(int)
+
+    @app.middleware("http")
+    async def count_bytes(request: Request, call_next):
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        kind = "query" if request.url.path.startswith("/api/0/query") else "raw"
+        app.state.bytes[kind] += len(body)
+        return Response(content=body, status_code=response.status_code,
+                        headers=dict(response.headers), media_type=response.media_type)
+
+    @app.get("/api/0/info")
+    async def info():
+        return {"hostname": host, "version": "stand-in"}
+
+    @app.get("/api/0/buckets/")
+    async def list_buckets():
+        return {b: {"id": b, "hostname": host} for b in buckets}
+
+    @app.get("/api/0/buckets/{bucket_id}/events")
+    async def events(bucket_id: str, limit: int = 100, start: str = None, end: str = None):
+        result = buckets.get(bucket_id, [])
+        if start:
+            result = [e for e in result if _parse(e["timestamp"]) >= _parse(start)]
+        if end:
+            result = [e for e in result if _parse(e["timestamp"]) < _parse(end)]
+        return list(reversed(result))[:limit]
+
+    @app.post("/api/0/query/")
+    async def query(body: dict):
+        program = "\n".join(body["query"])
+        results = []
+        for period in body["timeperiods"]:
+            start, end = (_parse(p) for p in period.split("/"))
+            source = web_events if "$domain" in program else window_events
+            in_period = [e for e in source if start <= _parse(e["timestamp"]) < end]
+
+            if "sum_durations" in program:
+                results.append(sum(e["duration"] for e in in_period))
+                continue
+
+            if "$domain" in program:
+                def key(e):
+                    netloc = e["data"]["url"].split("/")[2]
+                    return (netloc[4:] if netloc.startswith("www.") else netloc,)
+                fields = ["$domain"]
+            elif '"title"' in program:
+                key = lambda e: (e["data"]["app"], e["data"]["title"])
+                fields = ["app", "title"]
+            else:
+                key = lambda e: (e["data"]["app"],)
+                fields = ["app"]
+
+            merged: Dict[tuple, dict] = {}
+            for e in in_period:
+                k = key(e)
+                if k not in merged:
+                    merged[k] = {"timestamp": e["timestamp"], "duration": 0.0,
+                                 "data": dict(zip(fields, k))}
+                merged[k]["duration"] += e["duration"]
+            results.append(sorted(merged.values(), key=lambda m: m["duration"], reverse=True))
+        return results
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _time_call(fn, rounds: int) -> List[float]:
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def run_benchmark(n_events: int, rounds: int) -> None:
+    day_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+
+    stand_in = build_stand_in(day_start, n_events)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(stand_in, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    client = ActivityWatchClient()
+    client.base_url = f"http://127.0.0.1:{port}"
+
+    cases = {
+        "app totals": lambda: client.get_app_totals(day_start, day_end),
+        "app+title totals": lambda: client.get_app_totals(day_start, day_end, by_title=True),
+        "domain totals": lambda: client.get_domain_totals(day_start, day_end),
+        "hourly totals": lambda: client.get_hourly_totals(day_start, day_end),
+    }
+
+    print(f"Stand-in: {n_events} window events, {rounds} rounds per case\n")
+    print(f"{'case':<18} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'bytes/call':>12}")
+    print("-" * 56)
+
+    for name, call in cases.items():
+        for mode, use_query in (("raw", False), ("query", True)):
+            client.use_query_api = use_query
+            client._query_supported = None
+            await call()  # warm caches (bucket list, availability)
+            stand_in.state.bytes.clear()
+
+            samples = await _time_call(call, rounds)
+            total_bytes = sum(stand_in.state.bytes.values())
+            p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+            print(f"{name:<18} {mode:<6} {statistics.median(samples):>8.1f} "
+                  f"{p95:>8.1f} {total_bytes // rounds:>12,}")
+
+    print("\nNote: the raw path caps each bucket at 1000 events, so on heavy days "
+          "its totals are truncated while the query path covers the full range.")
+
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ActivityWatch raw vs query2 summaries")
+    parser.add_argument("--events", type=int, default=2000, help="Synthetic window events in the day")
+    parser.add_argument("--rounds", type=int, default=10, help="Timed calls per case and mode")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.events, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
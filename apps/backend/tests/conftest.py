@@ -24,6 +24,7 @@ from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.core.database import Base, get_db
+from app.core.realtime_backend import InProcessBackend, set_realtime_backend
 from app.models.user import User, PlanType
 from app.services.auth_service import get_password_hash, create_access_token
 
@@ -40,6 +41,15 @@ def event_loop() -> Generator:
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def realtime_backend() -> Generator:
+    """Fresh in-process pub/sub and shared state for every test (no Redis)."""
+    backend = InProcessBackend()
+    set_realtime_backend(backend)
+    yield backend
+    set_realtime_backend(None)
+
+
 @pytest.fixture(scope="function")
 async def test_engine():
     """Create a test database engine (in-memory SQLite)."""
@@ -0,0 +1,244 @@
+"""
+ActivityWatch client tests for Productify Pro.
+Tests cover: query2 summary aggregation, raw-events fallback and its parity
+with the query path, and request coalescing.
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+from app.services.activity_tracker import ActivityWatchClient
+
+
+DAY_START = datetime(2026, 1, 5)
+DAY_END = DAY_START + timedelta(days=1)
+
+RAW_ACTIVITIES = [
+    {"app_name": "Code", "window_title": "main.py", "url": None,
+     "start_time": "2026-01-05T09:00:00", "duration": 600},
+    {"app_name": "Chrome", "window_title": "GitHub", "url": "https://www.github.com/a",
+     "start_time": "2026-01-05T09:10:00", "duration": 300},
+    {"app_name": "Code", "window_title": "main.py", "url": None,
+     "start_time": "2026-01-05T10:00:00", "duration": 120},
+    {"app_name": "Chrome", "window_title": "GitHub", "url": "https://github.com/b",
+     "start_time": "2026-01-05T10:05:00", "duration": 60},
+]
+
+
+@pytest.fixture
+def aw_client() -> ActivityWatchClient:
+    client = ActivityWatchClient()
+    client.is_running = AsyncMock(return_value=True)
+    client.get_activities = AsyncMock(return_value=RAW_ACTIVITIES)
+    client.get_buckets = AsyncMock(return_value={})  # no AFK watcher
+    return client
+
+
+class TestSummaryFallback:
+    """Tests for summaries computed from raw events."""
+
+    @pytest.mark.asyncio
+    async def test_app_totals_from_raw_events(self, aw_client: ActivityWatchClient):
+        """App totals are summed and sorted by duration."""
+        totals = await aw_client.get_app_totals(DAY_START, DAY_END)
+
+        assert totals == [
+            {"app_name": "Code", "duration": 720},
+            {"app_name": "Chrome", "duration": 360},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_app_title_totals_keep_url(self, aw_client: ActivityWatchClient):
+        """Grouping by title keeps the URL so classification is unchanged."""
+        totals = await aw_client.get_app_totals(DAY_START, DAY_END, by_title=True)
+
+        assert sum(t["duration"] for t in totals) == 1080
+        assert {t["url"] for t in totals if t["app_name"] == "Chrome"} == {
+            "https://www.github.com/a", "https://github.com/b"
+        }
+
+    @pytest.mark.asyncio
+    async def test_domain_and_hourly_totals(self, aw_client: ActivityWatchClient):
+        """Domains drop the www prefix and hours bucket by start time."""
+        domains = await aw_client.get_domain_totals(DAY_START, DAY_END)
+        hourly = await aw_client.get_hourly_totals(DAY_START, DAY_END)
+
+        assert domains == [{"domain": "github.com", "duration": 360}]
+        assert hourly[9] == 900
+        assert hourly[10] == 180
+
+
+class TestQueryMode:
+    """Tests for server-side aggregation through /api/0/query/."""
+
+    @pytest.mark.asyncio
+    async def test_app_totals_use_query(self, aw_client: ActivityWatchClient):
+        """Query results are normalized and raw events are not fetched."""
+        aw_client.use_query_api = True
+        aw_client.query = AsyncMock(return_value=[[
+            {"timestamp": "2026-01-05T09:00:00", "duration": 720.4, "data": {"app": "Code"}},
+        ]])
+
+        totals = await aw_client.get_app_totals(DAY_START, DAY_END)
+
+        assert totals == [{"app_name": "Code", "duration": 720}]
+        program = "\n".join(aw_client.query.call_args.args[1])
+        assert 'merge_events_by_keys(window_events, ["app"])' in program
+        aw_client.get_activities.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_hourly_totals_use_one_period_per_hour(self, aw_client: ActivityWatchClient):
+        """Each hour in the range becomes its own query timeperiod."""
+        aw_client.use_query_api = True
+        aw_client.query = AsyncMock(return_value=[60.0] * 24)
+
+        hourly = await aw_client.get_hourly_totals(DAY_START, DAY_END)
+
+        assert len(aw_client.query.call_args.args[0]) == 24
+        assert all(seconds == 60 for seconds in hourly.values())
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_query_unavailable(self, aw_client: ActivityWatchClient):
+        """A failed query falls back to aggregating raw events."""
+        aw_client.use_query_api = True
+        aw_client.query = AsyncMock(return_value=None)
+
+        totals = await aw_client.get_app_totals(DAY_START, DAY_END)
+
+        assert totals[0] == {"app_name": "Code", "duration": 720}
+        aw_client.get_activities.assert_awaited_once()
+
+
+# Not-afk 09:00-09:12 and 10:00-10:06; the rest of the morning is AFK
+AFK_EVENTS = [
+    {"timestamp": "2026-01-05T10:06:00", "duration": 3000, "data": {"status": "afk"}},
+    {"timestamp": "2026-01-05T10:00:00", "duration": 360, "data": {"status": "not-afk"}},
+    {"timestamp": "2026-01-05T09:12:00", "duration": 2880, "data": {"status": "afk"}},
+    {"timestamp": "2026-01-05T09:00:00", "duration": 720, "data": {"status": "not-afk"}},
+]
+
+# What ActivityWatch returns for the merge-by-app/title program on the same
+# data: window events intersected with not-afk time, then merged
+QUERY_RESULT = [[
+    {"timestamp": "2026-01-05T09:00:00", "duration": 720.0, "data": {"app": "Code", "title": "main.py"}},
+    {"timestamp": "2026-01-05T09:10:00", "duration": 180.0, "data": {"app": "Chrome", "title": "GitHub"}},
+]]
+
+
+def events_before(events):
+    """get_events stand-in: newest first, up to `limit`, none after `end`"""
+    async def get_events(bucket_id, start=None, end=None, limit=100):
+        end = end.replace(tzinfo=None) if end else None
+        matching = [e for e in events if end is None or datetime.fromisoformat(e["timestamp"]) <= end]
+        return sorted(matching, key=lambda e: e["timestamp"], reverse=True)[:limit]
+    return get_events
+
+
+def by_app_and_title(totals):
+    grouped = {}
+    for t in totals:
+        key = (t["app_name"], t["window_title"])
+        grouped[key] = grouped.get(key, 0) + t["duration"]
+    return grouped
+
+
+class TestPathParity:
+    """The query path and the raw-events fallback agree on the same data."""
+
+    @pytest.mark.asyncio
+    async def test_app_totals_match_across_paths(self, aw_client: ActivityWatchClient):
+        aw_client.get_buckets = AsyncMock(return_value={"aw-watcher-afk_host": {}})
+        aw_client.get_events = AsyncMock(return_value=AFK_EVENTS)
+
+        aw_client.use_query_api = False
+        fallback = await aw_client.get_app_totals(DAY_START, DAY_END, by_title=True)
+
+        aw_client.use_query_api = True
+        aw_client.query = AsyncMock(return_value=QUERY_RESULT)
+        queried = await aw_client.get_app_totals(DAY_START, DAY_END, by_title=True)
+
+        assert by_app_and_title(fallback) == by_app_and_title(queried) == {
+            ("Code", "main.py"): 720,
+            ("Chrome", "GitHub"): 180,
+        }
+        # Only the fallback has URLs to classify browser time by
+        assert {t["url"] for t in fallback if t["app_name"] == "Chrome"} == {
+            "https://www.github.com/a", "https://github.com/b"
+        }
+
+    @pytest.mark.asyncio
+    async def test_afk_events_are_read_in_pages(self, aw_client: ActivityWatchClient):
+        """Ranges with more AFK events than one page keep their older periods."""
+        aw_client.AFK_PAGE_SIZE = 2
+        aw_client.get_buckets = AsyncMock(return_value={"aw-watcher-afk_host": {}})
+        aw_client.get_events = AsyncMock(side_effect=events_before(AFK_EVENTS))
+
+        totals = await aw_client.get_app_totals(DAY_START, DAY_END, by_title=True)
+
+        assert by_app_and_title(totals) == {("Code", "main.py"): 720, ("Chrome", "GitHub"): 180}
+        assert aw_client.get_events.await_count > 1
+
+    @pytest.mark.asyncio
+    async def test_time_without_afk_events_counts(self, aw_client: ActivityWatchClient):
+        """A stopped AFK watcher leaves its bucket behind; that time isn't dropped."""
+        aw_client.get_buckets = AsyncMock(return_value={"aw-watcher-afk_host": {}})
+        aw_client.get_events = AsyncMock(return_value=[])
+
+        totals = await aw_client.get_app_totals(DAY_START, DAY_END)
+
+        assert totals == [{"app_name": "Code", "duration": 720}, {"app_name": "Chrome", "duration": 360}]
+
+
+class TestSingleFlight:
+    """Tests for coalescing concurrent identical ActivityWatch requests."""
+
+    @staticmethod
+    def _slow_fetch(calls: list):
+        async def fetch(start, end):
+            calls.append((start, end))
+            await asyncio.sleep(0.01)
+            return [dict(a) for a in RAW_ACTIVITIES]
+        return fetch
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_calls_share_one_fetch(self):
+        """A burst of identical requests costs one fetch."""
+        client = ActivityWatchClient()
+        calls = []
+        client._fetch_activities = self._slow_fetch(calls)
+
+        results = await asyncio.gather(*[
+            client.get_activities(DAY_START, DAY_END) for _ in range(5)
+        ])
+
+        assert len(calls) == 1
+        assert all(r == RAW_ACTIVITIES for r in results)
+        # Callers get their own copies
+        results[0][0]["duration"] = 0
+        assert results[1][0]["duration"] == 600
+
+    @pytest.mark.asyncio
+    async def test_past_ranges_are_cached(self):
+        """Ranges that already ended are served from the TTL cache."""
+        client = ActivityWatchClient()
+        calls = []
+        client._fetch_activities = self._slow_fetch(calls)
+
+        await client.get_activities(DAY_START, DAY_END)
+        await client.get_activities(DAY_START, DAY_END)
+
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_open_ranges_are_not_cached(self):
+        """Ranges ending in the future are refetched once the flight lands."""
+        client = ActivityWatchClient()
+        calls = []
+        client._fetch_activities = self._slow_fetch(calls)
+        end = datetime.now() + timedelta(hours=1)
+
+        await client.get_activities(DAY_START, end)
+        await client.get_activities(DAY_START, end)
+
+        assert len(calls) == 2
@@ -0,0 +1,499 @@
+"""
+Deep work calculator tests for Productify Pro.
+Tests cover: sweep-line focus block detection parity with the original
+per-meeting scan, metric outputs built from a single pass, incremental
+scoring of today from ingested activities, the nightly batch job, and
+team member breakdowns computed in a constant number of queries.
+"""
+import json
+import pytest
+import random
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.activity import Activity
+from app.models.calendar import DeepWorkScore
+from app.models.team import Team, TeamMember, TeamRole
+from app.models.user import User
+from app.services.deepwork_batch_service import DeepWorkBatchService
+from app.services.deepwork_service import DeepWorkCalculator, FocusSweep, StreamingDeepWorkScorer, streaming_scorer
+from app.services.team_deepwork_service import TeamDeepWorkService
+
+
+DAY = datetime(2026, 3, 2)
+
+
+def make_activity(start: datetime, minutes: int, score: float, app: str = "Code"):
+    return SimpleNamespace(
+        start_time=start,
+        end_time=start + timedelta(minutes=minutes),
+        duration=minutes * 60,
+        productivity_score=score,
+        app_name=app,
+    )
+
+
+def make_meeting(start: datetime, minutes: int):
+    return SimpleNamespace(
+        start_time=start,
+        end_time=start + timedelta(minutes=minutes),
+        duration_minutes=minutes,
+    )
+
+
+def random_day(seed: int):
+    rng = random.Random(seed)
+    activities, meetings = [], []
+    cursor = DAY.replace(hour=8)
+    for _ in range(rng.randint(0, 120)):
+        minutes = rng.randint(0, 45)
+        score = rng.choice([0.0, 0.2, 0.45, 0.6, 0.8, 0.95, None])
+        activities.append(make_activity(cursor, minutes, score, rng.choice(["Code", "Slack", "Chrome"])))
+        cursor += timedelta(minutes=minutes + rng.randint(0, 10))
+    for _ in range(rng.randint(0, 8)):
+        start = DAY.replace(hour=rng.randint(8, 17), minute=rng.choice([0, 15, 30, 45]))
+        meetings.append(make_meeting(start, rng.choice([15, 30, 60, 90])))
+    return activities, meetings
+
+
+# Reference implementation: the original O(A x M) scan, kept to prove parity.
+def reference_focus_blocks(activities, meetings):
+    if not activities:
+        return []
+    interruptions = [{"start": m.start_time, "end": m.end_time} for m in meetings]
+    blocks, block_start, block_minutes = [], None, 0
+    for activity in sorted(activities, key=lambda a: a.start_time):
+        is_productive = (activity.productivity_score or 0.5) >= 0.6
+        during_meeting = any(i["start"] <= activity.start_time < i["end"] for i in interruptions)
+        if is_productive and not during_meeting:
+            if block_start is None:
+                block_start = activity.start_time
+            block_minutes += (activity.duration or 0) // 60
+        else:
+            if block_minutes >= 30:
+                blocks.append({"start_time": block_start, "duration_minutes": block_minutes})
+            block_start, block_minutes = None, 0
+    if block_minutes >= 30:
+        blocks.append({"start_time": block_start, "duration_minutes": block_minutes})
+    return blocks
+
+
+def reference_best_hour(activities):
+    hourly = defaultdict(list)
+    for a in activities:
+        hourly[a.start_time.hour].append(a.productivity_score or 0.5)
+    if not hourly:
+        return None
+    avg = {h: sum(s) / len(s) for h, s in hourly.items()}
+    return max(avg, key=avg.get)
+
+
+def reference_metrics(activities, meetings):
+    """Original _calculate_metrics inputs, computed the pre-sweep way."""
+    context_switches, prev_app = 0, None
+    productive = neutral = distracting = total = 0
+    for a in activities:
+        minutes = (a.duration or 0) // 60
+        total += minutes
+        score = a.productivity_score or 0.5
+        if score >= 0.6:
+            productive += minutes
+        elif score >= 0.4:
+            neutral += minutes
+        else:
+            distracting += minutes
+        if prev_app and a.app_name != prev_app:
+            context_switches += 1
+        prev_app = a.app_name
+    return {
+        "total_tracked_minutes": total,
+        "productive_minutes": productive,
+        "neutral_minutes": neutral,
+        "distracting_minutes": distracting,
+        "context_switches": context_switches,
+    }
+
+
+@pytest.fixture
+def calculator() -> DeepWorkCalculator:
+    return DeepWorkCalculator()
+
+
+class TestFocusSweepParity:
+    """The sweep-line pass must match the original per-meeting scan."""
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_focus_blocks_match_reference(self, calculator: DeepWorkCalculator, seed: int):
+        activities, meetings = random_day(seed)
+        assert calculator._identify_focus_blocks(activities, meetings) == \
+            reference_focus_blocks(activities, meetings)
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_metrics_match_reference(self, calculator: DeepWorkCalculator, seed: int):
+        activities, meetings = random_day(seed)
+        metrics = calculator._calculate_metrics(activities, meetings, DAY, DAY + timedelta(days=1))
+        if not activities:
+            return
+
+        for key, value in reference_metrics(activities, meetings).items():
+            assert metrics[key] == value, key
+
+        blocks = reference_focus_blocks(activities, meetings)
+        assert metrics["focus_blocks_count"] == len(blocks)
+        assert metrics["deep_work_minutes"] == sum(b["duration_minutes"] for b in blocks)
+        assert metrics["best_focus_hour"] == reference_best_hour(activities)
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_fragmentation_reuses_sweep_blocks(self, calculator: DeepWorkCalculator, seed: int):
+        activities, meetings = random_day(seed)
+        blocks = reference_focus_blocks(activities, meetings)
+        shared = calculator._calculate_fragmentation(activities, meetings, 5, blocks)
+        recomputed = calculator._calculate_fragmentation(activities, meetings, 5)
+        assert shared == recomputed
+
+
+class TestFocusSweep:
+    """Behavioural checks for the sweep accumulator."""
+
+    def test_meeting_breaks_focus_block(self):
+        meetings = [make_meeting(DAY.replace(hour=10), 30)]
+        sweep = FocusSweep(meetings, productive_threshold=0.6, min_block_minutes=30)
+        sweep.add(make_activity(DAY.replace(hour=9), 40, 0.9))
+        sweep.add(make_activity(DAY.replace(hour=10, minute=5), 20, 0.9))
+        sweep.add(make_activity(DAY.replace(hour=10, minute=30), 45, 0.9))
+
+        assert [b["duration_minutes"] for b in sweep.blocks()] == [40, 45]
+        assert sweep.meeting_overlap_minutes == 20
+
+    def test_meeting_end_is_exclusive(self):
+        meetings = [make_meeting(DAY.replace(hour=9), 30)]
+        sweep = FocusSweep(meetings, productive_threshold=0.6, min_block_minutes=30)
+        sweep.add(make_activity(DAY.replace(hour=9, minute=30), 30, 0.9))
+
+        assert sweep.meeting_overlap_minutes == 0
+        assert sweep.blocks()[0]["start_time"] == DAY.replace(hour=9, minute=30)
+
+    def test_open_block_reported_without_closing(self):
+        sweep = FocusSweep([], productive_threshold=0.6, min_block_minutes=30)
+        sweep.add(make_activity(DAY.replace(hour=9), 35, 0.9))
+
+        assert len(sweep.blocks()) == 1
+        assert sweep.focus_blocks == []
+
+
+def db_activity(user_id: int, start: datetime, minutes: int, score: float, app: str = "Code") -> Activity:
+    return Activity(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        app_name=app,
+        window_title=app,
+        start_time=start,
+        end_time=start + timedelta(minutes=minutes),
+        duration=minutes * 60,
+        productivity_score=score,
+    )
+
+
+class TestStreamingScorer:
+    """Today's score is kept up to date from ingestion without recomputing."""
+
+    SCORE_FIELDS = [
+        "deep_work_score", "deep_work_minutes", "total_tracked_minutes",
+        "context_switches", "focus_blocks_count", "longest_focus_block_minutes",
+        "productive_minutes", "neutral_minutes", "distracting_minutes",
+        "fragmentation_score", "best_focus_hour",
+    ]
+
+    @staticmethod
+    def _today(hour: int, minute: int = 0) -> datetime:
+        return datetime.combine(date.today(), datetime.min.time()).replace(hour=hour, minute=minute)
+
+    @pytest.mark.asyncio
+    async def test_incremental_matches_full_recompute(self, db_session: AsyncSession, test_user: User):
+        scorer = StreamingDeepWorkScorer(DeepWorkCalculator())
+        db_session.add(db_activity(test_user.id, self._today(0, 5), 40, 0.9))
+        await db_session.commit()
+
+        await scorer.get_today_score(db_session, test_user.id)
+
+        for i, (minutes, score, app) in enumerate([(50, 0.8, "Code"), (10, 0.2, "Slack"), (35, 0.7, "Code")]):
+            activity = db_activity(test_user.id, self._today(1, i * 15), minutes, score, app)
+            db_session.add(activity)
+            await db_session.commit()
+            await scorer.record_activity(activity)
+
+        scorer.calculator._get_activities = None  # incremental reads must not query activities
+        streamed = await scorer.get_today_score(db_session, test_user.id)
+
+        full = await DeepWorkCalculator().calculate_daily_score(db_session, test_user.id, date.today())
+        for field in self.SCORE_FIELDS:
+            assert getattr(streamed, field) == getattr(full, field), field
+
+    @pytest.mark.asyncio
+    async def test_out_of_order_activity_forces_recompute(
+        self, db_session: AsyncSession, test_user: User, realtime_backend
+    ):
+        scorer = StreamingDeepWorkScorer(DeepWorkCalculator())
+        db_session.add(db_activity(test_user.id, self._today(2), 40, 0.9))
+        await db_session.commit()
+        await scorer.get_today_score(db_session, test_user.id)
+
+        late = db_activity(test_user.id, self._today(1), 45, 0.9)
+        db_session.add(late)
+        await db_session.commit()
+        await scorer.record_activity(late)
+
+        assert (await realtime_backend.get(f"deepwork:{test_user.id}:{date.today()}"))["stale"]
+        score = await scorer.get_today_score(db_session, test_user.id)
+        assert score.total_tracked_minutes == 85
+        assert score.focus_blocks_count == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_drops_state(self, db_session: AsyncSession, test_user: User, realtime_backend):
+        scorer = StreamingDeepWorkScorer(DeepWorkCalculator())
+        await scorer.get_today_score(db_session, test_user.id)
+
+        await scorer.invalidate(test_user.id)
+
+        assert await realtime_backend.get(f"deepwork:{test_user.id}:{date.today()}") is None
+
+    @pytest.mark.asyncio
+    async def test_state_is_shared_between_workers(self, db_session: AsyncSession, test_user: User):
+        """Ingestion and invalidation on one worker show up in reads on another."""
+        reader, ingester = StreamingDeepWorkScorer(DeepWorkCalculator()), StreamingDeepWorkScorer(DeepWorkCalculator())
+        await reader.get_today_score(db_session, test_user.id)
+
+        activity = db_activity(test_user.id, self._today(1), 40, 0.9)
+        db_session.add(activity)
+        await db_session.commit()
+        await ingester.record_activity(activity)
+
+        assert (await reader.get_today_score(db_session, test_user.id)).total_tracked_minutes == 40
+
+        db_session.add(db_activity(test_user.id, self._today(2), 20, 0.9))
+        await db_session.commit()
+        await ingester.invalidate(test_user.id)  # e.g. a calendar sync on another worker
+
+        assert (await reader.get_today_score(db_session, test_user.id)).total_tracked_minutes == 60
+
+    @pytest.mark.asyncio
+    async def test_ingest_during_seed_is_not_lost(self, db_session: AsyncSession, test_user: User):
+        """An activity the seed's query missed makes it seed again rather than drop it."""
+        scorer = StreamingDeepWorkScorer(DeepWorkCalculator())
+        get_activities = scorer.calculator._get_activities
+        queries = []
+
+        async def racing_query(db, user_id, start, end):
+            activities = await get_activities(db, user_id, start, end)
+            queries.append(len(activities))
+            if len(queries) == 1:
+                # Committed and ingested right after the query read the table
+                activity = db_activity(test_user.id, self._today(1), 40, 0.9)
+                db_session.add(activity)
+                await db_session.commit()
+                await scorer.record_activity(activity)
+            return activities
+
+        scorer.calculator._get_activities = racing_query
+        score = await scorer.get_today_score(db_session, test_user.id)
+
+        assert queries == [0, 1]
+        assert score.total_tracked_minutes == 40
+        assert (await scorer.get_today_score(db_session, test_user.id)).total_tracked_minutes == 40
+
+    @pytest.mark.asyncio
+    async def test_activity_already_seeded_is_not_counted_twice(
+        self, db_session: AsyncSession, test_user: User
+    ):
+        """Committed before the seed's query but recorded after it: added once."""
+        scorer = StreamingDeepWorkScorer(DeepWorkCalculator())
+        activity = db_activity(test_user.id, self._today(1), 40, 0.9)
+        db_session.add(activity)
+        await db_session.commit()
+
+        await scorer.get_today_score(db_session, test_user.id)
+        await scorer.record_activity(activity)
+
+        assert (await scorer.get_today_score(db_session, test_user.id)).total_tracked_minutes == 40
+
+    @pytest.mark.asyncio
+    async def test_browser_activity_is_scored(
+        self, db_session: AsyncSession, test_user: User, authenticated_client
+    ):
+        """Browser extension ingestion feeds today's score like the other paths."""
+        await streaming_scorer.get_today_score(db_session, test_user.id)
+
+        response = await authenticated_client.post("/api/activities/browser", json={
+            "url": "https://docs.python.org/3/",
+            "title": "Python docs",
+            "duration": 40 * 60,
+            "timestamp": self._today(1).isoformat(),
+        })
+        assert response.status_code == 200
+
+        score = await streaming_scorer.get_today_score(db_session, test_user.id)
+        assert score.total_tracked_minutes == 40
+
+    def test_sweep_round_trips_through_json(self):
+        sweep = FocusSweep([make_meeting(DAY.replace(hour=10), 30)], productive_threshold=0.6, min_block_minutes=30)
+        sweep.add(make_activity(DAY.replace(hour=9), 45, 0.9))
+        sweep.add(make_activity(DAY.replace(hour=10, minute=5), 10, 0.9, app="Zoom"))
+
+        resumed = FocusSweep.from_dict(json.loads(json.dumps(sweep.to_dict())))
+        for later in (sweep, resumed):
+            later.add(make_activity(DAY.replace(hour=11), 40, 0.8))
+
+        assert resumed.to_dict() == sweep.to_dict()
+        assert resumed.blocks() == sweep.blocks()
+
+
+class TestDeepWorkBatch:
+    """Nightly recomputation across all users."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("workers", [0, 2])
+    async def test_batch_matches_per_user_calculation(
+        self,
+        db_session: AsyncSession,
+        test_user: User,
+        test_user_premium: User,
+        test_user_admin: User,
+        workers: int,
+    ):
+        yesterday = date.today() - timedelta(days=1)
+        base = datetime.combine(yesterday, datetime.min.time())
+        for user in (test_user, test_user_premium):
+            for i, (minutes, score, app) in enumerate([(45, 0.9, "Code"), (20, 0.3, "Slack"), (60, 0.8, "Code")]):
+                db_session.add(db_activity(user.id, base.replace(hour=9) + timedelta(minutes=70 * i), minutes, score, app))
+        await db_session.commit()
+
+        batch = DeepWorkBatchService()
+        batch.max_workers = workers
+        batch.chunk_size = 1
+        stats = await batch.recompute_day(db_session, yesterday)
+
+        assert stats["scored"] == 2
+        assert stats["skipped"] == 1  # admin has no data for the day
+        assert stats["chunks"] == 3
+        assert stats["errors"] == []
+
+        calculator = DeepWorkCalculator()
+        for user in (test_user, test_user_premium):
+            stored = await calculator.get_score_for_date(db_session, user.id, yesterday)
+            activities = await calculator._get_activities(
+                db_session, user.id, base, datetime.combine(yesterday, datetime.max.time())
+            )
+            expected = calculator._calculate_metrics(activities, [], None, None)
+            for field in TestStreamingScorer.SCORE_FIELDS:
+                assert getattr(stored, field) == expected[field], field
+
+        assert await calculator.get_score_for_date(db_session, test_user_admin.id, yesterday) is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_batches_keep_one_row_per_day(
+        self, db_session: AsyncSession, test_user: User, test_user_premium: User
+    ):
+        """A worker whose lookup missed another worker's rows updates them instead."""
+        yesterday = date.today() - timedelta(days=1)
+        base = datetime.combine(yesterday, datetime.min.time())
+        user_ids = sorted([test_user.id, test_user_premium.id])
+        for user_id in user_ids:
+            db_session.add(db_activity(user_id, base.replace(hour=9), 45, 0.9, "Code"))
+        await db_session.commit()
+
+        first = DeepWorkBatchService()
+        first.max_workers = 0
+        await first.recompute_day(db_session, yesterday)
+
+        second = DeepWorkBatchService()
+        second.max_workers = 0
+        real_lookup = second._existing_scores
+        lookups = []
+
+        async def stale_lookup(db, user_ids, target_date):
+            lookups.append(user_ids)
+            # The first lookup ran before the other worker committed
+            return {} if len(lookups) == 1 else await real_lookup(db, user_ids, target_date)
+
+        second._existing_scores = stale_lookup
+        stats = await second.recompute_day(db_session, yesterday)
+
+        assert stats["errors"] == []
+        assert stats["scored"] == 2
+        assert len(lookups) == 2
+        result = await db_session.execute(select(DeepWorkScore.user_id))
+        assert sorted(result.scalars().all()) == user_ids
+
+
+class TestTeamMemberBreakdown:
+    """Team member aggregates come from one grouped query, not one per member."""
+
+    @staticmethod
+    async def _make_team(db: AsyncSession, size: int) -> Team:
+        slug = f"team-{uuid.uuid4().hex[:8]}"
+        team = Team(name="Platform", slug=slug)
+        db.add(team)
+        await db.flush()
+
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        for i in range(size):
+            user = User(email=f"member{i}@{slug}.example.com", name=f"Member {i}", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            db.add(TeamMember(team_id=team.id, user_id=user.id, role=TeamRole.MEMBER))
+            # Member i has a score for each of the last i days; member 0 has none
+            for day in range(i):
+                db.add(DeepWorkScore(
+                    user_id=user.id,
+                    date=today - timedelta(days=day),
+                    deep_work_score=40 + 10 * day,
+                    deep_work_minutes=60 + i,
+                    meeting_load_percent=12.5 * day,
+                ))
+        await db.commit()
+        return team
+
+    @pytest.mark.asyncio
+    async def test_breakdown_averages(self, db_session: AsyncSession):
+        team = await self._make_team(db_session, 4)
+
+        members = await TeamDeepWorkService(db_session)._get_member_breakdown(team.id, 7)
+
+        by_name = {m["name"]: m for m in members}
+        assert by_name["Member 0"]["avg_score"] == 0
+        assert by_name["Member 0"]["avg_deep_work_minutes"] == 0
+        assert by_name["Member 3"]["avg_score"] == 50.0
+        assert by_name["Member 3"]["avg_deep_work_minutes"] == 63
+        assert by_name["Member 3"]["avg_meeting_load"] == 12.5
+        assert by_name["Member 3"]["role"] == "member"
+        assert [m["avg_score"] for m in members] == sorted(
+            (m["avg_score"] for m in members), reverse=True
+        )
+
+    @pytest.mark.asyncio
+    async def test_query_count_independent_of_team_size(self, db_session: AsyncSession):
+        small = await self._make_team(db_session, 2)
+        large = await self._make_team(db_session, 12)
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            service = TeamDeepWorkService(db_session)
+            await service._get_member_breakdown(small.id, 7)
+            small_count = len(statements)
+            await service._get_member_breakdown(large.id, 7)
+            large_count = len(statements) - small_count
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert small_count == large_count == 1
@@ -0,0 +1,403 @@
+"""
+Realtime activity tests for Productify Pro.
+Tests cover: authenticated per-user /ws/activities channels, ingestion
+publishing only the fields that changed, queued fan-out with slow
+consumer handling, delivery and shared state across workers, and the
+Server-Sent Events stream with its running totals.
+"""
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import main
+from app.api.routes import activities as activity_routes
+from app.models.activity import Activity
+from app.models.user import User
+from app.services import activity_events as events_module
+from app.services.activity_events import ActivityEventService, diff_activity
+from app.services.auth_service import create_access_token
+from app.services.connection_manager import ConnectionManager
+from app.services import live_totals as totals_module
+from app.services.live_totals import LiveTotalsService
+
+
+class FakeSocket:
+    """Records what the server sends; a stalled socket never finishes a send"""
+
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.texts = []
+        self.stalled = stalled
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.texts.append(text)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def flush():
+    """Let writer tasks drain their queues"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def realtime(monkeypatch):
+    """Fresh connection manager and event service wired into the app"""
+    manager = ConnectionManager()
+    events = ActivityEventService()
+    monkeypatch.setattr(events_module, "manager", manager)
+    monkeypatch.setattr(activity_routes, "activity_events", events)
+    monkeypatch.setattr(main, "manager", manager)
+    monkeypatch.setattr(main, "activity_events", events)
+    monkeypatch.setattr(totals_module, "manager", manager)
+    return manager, events
+
+
+def native_payload(**fields):
+    return {
+        "app_name": "Code",
+        "window_title": "main.py",
+        "timestamp": datetime.now().isoformat(),
+        **fields,
+    }
+
+
+class TestActivityChannel:
+    """Tests for the per-user /ws/activities channel."""
+
+    def test_socket_requires_token(self, realtime):
+        """Connections without a valid token are refused."""
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with TestClient(main.app).websocket_connect("/ws/activities"):
+                pass
+        assert exc.value.code == 1008
+
+        with pytest.raises(WebSocketDisconnect):
+            with TestClient(main.app).websocket_connect("/ws/activities?token=not-a-jwt"):
+                pass
+
+    def test_socket_gets_snapshot_then_pongs(self, realtime, realtime_backend):
+        """A subscriber first receives the user's current activity."""
+        manager, events = realtime
+        asyncio.run(realtime_backend.set("activity:42", {"app_name": "Code", "window_title": "main.py"}))
+        token = create_access_token(data={"sub": "42"})
+
+        with TestClient(main.app).websocket_connect(f"/ws/activities?token={token}") as ws:
+            snapshot = ws.receive_json()
+            assert snapshot["type"] == "current_activity"
+            assert snapshot["data"]["app_name"] == "Code"
+
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json()["type"] == "pong"
+
+        assert not manager.active_connections
+
+    @pytest.mark.asyncio
+    async def test_messages_only_reach_their_user(self, realtime):
+        """Each user's changes go to that user's sockets alone."""
+        manager, events = realtime
+        alice, bob = FakeSocket(), FakeSocket()
+        await manager.connect(alice, 1)
+        await manager.connect(bob, 2)
+
+        await events.publish(1, "Code", "main.py")
+        await flush()
+
+        assert [m["type"] for m in alice.sent] == ["current_activity"]
+        assert bob.sent == []
+
+
+class TestActivityDiffs:
+    """Tests for publishing changes from ingestion."""
+
+    def test_diff_activity(self):
+        assert diff_activity({"a": 1, "b": 2}, {"a": 1, "b": 3}) == {"b": 3}
+        assert diff_activity({"a": 1}, {"a": 1}) == {}
+
+    @pytest.mark.asyncio
+    async def test_heartbeats_send_only_changes(
+        self, realtime, authenticated_client: AsyncClient, test_user: User
+    ):
+        """Repeat heartbeats send nothing; a new window sends just what changed."""
+        manager, events = realtime
+        socket = FakeSocket()
+        await manager.connect(socket, test_user.id)
+
+        for payload in (
+            native_payload(),
+            native_payload(),
+            native_payload(window_title="config.py"),
+            native_payload(window_title="config.py", is_idle=True),
+        ):
+            response = await authenticated_client.post("/api/activities/native", json=payload)
+            assert response.status_code == 200
+        await flush()
+
+        first, changed, idle = socket.sent
+        assert first["type"] == "current_activity"
+        assert first["data"]["category"]
+        assert changed["type"] == "activity_diff"
+        assert set(changed["data"]) == {"window_title", "started_at"}
+        assert idle["data"] == {"is_idle": True}
+        assert events.get_stats() == {"published": 3, "suppressed": 1}
+
+    @pytest.mark.asyncio
+    async def test_anonymous_ingestion_publishes_nothing(self, realtime, client: AsyncClient):
+        """Activity without a user has no channel to go to."""
+        manager, events = realtime
+        response = await client.post("/api/activities/native", json=native_payload())
+
+        assert response.status_code == 200
+        assert events.get_stats()["published"] == 0
+
+
+class TestFanOut:
+    """Tests for per-connection send queues."""
+
+    @pytest.mark.asyncio
+    async def test_message_is_serialized_once(self):
+        """Every subscriber is sent the very same text."""
+        manager = ConnectionManager()
+        sockets = [FakeSocket() for _ in range(3)]
+        for socket in sockets:
+            await manager.connect(socket, 1)
+
+        await manager.broadcast({"type": "report_job", "data": {"job_id": "j1"}})
+        await flush()
+
+        texts = [socket.texts[0] for socket in sockets]
+        assert all(text is texts[0] for text in texts)
+        assert manager.get_stats()["sent"] == 3
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_hold_up_others(self):
+        """A stalled socket keeps only its newest messages; others get everything."""
+        manager = ConnectionManager(max_queue=2, policy="drop_oldest")
+        slow, fast = FakeSocket(stalled=True), FakeSocket()
+        await manager.connect(slow, 1)
+        await manager.connect(fast, 1)
+
+        for n in range(5):
+            await manager.send_to_user(1, {"n": n})
+            await flush()
+
+        assert [m["n"] for m in fast.sent] == [0, 1, 2, 3, 4]
+        assert [json.loads(t)["n"] for t in manager.active_connections[slow].queue] == [3, 4]
+        assert manager.get_stats()["dropped"] == 2
+
+    @pytest.mark.asyncio
+    async def test_disconnect_policy_closes_slow_client(self):
+        """With the disconnect policy a full queue drops the connection."""
+        manager = ConnectionManager(max_queue=1, policy="disconnect")
+        slow = FakeSocket(stalled=True)
+        await manager.connect(slow, 1)
+
+        for n in range(3):
+            await manager.send_to_user(1, {"n": n})
+            await flush()
+
+        assert slow not in manager.active_connections
+        assert slow.closed_with == 1013
+        assert manager.get_stats()["slow_disconnects"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stalled_send_times_out(self):
+        """A send that never completes disconnects the client."""
+        manager = ConnectionManager(send_timeout=0.01)
+        slow = FakeSocket(stalled=True)
+        await manager.connect(slow, 1)
+
+        await manager.send_to_user(1, {"n": 0})
+        await asyncio.sleep(0.05)
+
+        assert not manager.active_connections
+        assert slow.closed_with == 1013
+
+
+class TestAcrossWorkers:
+    """Tests for pub/sub and shared state through the realtime backend."""
+
+    @pytest.mark.asyncio
+    async def test_publish_reaches_sockets_on_another_worker(self, realtime_backend, monkeypatch):
+        """Activity ingested on one worker is pushed from the worker holding the socket."""
+        socket_worker, ingest_worker = ConnectionManager(), ConnectionManager()
+        socket = FakeSocket()
+        await socket_worker.connect(socket, 7)
+        monkeypatch.setattr(events_module, "manager", ingest_worker)
+
+        await ActivityEventService().publish(7, "Code", "main.py")
+        # A second worker's service sees the first one's state and sends only the change
+        await ActivityEventService().publish(7, "Code", "tests.py")
+        await ingest_worker.broadcast({"type": "report_job"})
+        await flush()
+
+        assert [m["type"] for m in socket.sent] == ["current_activity", "activity_diff", "report_job"]
+        assert set(socket.sent[1]["data"]) == {"window_title", "started_at"}
+
+    @pytest.mark.asyncio
+    async def test_channel_is_dropped_with_last_socket(self, realtime_backend):
+        """A worker stops listening for a user once their last socket closes."""
+        manager = ConnectionManager()
+        first, second = FakeSocket(), FakeSocket()
+        await manager.connect(first, 7)
+        await manager.connect(second, 7)
+
+        manager.disconnect(first)
+        await flush()
+        assert "ws:user:7" in realtime_backend._handlers
+        manager.disconnect(second)
+        await flush()
+        assert "ws:user:7" not in realtime_backend._handlers
+
+    @pytest.mark.asyncio
+    async def test_tracking_and_native_state_are_shared(self, client: AsyncClient):
+        """Live endpoints read the backend, not one worker's memory."""
+        response = await client.post("/api/activities/toggle-tracking", json={"tracking": False})
+        assert response.json()["tracking"] is False
+        await client.post("/api/activities/native", json=native_payload())
+
+        status = (await client.get("/api/activities/native/status")).json()
+        assert status["is_tracking"] is False
+        assert status["has_current"] is True
+        assert status["history_count"] == 1
+
+        await client.post("/api/activities/toggle-tracking", json={"tracking": True})
+
+
+class TestLiveStream:
+    """Tests for /api/activities/stream and the running totals behind it."""
+
+    @pytest.mark.asyncio
+    async def test_totals_seed_from_database(self, db_session, test_user: User):
+        """The first read adds up today's and this week's activity."""
+        now = datetime.now()
+        for duration, productive in ((600, True), (300, False)):
+            db_session.add(Activity(
+                user_id=test_user.id, app_name="Code", window_title="main.py",
+                start_time=now, end_time=now + timedelta(seconds=duration),
+                duration=duration, is_productive=productive,
+            ))
+        await db_session.commit()
+
+        totals = await LiveTotalsService().get_totals(db_session, test_user.id)
+
+        assert totals["today_total"] == 900
+        assert totals["today_productive"] == 600
+        assert totals["productivity"] == 67
+        assert totals["week_total"] >= 900
+
+    @pytest.mark.asyncio
+    async def test_ingestion_pushes_changed_totals(self, realtime, db_session, test_user: User):
+        """New activity updates the totals without a query and sends only what changed."""
+        manager, events = realtime
+        service = LiveTotalsService()
+        socket = FakeSocket()
+        await manager.connect(socket, test_user.id)
+        await service.get_totals(db_session, test_user.id)
+
+        now = datetime.now()
+        await service.record_activity(Activity(
+            user_id=test_user.id, start_time=now, duration=60, is_productive=False,
+        ))
+        await flush()
+
+        update = socket.sent[0]
+        assert update["type"] == "totals"
+        assert update["data"] == {"today_total": 60, "week_total": 60}
+        assert (await service.cached_totals(test_user.id))["today_total"] == 60
+
+    @pytest.mark.asyncio
+    async def test_concurrent_ingests_are_not_lost(self, realtime, db_session, test_user: User):
+        """Workers adding at the same time each keep the other's addition."""
+        workers = [LiveTotalsService(), LiveTotalsService()]
+        await workers[0].get_totals(db_session, test_user.id)
+
+        now = datetime.now()
+        await asyncio.gather(*(
+            workers[n % 2].record_activity(Activity(user_id=test_user.id, start_time=now, duration=10))
+            for n in range(20)
+        ))
+
+        assert (await workers[1].cached_totals(test_user.id))["today_total"] == 200
+
+    @pytest.mark.asyncio
+    async def test_ingest_during_seed_is_not_overwritten(self, realtime, db_session, test_user: User):
+        """An activity the seed's query missed makes it seed again rather than drop it."""
+        service = LiveTotalsService()
+        query_totals = service._query_totals
+        now = datetime.now()
+        queries = []
+
+        async def racing_query(db, user_id):
+            totals = await query_totals(db, user_id)
+            queries.append(totals)
+            if len(queries) == 1:
+                # Committed and ingested right after the query read the table
+                activity = Activity(
+                    user_id=user_id, app_name="Code", window_title="main.py",
+                    start_time=now, end_time=now + timedelta(seconds=30), duration=30,
+                )
+                db_session.add(activity)
+                await db_session.commit()
+                await service.record_activity(activity)
+            return totals
+
+        service._query_totals = racing_query
+        totals = await service.get_totals(db_session, test_user.id)
+
+        assert [q["today_total"] for q in queries] == [0, 30]
+        assert totals["today_total"] == 30
+        assert (await service.cached_totals(test_user.id))["today_total"] == 30
+
+    @pytest.mark.asyncio
+    async def test_unseeded_user_is_left_alone(self, realtime):
+        """Nobody is watching, so ingestion does no totals work."""
+        service = LiveTotalsService()
+        await service.record_activity(Activity(user_id=5, start_time=datetime.now(), duration=60))
+
+        assert await service.cached_totals(5) is None
+        assert service.get_stats()["updates"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_snapshot_then_deltas(self, realtime, realtime_backend):
+        """Snapshot first, then each published change as its own event."""
+        manager, events = realtime
+        service = LiveTotalsService()
+
+        async def snapshot():
+            return {"stats": {"today_total": 0}}
+
+        stream = service.stream(3, snapshot)
+        first = await stream.__anext__()
+        assert first.startswith("event: snapshot\n")
+
+        await events.publish(3, "Code", "main.py")
+        frame = await stream.__anext__()
+        event, data = frame.strip().split("\n")
+        assert event == "event: current_activity"
+        assert json.loads(data[len("data: "):])["data"]["app_name"] == "Code"
+
+        await stream.aclose()
+        assert "ws:user:3" not in realtime_backend._handlers
+
+    @pytest.mark.asyncio
+    async def test_stream_requires_auth(self, client: AsyncClient):
+        """EventSource clients without a valid token are refused."""
+        response = await client.get("/api/activities/stream")
+        assert response.status_code == 401
+
+        response = await client.get("/api/activities/stream?token=not-a-jwt")
+        assert response.status_code == 401
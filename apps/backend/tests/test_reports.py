@@ -0,0 +1,554 @@
+"""
+Report aggregation tests for Productify Pro.
+Tests cover: team report aggregation parity with per-member reports,
+single-pass daily stats, query counts that do not grow with team size
+or period length, PDF rendering in the worker pool, background report jobs
+with weekly pre-generation, and the content-addressed PDF cache.
+"""
+import asyncio
+import os
+import pickle
+import pytest
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.activity import Activity
+from app.models.calendar import CalendarEvent, DeepWorkScore
+from app.models.team import Team, TeamMember, TeamRole
+from app.models.user import User
+from app.services.report_cache import PIN_TIMEOUT_SECONDS, ReportPdfCache, report_pdf_cache
+from app.services.report_job_service import ReportJobService, last_week_window, report_job_service
+from app.services.report_renderer import ReportRenderer, report_renderer
+from app.services.report_service import ReportData, ReportDataAggregator, ReportPeriod, TeamReportAggregator
+
+
+END = datetime(2026, 3, 9, 18, 0)
+START = END - timedelta(days=7)
+
+
+async def seed_user(db: AsyncSession, index: int) -> User:
+    user = User(email=f"report{index}-{uuid.uuid4().hex[:6]}@example.com", name=f"Reporter {index}", hashed_password="x")
+    db.add(user)
+    await db.flush()
+
+    for day in range(8):
+        base = START.replace(hour=9) + timedelta(days=day)
+        for slot, (minutes, productive, category) in enumerate([
+            (50 + index, True, "Development"),
+            (15, False, "Communication"),
+            (30, day % 2 == 0, "Design"),
+        ]):
+            start = base + timedelta(minutes=70 * slot)
+            db.add(Activity(
+                id=str(uuid.uuid4()), user_id=user.id, app_name="Code", window_title="work",
+                start_time=start, end_time=start + timedelta(minutes=minutes),
+                duration=minutes * 60, is_productive=productive, category=category,
+            ))
+        meeting_start = base.replace(hour=14)
+        db.add(CalendarEvent(
+            user_id=user.id, calendar_connection_id="conn", provider_event_id=str(uuid.uuid4()),
+            title="Sync", start_time=meeting_start, end_time=meeting_start + timedelta(minutes=30),
+            duration_minutes=30, is_focus_time=(day == 3), is_organizer=False,
+        ))
+        db.add(DeepWorkScore(
+            user_id=user.id, date=base.replace(hour=0),
+            deep_work_score=30 + 7 * day + index, longest_focus_block_minutes=50,
+        ))
+    await db.commit()
+    return user
+
+
+@contextmanager
+def record_statements(db: AsyncSession):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+class TestTeamReportAggregator:
+    """Team reports are built from grouped queries."""
+
+    @pytest.mark.asyncio
+    async def test_member_stats_match_individual_reports(self, db_session: AsyncSession):
+        users = [await seed_user(db_session, i) for i in range(3)]
+
+        team_stats = await TeamReportAggregator(db_session).get_member_stats(
+            [u.id for u in users], START, END
+        )
+
+        individual = ReportDataAggregator(db_session)
+        for user in users:
+            data = await individual.get_report_data(user.id, ReportPeriod.WEEKLY, START, END)
+            stats = team_stats[user.id]
+            assert stats["deep_work_score"] == data.deep_work_score
+            assert stats["productive_hours"] == pytest.approx(data.productive_hours)
+            assert stats["meeting_hours"] == pytest.approx(data.meeting_hours)
+            assert stats["total_hours"] == pytest.approx(data.total_tracked_hours)
+            assert stats["productivity_percentage"] == pytest.approx(data.productivity_percentage)
+
+    @pytest.mark.asyncio
+    async def test_categories_and_daily_totals(self, db_session: AsyncSession):
+        users = [await seed_user(db_session, i) for i in range(2)]
+        aggregator = TeamReportAggregator(db_session)
+
+        categories = await aggregator.get_category_breakdown([u.id for u in users], START, END)
+        daily = await aggregator.get_daily_stats([u.id for u in users], START, END)
+
+        assert [c["category"] for c in categories] == ["Development", "Design", "Communication"]
+        assert sum(c["percentage"] for c in categories) == pytest.approx(100)
+        # The first seeded day starts before the 18:00 period start
+        assert [d["date"] for d in daily] == [f"2026-03-0{d}" for d in range(3, 10)]
+        assert daily[0]["meeting_hours"] == pytest.approx(1.0)
+        assert daily[2]["meeting_hours"] == 0  # focus time is not a meeting
+        assert sum(d["total_hours"] for d in daily) == pytest.approx(
+            sum(c["hours"] for c in categories)
+        )
+
+    @pytest.mark.asyncio
+    async def test_query_count_independent_of_team_size(self, db_session: AsyncSession):
+        small = [await seed_user(db_session, i) for i in range(1)]
+        large = [await seed_user(db_session, i) for i in range(1, 6)]
+        aggregator = TeamReportAggregator(db_session)
+        prev_end = START - timedelta(days=1)
+
+        counts = []
+        for users in (small, large):
+            with record_statements(db_session) as statements:
+                await aggregator.get_team_data(
+                    [u.id for u in users], START, END, prev_end - timedelta(days=7), prev_end
+                )
+            counts.append(len(statements))
+
+        assert counts[0] == counts[1] == 9
+
+    @pytest.mark.asyncio
+    async def test_team_preview_endpoint(self, authenticated_client, db_session: AsyncSession, test_user: User):
+        members = [await seed_user(db_session, i) for i in range(2)]
+        team = Team(name="Reports", slug=f"reports-{uuid.uuid4().hex[:6]}", owner_id=test_user.id)
+        db_session.add(team)
+        await db_session.flush()
+        db_session.add(TeamMember(team_id=team.id, user_id=test_user.id, role=TeamRole.OWNER))
+        for user in members:
+            db_session.add(TeamMember(team_id=team.id, user_id=user.id, role=TeamRole.MEMBER))
+        await db_session.commit()
+
+        response = await authenticated_client.get(
+            f"/api/reports/team/{team.id}/preview",
+            params={"start_date": START.isoformat(), "end_date": END.isoformat()},
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["member_count"] == 3
+        assert len(body["daily_stats"]) == 7
+        assert body["category_breakdown"][0]["category"] == "Development"
+        assert body["top_performers"][0]["user_id"] in {u.id for u in members}
+
+
+class TestDailyStats:
+    """Individual report daily stats are built from one query per table."""
+
+    @pytest.mark.asyncio
+    async def test_daily_stats_windows_and_query_count(self, db_session: AsyncSession):
+        user = await seed_user(db_session, 0)
+        aggregator = ReportDataAggregator(db_session)
+
+        with record_statements(db_session) as statements:
+            daily = await aggregator._calculate_daily_stats(user.id, START, END)
+
+        assert len(statements) == 2
+        # Windows run 18:00 to 18:00, so each holds the next morning's work
+        assert [d["date"] for d in daily] == [
+            (START + timedelta(days=i)).isoformat() for i in range(8)
+        ]
+        assert daily[0]["total_hours"] == pytest.approx(95 / 60)
+        assert daily[0]["productive_hours"] == pytest.approx(50 / 60)
+        assert daily[0]["meeting_hours"] == pytest.approx(0.5)
+        assert daily[2]["meeting_hours"] == 0  # focus time is not a meeting
+        assert daily[7]["total_hours"] == 0
+
+
+def sample_report_data() -> ReportData:
+    return ReportData(
+        user_name="Reporter", user_email="reporter@example.com",
+        period=ReportPeriod.WEEKLY, start_date=START, end_date=END,
+        total_tracked_hours=30.5, productive_hours=21.0, meeting_hours=6.0,
+        deep_work_score=64, productivity_percentage=68.9,
+        score_trend=2.5, productivity_trend=-1.0,
+        daily_stats=[
+            {"date": (START + timedelta(days=i)).isoformat(), "day_name": "Monday",
+             "productive_hours": 3.0, "meeting_hours": 1.0, "total_hours": 4.5}
+            for i in range(7)
+        ],
+        category_breakdown=[{"category": "Development", "hours": 20.0, "percentage": 65.6}],
+        top_apps=[{"name": "Code", "hours": 18.0, "is_productive": True}],
+        top_websites=[],
+        focus_blocks=[{"duration": 95, "date": START.isoformat()}],
+        meeting_count=8, avg_meeting_duration=45.0, meetings_organized=2,
+        insights=["Strong week."], recommendations=["Keep mornings free."],
+    )
+
+
+class TestReportRenderer:
+    """PDFs are rendered off the event loop with timing metrics."""
+
+    def test_report_data_is_picklable(self):
+        data = sample_report_data()
+        assert pickle.loads(pickle.dumps(data)) == data
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("workers", [0, 1])
+    async def test_render_returns_pdf_and_records_timings(self, workers: int):
+        renderer = ReportRenderer(max_workers=workers, max_pending=2)
+        try:
+            results = await asyncio.gather(*[renderer.render(sample_report_data()) for _ in range(3)])
+        finally:
+            renderer.shutdown()
+
+        assert all(pdf.startswith(b"%PDF") for pdf in results)
+        stats = renderer.get_stats()
+        assert stats["rendered"] == 3
+        assert stats["in_flight"] == 0 and stats["waiting"] == 0
+        assert stats["render_ms"]["max"] > 0
+
+
+class TestReportJobs:
+    """Reports can be generated in the background and served from storage."""
+
+    @pytest.fixture
+    def job_service(self, db_session: AsyncSession, tmp_path, monkeypatch) -> ReportJobService:
+        monkeypatch.setattr(report_renderer, "max_workers", 0)
+        monkeypatch.setattr(report_job_service, "session_factory",
+                            async_sessionmaker(db_session.bind, expire_on_commit=False))
+        monkeypatch.setattr(report_job_service, "storage_path", tmp_path)
+        monkeypatch.setattr(report_pdf_cache, "directory", tmp_path / "cache")
+        monkeypatch.setattr(report_pdf_cache, "_entries", None)
+        return report_job_service
+
+    @pytest.mark.asyncio
+    async def test_background_download_produces_stored_pdf(
+        self, authenticated_client, job_service: ReportJobService, test_user: User
+    ):
+        notified = []
+
+        async def listener(job):
+            notified.append((job.id, job.status))
+
+        job_service.add_listener(listener)
+        try:
+            response = await authenticated_client.get(
+                "/api/reports/download", params={"period": "daily", "background": True}
+            )
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+
+            status = await authenticated_client.get(f"/api/reports/jobs/{job_id}")
+            assert status.json()["status"] == "pending"
+
+            await job_service.run_job(job_id)
+        finally:
+            job_service._listeners.remove(listener)
+
+        assert notified == [(job_id, "completed")]
+        status = await authenticated_client.get(f"/api/reports/jobs/{job_id}")
+        assert status.json()["status"] == "completed"
+        artifact = await authenticated_client.get(f"/api/reports/jobs/{job_id}/file")
+        assert artifact.status_code == 200
+        assert artifact.content.startswith(b"%PDF")
+
+    @pytest.mark.asyncio
+    async def test_weekly_pregeneration_serves_download_from_storage(
+        self, authenticated_client, db_session: AsyncSession, job_service: ReportJobService,
+        test_user: User, monkeypatch
+    ):
+        summary = await job_service.pregenerate_weekly()
+        assert summary["queued"] == 1
+
+        jobs = await job_service.list_jobs(db_session, test_user.id)
+        await job_service.run_job(jobs[0].id)
+        db_session.expire_all()  # the worker finished the job in its own session
+
+        async def no_render(data):
+            raise AssertionError("pre-generated report should be served from disk")
+
+        monkeypatch.setattr(report_renderer, "render", no_render)
+        week_start, week_end = last_week_window()
+        params = {"period": "weekly", "start_date": week_start.isoformat(), "end_date": week_end.isoformat()}
+        response = await authenticated_client.get("/api/reports/download", params=params)
+
+        assert response.status_code == 200, response.text
+        assert response.content.startswith(b"%PDF")
+        assert response.headers["content-disposition"].startswith("attachment")
+        assert response.headers["etag"] == f'"{jobs[0].id}"'
+
+        revalidated = await authenticated_client.get(
+            "/api/reports/download", params=params, headers={"If-None-Match": response.headers["etag"]}
+        )
+        assert revalidated.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_pregeneration_queues_each_week_once(
+        self, db_session: AsyncSession, job_service: ReportJobService, test_user: User
+    ):
+        """Every worker's scheduler fires on Monday; only the first queues the week."""
+        other_worker = ReportJobService(session_factory=job_service.session_factory)
+
+        first = await job_service.pregenerate_weekly()
+        second = await other_worker.pregenerate_weekly()
+
+        assert (first["queued"], second["queued"]) == (1, 0)
+        assert len(await job_service.list_jobs(db_session, test_user.id)) == 1
+
+    @pytest.mark.asyncio
+    async def test_pregenerated_report_only_serves_its_window(
+        self, authenticated_client, db_session: AsyncSession, job_service: ReportJobService,
+        test_user: User, monkeypatch
+    ):
+        """The default "last 7 days" report is a different window and is rendered."""
+        await job_service.pregenerate_weekly()
+        jobs = await job_service.list_jobs(db_session, test_user.id)
+        await job_service.run_job(jobs[0].id)
+
+        renders = []
+        real_render = report_renderer.render
+
+        async def counting_render(data):
+            renders.append(data)
+            return await real_render(data)
+
+        monkeypatch.setattr(report_renderer, "render", counting_render)
+        response = await authenticated_client.get("/api/reports/download", params={"period": "weekly"})
+
+        assert response.status_code == 200
+        assert len(renders) == 1
+
+    @pytest.mark.asyncio
+    async def test_background_email_keeps_its_window(
+        self, authenticated_client, db_session: AsyncSession, job_service: ReportJobService, test_user: User
+    ):
+        """The client sends last week's bounds with every report action, email included."""
+        week_start, week_end = last_week_window()
+        response = await authenticated_client.post("/api/reports/email", json={
+            "period": "weekly", "background": True,
+            "start_date": week_start.isoformat(), "end_date": week_end.isoformat(),
+        })
+
+        job = await job_service.get_job(db_session, response.json()["job_id"], test_user.id)
+        assert (job.kind, job.start_date, job.end_date) == ("email", week_start, week_end)
+
+    @pytest.mark.asyncio
+    async def test_job_is_built_once_when_workers_race(
+        self, db_session: AsyncSession, job_service: ReportJobService, test_user: User, monkeypatch
+    ):
+        job = await job_service.submit(db_session, test_user.id, ReportPeriod.DAILY)
+        builds = []
+        real_build = job_service._build
+
+        async def counting_build(db, job):
+            builds.append(job.id)
+            return await real_build(db, job)
+
+        monkeypatch.setattr(job_service, "_build", counting_build)
+        await asyncio.gather(job_service.run_job(job.id), job_service.run_job(job.id))
+
+        assert builds == [job.id]
+
+    @pytest.mark.asyncio
+    async def test_start_requeues_only_stale_running_jobs(
+        self, db_session: AsyncSession, job_service: ReportJobService, test_user: User, monkeypatch
+    ):
+        pending = await job_service.submit(db_session, test_user.id, ReportPeriod.DAILY)
+        live = await job_service.submit(db_session, test_user.id, ReportPeriod.DAILY)
+        dead = await job_service.submit(db_session, test_user.id, ReportPeriod.DAILY)
+        live.status = dead.status = "running"
+        live.started_at = datetime.utcnow()
+        dead.started_at = datetime.utcnow() - job_service.timeout - timedelta(minutes=1)
+        await db_session.commit()
+
+        monkeypatch.setattr(job_service, "workers", 1)
+        monkeypatch.setattr(job_service, "_worker", lambda: asyncio.sleep(0))
+        monkeypatch.setattr(job_service.scheduler, "add_job", lambda *args, **kwargs: None)
+        monkeypatch.setattr(job_service.scheduler, "start", lambda: None)
+        await job_service.start()
+        queued = []
+        while not job_service._queue.empty():
+            queued.append(job_service._queue.get_nowait())
+        await job_service.stop()
+
+        assert set(queued) == {pending.id, dead.id}
+
+    @pytest.mark.asyncio
+    async def test_other_users_cannot_read_jobs(
+        self, authenticated_client, db_session: AsyncSession, job_service: ReportJobService,
+        test_user_premium: User
+    ):
+        job = await job_service.submit(db_session, test_user_premium.id, ReportPeriod.DAILY)
+
+        response = await authenticated_client.get(f"/api/reports/jobs/{job.id}")
+
+        assert response.status_code == 404
+
+
+class TestReportPdfCache:
+    """Unchanged report data is rendered once and revalidated by ETag."""
+
+    @pytest.fixture(autouse=True)
+    def thread_renderer(self, monkeypatch):
+        monkeypatch.setattr(report_renderer, "max_workers", 0)
+
+    def test_hash_ignores_time_of_day_but_not_numbers(self):
+        data = sample_report_data()
+        later = sample_report_data()
+        later.end_date = END.replace(hour=23, minute=59)
+        changed = sample_report_data()
+        changed.productive_hours += 0.5
+
+        assert data.content_hash() == later.content_hash()
+        assert data.content_hash() != changed.content_hash()
+
+    @pytest.mark.asyncio
+    async def test_hits_skip_rendering(self, tmp_path, monkeypatch):
+        cache = ReportPdfCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+        renders = []
+        real_render = report_renderer.render
+
+        async def counting_render(data):
+            renders.append(data)
+            return await real_render(data)
+
+        monkeypatch.setattr(report_renderer, "render", counting_render)
+
+        first, second = await asyncio.gather(
+            cache.get_or_render(sample_report_data()),
+            cache.get_or_render(sample_report_data()),
+        )
+        third = await cache.get_or_render(sample_report_data())
+
+        assert len(renders) == 1
+        assert first.key == second.key == third.key
+        assert cache.get_stats()["hits"] == 2
+        assert cache.get_stats()["hit_rate"] == pytest.approx(2 / 3, abs=0.001)
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_by_bytes(self, tmp_path):
+        cache = ReportPdfCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+        reports = []
+        for score in (10, 20, 30):
+            data = sample_report_data()
+            data.deep_work_score = score
+            reports.append(await cache.get_or_render(data))
+
+        # Touch the oldest so the middle one becomes least recently used
+        oldest = sample_report_data()
+        oldest.deep_work_score = 10
+        await cache.get_or_render(oldest)
+        cache.max_bytes = reports[0].size + reports[2].size
+        cache._evict()
+
+        assert cache.get_stats()["evictions"] == 1
+        assert os.path.exists(reports[0].path)
+        assert not os.path.exists(reports[1].path)
+        assert os.path.exists(reports[2].path)
+
+        # A fresh cache rebuilds its index from disk
+        reloaded = ReportPdfCache(directory=str(tmp_path), max_bytes=cache.max_bytes)
+        await reloaded._load_index()
+        assert reloaded.get_stats()["bytes"] == cache.get_stats()["bytes"]
+
+    @pytest.mark.asyncio
+    async def test_download_revalidates_with_etag(
+        self, authenticated_client, test_user: User, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(report_pdf_cache, "directory", tmp_path)
+        monkeypatch.setattr(report_pdf_cache, "_entries", None)
+        params = {"period": "daily", "start_date": START.isoformat(), "end_date": END.isoformat()}
+
+        response = await authenticated_client.get("/api/reports/download", params=params)
+        assert response.status_code == 200
+        assert response.content.startswith(b"%PDF")
+        etag = response.headers["etag"]
+
+        assert report_pdf_cache.get_stats()["pinned"] == 0  # released once sent
+
+        # Revalidation answers from the hash alone, even once the PDF is evicted
+        async def no_render(data):
+            raise AssertionError("a 304 should not render")
+
+        monkeypatch.setattr(report_pdf_cache, "_entries", None)
+        monkeypatch.setattr(report_pdf_cache, "directory", tmp_path / "evicted")
+        monkeypatch.setattr(report_renderer, "render", no_render)
+        revalidated = await authenticated_client.get(
+            "/api/reports/download", params=params, headers={"If-None-Match": etag}
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == etag
+        assert not (tmp_path / "evicted").exists()
+
+    @pytest.mark.asyncio
+    async def test_pinned_files_survive_eviction(self, tmp_path):
+        cache = ReportPdfCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+        reports = []
+        for score in (10, 20):
+            data = sample_report_data()
+            data.deep_work_score = score
+            reports.append(await cache.get_or_render(data, pin=(score == 10)))
+
+        cache.max_bytes = 1
+        cache._evict()
+        assert os.path.exists(reports[0].path)
+
+        cache.release(reports[0].key)
+        assert not os.path.exists(reports[0].path)
+        assert cache.get_stats()["pinned"] == 0
+
+    @pytest.mark.asyncio
+    async def test_pins_hold_across_workers(self, tmp_path):
+        """Workers share the directory; one can't evict a file another is sending."""
+        sending = ReportPdfCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+        other = ReportPdfCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+        pinned = await sending.get_or_render(sample_report_data(), pin=True)
+
+        data = sample_report_data()
+        data.deep_work_score = 20
+        await other.get_or_render(data)
+        other.max_bytes = 1
+        other._evict()
+        assert os.path.exists(pinned.path)
+
+        sending.release(pinned.key)
+        other._evict()
+        assert not os.path.exists(pinned.path)
+        assert list(tmp_path.glob("*/*.pin")) == []
+
+    @pytest.mark.asyncio
+    async def test_pins_left_by_dead_workers_expire(self, tmp_path):
+        cache = ReportPdfCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+        reports = []
+        for score in (10, 20):
+            data = sample_report_data()
+            data.deep_work_score = score
+            reports.append(await cache.get_or_render(data))
+        stale_pin = Path(reports[0].path).with_name(f"{reports[0].key}.dead-worker.pin")
+        stale_pin.touch()
+        old = time.time() - PIN_TIMEOUT_SECONDS - 1
+        os.utime(stale_pin, (old, old))
+
+        cache.max_bytes = 1
+        cache._evict()
+
+        assert not os.path.exists(reports[0].path)
+        assert not stale_pin.exists()
@@ -0,0 +1,1142 @@
+"""
+Screenshot pipeline tests for Productify Pro.
+Tests cover: capture and encode on the worker thread, image and thumbnail
+from one decoded frame, per-stage timing stats, the cloud upload path,
+concurrent blob uploads off the loop, the persistent upload retry queue,
+storage accounting from recorded sizes and usage counters, perceptual-hash
+de-duplication of near-identical captures, batched retention cleanup,
+the maintained index of local screenshot files, cached image serving,
+contact-sheet sprites for gallery pages, background recompression tiers,
+and the privacy blur stage.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+import pytest
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from unittest.mock import AsyncMock
+
+import mss
+from PIL import Image, ImageStat
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.routes import screenshots as screenshot_routes
+from app.models.screenshot import Screenshot, ScreenshotUsage
+from app.models.settings import UserSettings
+from app.models.team import Team, TeamMember, TeamRole
+from app.models.user import User
+from app.services.firebase_storage import FirebaseStorageService, firebase_storage
+from app.services import screenshot_sprite_service as sprite_module
+from app.services.screenshot_file_index import ScreenshotFileIndex, screenshot_file_index
+from app.services.screenshot_sprite_service import ScreenshotSpriteService
+from app.services.screenshot_tiering_service import screenshot_tiering_service
+from app.services.screenshot_service import (
+    CAPTURE_STAGES, ScreenshotService, capture_frame, dhash, hamming_distance, screenshot_service,
+)
+from app.services.screenshot_upload_queue import (
+    CLAIM_TIMEOUT_SECONDS, ScreenshotUploadQueue, screenshot_upload_queue,
+)
+from app.services.storage_usage_service import get_screenshot_usage
+
+
+SCREEN_SIZE = (1920, 1080)
+UNIFORM_FRAME = b"\x20\x40\x80\x00" * (SCREEN_SIZE[0] * SCREEN_SIZE[1])
+GRADIENT_FRAME = Image.radial_gradient("L").resize(SCREEN_SIZE).convert("RGB").tobytes("raw", "BGRX")
+# Sharp 8px stripes, standing in for text
+STRIPED_FRAME = (b"\x00\x00\x00\x00" * 8 + b"\xff\xff\xff\x00" * 8) * (SCREEN_SIZE[0] * SCREEN_SIZE[1] // 16)
+
+
+class FakeMss:
+    """Stands in for mss.mss(), recording the thread each grab ran on"""
+    grab_threads = []
+    frame = UNIFORM_FRAME
+
+    def __init__(self):
+        self.monitors = [None, {"top": 0, "left": 0, "width": SCREEN_SIZE[0], "height": SCREEN_SIZE[1]}]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def grab(self, monitor):
+        FakeMss.grab_threads.append(threading.current_thread().name)
+        shot = type("Shot", (), {})()
+        shot.size = SCREEN_SIZE
+        shot.bgra = FakeMss.frame
+        return shot
+
+
+@pytest.fixture
+def fake_mss(monkeypatch):
+    FakeMss.grab_threads = []
+    FakeMss.frame = UNIFORM_FRAME
+    monkeypatch.setattr(mss, "mss", FakeMss)
+    return FakeMss
+
+
+class FakeBucket:
+    """Blob store whose uploads wait at a barrier, so they must run concurrently"""
+
+    def __init__(self, parties: int = 2):
+        self.barrier = threading.Barrier(parties, timeout=2)
+        self.uploads = {}
+        self.threads = set()
+        self.signed = []
+
+    def blob(self, path):
+        bucket = self
+
+        class Blob:
+            public_url = f"https://storage.example/{path}"
+
+            def upload_from_string(self, content, content_type=None):
+                bucket.threads.add(threading.current_thread().name)
+                bucket.barrier.wait()
+                bucket.uploads[path] = content
+
+            def make_public(self):
+                pass
+
+            def generate_signed_url(self, **kwargs):
+                bucket.signed.append(path)
+                return f"https://signed.example/{path}?n={len(bucket.signed)}"
+
+            def delete(self):
+                bucket.uploads.pop(path, None)
+
+        return Blob()
+
+
+@pytest.fixture
+def bucket(monkeypatch) -> FakeBucket:
+    bucket = FakeBucket()
+    monkeypatch.setattr(firebase_storage, "_bucket", bucket)
+    monkeypatch.setattr(firebase_storage, "_initialized", True)
+    return bucket
+
+
+@pytest.fixture
+def upload_queue(tmp_path, db_session: AsyncSession, monkeypatch) -> ScreenshotUploadQueue:
+    queue = ScreenshotUploadQueue(
+        directory=str(tmp_path / "upload_queue"),
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+    )
+    monkeypatch.setattr(screenshot_upload_queue, "directory", queue.directory)
+    return queue
+
+
+@pytest.fixture
+def file_index(tmp_path) -> ScreenshotFileIndex:
+    previous = screenshot_file_index.directory
+    screenshot_file_index.reset(tmp_path)
+    yield screenshot_file_index
+    screenshot_file_index.reset(previous)
+
+
+@pytest.fixture
+def service(tmp_path, db_session: AsyncSession, fake_mss, file_index) -> ScreenshotService:
+    service = ScreenshotService()
+    service.screenshots_path = tmp_path
+    service.session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    yield service
+    service.stop_scheduler()
+
+
+class TestCaptureFrame:
+    """Tests for the blocking grab/resize/encode pipeline."""
+
+    @pytest.mark.parametrize("format,pil_format", [("webp", "WEBP"), ("jpeg", "JPEG")])
+    def test_image_and_thumbnail_from_one_frame(self, fake_mss, format, pil_format):
+        """Both outputs are encoded in the requested format at the expected sizes."""
+        frame = capture_frame((1280, 720), format, quality=50, thumbnail_quality=40)
+
+        image = Image.open(io.BytesIO(frame.image_bytes))
+        thumbnail = Image.open(io.BytesIO(frame.thumbnail_bytes))
+        assert image.format == thumbnail.format == pil_format
+        assert image.size == (frame.width, frame.height) == (1280, 720)
+        assert thumbnail.size == (320, 180)
+        assert set(frame.timings) == set(CAPTURE_STAGES)
+        assert len(fake_mss.grab_threads) == 1
+
+    def test_full_resolution_skips_resize(self, fake_mss):
+        """The "full" preset keeps the native screen size."""
+        frame = capture_frame(None, "jpeg", quality=50, thumbnail_quality=40)
+
+        assert (frame.width, frame.height) == SCREEN_SIZE
+
+
+class TestCaptureScreenshot:
+    """Tests for the async capture entry point."""
+
+    @pytest.mark.asyncio
+    async def test_capture_runs_off_the_event_loop(self, service: ScreenshotService, db_session: AsyncSession):
+        """The grab runs on the capture thread and the files and row are written."""
+        result = await service.capture_screenshot()
+
+        assert result is not None
+        assert FakeMss.grab_threads[0].startswith("screenshot")
+        assert FakeMss.grab_threads[0] != threading.current_thread().name
+        assert result["image_path"].endswith(".webp")
+        assert Image.open(result["image_path"]).size == (1280, 720)
+        assert Image.open(result["thumbnail_path"]).size == (320, 180)
+
+        row = (await db_session.execute(select(Screenshot).where(Screenshot.id == result["id"]))).scalar_one()
+        assert row.image_path == result["image_path"]
+
+    @pytest.mark.asyncio
+    async def test_stage_timings_are_recorded(self, service: ScreenshotService):
+        """Each capture adds a sample for every stage."""
+        await service.capture_screenshot()
+        await service.capture_screenshot()
+
+        stats = service.get_capture_stats()
+        assert stats["captured"] == 2
+        assert stats["failed"] == 0
+        assert set(stats["stages_ms"]) == set(CAPTURE_STAGES)
+        assert stats["total_ms"]["max"] > 0
+
+    @pytest.mark.asyncio
+    async def test_failed_grab_is_counted(self, service: ScreenshotService, monkeypatch):
+        """A grab error returns None and counts as a failure."""
+        def broken_grab(self, monitor):
+            raise RuntimeError("no display")
+        monkeypatch.setattr(FakeMss, "grab", broken_grab)
+
+        assert await service.capture_screenshot() is None
+        assert service.get_capture_stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cloud_upload_gets_encoded_bytes(self, service: ScreenshotService, monkeypatch, tmp_path):
+        """Cloud captures upload the pipeline's JPEG bytes without re-encoding."""
+        monkeypatch.setattr(FirebaseStorageService, "is_available", property(lambda self: True))
+        upload = AsyncMock(return_value={
+            "storage_path": "users/1/screenshots/x.jpg",
+            "storage_url": "https://storage.example/x.jpg",
+            "thumbnail_url": "https://storage.example/x_thumb.jpg",
+        })
+        monkeypatch.setattr(firebase_storage, "upload_screenshot", upload)
+
+        result = await service.capture_screenshot(user_id=1)
+
+        kwargs = upload.await_args.kwargs
+        assert Image.open(io.BytesIO(kwargs["image_bytes"])).format == "JPEG"
+        assert Image.open(io.BytesIO(kwargs["thumbnail_bytes"])).size == (320, 180)
+        assert result["storage_url"] == "https://storage.example/x.jpg"
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestFirebaseUploads:
+    """Tests for running blob operations on the upload pool."""
+
+    @pytest.mark.asyncio
+    async def test_image_and_thumbnail_upload_concurrently(self, bucket: FakeBucket):
+        """Both blobs are in flight at once, on pool threads."""
+        result = await firebase_storage.upload_screenshot(
+            user_id=7, image_bytes=b"image", thumbnail_bytes=b"thumb"
+        )
+
+        assert "error" not in result
+        assert bucket.uploads[result["storage_path"]] == b"image"
+        assert bucket.uploads[result["thumbnail_path"]] == b"thumb"
+        assert result["thumbnail_url"].endswith("_thumb.jpg")
+        assert all(name.startswith("firebase") for name in bucket.threads)
+
+    @pytest.mark.asyncio
+    async def test_raw_image_is_encoded_with_thumbnail(self, bucket: FakeBucket):
+        """Raw bytes are re-encoded as JPEG and a thumbnail is derived from them."""
+        buffer = io.BytesIO()
+        Image.new("RGBA", (1280, 720), (10, 20, 30, 255)).save(buffer, "PNG")
+
+        result = await firebase_storage.upload_screenshot(user_id=7, image_bytes=buffer.getvalue())
+
+        thumbnail = Image.open(io.BytesIO(bucket.uploads[result["thumbnail_path"]]))
+        assert Image.open(io.BytesIO(bucket.uploads[result["storage_path"]])).format == "JPEG"
+        assert thumbnail.size == (320, 180)
+
+
+class TestUploadRetryQueue:
+    """Tests for retrying failed uploads from local copies."""
+
+    @pytest.fixture
+    def failing_upload(self, monkeypatch):
+        monkeypatch.setattr(FirebaseStorageService, "is_available", property(lambda self: True))
+        upload = AsyncMock(return_value={"error": "network unreachable"})
+        monkeypatch.setattr(firebase_storage, "upload_screenshot", upload)
+        return upload
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_keeps_local_copy_and_queues(
+        self, service: ScreenshotService, upload_queue: ScreenshotUploadQueue, failing_upload
+    ):
+        """A failed capture upload is saved locally and persisted to the queue."""
+        result = await service.capture_screenshot(user_id=1)
+
+        assert result["image_path"].endswith(".jpg")
+        # A fresh instance sees the entry, as after a restart
+        entries = ScreenshotUploadQueue(directory=str(upload_queue.directory))._read_entries()
+        assert [e["screenshot_id"] for e in entries] == [result["id"]]
+        assert entries[0]["next_attempt_at"] > time.time()
+
+    @pytest.mark.asyncio
+    async def test_successful_retry_moves_row_to_cloud(
+        self, service: ScreenshotService, upload_queue: ScreenshotUploadQueue,
+        failing_upload, db_session: AsyncSession,
+    ):
+        """A retry uploads the local files, updates the row and cleans up."""
+        result = await service.capture_screenshot(user_id=1)
+        failing_upload.return_value = {
+            "storage_path": "users/1/screenshots/x.jpg",
+            "storage_url": "https://storage.example/x.jpg",
+            "thumbnail_url": "https://storage.example/x_thumb.jpg",
+        }
+
+        assert await upload_queue.drain() == 0  # not due yet
+        assert await upload_queue.drain(now=time.time() + 3600) == 1
+
+        kwargs = failing_upload.await_args.kwargs
+        assert kwargs["thumbnail_bytes"] is not None
+        db_session.expire_all()
+        row = (await db_session.execute(select(Screenshot).where(Screenshot.id == result["id"]))).scalar_one()
+        assert row.storage_url == "https://storage.example/x.jpg"
+        assert row.image_path is None
+        assert not os.path.exists(result["image_path"])
+        assert (await upload_queue.get_stats())["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failures_back_off_then_give_up(
+        self, service: ScreenshotService, upload_queue: ScreenshotUploadQueue, failing_upload
+    ):
+        """Each failure doubles the delay; the last attempt drops the entry."""
+        result = await service.capture_screenshot(user_id=1)
+        upload_queue.max_attempts = 3
+        later = time.time() + 10 ** 6
+
+        await upload_queue.drain(now=later)
+        first = upload_queue._read_entries()[0]
+        await upload_queue.drain(now=later)
+        second = upload_queue._read_entries()[0]
+
+        assert (first["attempts"], second["attempts"]) == (1, 2)
+        assert second["last_error"] == "network unreachable"
+        assert upload_queue.backoff_delay(2) > upload_queue.backoff_delay(0) * 3
+
+        await upload_queue.drain(now=later)
+        assert (await upload_queue.get_stats())["pending"] == 0
+        assert upload_queue.dropped == 1
+        assert os.path.exists(result["image_path"])
+
+    @pytest.mark.asyncio
+    async def test_workers_sharing_the_queue_upload_once(
+        self, service: ScreenshotService, upload_queue: ScreenshotUploadQueue, failing_upload
+    ):
+        """Each entry is claimed by one worker; the others skip it."""
+        await service.capture_screenshot(user_id=1)
+        failing_upload.return_value = {
+            "storage_path": "users/1/screenshots/x.jpg",
+            "storage_url": "https://storage.example/x.jpg",
+        }
+        other = ScreenshotUploadQueue(
+            directory=str(upload_queue.directory), session_factory=upload_queue.session_factory
+        )
+        later = time.time() + 3600
+
+        results = await asyncio.gather(upload_queue.drain(now=later), other.drain(now=later))
+
+        assert sorted(results) == [0, 1]
+        assert failing_upload.await_count == 2  # the capture's attempt and one retry
+        assert (await upload_queue.get_stats())["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_claiming_an_old_entry_is_not_stale(
+        self, service: ScreenshotService, upload_queue: ScreenshotUploadQueue, failing_upload
+    ):
+        """A claim's age counts from the claim, not from when the entry was written."""
+        result = await service.capture_screenshot(user_id=1)
+        old = time.time() - CLAIM_TIMEOUT_SECONDS * 10
+        os.utime(upload_queue._entry_path(result["id"]), (old, old))
+        worker = ScreenshotUploadQueue(directory=str(upload_queue.directory))
+        later = time.time() + 3600
+
+        assert worker._claim(result["id"], later) is not None
+        await upload_queue.drain(now=later)
+
+        assert failing_upload.await_count == 1  # only the capture's own attempt
+        assert worker._claim_path(result["id"]).exists()
+
+    @pytest.mark.asyncio
+    async def test_stale_claims_are_put_back(
+        self, service: ScreenshotService, upload_queue: ScreenshotUploadQueue, failing_upload
+    ):
+        """An entry claimed by a worker that died is retried by another one."""
+        result = await service.capture_screenshot(user_id=1)
+        dead = ScreenshotUploadQueue(directory=str(upload_queue.directory))
+        later = time.time() + 3600
+        claimed = dead._claim(result["id"], later)
+        assert claimed is not None
+        assert await upload_queue.drain(now=later) == 0
+        assert failing_upload.await_count == 1  # only the capture's own attempt
+
+        stale = time.time() - CLAIM_TIMEOUT_SECONDS - 1
+        os.utime(dead._claim_path(result["id"]), (stale, stale))
+        await upload_queue.drain(now=later)
+
+        assert failing_upload.await_count == 2
+        assert upload_queue._read_entries()[0]["attempts"] == 1
+
+
+def days_ago(days: int) -> datetime:
+    return datetime.now() - timedelta(days=days)
+
+
+def write_files(kind: str, directory, screenshot_id: str, index: int):
+    """Write a screenshot's files and return (image_path, thumbnail_path)"""
+    image_path = directory / f"{screenshot_id}.webp"
+    thumbnail_path = directory / f"{screenshot_id}_thumb.webp"
+    if kind == "placeholder":
+        image_path.write_bytes(b"i" * 1000)
+        thumbnail_path.write_bytes(b"t" * 100)
+    elif kind == "thumbnail":
+        # Distinctly coloured, and no full-size image
+        Image.new("RGB", (320, 180), (index * 40 % 256, 80, 160)).save(thumbnail_path, "WEBP")
+        image_path = None
+    elif kind == "frame":
+        frame = Image.radial_gradient("L").resize((1280, 720)).convert("RGB")
+        frame.save(image_path, "WEBP", quality=90)
+        frame.resize((320, 180)).save(thumbnail_path, "WEBP", quality=40)
+    else:
+        raise ValueError(kind)
+    return image_path, thumbnail_path
+
+
+async def seed_screenshots(
+    db: AsyncSession, user_id, count: int, *, directory=None, files: str = "placeholder",
+    sizes=None, start: Optional[datetime] = None, **fields,
+):
+    """
+    `count` screenshots a minute apart from `start` (default this morning),
+    returned as (id, image_path, thumbnail_path).
+
+    With a directory, `files` picks what is written there ("placeholder" bytes,
+    a "thumbnail" only, or a full-size 1280x720 "frame") and the stored sizes
+    are the files' sizes. Without one, rows point at missing files and take
+    their (image_size, thumbnail_size) from `sizes`.
+    """
+    if start is None:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    seeded = []
+    for index in range(count):
+        screenshot_id = str(uuid.uuid4())
+        if directory is None:
+            image_path, thumbnail_path = f"/missing/{index}.webp", f"/missing/{index}_thumb.webp"
+            image_size, thumbnail_size = sizes[index]
+        else:
+            image_path, thumbnail_path = write_files(files, directory, screenshot_id, index)
+            image_size = os.path.getsize(image_path) if image_path else 0
+            thumbnail_size = os.path.getsize(thumbnail_path)
+        db.add(Screenshot(
+            id=screenshot_id, user_id=user_id, timestamp=start + timedelta(minutes=index),
+            image_path=image_path and str(image_path), thumbnail_path=str(thumbnail_path),
+            image_size=image_size, thumbnail_size=thumbnail_size, **fields,
+        ))
+        seeded.append((screenshot_id, image_path and str(image_path), str(thumbnail_path)))
+    await db.commit()
+    return seeded
+
+
+@pytest.fixture
+def no_file_stats(monkeypatch):
+    """Fail the test if storage is measured from the filesystem"""
+    def forbidden(*args, **kwargs):
+        raise AssertionError("filesystem walked")
+    monkeypatch.setattr(os.path, "getsize", forbidden)
+    monkeypatch.setattr(os.path, "exists", forbidden)
+
+
+class TestStorageAccounting:
+    """Tests for stored sizes and per-user usage counters."""
+
+    @pytest.mark.asyncio
+    async def test_usage_row_is_built_from_stored_sizes(self, db_session: AsyncSession, test_user: User):
+        """Users without counters get them from one aggregate over the rows."""
+        await seed_screenshots(db_session, test_user.id, 2, sizes=[(1000, 100), (2000, 200)])
+
+        assert await get_screenshot_usage(db_session, test_user.id) == (2, 3300)
+        assert (await db_session.get(ScreenshotUsage, test_user.id)).total_bytes == 3300
+
+    @pytest.mark.asyncio
+    async def test_capture_records_sizes_and_counts(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User
+    ):
+        """A capture stores its encoded sizes and bumps the user's counters."""
+        user_id = test_user.id
+        await get_screenshot_usage(db_session, user_id)
+
+        result = await service.capture_screenshot(user_id=user_id)
+
+        db_session.expire_all()
+        row = await db_session.get(Screenshot, result["id"])
+        assert row.image_size == os.path.getsize(result["image_path"])
+        assert row.thumbnail_size == os.path.getsize(result["thumbnail_path"])
+        assert await get_screenshot_usage(db_session, user_id) == (1, row.image_size + row.thumbnail_size)
+
+    @pytest.mark.asyncio
+    async def test_stats_endpoint_uses_stored_sizes(
+        self, authenticated_client, db_session: AsyncSession, test_user: User, no_file_stats
+    ):
+        """Stats are one grouped query; no file is looked at."""
+        await seed_screenshots(
+            db_session, test_user.id, 2, sizes=[(1000, 100), (2000, 200)], category="Development"
+        )
+        await seed_screenshots(db_session, test_user.id, 1, sizes=[(500, 50)], category="Communication")
+
+        response = await authenticated_client.get("/api/screenshots/stats?days=7")
+
+        data = response.json()
+        assert data["total_count"] == 3
+        assert data["storage_bytes"] == 3850
+        assert data["categories"] == {"Development": 2, "Communication": 1}
+
+    @pytest.mark.asyncio
+    async def test_storage_endpoint_follows_deletes(
+        self, authenticated_client, db_session: AsyncSession, test_user: User
+    ):
+        """Permanent deletes lower the counters the storage endpoint reads."""
+        user_id = test_user.id
+        await seed_screenshots(db_session, user_id, 2, sizes=[(1000, 100), (2000, 200)])
+        response = await authenticated_client.get("/api/settings/storage")
+        assert response.json()["screenshot_count"] == 2
+
+        screenshot_id = (await db_session.execute(
+            select(Screenshot.id).where(Screenshot.image_size == 2000)
+        )).scalar_one()
+        await authenticated_client.delete(f"/api/screenshots/{screenshot_id}?permanent=true")
+
+        db_session.expire_all()
+        assert await get_screenshot_usage(db_session, user_id) == (1, 1100)
+        response = await authenticated_client.get("/api/settings/storage")
+        assert response.json()["screenshot_count"] == 1
+
+
+class TestDeduplication:
+    """Tests for storing near-identical captures as references."""
+
+    def test_dhash_distance(self):
+        """Identical and slightly changed frames are close; different content is not."""
+        gradient = Image.frombytes("RGB", SCREEN_SIZE, GRADIENT_FRAME, "raw", "BGRX")
+        tweaked = gradient.copy()
+        tweaked.paste((255, 255, 255), (0, 0, 40, 20))
+        uniform = Image.new("RGB", SCREEN_SIZE, (128, 64, 32))
+
+        assert hamming_distance(dhash(gradient), dhash(gradient.copy())) == 0
+        assert hamming_distance(dhash(gradient), dhash(tweaked)) <= 4
+        assert hamming_distance(dhash(gradient), dhash(uniform)) > 4
+
+    @pytest.mark.asyncio
+    async def test_repeat_capture_references_previous_image(
+        self, service: ScreenshotService, db_session: AsyncSession, tmp_path
+    ):
+        """A near-identical capture writes no files and points at the first."""
+        first = await service.capture_screenshot()
+        second = await service.capture_screenshot()
+
+        assert second["duplicate_of"] == first["id"]
+        assert second["image_path"] == first["image_path"]
+        assert second["image_size"] == second["thumbnail_size"] == 0
+        assert len(list(tmp_path.glob("*.webp"))) == 2  # one image + one thumbnail
+
+        stats = service.get_capture_stats()["dedupe"]
+        assert stats["deduplicated"] == 1
+        assert stats["ratio"] == 0.5
+        assert stats["bytes_saved"] == first["image_size"] + first["thumbnail_size"]
+
+    @pytest.mark.asyncio
+    async def test_changed_screen_is_stored(self, service: ScreenshotService):
+        """A different frame is encoded and stored as a new original."""
+        first = await service.capture_screenshot()
+        FakeMss.frame = GRADIENT_FRAME
+        second = await service.capture_screenshot()
+
+        assert "duplicate_of" not in second
+        assert second["image_path"] != first["image_path"]
+        assert second["image_size"] > 0
+
+    @pytest.mark.asyncio
+    async def test_threshold_zero_disables_dedupe(self, service: ScreenshotService):
+        """With dedupe off every capture is stored."""
+        service.dedupe_threshold = 0
+        await service.capture_screenshot()
+        second = await service.capture_screenshot()
+
+        assert second["image_size"] > 0
+
+    @pytest.mark.asyncio
+    async def test_deleting_original_hands_files_to_duplicate(
+        self, service: ScreenshotService, authenticated_client,
+        db_session: AsyncSession, test_user: User,
+    ):
+        """The surviving duplicate inherits the files and their bytes."""
+        user_id = test_user.id
+        first = await service.capture_screenshot(user_id=user_id)
+        second = await service.capture_screenshot(user_id=user_id)
+        third = await service.capture_screenshot(user_id=user_id)
+        usage_before = await get_screenshot_usage(db_session, user_id)
+
+        await authenticated_client.delete(f"/api/screenshots/{first['id']}?permanent=true")
+
+        db_session.expire_all()
+        heir = await db_session.get(Screenshot, second["id"])
+        assert os.path.exists(first["image_path"])
+        assert heir.duplicate_of is None
+        assert heir.image_size == first["image_size"]
+        assert (await db_session.get(Screenshot, third["id"])).duplicate_of == second["id"]
+        count, total_bytes = await get_screenshot_usage(db_session, user_id)
+        assert (count, total_bytes) == (usage_before[0] - 1, usage_before[1])
+
+    @pytest.mark.asyncio
+    async def test_deleting_duplicate_keeps_files(
+        self, service: ScreenshotService, authenticated_client, test_user: User
+    ):
+        """Removing a reference never removes the shared image."""
+        first = await service.capture_screenshot(user_id=test_user.id)
+        second = await service.capture_screenshot(user_id=test_user.id)
+
+        await authenticated_client.delete(f"/api/screenshots/{second['id']}?permanent=true")
+
+        assert os.path.exists(first["image_path"])
+        assert os.path.exists(first["thumbnail_path"])
+
+
+@contextmanager
+def record_statements(db: AsyncSession):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+class TestRetentionCleanup:
+    """Tests for keyset-batched, set-based screenshot cleanup."""
+
+    @pytest.mark.asyncio
+    async def test_cleanup_deletes_in_bounded_batches(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path
+    ):
+        """Expired rows go in one DELETE per batch and their files are removed."""
+        user_id = test_user.id
+        old = await seed_screenshots(db_session, user_id, 25, directory=tmp_path, start=days_ago(40))
+        recent = await seed_screenshots(db_session, user_id, 3, directory=tmp_path, start=days_ago(1))
+        await get_screenshot_usage(db_session, user_id)
+
+        with record_statements(db_session) as statements:
+            result = await service.cleanup_screenshots(
+                db_session, datetime.now() - timedelta(days=30), batch_size=10
+            )
+
+        deletes = [s for s in statements if s.lstrip().upper().startswith("DELETE FROM SCREENSHOTS")]
+        assert len(deletes) == 3
+        assert result == {"deleted_count": 25, "freed_bytes": 25 * 1100}
+        assert not any(os.path.exists(image_path) for _, image_path, _ in old)
+        assert all(os.path.exists(image_path) for _, image_path, _ in recent)
+        db_session.expire_all()
+        assert await get_screenshot_usage(db_session, user_id) == (3, 3 * 1100)
+
+    @pytest.mark.asyncio
+    async def test_cleanup_keeps_files_of_surviving_duplicates(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path
+    ):
+        """An expired original's files pass to a newer duplicate."""
+        user_id = test_user.id
+        [(original_id, image_path, thumbnail_path)] = await seed_screenshots(
+            db_session, user_id, 1, directory=tmp_path, start=days_ago(40)
+        )
+        duplicate_id = str(uuid.uuid4())
+        duplicate = Screenshot(
+            id=duplicate_id, user_id=user_id, timestamp=datetime.now(),
+            image_path=image_path, thumbnail_path=thumbnail_path,
+            duplicate_of=original_id,
+        )
+        db_session.add(duplicate)
+        await db_session.commit()
+
+        result = await service.cleanup_screenshots(db_session, datetime.now() - timedelta(days=30))
+
+        assert result == {"deleted_count": 1, "freed_bytes": 0}
+        assert os.path.exists(image_path)
+        db_session.expire_all()
+        heir = await db_session.get(Screenshot, duplicate_id)
+        assert (heir.duplicate_of, heir.image_size) == (None, 1000)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_cleanup_releases_usage_once(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path, monkeypatch
+    ):
+        """A worker whose batch was deleted under it releases nothing for those rows."""
+        user_id = test_user.id
+        await seed_screenshots(db_session, user_id, 5, directory=tmp_path, start=days_ago(40))
+        await seed_screenshots(db_session, user_id, 2, directory=tmp_path, start=days_ago(1))
+        await get_screenshot_usage(db_session, user_id)
+        cutoff = datetime.now() - timedelta(days=30)
+
+        real_execute = db_session.execute
+        rival_results = []
+
+        async def execute(statement, *args, **kwargs):
+            # Another worker cleans the same batch between our select and delete
+            if getattr(statement, "is_delete", False) and not rival_results:
+                async with async_sessionmaker(db_session.bind, expire_on_commit=False)() as other:
+                    rival_results.append(await service.cleanup_screenshots(other, cutoff))
+            return await real_execute(statement, *args, **kwargs)
+
+        monkeypatch.setattr(db_session, "execute", execute)
+        result = await service.cleanup_screenshots(db_session, cutoff)
+
+        assert rival_results == [{"deleted_count": 5, "freed_bytes": 5 * 1100}]
+        assert result == {"deleted_count": 0, "freed_bytes": 0}
+        db_session.expire_all()
+        assert await get_screenshot_usage(db_session, user_id) == (2, 2 * 1100)
+
+    @pytest.mark.asyncio
+    async def test_cleanup_endpoint(
+        self, client, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path
+    ):
+        """The endpoint reports rows deleted and space freed."""
+        await seed_screenshots(db_session, test_user.id, 4, directory=tmp_path, start=days_ago(40))
+
+        response = await client.delete("/api/screenshots/cleanup?older_than_days=30")
+
+        assert response.json()["deleted_count"] == 4
+        assert list(tmp_path.glob("*.webp")) == []
+
+
+class TestFileIndex:
+    """Tests for the maintained index behind GET /api/screenshots/files."""
+
+    @pytest.mark.asyncio
+    async def test_captures_are_listed_newest_first(
+        self, service: ScreenshotService, file_index: ScreenshotFileIndex, tmp_path
+    ):
+        """Saved captures land in the index with size and format."""
+        service.dedupe_threshold = 0
+        first = await service.capture_screenshot()
+        second = await service.capture_screenshot()
+
+        entries = await file_index.list()
+
+        assert [e["name"] for e in entries] == [
+            os.path.basename(second["image_path"]), os.path.basename(first["image_path"]),
+        ]
+        assert entries[0]["format"] == "webp"
+        assert entries[0]["size"] == os.path.getsize(second["image_path"])
+
+    @pytest.mark.asyncio
+    async def test_log_is_replayed_and_rebuilt(self, file_index: ScreenshotFileIndex, tmp_path):
+        """A fresh index replays the log; without a log it scans once."""
+        for name in ("a.webp", "b.jpg", "c.png", "c_thumb.png", "notes.txt"):
+            (tmp_path / name).write_bytes(b"x" * 10)
+
+        assert await file_index.count() == 3
+        await file_index.discard([str(tmp_path / "b.jpg")])
+        await file_index.add(tmp_path / "d.jpeg", 42, mtime=time.time() + 60)
+
+        replayed = ScreenshotFileIndex(tmp_path)
+        assert [e["name"] for e in await replayed.list()][0] == "d.jpeg"
+        assert {e["name"] for e in await replayed.list()} == {"a.webp", "c.png", "d.jpeg"}
+
+        os.remove(file_index.log_path)
+        rescanned = ScreenshotFileIndex(tmp_path)
+        assert {e["format"] for e in await rescanned.list()} == {"webp", "jpeg", "png"}
+
+    @pytest.mark.asyncio
+    async def test_log_is_compacted(self, file_index: ScreenshotFileIndex, tmp_path):
+        """Churn does not grow the log without bound."""
+        for index in range(200):
+            path = tmp_path / f"{index}.webp"
+            await file_index.add(path, 1)
+            await file_index.discard([str(path)])
+
+        with open(file_index.log_path) as log:
+            assert len(log.readlines()) <= 100
+
+    @pytest.mark.asyncio
+    async def test_cleanup_and_endpoint(
+        self, client, service: ScreenshotService, db_session: AsyncSession,
+        test_user: User, file_index: ScreenshotFileIndex, tmp_path
+    ):
+        """Cleanup drops files from the index and the listing follows."""
+        await seed_screenshots(db_session, test_user.id, 3, directory=tmp_path, start=days_ago(40))
+        [(kept_id, kept_path, _)] = await seed_screenshots(
+            db_session, test_user.id, 1, directory=tmp_path, start=days_ago(1)
+        )
+        assert await file_index.count() == 4
+
+        await service.cleanup_screenshots(db_session, datetime.now() - timedelta(days=30))
+
+        response = await client.get("/api/screenshots/files")
+        body = response.json()
+        assert body["total"] == 1
+        assert [f["filename"] for f in body["screenshots"]] == [os.path.basename(kept_path)]
+        assert body["screenshots"][0]["size_kb"] == round(1000 / 1024, 1)
+
+
+class TestImageCaching:
+    """Tests for ETags, cache headers and signed URL reuse on image routes."""
+
+    @pytest.mark.asyncio
+    async def test_image_revalidates_with_etag(self, client, service: ScreenshotService):
+        """Images carry a strong ETag and long-lived cache headers; a match is a bodiless 304."""
+        captured = await service.capture_screenshot()
+        url = f"/api/screenshots/{captured['id']}/image"
+
+        response = await client.get(url)
+        etag = response.headers["etag"]
+        assert response.status_code == 200
+        assert etag == f'"{captured["id"]}-image-{captured["image_size"]}"'
+        assert "immutable" in response.headers["cache-control"]
+
+        revalidated = await client.get(url, headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+        thumbnail = await client.get(url, params={"thumbnail": True}, headers={"If-None-Match": etag})
+        assert thumbnail.status_code == 200
+        assert thumbnail.headers["etag"] != etag
+
+    @pytest.mark.asyncio
+    async def test_file_route_revalidates(self, client, service: ScreenshotService, tmp_path, monkeypatch):
+        """Files by name revalidate too, thumbnails included."""
+        monkeypatch.setattr(screenshot_service, "screenshots_path", tmp_path)
+        captured = await service.capture_screenshot()
+
+        for path in (captured["image_path"], captured["thumbnail_path"]):
+            url = f"/api/screenshots/files/{os.path.basename(path)}"
+            response = await client.get(url)
+            assert response.headers["etag"] == f'"{os.path.basename(path)}-{os.path.getsize(path)}"'
+
+            revalidated = await client.get(url, headers={"If-None-Match": response.headers["etag"]})
+            assert revalidated.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_signed_urls_are_reused(self, bucket: FakeBucket, monkeypatch):
+        """A signed URL is generated once per path until it ages out or the blob is deleted."""
+        monkeypatch.setattr(firebase_storage, "_signed_urls", {})
+
+        first = await firebase_storage.get_signed_url("users/1/a.jpg")
+        assert await firebase_storage.get_signed_url("users/1/a.jpg") == first
+        await firebase_storage.get_signed_url("users/1/b.jpg")
+        assert bucket.signed == ["users/1/a.jpg", "users/1/b.jpg"]
+
+        await firebase_storage.delete_file("users/1/a.jpg")
+        assert await firebase_storage.get_signed_url("users/1/a.jpg") != first
+
+        monkeypatch.setattr(firebase_storage, "signed_url_cache_seconds", 0)
+        await firebase_storage.get_signed_url("users/1/c.jpg")
+        await firebase_storage.get_signed_url("users/1/c.jpg")
+        assert len(bucket.signed) == 5
+
+    @pytest.mark.asyncio
+    async def test_cloud_image_redirects_to_signed_url(
+        self, client, bucket: FakeBucket, db_session: AsyncSession, test_user: User, monkeypatch
+    ):
+        """Uploaded screenshots redirect to a cached signed URL."""
+        monkeypatch.setattr(firebase_storage, "_signed_urls", {})
+        screenshot_id = str(uuid.uuid4())
+        db_session.add(Screenshot(
+            id=screenshot_id, user_id=test_user.id, timestamp=datetime.now(),
+            storage_path="users/1/screenshots/x.jpg", storage_url="https://public.example/x.jpg",
+        ))
+        await db_session.commit()
+
+        for _ in range(2):
+            response = await client.get(
+                f"/api/screenshots/{screenshot_id}/image", params={"thumbnail": True}, follow_redirects=False
+            )
+            assert response.status_code == 307
+            assert response.headers["location"].startswith("https://signed.example/users/1/screenshots/x_thumb.jpg")
+        assert bucket.signed == ["users/1/screenshots/x_thumb.jpg"]
+
+
+@pytest.fixture
+def sprites(tmp_path, monkeypatch) -> ScreenshotSpriteService:
+    sprites = ScreenshotSpriteService(directory=str(tmp_path / "sprites"))
+    monkeypatch.setattr(screenshot_routes, "screenshot_sprite_service", sprites)
+    monkeypatch.setattr(sprite_module, "screenshot_sprite_service", sprites)
+    yield sprites
+    sprites.shutdown()
+
+
+class TestContactSheets:
+    """Tests for gallery pages served as one sprite image plus an offset map."""
+
+    @pytest.mark.asyncio
+    async def test_page_is_one_sprite_with_offsets(
+        self, client, sprites: ScreenshotSpriteService, db_session: AsyncSession, tmp_path
+    ):
+        """Tiles are laid out in a grid and the sprite image is served once per key."""
+        ids = [i for i, _, _ in await seed_screenshots(
+            db_session, None, 12, directory=tmp_path, files="thumbnail"
+        )]
+
+        response = await client.get("/api/screenshots/sprites")
+        sheet = response.json()
+
+        assert [t["id"] for t in sheet["tiles"]] == ids
+        assert (sheet["tiles"][11]["x"], sheet["tiles"][11]["y"]) == (320, 180)
+        assert (sheet["width"], sheet["height"]) == (3200, 360)
+        assert sheet["tiles"][0]["width"] == 320
+
+        image = await client.get(sheet["sprite_url"])
+        assert image.status_code == 200
+        sprite = Image.open(io.BytesIO(image.content))
+        assert sprite.size == (3200, 360)
+        assert sprite.getpixel((320 + 160, 180 + 90))[0] == pytest.approx(11 * 40 % 256, abs=8)
+
+        revalidated = await client.get(sheet["sprite_url"], headers={"If-None-Match": image.headers["etag"]})
+        assert revalidated.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_sheets_are_cached_until_the_page_changes(
+        self, client, sprites: ScreenshotSpriteService, db_session: AsyncSession, tmp_path
+    ):
+        """Repeat requests reuse the sheet; a new capture replaces it."""
+        await seed_screenshots(db_session, None, 3, directory=tmp_path, files="thumbnail")
+
+        first = (await client.get("/api/screenshots/sprites")).json()
+        again = (await client.get("/api/screenshots/sprites")).json()
+        assert again["sprite_key"] == first["sprite_key"]
+        assert (sprites.hits, sprites.misses) == (1, 1)
+
+        await seed_screenshots(db_session, None, 1, directory=tmp_path, files="thumbnail")
+        changed = (await client.get("/api/screenshots/sprites")).json()
+
+        assert changed["sprite_key"] != first["sprite_key"]
+        assert changed["count"] == 4
+        assert (await client.get(first["sprite_url"])).status_code == 404
+        assert len(list(sprites.directory.glob("*.webp"))) == 1
+
+    @pytest.mark.asyncio
+    async def test_pages(self, client, sprites: ScreenshotSpriteService, db_session: AsyncSession, tmp_path):
+        """Days larger than a page are split; missing thumbnails leave an empty tile."""
+        sprites.page_size = 5
+        ids = [i for i, _, _ in await seed_screenshots(
+            db_session, None, 7, directory=tmp_path, files="thumbnail"
+        )]
+        os.remove(tmp_path / f"{ids[6]}_thumb.webp")
+
+        sheet = (await client.get("/api/screenshots/sprites", params={"page": 1})).json()
+
+        assert (sheet["pages"], sheet["total"], sheet["count"]) == (2, 7, 2)
+        assert [t["id"] for t in sheet["tiles"]] == ids[5:]
+        assert sheet["tiles"][1]["width"] == 0
+
+    @pytest.mark.asyncio
+    async def test_team_member_sprite(
+        self, authenticated_client, sprites: ScreenshotSpriteService,
+        db_session: AsyncSession, test_user: User, tmp_path
+    ):
+        """Team admins get a member's day as contact sheets, subject to sharing."""
+        team = Team(name="Platform", slug=f"team-{uuid.uuid4().hex[:8]}")
+        member = User(email="sprite-member@example.com", name="Member", hashed_password="x")
+        db_session.add_all([team, member])
+        await db_session.flush()
+        sharing = TeamMember(team_id=team.id, user_id=member.id, role=TeamRole.MEMBER, share_screenshots=True)
+        db_session.add_all([
+            TeamMember(team_id=team.id, user_id=test_user.id, role=TeamRole.OWNER),
+            sharing,
+        ])
+        await db_session.commit()
+        team_id, member_id = team.id, member.id
+        ids = [i for i, _, _ in await seed_screenshots(
+            db_session, member_id, 4, directory=tmp_path, files="thumbnail"
+        )]
+        await seed_screenshots(db_session, test_user.id, 2, directory=tmp_path, files="thumbnail")
+
+        url = f"/api/teams/{team_id}/members/{member_id}/screenshots/sprite"
+        sheet = (await authenticated_client.get(url)).json()
+
+        assert [t["id"] for t in sheet["tiles"]] == ids
+        assert (await authenticated_client.get(sheet["sprite_url"])).status_code == 200
+
+        sharing.share_screenshots = False
+        await db_session.commit()
+        assert (await authenticated_client.get(url)).status_code == 403
+
+
+class TestTiering:
+    """Tests for recompressing older screenshots to cheaper storage tiers."""
+
+    @pytest.fixture(autouse=True)
+    def inline_workers(self, monkeypatch):
+        monkeypatch.setattr(screenshot_tiering_service, "max_workers", 0)
+
+    @pytest.mark.asyncio
+    async def test_old_images_are_recompressed(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path
+    ):
+        """Images past the cutoff shrink in place; sizes, usage and mtimes follow."""
+        user_id = test_user.id
+        old = await seed_screenshots(db_session, user_id, 3, directory=tmp_path, files="frame", start=days_ago(20))
+        [(recent_id, recent_path, _)] = await seed_screenshots(
+            db_session, user_id, 1, directory=tmp_path, files="frame", start=days_ago(1)
+        )
+        _, usage_before = await get_screenshot_usage(db_session, user_id)
+        before = {path: os.stat(path) for _, path, _ in old}
+
+        service.update_settings(tier_after_days=14, tier_resolution="low", tier_quality=30)
+        stats = await service.tier_screenshots(db_session)
+
+        assert (stats["processed"], stats["failed"]) == (3, 0)
+        assert stats["bytes_reclaimed"] == sum(s.st_size for s in before.values()) - stats["bytes_after"] > 0
+        for screenshot_id, path, _ in old:
+            with Image.open(path) as img:
+                assert img.height == 480 and img.width <= 854
+            assert os.stat(path).st_mtime == before[path].st_mtime
+        db_session.expire_all()
+        rows = {s.id: s for s in (await db_session.execute(select(Screenshot))).scalars()}
+        assert {rows[i].storage_tier for i, _, _ in old} == {"compressed"}
+        assert rows[recent_id].storage_tier == "original"
+        assert rows[old[0][0]].image_size == os.path.getsize(old[0][1])
+        assert (await get_screenshot_usage(db_session, user_id))[1] == usage_before - stats["bytes_reclaimed"]
+
+        again = await service.tier_screenshots(db_session)
+        assert again["processed"] == 0
+        assert screenshot_tiering_service.get_stats()["last_run"]["processed"] == 0
+
+    @pytest.mark.asyncio
+    async def test_full_size_can_be_dropped(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path
+    ):
+        """Dropping keeps only the thumbnail, for near-duplicates too."""
+        user_id = test_user.id
+        [(original_id, image_path, thumbnail_path)] = await seed_screenshots(
+            db_session, user_id, 1, directory=tmp_path, files="frame", start=days_ago(20)
+        )
+        duplicate_id = str(uuid.uuid4())
+        db_session.add(Screenshot(
+            id=duplicate_id, user_id=user_id, timestamp=datetime.now(),
+            image_path=image_path, thumbnail_path=thumbnail_path, duplicate_of=original_id,
+        ))
+        await db_session.commit()
+        _, usage_before = await get_screenshot_usage(db_session, user_id)
+        image_size = os.path.getsize(image_path)
+
+        service.update_settings(tier_after_days=14, tier_drop_full_size=True)
+        stats = await service.tier_screenshots(db_session)
+
+        assert stats["bytes_reclaimed"] == image_size
+        assert not os.path.exists(image_path)
+        db_session.expire_all()
+        original = await db_session.get(Screenshot, original_id)
+        duplicate = await db_session.get(Screenshot, duplicate_id)
+        assert (original.storage_tier, original.image_path, original.image_size) == ("thumbnail", thumbnail_path, 0)
+        assert duplicate.image_path == thumbnail_path
+        assert (await get_screenshot_usage(db_session, user_id))[1] == usage_before - image_size
+
+    @pytest.mark.asyncio
+    async def test_runs_in_a_process_pool(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User, tmp_path, monkeypatch
+    ):
+        """Re-encoding also works from the low-priority worker processes."""
+        monkeypatch.setattr(screenshot_tiering_service, "max_workers", 1)
+        await seed_screenshots(db_session, test_user.id, 2, directory=tmp_path, files="frame", start=days_ago(20))
+
+        stats = await service.tier_screenshots(db_session, cutoff=datetime.now() - timedelta(days=14))
+
+        assert (stats["processed"], stats["failed"]) == (2, 0)
+
+    def test_tier_settings_are_validated(self, service: ScreenshotService):
+        """Unknown presets and out-of-range qualities are ignored."""
+        service.update_settings(tier_resolution="huge", tier_quality=0)
+        assert (service.tier_resolution, service.tier_quality) == ("low", 30)
+        service.update_settings(tier_resolution="medium", tier_quality=45, tier_drop_full_size=True)
+        assert (service.tier_resolution, service.tier_quality, service.tier_drop_full_size) == ("medium", 45, True)
+
+
+def contrast(image_bytes: bytes) -> float:
+    return ImageStat.Stat(Image.open(io.BytesIO(image_bytes)).convert("L")).stddev[0]
+
+
+class TestPrivacyBlur:
+    """Tests for the blur stage of the capture pipeline."""
+
+    @pytest.fixture(autouse=True)
+    def striped(self, fake_mss):
+        FakeMss.frame = STRIPED_FRAME
+
+    def test_blur_applies_to_image_and_thumbnail(self, fake_mss):
+        """Both outputs come from the blurred frame, and the stage is timed."""
+        sharp = capture_frame((1280, 720), "webp", quality=50, thumbnail_quality=40)
+        blurred = capture_frame((1280, 720), "webp", quality=50, thumbnail_quality=40, blur=True)
+
+        assert blurred.blurred and not sharp.blurred
+        assert contrast(blurred.image_bytes) < contrast(sharp.image_bytes) / 4
+        assert contrast(blurred.thumbnail_bytes) < contrast(sharp.thumbnail_bytes) / 4
+        assert blurred.timings["blur"] > 0
+
+    def test_modes(self, service: ScreenshotService):
+        """"excluded" matches app names case-insensitively; flagged captures always blur."""
+        service.update_settings(blur_mode="excluded", excluded_apps=["1Password", "Slack"])
+        assert service.should_blur("1password")
+        assert service.should_blur("Slack Helper")
+        assert not service.should_blur("Code")
+        assert service.should_blur("Code", flagged=True)
+
+        service.update_settings(blur_mode="always")
+        assert service.should_blur(None)
+        service.update_settings(blur_mode="sometimes")
+        assert service.blur_mode == "always"
+        service.update_settings(blur_mode="never")
+        assert not service.should_blur("1Password")
+
+    @pytest.mark.asyncio
+    async def test_excluded_app_capture_is_stored_blurred(
+        self, service: ScreenshotService, db_session: AsyncSession
+    ):
+        """The row is marked blurred and the blur count is reported."""
+        service.update_settings(blur_mode="excluded", excluded_apps=["Slack"])
+        result = await service.capture_screenshot(app_name="Slack")
+
+        row = (await db_session.execute(select(Screenshot).where(Screenshot.id == result["id"]))).scalar_one()
+        assert row.is_blurred is True
+        with open(result["thumbnail_path"], "rb") as f:
+            assert contrast(f.read()) < 40
+        assert service.get_capture_stats()["blur"] == {"mode": "excluded", "blurred": 1}
+
+    @pytest.mark.asyncio
+    async def test_user_privacy_setting_blurs(
+        self, service: ScreenshotService, db_session: AsyncSession, test_user: User
+    ):
+        """A user who asked for blurred screenshots gets them in any mode."""
+        db_session.add(UserSettings(user_id=test_user.id, blur_screenshots=True))
+        await db_session.commit()
+
+        result = await service.capture_screenshot(user_id=test_user.id)
+
+        assert result["is_blurred"] is True
+
+    @pytest.mark.asyncio
+    async def test_dedupe_never_crosses_blur_state(self, service: ScreenshotService):
+        """A blurred capture is not stored as a reference to a sharp one, or the reverse."""
+        service.update_settings(blur_mode="excluded", excluded_apps=["Slack"])
+        sharp = await service.capture_screenshot(app_name="Code")
+        blurred = await service.capture_screenshot(app_name="Slack")
+        again = await service.capture_screenshot(app_name="Slack")
+
+        assert "duplicate_of" not in blurred
+        assert blurred["image_path"] != sharp["image_path"]
+        assert again["duplicate_of"] == blurred["id"]
@@ -1,6 +1,7 @@
 import { useEffect, useRef, useCallback, useState } from 'react';
 import { useQueryClient } from '@tanstack/react-query';
 import { useActivityStore } from '@/stores/activityStore';
+import { useAuthStore } from '@/stores/authStore';
 import { activityKeys } from './useActivities';
 
 // Derive WebSocket URL from API URL
@@ -11,26 +12,28 @@ const MAX_RECONNECT_ATTEMPTS = 10;
 
 type TimeoutId = ReturnType<typeof setTimeout>;
 
+interface LiveActivity {
+  app_name: string;
+  window_title: string;
+  url: string | null;
+  started_at: string | null;
+  is_idle: boolean;
+  category: string;
+  productivity_score: number;
+  productivity_type: 'productive' | 'neutral' | 'distracting';
+}
+
+// "current_activity" carries every field; "activity_diff" only the changed ones
 interface WebSocketMessage {
   type: string;
   timestamp: string;
-  data?: {
-    app_name: string;
-    window_title: string;
-    url: string | null;
-    duration: number;
-    start_time: string | null;
-    is_afk: boolean;
-    category: string;
-    productivity_score: number;
-    productivity_type: 'productive' | 'neutral' | 'distracting';
-  };
-  activitywatch_available?: boolean;
+  data?: Partial<LiveActivity>;
 }
 
 export function useActivityWebSocket() {
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectAttemptsRef = useRef(0);
+  const activityRef = useRef<LiveActivity | null>(null);
   const reconnectTimeoutRef = useRef<TimeoutId | null>(null);
   const pingIntervalRef = useRef<TimeoutId | null>(null);
 
@@ -38,15 +41,21 @@ export function useActivityWebSocket() {
   const [lastMessage, setLastMessage] = useState<WebSocketMessage | null>(null);
 
   const queryClient = useQueryClient();
-  const { setCurrentActivity, setIsConnected: setStoreConnected, setActivityWatchAvailable } = useActivityStore();
+  const { setCurrentActivity, setIsConnected: setStoreConnected } = useActivityStore();
 
   const connect = useCallback(() => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
       return;
     }
 
+    // The socket subscribes to the signed-in user's channel only
+    const token = useAuthStore.getState().token;
+    if (!token) {
+      return;
+    }
+
     try {
-      const ws = new WebSocket(WS_URL);
+      const ws = new WebSocket(`${WS_URL}?token=${encodeURIComponent(token)}`);
       wsRef.current = ws;
 
       ws.onopen = () => {
@@ -67,26 +76,26 @@ export function useActivityWebSocket() {
           const message: WebSocketMessage = JSON.parse(event.data);
           setLastMessage(message);
 
-          if (message.type === 'current_activity' && message.data) {
+          const isFull = message.type === 'current_activity';
+          if ((isFull || (message.type === 'activity_diff' && activityRef.current)) && message.data) {
+            const activity = (isFull ? message.data : { ...activityRef.current, ...message.data }) as LiveActivity;
+            activityRef.current = activity;
+            const startTime = activity.started_at ? new Date(activity.started_at) : new Date();
+
             // Update the store with current activity
             setCurrentActivity({
               id: `ws-${Date.now()}`,
-              appName: message.data.app_name,
-              windowTitle: message.data.window_title,
-              url: message.data.url || undefined,
-              duration: message.data.duration,
-              category: message.data.category,
-              productivityScore: message.data.productivity_score,
-              productivityType: message.data.productivity_type,
-              isAfk: message.data.is_afk,
-              startTime: message.data.start_time ? new Date(message.data.start_time) : new Date(),
+              appName: activity.app_name,
+              windowTitle: activity.window_title,
+              url: activity.url || undefined,
+              duration: Math.max(0, Math.round((Date.now() - startTime.getTime()) / 1000)),
+              category: activity.category,
+              productivityScore: activity.productivity_score,
+              productivityType: activity.productivity_type,
+              isAfk: activity.is_idle,
+              startTime,
             });
 
-            // Update ActivityWatch availability
-            if (message.activitywatch_available !== undefined) {
-              setActivityWatchAvailable(message.activitywatch_available);
-            }
-
             // Invalidate current activity query to sync React Query cache
             queryClient.invalidateQueries({ queryKey: activityKeys.current() });
           }
@@ -122,7 +131,7 @@ export function useActivityWebSocket() {
     } catch (err) {
       console.error('Failed to create WebSocket:', err);
     }
-  }, [queryClient, setCurrentActivity, setStoreConnected, setActivityWatchAvailable]);
+  }, [queryClient, setCurrentActivity, setStoreConnected]);
 
   const disconnect = useCallback(() => {
     if (reconnectTimeoutRef.current) {
@@ -2,6 +2,7 @@
  * Reports API Client
  * Handles report generation, preview, and download
  */
+import { format, startOfWeek, subWeeks } from 'date-fns';
 import { apiClient } from './client';
 
 export type ReportPeriod = 'daily' | 'weekly' | 'monthly';
@@ -50,6 +51,25 @@ export interface ReportPreview {
 export interface EmailReportRequest {
   period: ReportPeriod;
   recipient_email?: string;
+  start_date?: string;
+  end_date?: string;
+}
+
+export interface ReportWindow {
+  startDate?: string;
+  endDate?: string;
+}
+
+/**
+ * Date range a period's report covers. Weekly is last Monday-to-Monday
+ * week in local time, the window the server pre-generates every Monday,
+ * so its PDF is served from storage; other periods use the server default.
+ */
+export function reportWindow(period: ReportPeriod, now: Date = new Date()): ReportWindow {
+  if (period !== 'weekly') return {};
+  const weekEnd = startOfWeek(now, { weekStartsOn: 1 });
+  const toLocal = (date: Date) => format(date, "yyyy-MM-dd'T'HH:mm:ss");
+  return { startDate: toLocal(subWeeks(weekEnd, 1)), endDate: toLocal(weekEnd) };
 }
 
 /**
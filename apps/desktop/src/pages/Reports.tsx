@@ -27,6 +27,7 @@ import {
   getReportPreview,
   downloadReportPDF,
   sendReportEmail,
+  reportWindow,
   ReportPeriod,
 } from '@/lib/api/reports';
 
@@ -38,7 +39,7 @@ type PeriodOption = {
 
 const periodOptions: PeriodOption[] = [
   { value: 'daily', label: 'Daily', description: 'Today\'s activity' },
-  { value: 'weekly', label: 'Weekly', description: 'Last 7 days' },
+  { value: 'weekly', label: 'Weekly', description: 'Last full week' },
   { value: 'monthly', label: 'Monthly', description: 'Last 30 days' },
 ];
 
@@ -49,12 +50,18 @@ export default function Reports() {
   // Fetch report preview
   const { data: preview, isLoading, error, refetch } = useQuery({
     queryKey: ['report-preview', selectedPeriod],
-    queryFn: () => getReportPreview(selectedPeriod),
+    queryFn: () => {
+      const { startDate, endDate } = reportWindow(selectedPeriod);
+      return getReportPreview(selectedPeriod, startDate, endDate);
+    },
   });
 
   // Email mutation
   const emailMutation = useMutation({
-    mutationFn: () => sendReportEmail({ period: selectedPeriod }),
+    mutationFn: () => {
+      const { startDate, endDate } = reportWindow(selectedPeriod);
+      return sendReportEmail({ period: selectedPeriod, start_date: startDate, end_date: endDate });
+    },
     onSuccess: () => {
       toast.success('Report sent to your email!');
     },
@@ -67,7 +74,8 @@ export default function Reports() {
   const handleDownload = async () => {
     setIsDownloading(true);
     try {
-      await downloadReportPDF(selectedPeriod);
+      const { startDate, endDate } = reportWindow(selectedPeriod);
+      await downloadReportPDF(selectedPeriod, startDate, endDate);
       toast.success('Report downloaded successfully!');
     } catch (error: any) {
       toast.error(error?.response?.data?.detail || 'Failed to download report');